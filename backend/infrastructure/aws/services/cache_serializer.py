@@ -0,0 +1,131 @@
+"""
+Compact serialization for values stored in ElastiCache.
+Values are encoded with orjson or msgpack where possible, compressed with
+zstd above a size threshold and tagged with a version byte, so payloads
+written by older adapter versions still decode.
+"""
+
+import json
+import pickle
+from typing import Any
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+# First byte of every payload written by CacheSerializer. Older payloads
+# are JSON text or pickle (0x80 ...), neither of which can start with it.
+PAYLOAD_VERSION = 0x01
+
+# Second byte: codec in the low bits, compression flag in the high bit
+CODEC_PICKLE = 0x00
+CODEC_ORJSON = 0x01
+CODEC_MSGPACK = 0x02
+FLAG_ZSTD = 0x80
+
+CACHE_CODECS = ("auto", "orjson", "msgpack", "pickle")
+
+# orjson would otherwise turn these into strings or dicts; they go to pickle instead
+_ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+    if ORJSON_AVAILABLE else 0
+)
+
+
+class CacheSerializer:
+    """
+    Encode cache values as [version byte][codec byte][body].
+    
+    The codec is orjson, msgpack or pickle ("auto" takes the first one
+    installed). Values the codec can't represent exactly - datetimes,
+    dataclasses, sets, custom objects - fall back to pickle per value;
+    tuples come back as lists from orjson and msgpack, and orjson stores
+    UUIDs and Enum members as their string or value. Bodies larger than
+    `compression_threshold` bytes are zstd-compressed when zstandard is
+    installed.
+    """
+    
+    def __init__(self, codec: str = "auto", compression_threshold: int = 1024, compression_level: int = 3):
+        if codec not in CACHE_CODECS:
+            raise ValueError(f"Unknown cache codec '{codec}', expected one of {CACHE_CODECS}")
+        if codec == "auto":
+            codec = "orjson" if ORJSON_AVAILABLE else "msgpack" if MSGPACK_AVAILABLE else "pickle"
+        if codec == "orjson" and not ORJSON_AVAILABLE:
+            raise ValueError("orjson is not installed")
+        if codec == "msgpack" and not MSGPACK_AVAILABLE:
+            raise ValueError("msgpack is not installed")
+        
+        self.codec = codec
+        self.compression_threshold = compression_threshold
+        self._compressor = zstandard.ZstdCompressor(level=compression_level) if ZSTD_AVAILABLE else None
+        self._decompressor = zstandard.ZstdDecompressor() if ZSTD_AVAILABLE else None
+    
+    def dumps(self, value: Any) -> bytes:
+        """Encode a value."""
+        codec, body = self._encode(value)
+        
+        if self._compressor is not None and len(body) > self.compression_threshold:
+            compressed = self._compressor.compress(body)
+            if len(compressed) < len(body):
+                codec |= FLAG_ZSTD
+                body = compressed
+        
+        return bytes((PAYLOAD_VERSION, codec)) + body
+    
+    def loads(self, data: bytes) -> Any:
+        """Decode a value written by dumps() or by the earlier JSON/pickle format."""
+        if not data or data[0] != PAYLOAD_VERSION:
+            return self._loads_legacy(data)
+        
+        codec = data[1]
+        body = data[2:]
+        if codec & FLAG_ZSTD:
+            if self._decompressor is None:
+                raise ValueError("Cache payload is zstd-compressed but zstandard is not installed")
+            body = self._decompressor.decompress(body)
+            codec &= ~FLAG_ZSTD
+        
+        if codec == CODEC_ORJSON:
+            return orjson.loads(body)
+        if codec == CODEC_MSGPACK:
+            return msgpack.unpackb(body, raw=False, strict_map_key=False)
+        if codec == CODEC_PICKLE:
+            return pickle.loads(body)
+        raise ValueError(f"Unknown cache payload codec {codec}")
+    
+    def _encode(self, value: Any):
+        if self.codec == "orjson":
+            try:
+                return CODEC_ORJSON, orjson.dumps(value, option=_ORJSON_OPTIONS)
+            except TypeError:
+                pass
+        elif self.codec == "msgpack":
+            try:
+                return CODEC_MSGPACK, msgpack.packb(value, use_bin_type=True)
+            except (TypeError, ValueError, OverflowError):
+                pass
+        
+        return CODEC_PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    @staticmethod
+    def _loads_legacy(data: bytes) -> Any:
+        """Decode the earlier format: JSON for simple types, pickle otherwise."""
+        try:
+            return json.loads(data.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return pickle.loads(data)
@@ -3,74 +3,133 @@ AWS ElastiCache service adapter for caching operations.
 This adapter provides caching capabilities using AWS ElastiCache (Redis).
 """
 
-import json
-import pickle
-from typing import Any, Dict, List, Optional
+import asyncio
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 import boto3
-import redis
+from redis import asyncio as redis_asyncio
 from botocore.exceptions import ClientError, BotoCoreError
 
 from backend.core.interfaces import CacheService
+from .cache_serializer import CacheSerializer
 
 
 class AWSElastiCacheAdapter(CacheService):
-    """AWS ElastiCache implementation for caching operations."""
+    """
+    AWS ElastiCache implementation for caching operations.
     
-    def __init__(self, cluster_endpoint: str, port: int = 6379, region_name: str = "us-east-1"):
+    Redis is reached through an asyncio connection pool of up to
+    max_connections connections; when all are busy, commands wait up to
+    pool_timeout seconds for one instead of failing. Values are encoded by
+    CacheSerializer (orjson or msgpack, zstd above compression_threshold
+    bytes), which still reads payloads written by earlier versions.
+    
+    Key listing and tenant flushes walk the keyspace with incremental SCAN
+    and remove keys with UNLINK in bounded batches, so they never block the
+    shard the way KEYS and one huge DEL do.
+    
+    With namespace_versioning, tenant keys carry a namespace version
+    ("{tenant_id}:v{version}:{key}") and flush_tenant_cache only increments
+    it, in O(1); keys of older versions are no longer addressed and expire
+    on their TTL, so writes without a TTL get namespace_key_ttl. Other
+    processes pick up a new version within namespace_refresh_seconds.
+    """
+    
+    # Pub/sub channel for near cache invalidations
+    INVALIDATION_CHANNEL = "cache:invalidate"
+    
+    def __init__(self, cluster_endpoint: str, port: int = 6379, region_name: str = "us-east-1",
+                 namespace_versioning: bool = False, namespace_refresh_seconds: float = 1.0,
+                 namespace_key_ttl: int = 86400, scan_count: int = 1000, unlink_batch_size: int = 500,
+                 max_connections: int = 20, pool_timeout: float = 5.0, serializer: str = "auto",
+                 compression_threshold: int = 1024):
         """Initialize AWS ElastiCache adapter."""
         self.cluster_endpoint = cluster_endpoint
         self.port = port
         self.region_name = region_name
         
+        # Value encoding
+        self.serializer = CacheSerializer(serializer, compression_threshold=compression_threshold)
+        
+        # Keyspace iteration
+        self.scan_count = scan_count
+        self.unlink_batch_size = unlink_batch_size
+        
+        # Versioned tenant namespaces
+        self.namespace_versioning = namespace_versioning
+        self.namespace_refresh_seconds = namespace_refresh_seconds
+        self.namespace_key_ttl = namespace_key_ttl
+        self._namespace_versions: Dict[str, Tuple[int, float]] = {}
+        
         # ElastiCache management client
         self.elasticache_client = boto3.client('elasticache', region_name=region_name)
         
-        # Redis connection pool
-        self.redis_pool = redis.ConnectionPool(
+        # Redis connection pool (asyncio; waits for a free connection when exhausted)
+        self.redis_pool = redis_asyncio.BlockingConnectionPool(
             host=cluster_endpoint,
             port=port,
             decode_responses=False,  # We'll handle encoding ourselves
-            max_connections=20,
+            max_connections=max_connections,
+            timeout=pool_timeout,
             retry_on_timeout=True,
             socket_connect_timeout=5,
             socket_timeout=5
         )
         
         self._redis_client = None
+        self._invalidation_task: Optional[asyncio.Task] = None
     
     @property
     def redis_client(self):
         """Lazy load Redis client."""
         if self._redis_client is None:
-            self._redis_client = redis.Redis(connection_pool=self.redis_pool)
+            self._redis_client = redis_asyncio.Redis(connection_pool=self.redis_pool)
         return self._redis_client
     
-    def _get_tenant_key(self, key: str, tenant_id: str) -> str:
+    async def _tenant_prefix(self, tenant_id: str) -> str:
+        """Key prefix of a tenant's namespace."""
+        if self.namespace_versioning:
+            return f"{tenant_id}:v{await self._namespace_version(tenant_id)}:"
+        return f"{tenant_id}:"
+    
+    async def _get_tenant_key(self, key: str, tenant_id: str) -> str:
         """Generate tenant-isolated cache key."""
-        return f"{tenant_id}:{key}"
+        return await self._tenant_prefix(tenant_id) + key
+    
+    def _namespace_version_key(self, tenant_id: str) -> str:
+        # Outside the tenant's prefix so tenant scans never see it
+        return f"__namespace__:{tenant_id}"
+    
+    async def _namespace_version(self, tenant_id: str) -> int:
+        """Get a tenant's namespace version, re-read at most every namespace_refresh_seconds."""
+        now = time.monotonic()
+        cached = self._namespace_versions.get(tenant_id)
+        if cached is not None and now - cached[1] < self.namespace_refresh_seconds:
+            return cached[0]
+        
+        version = int(await self.redis_client.get(self._namespace_version_key(tenant_id)) or 0)
+        self._namespace_versions[tenant_id] = (version, now)
+        return version
+    
+    def _default_ttl(self, ttl: Optional[int]) -> Optional[int]:
+        """Versioned keys always expire, so flushed namespaces are reclaimed."""
+        if ttl or not self.namespace_versioning:
+            return ttl
+        return self.namespace_key_ttl
     
     def _serialize_value(self, value: Any) -> bytes:
         """Serialize value for storage in Redis."""
-        if isinstance(value, (str, int, float, bool)):
-            return json.dumps(value).encode('utf-8')
-        else:
-            # Use pickle for complex objects
-            return pickle.dumps(value)
+        return self.serializer.dumps(value)
     
     def _deserialize_value(self, data: bytes) -> Any:
         """Deserialize value from Redis storage."""
-        try:
-            # Try JSON first (for simple types)
-            return json.loads(data.decode('utf-8'))
-        except (json.JSONDecodeError, UnicodeDecodeError):
-            # Fall back to pickle for complex objects
-            return pickle.loads(data)
+        return self.serializer.loads(data)
     
     async def get(self, key: str, tenant_id: str) -> Optional[Any]:
         """Get value from cache."""
         try:
-            cache_key = self._get_tenant_key(key, tenant_id)
-            data = self.redis_client.get(cache_key)
+            cache_key = await self._get_tenant_key(key, tenant_id)
+            data = await self.redis_client.get(cache_key)
             
             if data is None:
                 return None
@@ -84,13 +143,14 @@ class AWSElastiCacheAdapter(CacheService):
     async def set(self, key: str, value: Any, tenant_id: str, ttl: int = None) -> bool:
         """Set value in cache with optional TTL."""
         try:
-            cache_key = self._get_tenant_key(key, tenant_id)
+            cache_key = await self._get_tenant_key(key, tenant_id)
             serialized_value = self._serialize_value(value)
+            ttl = self._default_ttl(ttl)
             
             if ttl:
-                result = self.redis_client.setex(cache_key, ttl, serialized_value)
+                result = await self.redis_client.setex(cache_key, ttl, serialized_value)
             else:
-                result = self.redis_client.set(cache_key, serialized_value)
+                result = await self.redis_client.set(cache_key, serialized_value)
             
             return bool(result)
             
@@ -101,8 +161,8 @@ class AWSElastiCacheAdapter(CacheService):
     async def delete(self, key: str, tenant_id: str) -> bool:
         """Delete value from cache."""
         try:
-            cache_key = self._get_tenant_key(key, tenant_id)
-            result = self.redis_client.delete(cache_key)
+            cache_key = await self._get_tenant_key(key, tenant_id)
+            result = await self.redis_client.delete(cache_key)
             return result > 0
             
         except Exception as e:
@@ -112,8 +172,8 @@ class AWSElastiCacheAdapter(CacheService):
     async def exists(self, key: str, tenant_id: str) -> bool:
         """Check if key exists in cache."""
         try:
-            cache_key = self._get_tenant_key(key, tenant_id)
-            return bool(self.redis_client.exists(cache_key))
+            cache_key = await self._get_tenant_key(key, tenant_id)
+            return bool(await self.redis_client.exists(cache_key))
             
         except Exception as e:
             print(f"Error checking cache key existence: {e}")
@@ -122,8 +182,8 @@ class AWSElastiCacheAdapter(CacheService):
     async def increment(self, key: str, tenant_id: str, amount: int = 1) -> Optional[int]:
         """Increment a numeric value in cache."""
         try:
-            cache_key = self._get_tenant_key(key, tenant_id)
-            return self.redis_client.incrby(cache_key, amount)
+            cache_key = await self._get_tenant_key(key, tenant_id)
+            return await self.redis_client.incrby(cache_key, amount)
             
         except Exception as e:
             print(f"Error incrementing cache value: {e}")
@@ -132,8 +192,8 @@ class AWSElastiCacheAdapter(CacheService):
     async def decrement(self, key: str, tenant_id: str, amount: int = 1) -> Optional[int]:
         """Decrement a numeric value in cache."""
         try:
-            cache_key = self._get_tenant_key(key, tenant_id)
-            return self.redis_client.decrby(cache_key, amount)
+            cache_key = await self._get_tenant_key(key, tenant_id)
+            return await self.redis_client.decrby(cache_key, amount)
             
         except Exception as e:
             print(f"Error decrementing cache value: {e}")
@@ -142,8 +202,8 @@ class AWSElastiCacheAdapter(CacheService):
     async def get_multiple(self, keys: List[str], tenant_id: str) -> Dict[str, Any]:
         """Get multiple values from cache."""
         try:
-            cache_keys = [self._get_tenant_key(key, tenant_id) for key in keys]
-            values = self.redis_client.mget(cache_keys)
+            tenant_prefix = await self._tenant_prefix(tenant_id)
+            values = await self.redis_client.mget([tenant_prefix + key for key in keys])
             
             result = {}
             for i, key in enumerate(keys):
@@ -161,46 +221,92 @@ class AWSElastiCacheAdapter(CacheService):
     async def set_multiple(self, key_value_pairs: Dict[str, Any], tenant_id: str, ttl: int = None) -> bool:
         """Set multiple values in cache."""
         try:
-            pipe = self.redis_client.pipeline()
+            tenant_prefix = await self._tenant_prefix(tenant_id)
+            ttl = self._default_ttl(ttl)
             
-            for key, value in key_value_pairs.items():
-                cache_key = self._get_tenant_key(key, tenant_id)
-                serialized_value = self._serialize_value(value)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in key_value_pairs.items():
+                    cache_key = tenant_prefix + key
+                    serialized_value = self._serialize_value(value)
                 
-                if ttl:
-                    pipe.setex(cache_key, ttl, serialized_value)
-                else:
-                    pipe.set(cache_key, serialized_value)
+                    if ttl:
+                        pipe.setex(cache_key, ttl, serialized_value)
+                    else:
+                        pipe.set(cache_key, serialized_value)
             
-            results = pipe.execute()
+                results = await pipe.execute()
             return all(results)
             
         except Exception as e:
             print(f"Error setting multiple cache values: {e}")
             return False
     
+    async def delete_multiple(self, keys: List[str], tenant_id: str) -> int:
+        """Delete multiple values from cache. Returns the number of keys removed."""
+        try:
+            if not keys:
+                return 0
+            
+            tenant_prefix = await self._tenant_prefix(tenant_id)
+            return await self.redis_client.delete(*[tenant_prefix + key for key in keys])
+        
+        except Exception as e:
+            print(f"Error deleting multiple cache values: {e}")
+            return 0
+    
+    async def scan_keys(self, pattern: str, tenant_id: str) -> AsyncIterator[str]:
+        """
+        Iterate a tenant's keys matching a pattern with cursor-based SCAN.
+        
+        Each step examines about scan_count keys, so a large keyspace is
+        walked without blocking Redis. Keys are yielded without the tenant
+        prefix; a key may be yielded more than once if the keyspace is
+        resized mid-scan.
+        """
+        tenant_prefix = await self._tenant_prefix(tenant_id)
+        match = tenant_prefix + pattern
+        cursor = 0
+        
+        while True:
+            cursor, cache_keys = await self.redis_client.scan(cursor, match=match, count=self.scan_count)
+            for cache_key in cache_keys:
+                yield cache_key.decode('utf-8')[len(tenant_prefix):]
+            
+            if cursor == 0:
+                break
+    
     async def get_keys_by_pattern(self, pattern: str, tenant_id: str) -> List[str]:
         """Get keys matching a pattern for a tenant."""
         try:
-            tenant_pattern = self._get_tenant_key(pattern, tenant_id)
-            cache_keys = self.redis_client.keys(tenant_pattern)
-            
-            # Remove tenant prefix from keys
-            tenant_prefix = f"{tenant_id}:"
-            return [key.decode('utf-8')[len(tenant_prefix):] for key in cache_keys]
+            return list(dict.fromkeys([key async for key in self.scan_keys(pattern, tenant_id)]))
             
         except Exception as e:
             print(f"Error getting keys by pattern: {e}")
             return []
     
     async def flush_tenant_cache(self, tenant_id: str) -> bool:
-        """Flush all cache entries for a tenant."""
+        """
+        Flush all cache entries for a tenant.
+        
+        With namespace_versioning this bumps the tenant's namespace version;
+        otherwise the tenant's keys are scanned and unlinked in batches.
+        """
         try:
-            pattern = f"{tenant_id}:*"
-            keys = self.redis_client.keys(pattern)
-            
-            if keys:
-                self.redis_client.delete(*keys)
+            if self.namespace_versioning:
+                version = await self.redis_client.incr(self._namespace_version_key(tenant_id))
+                self._namespace_versions[tenant_id] = (version, time.monotonic())
+                return True
+            
+            tenant_prefix = await self._tenant_prefix(tenant_id)
+            batch = []
+            async for key in self.scan_keys("*", tenant_id):
+                batch.append(tenant_prefix + key)
+                if len(batch) >= self.unlink_batch_size:
+                    await self.redis_client.unlink(*batch)
+                    batch = []
+            
+            if batch:
+                await self.redis_client.unlink(*batch)
             
             return True
             
@@ -211,7 +317,7 @@ class AWSElastiCacheAdapter(CacheService):
     async def get_cache_info(self) -> Dict[str, Any]:
         """Get cache cluster information."""
         try:
-            info = self.redis_client.info()
+            info = await self.redis_client.info()
             
             return {
                 'redis_version': info.get('redis_version'),
@@ -305,12 +411,37 @@ class AWSElastiCacheAdapter(CacheService):
             print(f"Error listing backups: {e}")
             return []
     
-    def close_connections(self):
+    async def publish_invalidation(self, message: bytes) -> int:
+        """Publish a near cache invalidation. Returns the number of subscribers reached."""
+        return await self.redis_client.publish(self.INVALIDATION_CHANNEL, message)
+    
+    async def subscribe_invalidations(self, handler: Callable[[bytes], None]):
+        """Call `handler` with every invalidation message, from a listener task."""
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.INVALIDATION_CHANNEL)
+        self._invalidation_task = asyncio.create_task(self._listen_invalidations(pubsub, handler))
+        
+    async def _listen_invalidations(self, pubsub, handler: Callable[[bytes], None]):
+        try:
+            async for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                try:
+                    handler(message['data'])
+                except Exception as e:
+                    print(f"Error applying cache invalidation: {e}")
+        finally:
+            await pubsub.reset()
+    
+    async def close_connections(self):
         """Close Redis connections."""
         try:
+            if self._invalidation_task:
+                self._invalidation_task.cancel()
+                await asyncio.gather(self._invalidation_task, return_exceptions=True)
             if self._redis_client:
-                self._redis_client.close()
+                await self._redis_client.aclose()
             if self.redis_pool:
-                self.redis_pool.disconnect()
+                await self.redis_pool.disconnect()
         except Exception as e:
             print(f"Error closing connections: {e}")
\ No newline at end of file
@@ -3,13 +3,15 @@ AWS Lambda service adapter for function invocation and compute operations.
 This adapter provides compute capabilities using AWS Lambda functions.
 """
 
+import asyncio
 import json
 import uuid
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
 import boto3
 from botocore.exceptions import ClientError, BotoCoreError
 
 from backend.core.interfaces import ComputeService
+from backend.infrastructure.fan_out import map_as_completed
 
 
 class AWSLambdaAdapter(ComputeService):
@@ -46,6 +48,27 @@ class AWSLambdaAdapter(ComputeService):
     async def invoke_function(self, function_name: str, payload: Dict[str, Any], 
                              tenant_id: str, async_mode: bool = False) -> Dict[str, Any]:
         """Invoke a compute function."""
+        return self._invoke(function_name, payload, tenant_id, async_mode)
+    
+    async def invoke_map(self, function_name: str, payloads: Iterable[Dict[str, Any]], tenant_id: str,
+                         concurrency: int = 10) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Invoke a function once per payload, `concurrency` at a time, yielding
+        {"index", "status", "result" | "error"} per payload as each finishes.
+        """
+        async def invoke(payload: Dict[str, Any]) -> Any:
+            # boto3 blocks, so each invocation runs on a thread to overlap them
+            response = await asyncio.to_thread(self._invoke, function_name, payload, tenant_id, False)
+            if response['status'] == 'error':
+                raise RuntimeError(response['error'])
+            return response['result']
+        
+        async for outcome in map_as_completed(invoke, payloads, concurrency):
+            yield outcome
+    
+    def _invoke(self, function_name: str, payload: Dict[str, Any],
+                tenant_id: str, async_mode: bool) -> Dict[str, Any]:
+        """Invoke a Lambda function (blocking)."""
         try:
             full_function_name = self._get_function_name(function_name, tenant_id)
             prepared_payload = self._prepare_payload(payload, tenant_id)
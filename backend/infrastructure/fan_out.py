@@ -0,0 +1,50 @@
+"""
+Bounded-concurrency fan-out shared by the compute backends.
+Runs one coroutine per item with a fixed number in flight and streams
+each item's outcome back as it completes.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional
+
+
+async def map_as_completed(func: Callable[[Any], Awaitable[Any]], items: Iterable[Any],
+                           concurrency: int) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Await func(item) for every item, at most `concurrency` at a time.
+    
+    Yields one outcome per item in completion order:
+    {"index": i, "status": "completed", "result": ...} or
+    {"index": i, "status": "failed", "error": ..., "error_type": ...}.
+    An item that raises doesn't stop the others. Items are pulled lazily,
+    and workers pause while `concurrency` outcomes wait to be consumed, so
+    a slow consumer holds back the batch instead of buffering it.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    
+    pending = enumerate(items)
+    outcomes: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    
+    async def worker():
+        for index, item in pending:
+            try:
+                outcome = {"index": index, "status": "completed", "result": await func(item)}
+            except Exception as e:
+                outcome = {"index": index, "status": "failed", "error": str(e), "error_type": type(e).__name__}
+            await outcomes.put(outcome)
+        await outcomes.put(None)
+    
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        running = len(workers)
+        while running:
+            outcome: Optional[Dict[str, Any]] = await outcomes.get()
+            if outcome is None:
+                running -= 1
+            else:
+                yield outcome
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,268 @@
+"""
+Durable job queue for the local job runner.
+Queued, scheduled and running jobs are kept in SQLite (WAL mode) so they
+survive a restart; delivery is at-least-once with visibility timeouts.
+"""
+
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class DurableJobQueue:
+    """
+    SQLite-backed job table with leases, acknowledgements and a dead-letter state.
+    
+    A job row is "queued" until a worker leases it, which makes it
+    "running" and hides it for a visibility timeout. ack() marks it "done";
+    release() puts it back for a retry; dead_letter() parks it as "dead".
+    A lease that is not acked before its timeout (the worker or the process
+    died) can be leased again, so every job runs at least once. Jobs that
+    keep getting leased without finishing are dead-lettered once they run
+    out of deliveries.
+    
+    Each job has an idempotency key, unique per tenant: enqueueing the same
+    key again returns the existing job instead of adding a second one, for
+    as long as the row exists (done rows are removed with forget()).
+    
+    The job itself is stored pickled; the queue only reads the columns it
+    needs to schedule. With synchronous=NORMAL in WAL mode a committed job
+    survives a process crash; pass synchronous="FULL" to also survive power
+    loss at the cost of an fsync per commit.
+    """
+    
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    DEAD = "dead"
+    
+    def __init__(self, path: Path, synchronous: str = "NORMAL"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self._conn = sqlite3.connect(str(self.path), isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                tenant_id TEXT NOT NULL,
+                idempotency_key TEXT NOT NULL,
+                state TEXT NOT NULL,
+                visible_at REAL NOT NULL,
+                deliveries INTEGER NOT NULL DEFAULT 0,
+                max_deliveries INTEGER NOT NULL,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                job BLOB NOT NULL,
+                UNIQUE (tenant_id, idempotency_key)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, visible_at)")
+        self._lock = threading.Lock()
+    
+    def enqueue(self, job_id: str, tenant_id: str, job: Any, visible_at: float,
+                max_deliveries: int, idempotency_key: Optional[str] = None) -> Tuple[str, bool]:
+        """
+        Add a job that becomes visible at `visible_at` (epoch seconds).
+        
+        Returns (job_id, created); if the tenant already has a job with the
+        same idempotency key, that job's id is returned with created=False.
+        """
+        key = idempotency_key or job_id
+        blob = pickle.dumps(job, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, tenant_id, idempotency_key, state, visible_at, "
+                "max_deliveries, updated_at, job) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, tenant_id, key, self.QUEUED, visible_at, max_deliveries, time.time(), blob)
+            )
+            if cursor.rowcount:
+                return job_id, True
+            
+            row = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE tenant_id = ? AND idempotency_key = ?", (tenant_id, key)
+            ).fetchone()
+            return row[0], False
+    
+    def enqueue_many(self, jobs: Iterable[Tuple[str, str, Any, float, int, Optional[str]]]) -> int:
+        """Add many (job_id, tenant_id, job, visible_at, max_deliveries, idempotency_key) in one transaction."""
+        now = time.time()
+        rows = [
+            (job_id, tenant_id, key or job_id, self.QUEUED, visible_at, max_deliveries, now,
+             pickle.dumps(job, protocol=pickle.HIGHEST_PROTOCOL))
+            for job_id, tenant_id, job, visible_at, max_deliveries, key in jobs
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (job_id, tenant_id, idempotency_key, state, visible_at, "
+                    "max_deliveries, updated_at, job) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                created = self._conn.total_changes - before
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return created
+    
+    def lease(self, job_id: str, visibility_timeout: float) -> bool:
+        """
+        Claim a visible job for `visibility_timeout` seconds.
+        
+        Returns False if the job was acked, dead-lettered or is leased by
+        someone else. A job that has used up its deliveries is dead-lettered
+        instead of leased.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT deliveries, max_deliveries FROM jobs "
+                "WHERE job_id = ? AND state IN (?, ?) AND visible_at <= ?",
+                (job_id, self.QUEUED, self.RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return False
+            
+            deliveries, max_deliveries = row
+            if deliveries >= max_deliveries:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                    (self.DEAD, f"Gave up after {deliveries} deliveries without completing", now, job_id)
+                )
+                logger.warning(f"Job {job_id} dead-lettered after {deliveries} unfinished deliveries")
+                return False
+            
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, visible_at = ?, deliveries = deliveries + 1, updated_at = ? "
+                "WHERE job_id = ?",
+                (self.RUNNING, now + visibility_timeout, now, job_id)
+            )
+            return True
+    
+    def ack(self, job_id: str):
+        """Mark a job as completed."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = NULL, updated_at = ? WHERE job_id = ?",
+                (self.DONE, time.time(), job_id)
+            )
+    
+    def release(self, job_id: str, job: Any, visible_at: float, max_deliveries: int,
+                error: Optional[str] = None) -> bool:
+        """
+        Requeue a stored job for another attempt at `visible_at`, storing its
+        updated state. Returns False if the queue has no such job.
+        """
+        blob = pickle.dumps(job, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, visible_at = ?, max_deliveries = ?, error = ?, updated_at = ?, job = ? "
+                "WHERE job_id = ?",
+                (self.QUEUED, visible_at, max_deliveries, error, time.time(), blob, job_id)
+            )
+            return bool(cursor.rowcount)
+    
+    def dead_letter(self, job_id: str, error: str):
+        """Park a job that failed permanently."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (self.DEAD, error, time.time(), job_id)
+            )
+    
+    def requeue_dead_letter(self, job_id: str, tenant_id: str) -> bool:
+        """Move a dead-lettered job back to the queue with a fresh delivery count."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, visible_at = ?, deliveries = 0, error = NULL, updated_at = ? "
+                "WHERE job_id = ? AND tenant_id = ? AND state = ?",
+                (self.QUEUED, time.time(), time.time(), job_id, tenant_id, self.DEAD)
+            )
+            return bool(cursor.rowcount)
+    
+    def forget(self, job_ids: Iterable[str]):
+        """Remove finished (done) jobs, releasing their idempotency keys."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM jobs WHERE job_id = ? AND state = ?",
+                [(job_id, self.DONE) for job_id in job_ids]
+            )
+    
+    def purge_done(self, before: float) -> int:
+        """Remove done jobs finished before `before` (epoch seconds)."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE state = ? AND updated_at < ?", (self.DONE, before)
+            )
+            return cursor.rowcount
+    
+    def get_job(self, job_id: str) -> Optional[Any]:
+        """Load a stored job."""
+        with self._lock:
+            row = self._conn.execute("SELECT job FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+    
+    def get_state(self, job_id: str, tenant_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's queue state, or None if the tenant has no such job."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, visible_at, deliveries, error FROM jobs WHERE job_id = ? AND tenant_id = ?",
+                (job_id, tenant_id)
+            ).fetchone()
+        if row is None:
+            return None
+        state, visible_at, deliveries, error = row
+        return {"state": state, "visible_at": visible_at, "deliveries": deliveries, "error": error}
+    
+    def pending_jobs(self) -> List[Tuple[float, Any]]:
+        """Load every queued or leased job as (visible_at, job), for recovery after a restart."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT visible_at, job FROM jobs WHERE state IN (?, ?) ORDER BY visible_at",
+                (self.QUEUED, self.RUNNING)
+            ).fetchall()
+        
+        jobs = []
+        for visible_at, blob in rows:
+            try:
+                jobs.append((visible_at, pickle.loads(blob)))
+            except Exception as e:
+                logger.error(f"Skipping unreadable queued job: {e}")
+        return jobs
+    
+    def list_dead_letters(self, tenant_id: str) -> List[Dict[str, Any]]:
+        """List a tenant's dead-lettered jobs, most recent first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, deliveries, error, updated_at FROM jobs "
+                "WHERE tenant_id = ? AND state = ? ORDER BY updated_at DESC",
+                (tenant_id, self.DEAD)
+            ).fetchall()
+        return [
+            {"job_id": job_id, "deliveries": deliveries, "error": error, "failed_at": updated_at}
+            for job_id, deliveries, error, updated_at in rows
+        ]
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Count jobs per state."""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = {self.QUEUED: 0, self.RUNNING: 0, self.DONE: 0, self.DEAD: 0}
+        counts.update(rows)
+        return counts
+    
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,220 @@
+"""
+Shared expiry scheduler for the local services.
+Keeps one min-heap of deadlines so expiry work scales with the number of
+items that actually come due instead of with the size of each store.
+"""
+
+import asyncio
+import heapq
+import inspect
+import logging
+import threading
+import time
+import weakref
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiryHandle:
+    """
+    A service's registration with the expiry scheduler.
+    
+    Keys are scheduled with an absolute deadline (epoch seconds);
+    rescheduling a key replaces its previous deadline. When keys come due
+    the service's callback receives them in one batch and re-checks each
+    against its own state, so a timer that fires late or after the item was
+    renewed is harmless.
+    """
+    
+    def __init__(self, scheduler: 'ExpiryScheduler', handle_id: int, name: str,
+                 on_expire: Callable[[List[Hashable]], Any]):
+        self.name = name
+        self._scheduler = scheduler
+        self._handle_id = handle_id
+        
+        # Bound methods are held weakly so a registered service can still be
+        # garbage collected; its handle closes on the next firing
+        if inspect.ismethod(on_expire):
+            self._callback = weakref.WeakMethod(on_expire)
+        else:
+            self._callback = lambda: on_expire
+        
+        # key -> seq of its live heap item
+        self._pending: Dict[Hashable, int] = {}
+        self.closed = False
+    
+    def schedule(self, key: Hashable, deadline: float):
+        """Schedule (or reschedule) a key to expire at `deadline`."""
+        self._scheduler._schedule(self, key, deadline)
+    
+    def cancel(self, key: Hashable):
+        """Cancel a key's pending expiry, if any."""
+        self._scheduler._cancel(self, key)
+    
+    def close(self):
+        """Cancel all pending expiries and stop receiving callbacks."""
+        self._scheduler._close(self)
+    
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+class ExpiryScheduler:
+    """
+    Min-heap of (deadline, seq, handle_id, key) shared by the local services.
+    
+    Cancelled and rescheduled items stay in the heap and are skipped when
+    they surface; the heap is rebuilt once they outnumber live items. A
+    background task on the running event loop fires due keys every
+    `tick_seconds`; run_due() can also be called directly.
+    """
+    
+    def __init__(self, tick_seconds: float = 1.0):
+        self.tick_seconds = tick_seconds
+        self.expired = 0
+        
+        self._heap: List[Tuple[float, int, int, Hashable]] = []
+        self._handles: Dict[int, ExpiryHandle] = {}
+        self._live = 0
+        self._seq = 0
+        self._next_handle_id = 0
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+    
+    def register(self, name: str, on_expire: Callable[[List[Hashable]], Any]) -> ExpiryHandle:
+        """Register a service callback that receives batches of due keys."""
+        with self._lock:
+            self._next_handle_id += 1
+            handle = ExpiryHandle(self, self._next_handle_id, name, on_expire)
+            self._handles[handle._handle_id] = handle
+        
+        self.ensure_running()
+        return handle
+    
+    def _schedule(self, handle: ExpiryHandle, key: Hashable, deadline: float):
+        with self._lock:
+            if handle.closed:
+                return
+            
+            self._seq += 1
+            if key not in handle._pending:
+                self._live += 1
+            handle._pending[key] = self._seq
+            heapq.heappush(self._heap, (deadline, self._seq, handle._handle_id, key))
+            
+            if len(self._heap) > 2 * self._live + 1024:
+                self._compact()
+        
+        self.ensure_running()
+    
+    def _cancel(self, handle: ExpiryHandle, key: Hashable):
+        with self._lock:
+            if handle._pending.pop(key, None) is not None:
+                self._live -= 1
+    
+    def _close(self, handle: ExpiryHandle):
+        with self._lock:
+            if handle.closed:
+                return
+            handle.closed = True
+            self._live -= len(handle._pending)
+            handle._pending.clear()
+            self._handles.pop(handle._handle_id, None)
+            
+            if len(self._heap) > 2 * self._live + 1024:
+                self._compact()
+    
+    def _compact(self):
+        """Drop stale heap items (caller holds the lock)."""
+        live = []
+        for item in self._heap:
+            handle = self._handles.get(item[2])
+            if handle is not None and handle._pending.get(item[3]) == item[1]:
+                live.append(item)
+        heapq.heapify(live)
+        self._heap = live
+    
+    def next_deadline(self) -> Optional[float]:
+        """Get the earliest pending deadline (may belong to a stale item)."""
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+    
+    def run_due(self, now: Optional[float] = None) -> int:
+        """Fire callbacks for all keys due by `now`. Returns the number of keys fired."""
+        now = time.time() if now is None else now
+        due: Dict[ExpiryHandle, List[Hashable]] = defaultdict(list)
+        
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, handle_id, key = heapq.heappop(self._heap)
+                handle = self._handles.get(handle_id)
+                if handle is None or handle._pending.get(key) != seq:
+                    continue
+                
+                del handle._pending[key]
+                self._live -= 1
+                due[handle].append(key)
+        
+        fired = 0
+        for handle, keys in due.items():
+            callback = handle._callback()
+            if callback is None:
+                handle.close()
+                continue
+            
+            try:
+                callback(keys)
+                fired += len(keys)
+            except Exception as e:
+                logger.error(f"Error expiring {len(keys)} keys for {handle.name}: {e}")
+        
+        self.expired += fired
+        return fired
+    
+    def ensure_running(self):
+        """Start the background firing task on the running event loop, if any."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        
+        task = self._task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+    
+    async def _run(self):
+        """Background task firing due keys every tick."""
+        while True:
+            try:
+                await asyncio.sleep(self.tick_seconds)
+                self.run_due()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in expiry scheduler: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pending and fired counts."""
+        with self._lock:
+            return {
+                "pending": self._live,
+                "heap_size": len(self._heap),
+                "registered": len(self._handles),
+                "expired": self.expired
+            }
+
+
+_expiry_scheduler: Optional[ExpiryScheduler] = None
+_expiry_scheduler_lock = threading.Lock()
+
+
+def get_expiry_scheduler() -> ExpiryScheduler:
+    """Get the process-wide expiry scheduler shared by the local services."""
+    global _expiry_scheduler
+    with _expiry_scheduler_lock:
+        if _expiry_scheduler is None:
+            _expiry_scheduler = ExpiryScheduler()
+        return _expiry_scheduler
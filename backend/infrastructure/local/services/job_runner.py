@@ -4,11 +4,14 @@ Provides task queue, execution engine, and job scheduling with retry mechanisms.
 """
 
 import asyncio
+import heapq
 import json
 import logging
+import os
+import pickle
 import time
 import traceback
-from typing import Any, Dict, List, Optional, Callable, Union
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Callable, Tuple, Union
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict, field
 from pathlib import Path
@@ -18,9 +21,14 @@ import uuid
 import importlib
 import sys
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
 
 from ....core.interfaces import ComputeService
 from ....core.settings import get_settings
+from ...fan_out import map_as_completed
+from .durable_queue import DurableJobQueue
+from .expiry_scheduler import get_expiry_scheduler
 
 
 logger = logging.getLogger(__name__)
@@ -44,6 +52,13 @@ class JobPriority(Enum):
     CRITICAL = 4
 
 
+class ExecutionLane(Enum):
+    """Where a registered function runs."""
+    ASYNC = "async"  # On the event loop (coroutine functions)
+    THREAD = "thread"  # Thread pool (I/O-bound or GIL-releasing sync functions)
+    PROCESS = "process"  # Process pool (CPU-bound sync functions)
+
+
 @dataclass
 class JobResult:
     """Result of job execution."""
@@ -69,78 +84,254 @@ class JobConfig:
     timeout_seconds: int = 300
     max_retries: int = 3
     retry_delay_seconds: int = 5
+    max_retry_delay_seconds: int = 300
     async_mode: bool = False
     created_at: datetime = field(default_factory=datetime.now)
     scheduled_at: Optional[datetime] = None
+    retry_count: int = 0
+    idempotency_key: Optional[str] = None
+    # Set by _enqueue; only jobs in the durable queue are leased, acked and released
+    durable: bool = False
+    
+    @property
+    def max_attempts(self) -> int:
+        """First attempt plus retries."""
+        return self.max_retries + 1
     
     def should_retry(self, current_retry_count: int) -> bool:
         """Check if job should be retried."""
         return current_retry_count < self.max_retries
+    
+    def retry_delay(self, retry_count: int) -> float:
+        """Exponential backoff before retry number `retry_count` (1-based)."""
+        return min(self.retry_delay_seconds * 2 ** (retry_count - 1), self.max_retry_delay_seconds)
 
 
 class JobQueue:
-    """Priority queue for job management."""
+    """
+    Priority queue for job management with fair scheduling across tenants.
     
-    def __init__(self):
-        self.queues = {
-            JobPriority.CRITICAL: asyncio.Queue(),
-            JobPriority.HIGH: asyncio.Queue(),
-            JobPriority.NORMAL: asyncio.Queue(),
-            JobPriority.LOW: asyncio.Queue()
-        }
-        self._lock = asyncio.Lock()
+    All jobs share one heap ordered by (priority, finish tag, seq), so a
+    single await wakes on whichever job is next. Within a priority, tenants
+    are served by weighted fair queuing: each job's finish tag is its
+    tenant's previous tag (or the priority's current virtual time, if that
+    is later) plus 1 / weight. A tenant that floods a priority only delays
+    its own jobs; other tenants' jobs are interleaved in proportion to
+    their weights. seq keeps jobs of one tenant in FIFO order.
+    """
+    
+    def __init__(self, tenant_weights: Optional[Dict[str, float]] = None, default_weight: float = 1.0):
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = 0
+        
+        self.tenant_weights: Dict[str, float] = dict(tenant_weights or {})
+        self.default_weight = default_weight
+        
+        # Per priority: finish tag of the last job handed out, and of each tenant's last queued job
+        self._virtual_time: Dict[JobPriority, float] = {priority: 0.0 for priority in JobPriority}
+        self._last_finish: Dict[Tuple[JobPriority, str], float] = {}
+        
+        # Queue depths
+        self._priority_sizes: Dict[JobPriority, int] = {priority: 0 for priority in JobPriority}
+        self._tenant_sizes: Dict[str, int] = {}
+    
+    def set_tenant_weight(self, tenant_id: str, weight: float):
+        """Set a tenant's share within each priority (default 1.0)."""
+        if weight <= 0:
+            raise ValueError("Tenant weight must be positive")
+        self.tenant_weights[tenant_id] = weight
     
     async def put(self, job_config: JobConfig):
-        """Add job to appropriate priority queue."""
-        await self.queues[job_config.priority].put(job_config)
+        """Add job to the queue."""
+        self.put_nowait(job_config)
     
-    async def get(self) -> JobConfig:
-        """Get next job from highest priority queue."""
-        # Check queues in priority order
-        for priority in [JobPriority.CRITICAL, JobPriority.HIGH, JobPriority.NORMAL, JobPriority.LOW]:
-            try:
-                return self.queues[priority].get_nowait()
-            except asyncio.QueueEmpty:
-                continue
+    def put_nowait(self, job_config: JobConfig):
+        """Add job to the queue (never blocks; the queue is unbounded)."""
+        priority = job_config.priority
+        tenant_id = job_config.tenant_id
+        weight = self.tenant_weights.get(tenant_id, self.default_weight)
         
-        # If no jobs available, wait for any job
-        tasks = [
-            asyncio.create_task(queue.get())
-            for queue in self.queues.values()
-        ]
+        start = max(self._virtual_time[priority], self._last_finish.get((priority, tenant_id), 0.0))
+        finish = start + 1.0 / weight
+        self._last_finish[(priority, tenant_id)] = finish
         
-        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        self._seq += 1
+        self._priority_sizes[priority] += 1
+        self._tenant_sizes[tenant_id] = self._tenant_sizes.get(tenant_id, 0) + 1
+        self._queue.put_nowait((-priority.value, finish, self._seq, job_config))
+    
+    async def get(self) -> JobConfig:
+        """Get next job: highest priority first, fair across tenants within it."""
+        _, finish, _, job_config = await self._queue.get()
+        priority = job_config.priority
+        tenant_id = job_config.tenant_id
         
-        # Cancel pending tasks
-        for task in pending:
-            task.cancel()
+        self._virtual_time[priority] = finish
+        self._priority_sizes[priority] -= 1
+        self._tenant_sizes[tenant_id] -= 1
+        if not self._tenant_sizes[tenant_id]:
+            del self._tenant_sizes[tenant_id]
+            # Its tags are now behind the virtual time, so they no longer matter
+            for key in [(p, tenant_id) for p in JobPriority]:
+                self._last_finish.pop(key, None)
         
-        # Return the first completed job
-        return done.pop().result()
+        return job_config
     
     def qsize(self) -> Dict[JobPriority, int]:
         """Get queue sizes for each priority."""
-        return {priority: queue.qsize() for priority, queue in self.queues.items()}
+        return dict(self._priority_sizes)
+    
+    def tenant_sizes(self) -> Dict[str, int]:
+        """Get the number of queued jobs per tenant."""
+        return dict(self._tenant_sizes)
+    
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+
+class DelayedJobQueue:
+    """
+    Min-heap of (run_at, seq, job) for jobs that must not run yet.
+    
+    Holds scheduled jobs and retries waiting out their backoff, so delayed
+    work never occupies a worker. The runner's scheduler task sleeps until
+    the earliest run_at and moves due jobs to the priority queues; put()
+    wakes it early when a job becomes the new earliest.
+    """
+    
+    def __init__(self):
+        self._heap: List[Tuple[float, int, JobConfig]] = []
+        self._seq = 0
+        self._changed = asyncio.Event()
+    
+    def put(self, job_config: JobConfig, run_at: float):
+        """Hold a job until `run_at` (epoch seconds)."""
+        self._seq += 1
+        heapq.heappush(self._heap, (run_at, self._seq, job_config))
+        if self._heap[0][1] == self._seq:
+            self._changed.set()
+    
+    def pop_due(self, now: Optional[float] = None) -> List[JobConfig]:
+        """Remove and return the jobs due by `now`, earliest first."""
+        now = time.time() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+    
+    def next_run_at(self) -> Optional[float]:
+        """Get the earliest run_at, or None if no job is waiting."""
+        return self._heap[0][0] if self._heap else None
+    
+    async def wait(self, timeout: Optional[float]):
+        """Sleep until `timeout` passes or a job with an earlier run_at is added."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    def clear_changed(self):
+        """Reset the wake-up flag before checking for due jobs."""
+        self._changed.clear()
+    
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+@dataclass(frozen=True)
+class SharedArrayRef:
+    """Placeholder for a NumPy array passed to the process lane through shared memory."""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+def _share_arrays(value: Any, min_bytes: int, segments: List[shared_memory.SharedMemory]) -> Any:
+    """Copy large arrays in a payload into shared memory, replacing them with SharedArrayRefs."""
+    if isinstance(value, np.ndarray):
+        if value.nbytes < min_bytes or value.dtype.hasobject:
+            return value
+        segment = shared_memory.SharedMemory(create=True, size=value.nbytes)
+        segments.append(segment)
+        np.ndarray(value.shape, dtype=value.dtype, buffer=segment.buf)[...] = value
+        return SharedArrayRef(segment.name, value.shape, value.dtype.str)
+    if isinstance(value, dict):
+        return {key: _share_arrays(item, min_bytes, segments) for key, item in value.items()}
+    if type(value) in (list, tuple):
+        return type(value)(_share_arrays(item, min_bytes, segments) for item in value)
+    return value
+
+
+def _attach_arrays(value: Any, segments: List[shared_memory.SharedMemory]) -> Any:
+    """Replace SharedArrayRefs with arrays backed by the shared memory (no copy)."""
+    if isinstance(value, SharedArrayRef):
+        segment = shared_memory.SharedMemory(name=value.name)
+        segments.append(segment)
+        return np.ndarray(value.shape, dtype=np.dtype(value.dtype), buffer=segment.buf)
+    if isinstance(value, dict):
+        return {key: _attach_arrays(item, segments) for key, item in value.items()}
+    if type(value) in (list, tuple):
+        return type(value)(_attach_arrays(item, segments) for item in value)
+    return value
+
+
+def _run_in_process(func: Callable, payload: Dict[str, Any]) -> Any:
+    """Process-lane entry point, executed in a pool worker."""
+    segments: List[shared_memory.SharedMemory] = []
+    try:
+        return func(_attach_arrays(payload, segments))
+    finally:
+        for segment in segments:
+            try:
+                segment.close()
+            except BufferError:
+                # The result still references the array; the mapping goes with it
+                pass
 
 
 class FunctionRegistry:
-    """Registry for available functions that can be executed."""
+    """
+    Registry for available functions that can be executed.
+    
+    Each function runs on an execution lane, declared as metadata["lane"]:
+    "async" for coroutine functions, "thread" (the default for sync
+    functions) or "process" for CPU-bound sync functions. Process-lane
+    functions must be picklable, i.e. defined at module level.
+    """
     
     def __init__(self):
         self.functions: Dict[str, Callable] = {}
         self.function_metadata: Dict[str, Dict[str, Any]] = {}
+        self.function_lanes: Dict[str, ExecutionLane] = {}
     
     def register_function(self, name: str, func: Callable, metadata: Dict[str, Any] = None):
         """Register a function for execution."""
+        metadata = dict(metadata or {})
+        is_async = asyncio.iscoroutinefunction(func)
+        lane = ExecutionLane(metadata.get("lane", ExecutionLane.ASYNC if is_async else ExecutionLane.THREAD))
+        
+        if is_async and lane != ExecutionLane.ASYNC:
+            raise ValueError(f"Function {name} is a coroutine function and must use the async lane")
+        if not is_async and lane == ExecutionLane.ASYNC:
+            raise ValueError(f"Function {name} is not a coroutine function and can't use the async lane")
+        if lane == ExecutionLane.PROCESS:
+            try:
+                pickle.dumps(func)
+            except (pickle.PicklingError, AttributeError, TypeError) as e:
+                raise ValueError(f"Function {name} must be defined at module level to use the process lane: {e}")
+        
+        metadata["lane"] = lane.value
         self.functions[name] = func
-        self.function_metadata[name] = metadata or {}
-        logger.info(f"Registered function: {name}")
+        self.function_metadata[name] = metadata
+        self.function_lanes[name] = lane
+        logger.info(f"Registered function: {name} ({lane.value} lane)")
     
     def unregister_function(self, name: str):
         """Unregister a function."""
         if name in self.functions:
             del self.functions[name]
             del self.function_metadata[name]
+            del self.function_lanes[name]
             logger.info(f"Unregistered function: {name}")
     
     def get_function(self, name: str) -> Optional[Callable]:
@@ -154,6 +345,10 @@ class FunctionRegistry:
     def get_function_metadata(self, name: str) -> Dict[str, Any]:
         """Get metadata for a function."""
         return self.function_metadata.get(name, {})
+    
+    def get_lane(self, name: str) -> Optional[ExecutionLane]:
+        """Get the execution lane of a function."""
+        return self.function_lanes.get(name)
 
 
 class LocalJobRunner(ComputeService):
@@ -167,6 +362,7 @@ class LocalJobRunner(ComputeService):
         
         # Job management
         self.job_queue = JobQueue()
+        self.delayed_jobs = DelayedJobQueue()
         self.active_jobs: Dict[str, JobConfig] = {}
         self.job_results: Dict[str, JobResult] = {}
         self.function_registry = FunctionRegistry()
@@ -175,25 +371,44 @@ class LocalJobRunner(ComputeService):
         self.max_concurrent_jobs = self.settings.local.max_concurrent_jobs
         self.worker_semaphore = asyncio.Semaphore(self.max_concurrent_jobs)
         
-        # Thread pools for sync function execution
+        # Thread pool for sync functions, process pool for CPU-bound process-lane functions
         self.thread_pool = ThreadPoolExecutor(max_workers=self.max_concurrent_jobs)
-        self.process_pool = ProcessPoolExecutor(max_workers=max(1, self.max_concurrent_jobs // 2))
+        # Pool workers must share this process's resource tracker, or each one would start its
+        # own and try to clean up shared memory segments that this process already unlinked
+        resource_tracker.ensure_running()
+        self.process_pool = ProcessPoolExecutor(max_workers=min(self.max_concurrent_jobs, os.cpu_count() or 1))
+        
+        # NumPy arrays at least this large reach the process lane through shared memory
+        self.shared_memory_min_bytes = 1024 * 1024
         
         # Storage
         self.data_directory = Path(self.settings.local.data_directory)
         self.data_directory.mkdir(parents=True, exist_ok=True)
         self.jobs_file = self.data_directory / "job_results.json"
         
+        # Queued, scheduled and running jobs survive restarts in the durable queue
+        self.job_store = DurableJobQueue(self.data_directory / "job_queue.db")
+        self.visibility_grace_seconds = 30
+        
+        # Finished job results are dropped after the retention period
+        self.result_retention_hours = 24
+        self._result_expiry = get_expiry_scheduler().register("job_results", self._expire_results)
+        
         # Background tasks
         self.worker_tasks: List[asyncio.Task] = []
         self.scheduler_task: Optional[asyncio.Task] = None
-        self.cleanup_task: Optional[asyncio.Task] = None
+        
+        # Completion notifications: futures per job, event queues per tenant
+        self._job_waiters: Dict[str, List[asyncio.Future]] = {}
+        self._job_watchers: Dict[str, List[asyncio.Queue]] = {}
+        self.watch_queue_size = 1000
         
         # Thread safety
         self._lock = threading.RLock()
         
-        # Load persisted data
+        # Load persisted data and requeue jobs left over from the previous run
         self._load_persisted_data()
+        self._recover_jobs()
         
         # Register built-in functions
         self._register_builtin_functions()
@@ -210,9 +425,8 @@ class LocalJobRunner(ComputeService):
             task = asyncio.create_task(self._worker_loop(f"worker-{i}"))
             self.worker_tasks.append(task)
         
-        # Start scheduler and cleanup tasks
+        # Start scheduler task
         self.scheduler_task = asyncio.create_task(self._scheduler_loop())
-        self.cleanup_task = asyncio.create_task(self._cleanup_loop())
         
         logger.info(f"Started {len(self.worker_tasks)} worker tasks")
     
@@ -262,10 +476,10 @@ class LocalJobRunner(ComputeService):
             
             if async_mode:
                 # Queue job for async execution
-                await self.job_queue.put(job_config)
+                job_id = await self._enqueue(job_config)
                 
                 return {
-                    "job_id": job_config.job_id,
+                    "job_id": job_id,
                     "status": "queued",
                     "async": True
                 }
@@ -277,11 +491,37 @@ class LocalJobRunner(ComputeService):
                     return result.result
                 else:
                     raise Exception(f"Job failed: {result.error}")
-                    
+        
         except Exception as e:
             logger.error(f"Error invoking function {function_name}: {e}")
             raise
     
+    async def invoke_map(self, function_name: str, payloads: Iterable[Dict[str, Any]], tenant_id: str,
+                         concurrency: int = 10) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Invoke a function once per payload, `concurrency` at a time, yielding
+        {"index", "status", "result" | "error"} per payload as each finishes.
+        
+        Failed items are reported in the stream and not retried, so the
+        caller decides what to resubmit.
+        """
+        async def invoke(payload: Dict[str, Any]) -> Any:
+            job_config = JobConfig(
+                job_id=str(uuid.uuid4()),
+                tenant_id=tenant_id,
+                function_name=function_name,
+                payload=payload,
+                timeout_seconds=payload.get("timeout", 300),
+                max_retries=0
+            )
+            result = await self._execute_job(job_config)
+            if result.status != JobStatus.COMPLETED:
+                raise RuntimeError(result.error)
+            return result.result
+        
+        async for outcome in map_as_completed(invoke, payloads, concurrency):
+            yield outcome
+    
     async def schedule_job(self, job_config: Dict[str, Any], tenant_id: str) -> str:
         """Schedule a job for execution."""
         try:
@@ -294,7 +534,9 @@ class LocalJobRunner(ComputeService):
                 priority=JobPriority(job_config.get("priority", JobPriority.NORMAL.value)),
                 timeout_seconds=job_config.get("timeout_seconds", 300),
                 max_retries=job_config.get("max_retries", 3),
-                async_mode=True
+                retry_delay_seconds=job_config.get("retry_delay_seconds", 5),
+                async_mode=True,
+                idempotency_key=job_config.get("idempotency_key")
             )
             
             # Handle scheduled execution
@@ -304,12 +546,12 @@ class LocalJobRunner(ComputeService):
                 else:
                     config.scheduled_at = job_config["scheduled_at"]
             
-            # Queue the job
-            await self.job_queue.put(config)
-            
-            logger.info(f"Scheduled job {config.job_id} for function {config.function_name}")
-            return config.job_id
+            # Queue the job (an existing job with the same idempotency key is returned instead)
+            job_id = await self._enqueue(config)
             
+            logger.info(f"Scheduled job {job_id} for function {config.function_name}")
+            return job_id
+        
         except Exception as e:
             logger.error(f"Error scheduling job: {e}")
             raise
@@ -334,26 +576,113 @@ class LocalJobRunner(ComputeService):
                 
                 # Check completed jobs
                 if job_id in self.job_results:
-                    result = self.job_results[job_id]
-                    
+                    return self._result_status(job_id, self.job_results[job_id])
+                
+                # Check the durable queue for queued, scheduled and dead-lettered jobs
+                queued = self.job_store.get_state(job_id, tenant_id)
+                if queued and queued["state"] != DurableJobQueue.DONE:
+                    dead = queued["state"] == DurableJobQueue.DEAD
                     return {
                         "job_id": job_id,
-                        "status": result.status.value,
-                        "result": result.result,
-                        "error": result.error,
-                        "execution_time_ms": result.execution_time_ms,
-                        "started_at": result.started_at.isoformat() if result.started_at else None,
-                        "completed_at": result.completed_at.isoformat() if result.completed_at else None,
-                        "retry_count": result.retry_count,
-                        "logs": result.logs
+                        "status": (JobStatus.FAILED if dead else JobStatus.PENDING).value,
+                        "dead_letter": dead,
+                        "error": queued["error"],
+                        "deliveries": queued["deliveries"]
                     }
                 
                 return {"job_id": job_id, "status": "not_found"}
-                
+        
         except Exception as e:
             logger.error(f"Error getting job status for {job_id}: {e}")
             raise
     
+    def _result_status(self, job_id: str, result: JobResult) -> Dict[str, Any]:
+        """Status of a job that has a result."""
+        return {
+            "job_id": job_id,
+            "status": result.status.value,
+            "result": result.result,
+            "error": result.error,
+            "execution_time_ms": result.execution_time_ms,
+            "started_at": result.started_at.isoformat() if result.started_at else None,
+            "completed_at": result.completed_at.isoformat() if result.completed_at else None,
+            "retry_count": result.retry_count,
+            "logs": result.logs
+        }
+    
+    async def wait_for_job(self, job_id: str, tenant_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Wait until a job completes or fails and return its final status.
+        
+        Returns at once if the job has already finished. Raises
+        asyncio.TimeoutError if `timeout` seconds pass first, and ValueError
+        if the job is unknown.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self._job_waiters.setdefault(job_id, []).append(waiter)
+        try:
+            status = await self.get_job_status(job_id, tenant_id)
+            if status["status"] in (JobStatus.COMPLETED.value, JobStatus.FAILED.value):
+                return status
+            if status["status"] == "not_found":
+                raise ValueError(f"Job not found: {job_id}")
+            
+            return await asyncio.wait_for(waiter, timeout)
+        finally:
+            waiters = self._job_waiters.get(job_id)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._job_waiters[job_id]
+    
+    async def watch_jobs(self, tenant_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a tenant's job status changes (running, retrying, completed,
+        failed) as they happen, starting from the first iteration.
+        
+        The stream ends when the runner shuts down. A watcher more than
+        watch_queue_size events behind loses the oldest ones.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.watch_queue_size)
+        self._job_watchers.setdefault(tenant_id, []).append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            watchers = self._job_watchers.get(tenant_id)
+            if watchers and queue in watchers:
+                watchers.remove(queue)
+                if not watchers:
+                    del self._job_watchers[tenant_id]
+    
+    def _publish_job_event(self, job_config: JobConfig, result: JobResult):
+        """Send a status change to the tenant's watchers and resolve waiters once the job has finished."""
+        watchers = self._job_watchers.get(job_config.tenant_id)
+        finished = result.status in (JobStatus.COMPLETED, JobStatus.FAILED)
+        waiters = self._job_waiters.pop(job_config.job_id, None) if finished else None
+        if not watchers and not waiters:
+            return
+        
+        event = self._result_status(job_config.job_id, result)
+        event["tenant_id"] = job_config.tenant_id
+        event["function_name"] = job_config.function_name
+        
+        for queue in watchers or ():
+            self._offer(queue, event)
+        for waiter in waiters or ():
+            if not waiter.done():
+                waiter.set_result(event)
+    
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: Optional[Dict[str, Any]]):
+        """Add an event to a watcher's queue, dropping its oldest event if it is full."""
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+    
     async def _worker_loop(self, worker_name: str):
         """Main worker loop for processing jobs."""
         logger.info(f"Started worker: {worker_name}")
@@ -363,18 +692,16 @@ class LocalJobRunner(ComputeService):
                 # Get next job from queue
                 job_config = await self.job_queue.get()
                 
-                # Check if job is scheduled for future execution
-                if job_config.scheduled_at and job_config.scheduled_at > datetime.now():
-                    # Put job back in queue for later
-                    await asyncio.sleep(1)
-                    await self.job_queue.put(job_config)
+                # Skip jobs that were already acked or are leased elsewhere
+                visibility_timeout = job_config.timeout_seconds + self.visibility_grace_seconds
+                if job_config.durable and not self.job_store.lease(job_config.job_id, visibility_timeout):
                     continue
                 
                 # Acquire semaphore for concurrent job limit
                 async with self.worker_semaphore:
                     # Execute the job
                     await self._execute_job(job_config)
-                
+            
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -387,12 +714,16 @@ class LocalJobRunner(ComputeService):
         """Execute a single job."""
         job_id = job_config.job_id
         start_time = time.time()
+        retry_at = None
         
-        # Create job result
+        # Create job result, keeping the log of earlier attempts
+        previous = self.job_results.get(job_id)
         result = JobResult(
             job_id=job_id,
             status=JobStatus.RUNNING,
-            started_at=datetime.now()
+            started_at=datetime.now(),
+            retry_count=job_config.retry_count,
+            logs=list(previous.logs) if previous else []
         )
         
         try:
@@ -400,6 +731,7 @@ class LocalJobRunner(ComputeService):
             with self._lock:
                 self.active_jobs[job_id] = job_config
                 self.job_results[job_id] = result
+            self._publish_job_event(job_config, result)
             
             logger.info(f"Executing job {job_id}: {job_config.function_name}")
             
@@ -410,19 +742,10 @@ class LocalJobRunner(ComputeService):
             
             # Execute function with timeout
             try:
-                if asyncio.iscoroutinefunction(func):
-                    # Async function
-                    job_result = await asyncio.wait_for(
-                        func(job_config.payload),
-                        timeout=job_config.timeout_seconds
-                    )
-                else:
-                    # Sync function - run in thread pool
-                    loop = asyncio.get_event_loop()
-                    job_result = await asyncio.wait_for(
-                        loop.run_in_executor(self.thread_pool, func, job_config.payload),
-                        timeout=job_config.timeout_seconds
-                    )
+                job_result = await asyncio.wait_for(
+                    self._run_function(job_config.function_name, func, job_config.payload),
+                    timeout=job_config.timeout_seconds
+                )
                 
                 # Job completed successfully
                 result.status = JobStatus.COMPLETED
@@ -431,7 +754,7 @@ class LocalJobRunner(ComputeService):
                 result.execution_time_ms = (time.time() - start_time) * 1000
                 
                 logger.info(f"Job {job_id} completed successfully in {result.execution_time_ms:.2f}ms")
-                
+            
             except asyncio.TimeoutError:
                 raise Exception(f"Job timed out after {job_config.timeout_seconds} seconds")
             except Exception as e:
@@ -442,13 +765,15 @@ class LocalJobRunner(ComputeService):
                     result.error = str(e)
                     result.logs.append(f"Retry {result.retry_count}: {str(e)}")
                     
-                    logger.warning(f"Job {job_id} failed, retrying ({result.retry_count}/{job_config.max_retries}): {e}")
-                    
-                    # Schedule retry
-                    await asyncio.sleep(job_config.retry_delay_seconds)
-                    await self.job_queue.put(job_config)
+                    delay = job_config.retry_delay(result.retry_count)
+                    logger.warning(
+                        f"Job {job_id} failed, retrying in {delay:.1f}s "
+                        f"({result.retry_count}/{job_config.max_retries}): {e}"
+                    )
                     
-                    return result
+                    # Schedule retry with backoff without holding the worker
+                    job_config.retry_count = result.retry_count
+                    retry_at = time.time() + delay
                 else:
                     raise
         
@@ -471,46 +796,165 @@ class LocalJobRunner(ComputeService):
                 
                 # Update result
                 self.job_results[job_id] = result
+                self._schedule_result_expiry(job_id, result)
+            
+            if result.status != JobStatus.RUNNING:
+                self._publish_job_event(job_config, result)
+        
+        if job_config.durable:
+            self._update_job_store(job_config, result, retry_at)
+        if result.status == JobStatus.RETRYING:
+            self.delayed_jobs.put(job_config, retry_at)
         
         return result
     
+    def _update_job_store(self, job_config: JobConfig, result: JobResult, retry_at: Optional[float]):
+        """
+        Ack, requeue or dead-letter a durable job after an attempt. Store
+        errors are logged rather than raised: they don't change the outcome,
+        and an unacked job is redelivered after its lease times out.
+        """
+        job_id = job_config.job_id
+        try:
+            if result.status == JobStatus.COMPLETED:
+                self.job_store.ack(job_id)
+            elif result.status == JobStatus.RETRYING:
+                self.job_store.release(job_id, job_config, retry_at, job_config.max_attempts, error=result.error)
+            else:
+                self.job_store.dead_letter(job_id, result.error)
+        except Exception as e:
+            logger.error(f"Error updating job {job_id} in the durable queue: {e}")
+    
+    async def _run_function(self, function_name: str, func: Callable, payload: Dict[str, Any]) -> Any:
+        """Run a function on its execution lane."""
+        lane = self.function_registry.get_lane(function_name)
+        if lane == ExecutionLane.ASYNC:
+            return await func(payload)
+        
+        loop = asyncio.get_running_loop()
+        if lane == ExecutionLane.THREAD:
+            return await loop.run_in_executor(self.thread_pool, func, payload)
+        
+        # Process lane: large arrays go through shared memory instead of being pickled
+        segments: List[shared_memory.SharedMemory] = []
+        try:
+            shared_payload = _share_arrays(payload, self.shared_memory_min_bytes, segments)
+            return await loop.run_in_executor(self.process_pool, _run_in_process, func, shared_payload)
+        finally:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+    
+    async def _enqueue(self, job_config: JobConfig) -> str:
+        """
+        Store a job in the durable queue, then queue it for the workers or
+        hold it in the delay heap until scheduled_at. Returns the job id, which
+        is an existing job's if the idempotency key was already used.
+        """
+        now = time.time()
+        run_at = job_config.scheduled_at.timestamp() if job_config.scheduled_at else now
+        job_config.durable = True
+        job_id, created = self.job_store.enqueue(
+            job_config.job_id, job_config.tenant_id, job_config, run_at,
+            job_config.max_attempts, job_config.idempotency_key
+        )
+        if not created:
+            logger.info(f"Job with idempotency key {job_config.idempotency_key} already exists: {job_id}")
+            return job_id
+        
+        if run_at > now:
+            self.delayed_jobs.put(job_config, run_at)
+        else:
+            await self.job_queue.put(job_config)
+        return job_id
+    
+    def _recover_jobs(self):
+        """Requeue jobs that were queued, scheduled or running when the previous run stopped."""
+        try:
+            self.job_store.purge_done(time.time() - self.result_retention_hours * 3600)
+            
+            now = time.time()
+            recovered = self.job_store.pending_jobs()
+            for visible_at, job_config in recovered:
+                # A persisted "running" result is stale; the job will run again
+                result = self.job_results.get(job_config.job_id)
+                if result is not None and result.status == JobStatus.RUNNING:
+                    del self.job_results[job_config.job_id]
+                
+                # Leases from the previous run become visible again when they time out
+                if visible_at > now:
+                    self.delayed_jobs.put(job_config, visible_at)
+                else:
+                    self.job_queue.put_nowait(job_config)
+            
+            if recovered:
+                logger.info(f"Recovered {len(recovered)} jobs from the durable queue")
+        
+        except Exception as e:
+            logger.error(f"Error recovering queued jobs: {e}")
+    
+    async def list_dead_letters(self, tenant_id: str) -> List[Dict[str, Any]]:
+        """List a tenant's jobs that failed permanently."""
+        return self.job_store.list_dead_letters(tenant_id)
+    
+    async def requeue_dead_letter(self, job_id: str, tenant_id: str) -> bool:
+        """Give a dead-lettered job a fresh set of retries."""
+        if not self.job_store.requeue_dead_letter(job_id, tenant_id):
+            return False
+        
+        job_config = self.job_store.get_job(job_id)
+        job_config.retry_count = 0
+        with self._lock:
+            self.job_results.pop(job_id, None)
+            self._result_expiry.cancel(job_id)
+        await self.job_queue.put(job_config)
+        return True
+    
     async def _scheduler_loop(self):
-        """Background scheduler for handling scheduled jobs."""
+        """Background timer moving delayed jobs to the priority queues when they come due."""
         while True:
             try:
-                await asyncio.sleep(10)  # Check every 10 seconds
-                # Scheduler logic would go here for more complex scheduling
+                self.delayed_jobs.clear_changed()
+                for job_config in self.delayed_jobs.pop_due():
+                    await self.job_queue.put(job_config)
                 
+                next_run_at = self.delayed_jobs.next_run_at()
+                timeout = max(0.0, next_run_at - time.time()) if next_run_at is not None else None
+                await self.delayed_jobs.wait(timeout)
+            
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"Error in scheduler loop: {e}")
+                await asyncio.sleep(1)
     
-    async def _cleanup_loop(self):
-        """Background cleanup for old job results."""
-        while True:
-            try:
-                await asyncio.sleep(3600)  # Run every hour
-                
-                # Clean up old job results (older than 24 hours)
-                cutoff_time = datetime.now() - timedelta(hours=24)
-                
-                with self._lock:
-                    old_jobs = []
-                    for job_id, result in self.job_results.items():
-                        if (result.completed_at and result.completed_at < cutoff_time):
-                            old_jobs.append(job_id)
-                    
-                    for job_id in old_jobs:
-                        del self.job_results[job_id]
-                    
-                    if old_jobs:
-                        logger.info(f"Cleaned up {len(old_jobs)} old job results")
+    def _schedule_result_expiry(self, job_id: str, result: JobResult):
+        """Schedule removal of a finished job's result after the retention period."""
+        if result.completed_at:
+            deadline = result.completed_at.timestamp() + self.result_retention_hours * 3600
+            self._result_expiry.schedule(job_id, deadline)
+    
+    def _expire_results(self, job_ids: List[str]):
+        """Expiry callback: drop job results older than the retention period."""
+        with self._lock:
+            cutoff_time = datetime.now() - timedelta(hours=self.result_retention_hours)
+            expired = []
+            for job_id in job_ids:
+                result = self.job_results.get(job_id)
+                if result is None or not result.completed_at:
+                    continue
                 
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"Error in cleanup loop: {e}")
+                if result.completed_at < cutoff_time:
+                    del self.job_results[job_id]
+                    expired.append(job_id)
+                else:
+                    self._schedule_result_expiry(job_id, result)
+            
+            # Completed jobs leave the durable queue with their results, freeing their idempotency keys
+            self.job_store.forget(expired)
+            
+            if expired:
+                logger.info(f"Cleaned up {len(expired)} old job results")
     
     def _load_persisted_data(self):
         """Load persisted job results from disk."""
@@ -529,9 +973,10 @@ class LocalJobRunner(ComputeService):
                     result_data['status'] = JobStatus(result_data['status'])
                     result = JobResult(**result_data)
                     self.job_results[job_id] = result
+                    self._schedule_result_expiry(job_id, result)
                 
                 logger.info(f"Loaded {len(self.job_results)} job results from persistence")
-                
+        
         except Exception as e:
             logger.error(f"Error loading persisted job data: {e}")
     
@@ -556,7 +1001,7 @@ class LocalJobRunner(ComputeService):
                     json.dump(persist_data, f, indent=2)
                 
                 logger.debug("Persisted job results to disk")
-                
+        
         except Exception as e:
             logger.error(f"Error persisting job data: {e}")
     
@@ -574,6 +1019,9 @@ class LocalJobRunner(ComputeService):
                 "active_jobs": len(self.active_jobs),
                 "total_job_results": len(self.job_results),
                 "queue_sizes": {priority.name: size for priority, size in queue_sizes.items()},
+                "delayed_jobs": len(self.delayed_jobs),
+                "tenant_queue_depths": self.job_queue.tenant_sizes(),
+                "durable_queue": self.job_store.get_stats(),
                 "status_counts": status_counts,
                 "max_concurrent_jobs": self.max_concurrent_jobs,
                 "registered_functions": len(self.function_registry.functions),
@@ -584,8 +1032,12 @@ class LocalJobRunner(ComputeService):
         """Shutdown the job runner and cleanup resources."""
         logger.info("Shutting down local job runner")
         
+        # Queued jobs interrupted by the shutdown are redelivered right away on the next start;
+        # synchronous invocations were never stored and are left to their callers
+        interrupted = [job_config for job_config in self.active_jobs.values() if job_config.durable]
+        
         # Cancel all background tasks
-        all_tasks = self.worker_tasks + [self.scheduler_task, self.cleanup_task]
+        all_tasks = self.worker_tasks + [self.scheduler_task]
         for task in all_tasks:
             if task:
                 task.cancel()
@@ -598,7 +1050,22 @@ class LocalJobRunner(ComputeService):
         self.thread_pool.shutdown(wait=True)
         self.process_pool.shutdown(wait=True)
         
+        for job_config in interrupted:
+            self.job_store.release(job_config.job_id, job_config, time.time(), job_config.max_attempts)
+        
+        # Wake waiters and end watch streams
+        for waiters in list(self._job_waiters.values()):
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(RuntimeError("Job runner shut down"))
+        for watchers in list(self._job_watchers.values()):
+            for queue in watchers:
+                self._offer(queue, None)
+        
         # Final persistence
         await self.persist_data()
+        self.job_store.close()
+        
+        self._result_expiry.close()
         
         logger.info("Local job runner shutdown complete")
\ No newline at end of file
@@ -9,7 +9,7 @@ import json
 import logging
 import os
 import time
-from typing import Any, Dict, Optional, AsyncIterator
+from typing import Any, Dict, List, Optional, AsyncIterator
 from datetime import datetime
 from pathlib import Path
 import threading
@@ -18,6 +18,7 @@ from openai import AsyncOpenAI
 
 from ....core.interfaces import LLMService
 from ....core.settings import get_settings
+from .expiry_scheduler import get_expiry_scheduler
 
 
 logger = logging.getLogger(__name__)
@@ -44,6 +45,8 @@ class LocalLLMService(LLMService):
         
         # In-memory cache (simple dict)
         self.cache: Dict[str, Dict[str, Any]] = {}
+        self.cache_ttl_seconds = 3600
+        self._cache_expiry = get_expiry_scheduler().register("llm_cache", self._expire_cache_entries)
         
         # Thread safety
         self._lock = threading.RLock()
@@ -111,8 +114,8 @@ class LocalLLMService(LLMService):
             if tenant_cache_key in self.cache:
                 cached_entry = self.cache[tenant_cache_key]
                 
-                # Check if cache entry is still valid (1 hour TTL)
-                if time.time() - cached_entry['timestamp'] < 3600:
+                # Check if cache entry is still valid
+                if time.time() - cached_entry['timestamp'] < self.cache_ttl_seconds:
                     logger.debug(f"Cache hit for agent {agent_id}")
                     
                     # Log cache hit
@@ -136,6 +139,7 @@ class LocalLLMService(LLMService):
                 else:
                     # Cache expired, remove it
                     del self.cache[tenant_cache_key]
+                    self._cache_expiry.cancel(tenant_cache_key)
         
         # Cache miss - call OpenAI
         try:
@@ -168,12 +172,14 @@ class LocalLLMService(LLMService):
             
             # Store in cache
             with self._lock:
+                cached_at = time.time()
                 self.cache[tenant_cache_key] = {
                     'content': content,
                     'model': model_used,
                     'tokens': tokens_used,
-                    'timestamp': time.time()
+                    'timestamp': cached_at
                 }
+                self._cache_expiry.schedule(tenant_cache_key, cached_at + self.cache_ttl_seconds)
             
             # Log usage
             await self._log_usage(
@@ -417,6 +423,20 @@ class LocalLLMService(LLMService):
         except Exception as e:
             logger.error(f"Error writing usage log to file: {e}")
     
+    def _expire_cache_entries(self, cache_keys: List[str]):
+        """Expiry callback: drop cached responses older than cache_ttl_seconds."""
+        with self._lock:
+            now = time.time()
+            for cache_key in cache_keys:
+                entry = self.cache.get(cache_key)
+                if entry is None:
+                    continue
+                
+                if now - entry['timestamp'] >= self.cache_ttl_seconds:
+                    del self.cache[cache_key]
+                else:
+                    self._cache_expiry.schedule(cache_key, entry['timestamp'] + self.cache_ttl_seconds)
+    
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics."""
         with self._lock:
@@ -441,9 +461,12 @@ class LocalLLMService(LLMService):
                 keys_to_delete = [k for k in self.cache.keys() if k.startswith(f"{tenant_id}:")]
                 for key in keys_to_delete:
                     del self.cache[key]
+                    self._cache_expiry.cancel(key)
                 logger.info(f"Cleared {len(keys_to_delete)} cache entries for tenant {tenant_id}")
             else:
                 # Clear all cache
                 entry_count = len(self.cache)
+                for key in self.cache:
+                    self._cache_expiry.cancel(key)
                 self.cache.clear()
                 logger.info(f"Cleared all {entry_count} cache entries")
@@ -4,23 +4,40 @@ Provides in-memory storage with persistence options and session management.
 """
 
 import asyncio
+import bisect
+import heapq
 import json
+import os
 import pickle
+import struct
+import sys
 import time
 import logging
-from typing import Any, Dict, Optional, List
+import zlib
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, List, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from pathlib import Path
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 import threading
 
 from ....core.interfaces import AgentCoreService, AgentSession
 from ....core.settings import get_settings
+from .expiry_scheduler import ExpiryHandle, get_expiry_scheduler
 
 
 logger = logging.getLogger(__name__)
 
 
+MEMORY_EVICTION_POLICIES = ("lru", "lfu", "ttl")
+
+# Bytes charged per entry on top of its key and pickled value
+# (dataclass instance, datetimes and the store's dict slot)
+_ENTRY_OVERHEAD_BYTES = 512
+
+
 @dataclass
 class MemoryEntry:
     """Entry in the local memory store."""
@@ -33,6 +50,7 @@ class MemoryEntry:
     expires_at: Optional[datetime] = None
     access_count: int = 0
     last_accessed: Optional[datetime] = None
+    size_bytes: int = 0
     
     def is_expired(self) -> bool:
         """Check if the memory entry has expired."""
@@ -46,6 +64,496 @@ class MemoryEntry:
         self.last_accessed = datetime.now()
 
 
+class BoundedMemoryStore(MutableMapping):
+    """
+    Memory entries held within a byte budget.
+    
+    Each entry is measured once when it is stored, so the running total is
+    always current. Over budget, entries that have already expired go first,
+    then entries chosen by the eviction policy: least recently used ("lru"),
+    least frequently used ("lfu") or soonest to expire ("ttl", falling back
+    to least recently used for entries without an expiry).
+    
+    Expiry deadlines are registered with `expiry`, if given, so expired
+    entries can be dropped without scanning the store; `on_evict` is called
+    with the key of every entry evicted for space.
+    
+    Entry keys are also indexed per tenant and user in sorted order, so a
+    user's entries, or those under a key prefix, are listed without
+    scanning the store.
+    
+    The store is not locked itself; LocalMemoryService serializes access.
+    """
+    
+    def __init__(self, max_bytes: int, policy: str = "lru", expiry: Optional[ExpiryHandle] = None,
+                 on_evict: Optional[Callable[[str], None]] = None):
+        if policy not in MEMORY_EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy '{policy}', expected one of {MEMORY_EVICTION_POLICIES}")
+        
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.expiry = expiry
+        self.on_evict = on_evict
+        self.total_bytes = 0
+        
+        # Counters
+        self.evictions = 0
+        self.expired_evictions = 0
+        self.evicted_bytes = 0
+        self.rejections = 0
+        
+        # memory_key -> entry, least recently used first
+        self._entries: 'OrderedDict[str, MemoryEntry]' = OrderedDict()
+        
+        # Lazily invalidated heaps of (priority, seq, memory_key); an item is
+        # live while its seq is still the one recorded for the key
+        self._expiry_heap: List[Tuple[float, int, str]] = []
+        self._expiry_seq: Dict[str, int] = {}
+        self._frequency_heap: List[Tuple[int, int, str]] = []
+        self._frequency_seq: Dict[str, int] = {}
+        self._seq = 0
+        
+        # tenant_id -> user_id -> sorted entry keys
+        self._key_index: Dict[str, Dict[str, List[str]]] = {}
+    
+    def __getitem__(self, memory_key: str) -> MemoryEntry:
+        return self._entries[memory_key]
+    
+    def __setitem__(self, memory_key: str, entry: MemoryEntry):
+        if not self.put(memory_key, entry):
+            raise ValueError(f"Memory entry {memory_key} exceeds the memory budget")
+    
+    def __delitem__(self, memory_key: str):
+        if memory_key not in self._entries:
+            raise KeyError(memory_key)
+        self._discard(memory_key)
+    
+    def __iter__(self):
+        return iter(self._entries)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, memory_key: object) -> bool:
+        return memory_key in self._entries
+    
+    @staticmethod
+    def measure(memory_key: str, entry: MemoryEntry, value_size: Optional[int] = None) -> int:
+        """Measure the bytes an entry is charged against the budget."""
+        if value_size is None:
+            try:
+                value_size = len(pickle.dumps(entry.value, protocol=pickle.HIGHEST_PROTOCOL))
+            except Exception:
+                value_size = sys.getsizeof(entry.value)
+        
+        key_size = len(memory_key) + len(entry.key) + len(entry.tenant_id) + len(entry.user_id)
+        return value_size + key_size + _ENTRY_OVERHEAD_BYTES
+    
+    def put(self, memory_key: str, entry: MemoryEntry, value_size: Optional[int] = None) -> bool:
+        """
+        Store an entry, evicting others to stay within the budget.
+        
+        `value_size` is the pickled size of the value, if the caller already
+        has it. Returns False, leaving any previous entry in place, if the
+        entry alone is larger than the budget.
+        """
+        size = self.measure(memory_key, entry, value_size)
+        if size > self.max_bytes:
+            self.rejections += 1
+            return False
+        
+        replaced = memory_key in self._entries
+        if replaced:
+            self._discard(memory_key, unindex=False)
+        
+        entry.size_bytes = size
+        self._entries[memory_key] = entry
+        self.total_bytes += size
+        if not replaced:
+            self._index_key(entry)
+        
+        if entry.expires_at is not None:
+            self._seq += 1
+            self._expiry_seq[memory_key] = self._seq
+            heapq.heappush(self._expiry_heap, (entry.expires_at.timestamp(), self._seq, memory_key))
+            if self.expiry is not None:
+                self.expiry.schedule(memory_key, entry.expires_at.timestamp())
+        if self.policy == "lfu":
+            self._push_frequency(memory_key, entry)
+        
+        self._compact_heaps()
+        self._enforce_budget(protect=memory_key)
+        return True
+    
+    def touch(self, memory_key: str) -> MemoryEntry:
+        """Mark an entry as accessed and update its eviction priority."""
+        entry = self._entries[memory_key]
+        entry.access()
+        self._entries.move_to_end(memory_key)
+        if self.policy == "lfu":
+            self._push_frequency(memory_key, entry)
+        return entry
+    
+    def keys_with_prefix(self, tenant_id: str, user_id: str, prefix: str = "") -> List[str]:
+        """Get a user's entry keys starting with `prefix`, in sorted order."""
+        keys = self._key_index.get(tenant_id, {}).get(user_id)
+        if not keys:
+            return []
+        if not prefix:
+            return list(keys)
+        
+        start = bisect.bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        return keys[start:end]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get size and eviction counters."""
+        return {
+            "eviction_policy": self.policy,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expired_evictions": self.expired_evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "rejections": self.rejections
+        }
+    
+    def _discard(self, memory_key: str, unindex: bool = True):
+        """Remove an entry and its accounting; heap items go stale."""
+        entry = self._entries.pop(memory_key)
+        self.total_bytes -= entry.size_bytes
+        self._frequency_seq.pop(memory_key, None)
+        if self._expiry_seq.pop(memory_key, None) is not None and self.expiry is not None:
+            self.expiry.cancel(memory_key)
+        if unindex:
+            self._unindex_key(entry)
+    
+    def _index_key(self, entry: MemoryEntry):
+        keys = self._key_index.setdefault(entry.tenant_id, {}).setdefault(entry.user_id, [])
+        bisect.insort(keys, entry.key)
+    
+    def _unindex_key(self, entry: MemoryEntry):
+        users = self._key_index.get(entry.tenant_id)
+        keys = users.get(entry.user_id) if users else None
+        if not keys:
+            return
+        
+        position = bisect.bisect_left(keys, entry.key)
+        if position < len(keys) and keys[position] == entry.key:
+            del keys[position]
+        if not keys:
+            del users[entry.user_id]
+            if not users:
+                del self._key_index[entry.tenant_id]
+    
+    def _push_frequency(self, memory_key: str, entry: MemoryEntry):
+        self._seq += 1
+        self._frequency_seq[memory_key] = self._seq
+        heapq.heappush(self._frequency_heap, (entry.access_count, self._seq, memory_key))
+    
+    def _compact_heaps(self):
+        """Rebuild heaps once stale items outnumber live ones."""
+        if len(self._expiry_heap) > 2 * len(self._expiry_seq) + 64:
+            self._expiry_heap = [
+                item for item in self._expiry_heap if self._expiry_seq.get(item[2]) == item[1]
+            ]
+            heapq.heapify(self._expiry_heap)
+        
+        if len(self._frequency_heap) > 2 * len(self._frequency_seq) + 64:
+            self._frequency_heap = [
+                item for item in self._frequency_heap if self._frequency_seq.get(item[2]) == item[1]
+            ]
+            heapq.heapify(self._frequency_heap)
+    
+    def _pop_heap(self, heap: List[Tuple], seqs: Dict[str, int], protect: str,
+                  before: Optional[float] = None) -> Optional[str]:
+        """Pop the first live key of a heap other than `protect`."""
+        skipped = None
+        victim = None
+        
+        while heap:
+            priority, seq, memory_key = heap[0]
+            if seqs.get(memory_key) != seq:
+                heapq.heappop(heap)
+                continue
+            if before is not None and priority > before:
+                break
+            if memory_key == protect:
+                skipped = heapq.heappop(heap)
+                continue
+            
+            heapq.heappop(heap)
+            victim = memory_key
+            break
+        
+        if skipped is not None:
+            heapq.heappush(heap, skipped)
+        return victim
+    
+    def _pop_least_recent(self, protect: str) -> Optional[str]:
+        for memory_key in self._entries:
+            if memory_key != protect:
+                return memory_key
+        return None
+    
+    def _enforce_budget(self, protect: str):
+        """Evict entries other than `protect` until the budget is met."""
+        now = time.time()
+        
+        while self.total_bytes > self.max_bytes:
+            expired = True
+            victim = self._pop_heap(self._expiry_heap, self._expiry_seq, protect, before=now)
+            
+            if victim is None:
+                expired = False
+                if self.policy == "lfu":
+                    victim = self._pop_heap(self._frequency_heap, self._frequency_seq, protect)
+                elif self.policy == "ttl":
+                    victim = self._pop_heap(self._expiry_heap, self._expiry_seq, protect)
+                if victim is None:
+                    victim = self._pop_least_recent(protect)
+            
+            if victim is None:
+                break
+            
+            size = self._entries[victim].size_bytes
+            self._discard(victim)
+            self.evictions += 1
+            self.evicted_bytes += size
+            if expired:
+                self.expired_evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(victim)
+            logger.debug(f"Evicted memory ({self.policy}{', expired' if expired else ''}): {victim}")
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    return value.timestamp() if value is not None else None
+
+
+def _datetime(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value) if value is not None else None
+
+
+def encode_memory_entry(memory_key: str, entry: MemoryEntry, value_bytes: bytes) -> bytes:
+    """Encode a memory entry for the WAL; `value_bytes` is the pickled value."""
+    return pickle.dumps((
+        memory_key, entry.key, entry.tenant_id, entry.user_id,
+        entry.created_at.timestamp(), entry.updated_at.timestamp(), _timestamp(entry.expires_at),
+        entry.access_count, _timestamp(entry.last_accessed), value_bytes
+    ), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_memory_entry(payload: bytes) -> Tuple[str, MemoryEntry, int]:
+    """Decode a WAL memory entry into (memory_key, entry, pickled value size)."""
+    (memory_key, key, tenant_id, user_id, created_at, updated_at, expires_at,
+     access_count, last_accessed, value_bytes) = pickle.loads(payload)
+    entry = MemoryEntry(
+        key=key,
+        value=pickle.loads(value_bytes),
+        tenant_id=tenant_id,
+        user_id=user_id,
+        created_at=datetime.fromtimestamp(created_at),
+        updated_at=datetime.fromtimestamp(updated_at),
+        expires_at=_datetime(expires_at),
+        access_count=access_count,
+        last_accessed=_datetime(last_accessed)
+    )
+    return memory_key, entry, len(value_bytes)
+
+
+_SESSION_TOUCH = struct.Struct("<d")
+
+
+def encode_session_touch(session_key: str, last_activity: datetime) -> bytes:
+    """Encode a session activity update for the WAL."""
+    return _SESSION_TOUCH.pack(last_activity.timestamp()) + session_key.encode()
+
+
+def decode_session_touch(payload: bytes) -> Tuple[str, datetime]:
+    """Decode a WAL session activity update into (session_key, last_activity)."""
+    (timestamp,) = _SESSION_TOUCH.unpack_from(payload)
+    return payload[_SESSION_TOUCH.size:].decode(), datetime.fromtimestamp(timestamp)
+
+
+class MemoryWriteAheadLog:
+    """
+    Append-only log of memory and session operations with compacted snapshots.
+    
+    Records are (op, length, crc32) headers followed by a pickled payload.
+    The service appends encoded records to an in-memory buffer; flush()
+    writes everything buffered with one fsync per file and runs on the
+    service's WAL thread, so puts never wait on the disk.
+    
+    Files are numbered by generation: memory.<g>.snapshot holds the state
+    at the moment memory.<g>.wal was started, and manifest.json names the
+    newest complete snapshot. Recovery loads that snapshot and replays every
+    log from its generation on, stopping at a torn or corrupt tail.
+    """
+    
+    PUT_MEMORY = 1
+    DELETE_MEMORY = 2
+    PUT_SESSION = 3
+    DELETE_SESSION = 4
+    TOUCH_SESSION = 5  # Only the session's last activity time changed
+    
+    _HEADER = struct.Struct("<BII")
+    
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.directory / "manifest.json"
+        
+        self.generation = 1
+        self.bytes_since_snapshot = 0
+        self.records_written = 0
+        self.fsyncs = 0
+        
+        # Buffered records as (generation, bytes), oldest first
+        self._pending: List[Tuple[int, bytearray]] = []
+        self._files: Dict[int, BinaryIO] = {}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def encode(cls, op: int, payload: bytes) -> bytes:
+        """Encode one record."""
+        return cls._HEADER.pack(op, len(payload), zlib.crc32(payload)) + payload
+    
+    def _log_path(self, generation: int) -> Path:
+        return self.directory / f"memory.{generation}.wal"
+    
+    def _snapshot_path(self, generation: int) -> Path:
+        return self.directory / f"memory.{generation}.snapshot"
+    
+    def _generations(self, suffix: str) -> List[int]:
+        return sorted(int(path.name.split('.')[1]) for path in self.directory.glob(f"memory.*.{suffix}"))
+    
+    def exists(self) -> bool:
+        """Check whether a snapshot or log has been written."""
+        return self.manifest_path.exists() or bool(self._generations("wal"))
+    
+    def append(self, op: int, payload: bytes):
+        """Buffer a record for the current generation's log."""
+        record = self.encode(op, payload)
+        with self._lock:
+            if not self._pending or self._pending[-1][0] != self.generation:
+                self._pending.append((self.generation, bytearray()))
+            self._pending[-1][1].extend(record)
+            self.bytes_since_snapshot += len(record)
+    
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+    
+    def flush(self):
+        """Write buffered records and fsync (blocking; run off the event loop)."""
+        with self._lock:
+            batches, self._pending = self._pending, []
+            current_generation = self.generation
+        
+        for generation, data in batches:
+            log_file = self._files.get(generation)
+            if log_file is None:
+                log_file = self._files[generation] = open(self._log_path(generation), 'ab')
+            log_file.write(data)
+            log_file.flush()
+            os.fsync(log_file.fileno())
+            self.fsyncs += 1
+        
+        # Logs of earlier generations receive no more records
+        for generation in [g for g in self._files if g < current_generation]:
+            self._files.pop(generation).close()
+    
+    def rotate(self) -> int:
+        """Start a new log generation; returns it. Call while the state is quiescent."""
+        with self._lock:
+            self.generation += 1
+            self.bytes_since_snapshot = 0
+            return self.generation
+    
+    def write_snapshot(self, generation: int, records: Iterator[bytes]):
+        """
+        Write a snapshot for `generation`, switch the manifest to it and drop
+        older files. `records` are encoded records of the full state.
+        """
+        self.flush()
+        
+        snapshot_path = self._snapshot_path(generation)
+        temp_path = snapshot_path.with_name(snapshot_path.name + ".tmp")
+        with open(temp_path, 'wb') as f:
+            for record in records:
+                f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, snapshot_path)
+        
+        temp_manifest = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(temp_manifest, 'w') as f:
+            json.dump({"generation": generation}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_manifest, self.manifest_path)
+        
+        for old_generation in self._generations("wal"):
+            if old_generation < generation:
+                self._log_path(old_generation).unlink()
+        for old_generation in self._generations("snapshot"):
+            if old_generation < generation:
+                self._snapshot_path(old_generation).unlink()
+    
+    def _read(self, path: Path, truncate: bool) -> Iterator[Tuple[int, bytes]]:
+        """Yield the valid records of a file, truncating a torn tail if asked."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        
+        offset = 0
+        header_size = self._HEADER.size
+        view = memoryview(data)
+        while offset + header_size <= len(data):
+            op, length, checksum = self._HEADER.unpack_from(data, offset)
+            payload = view[offset + header_size:offset + header_size + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            yield op, bytes(payload)
+            offset += header_size + length
+        
+        if offset < len(data):
+            logger.warning(f"Discarding {len(data) - offset} bytes of torn or corrupt records in {path.name}")
+            if truncate:
+                with open(path, 'r+b') as f:
+                    f.truncate(offset)
+    
+    def replay(self) -> Iterator[Tuple[int, bytes]]:
+        """Yield all records of the newest snapshot and the logs after it."""
+        snapshot_generation = 0
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r') as f:
+                snapshot_generation = json.load(f)["generation"]
+            yield from self._read(self._snapshot_path(snapshot_generation), truncate=False)
+        
+        log_generations = [g for g in self._generations("wal") if g >= snapshot_generation]
+        for generation in log_generations:
+            yield from self._read(self._log_path(generation), truncate=True)
+        
+        # New records go to a fresh log after everything replayed
+        self.generation = max([snapshot_generation] + log_generations) + 1
+    
+    def close(self):
+        """Close open log files (after a final flush)."""
+        for log_file in self._files.values():
+            log_file.close()
+        self._files.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "generation": self.generation,
+            "bytes_since_snapshot": self.bytes_since_snapshot,
+            "fsyncs": self.fsyncs
+        }
+
+
 class LocalMemoryService(AgentCoreService):
     """
     Local memory service that provides Agent Core functionality using local storage.
@@ -55,28 +563,50 @@ class LocalMemoryService(AgentCoreService):
     def __init__(self):
         self.settings = get_settings()
         
-        # In-memory storage
-        self.memory_store: Dict[str, MemoryEntry] = {}
+        # Configuration
+        self.max_memory_mb = self.settings.local.max_memory_mb
+        self.eviction_policy = getattr(self.settings.local, "memory_eviction_policy", "lru")
+        self.default_ttl_hours = 24
+        self.session_idle_hours = 24
+        
+        # Expiry of memory entries and idle sessions
+        expiry_scheduler = get_expiry_scheduler()
+        self._memory_expiry = expiry_scheduler.register("memory", self._expire_memory)
+        self._session_expiry = expiry_scheduler.register("sessions", self._expire_sessions)
+        
+        # In-memory storage, bounded by max_memory_mb
+        self.memory_store = BoundedMemoryStore(
+            int(self.max_memory_mb * 1024 * 1024), self.eviction_policy, self._memory_expiry,
+            on_evict=self._log_memory_delete
+        )
         self.sessions: Dict[str, AgentSession] = {}
         
+        # Session indexes: (tenant_id, user_id) -> session keys in creation
+        # order, and all session keys least recently active first
+        self._user_sessions: Dict[Tuple[str, str], Dict[str, None]] = {}
+        self._session_activity: 'OrderedDict[str, None]' = OrderedDict()
+        
         # Persistence settings
         self.data_directory = Path(self.settings.local.data_directory)
         self.data_directory.mkdir(parents=True, exist_ok=True)
         
+        # Legacy full-JSON files, migrated to the WAL on first start
         self.memory_file = self.data_directory / "memory_store.json"
         self.sessions_file = self.data_directory / "sessions.json"
         
-        # Configuration
-        self.max_memory_mb = self.settings.local.max_memory_mb
-        self.default_ttl_hours = 24
-        self.cleanup_interval = 300  # 5 minutes
+        # Write-ahead log, group-committed every wal_flush_interval seconds
+        # and compacted into a snapshot once it grows past snapshot_wal_bytes
+        self.wal = MemoryWriteAheadLog(self.data_directory / "memory")
+        self.wal_flush_interval = 0.05
+        self.snapshot_wal_bytes = 64 * 1024 * 1024
+        self._wal_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-wal")
         
         # Thread safety
         self._lock = threading.RLock()
         
         # Background tasks
-        self._cleanup_task: Optional[asyncio.Task] = None
         self._persistence_task: Optional[asyncio.Task] = None
+        self._wal_flush_task: Optional[asyncio.Task] = None
         
         # Load persisted data
         self._load_persisted_data()
@@ -87,8 +617,8 @@ class LocalMemoryService(AgentCoreService):
         logger.info("Local memory service initialized")
     
     async def _start_background_tasks(self):
-        """Start background cleanup and persistence tasks."""
-        self._cleanup_task = asyncio.create_task(self._cleanup_expired_entries())
+        """Start background WAL flush and snapshot tasks."""
+        self._wal_flush_task = asyncio.create_task(self._wal_flush_loop())
         self._persistence_task = asyncio.create_task(self._periodic_persistence())
     
     def _generate_memory_key(self, user_id: str, key: str, tenant_id: str) -> str:
@@ -102,6 +632,13 @@ class LocalMemoryService(AgentCoreService):
     async def put_memory(self, user_id: str, key: str, value: Any, tenant_id: str, ttl_hours: Optional[int] = None) -> bool:
         """Store memory data for a user within a tenant context."""
         try:
+            # Pickled once for both size accounting and the WAL
+            try:
+                value_bytes = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                value_bytes = None
+                logger.warning(f"Memory {user_id}:{key} can't be pickled and won't be persisted: {e}")
+            
             with self._lock:
                 memory_key = self._generate_memory_key(user_id, key, tenant_id)
                 
@@ -112,23 +649,33 @@ class LocalMemoryService(AgentCoreService):
                 elif self.default_ttl_hours > 0:
                     expires_at = datetime.now() + timedelta(hours=self.default_ttl_hours)
                 
-                # Create or update memory entry
-                if memory_key in self.memory_store:
-                    entry = self.memory_store[memory_key]
-                    entry.value = value
-                    entry.updated_at = datetime.now()
-                    entry.expires_at = expires_at
-                else:
-                    entry = MemoryEntry(
-                        key=key,
-                        value=value,
-                        tenant_id=tenant_id,
-                        user_id=user_id,
-                        created_at=datetime.now(),
-                        updated_at=datetime.now(),
-                        expires_at=expires_at
+                # Create or replace the memory entry, keeping its history
+                now = datetime.now()
+                previous = self.memory_store.get(memory_key)
+                entry = MemoryEntry(
+                    key=key,
+                    value=value,
+                    tenant_id=tenant_id,
+                    user_id=user_id,
+                    created_at=previous.created_at if previous else now,
+                    updated_at=now,
+                    expires_at=expires_at,
+                    access_count=previous.access_count if previous else 0,
+                    last_accessed=previous.last_accessed if previous else None
+                )
+                
+                value_size = len(value_bytes) if value_bytes is not None else None
+                if not self.memory_store.put(memory_key, entry, value_size):
+                    logger.warning(f"Memory {memory_key} exceeds the {self.max_memory_mb} MB memory budget")
+                    return False
+                
+                if value_bytes is not None:
+                    self.wal.append(
+                        MemoryWriteAheadLog.PUT_MEMORY, encode_memory_entry(memory_key, entry, value_bytes)
                     )
-                    self.memory_store[memory_key] = entry
+                elif previous is not None:
+                    # The logged value was overwritten; don't let a restart bring it back
+                    self._log_memory_delete(memory_key)
                 
                 logger.debug(f"Stored memory: {memory_key}")
                 return True
@@ -155,7 +702,7 @@ class LocalMemoryService(AgentCoreService):
                     return None
                 
                 # Mark as accessed
-                entry.access()
+                self.memory_store.touch(memory_key)
                 
                 logger.debug(f"Retrieved memory: {memory_key}")
                 return entry.value
@@ -185,7 +732,9 @@ class LocalMemoryService(AgentCoreService):
                     configuration=config
                 )
                 
-                self.sessions[session_key] = session
+                self._add_session(session_key, session)
+                self._schedule_session_expiry(session_key, session)
+                self._log_session_put(session_key, session)
                 
                 logger.info(f"Created session: {session_id} for tenant {tenant_id}")
                 return session_id
@@ -206,7 +755,8 @@ class LocalMemoryService(AgentCoreService):
                 session = self.sessions[session_key]
                 
                 # Update last activity
-                session.last_activity = datetime.now()
+                self._touch_session(session_key, session)
+                self._log_session_touch(session_key, session)
                 
                 logger.debug(f"Retrieved session: {session_id}")
                 return session
@@ -225,13 +775,20 @@ class LocalMemoryService(AgentCoreService):
                     return False
                 
                 session = self.sessions[session_key]
+                owner = (session.tenant_id, session.user_id)
                 
                 # Update session fields
                 for field, value in updates.items():
                     if hasattr(session, field):
                         setattr(session, field, value)
                 
-                session.last_activity = datetime.now()
+                # Re-index a session moved to another user or tenant
+                if (session.tenant_id, session.user_id) != owner:
+                    self._remove_session(session_key, owner)
+                    self._add_session(session_key, session)
+                
+                self._touch_session(session_key, session)
+                self._log_session_put(session_key, session)
                 
                 logger.debug(f"Updated session: {session_id}")
                 return True
@@ -247,7 +804,9 @@ class LocalMemoryService(AgentCoreService):
                 session_key = self._generate_session_key(session_id, tenant_id)
                 
                 if session_key in self.sessions:
-                    del self.sessions[session_key]
+                    self._remove_session(session_key)
+                    self._session_expiry.cancel(session_key)
+                    self._log_session_delete(session_key)
                     logger.info(f"Deleted session: {session_id}")
                     return True
                 
@@ -261,13 +820,8 @@ class LocalMemoryService(AgentCoreService):
         """List all sessions for a user in a tenant."""
         try:
             with self._lock:
-                user_sessions = []
-                
-                for session_key, session in self.sessions.items():
-                    if session.user_id == user_id and session.tenant_id == tenant_id:
-                        user_sessions.append(session)
-                
-                return user_sessions
+                session_keys = self._user_sessions.get((tenant_id, user_id), {})
+                return [self.sessions[session_key] for session_key in session_keys]
                 
         except Exception as e:
             logger.error(f"Error listing sessions for user {user_id} in tenant {tenant_id}: {e}")
@@ -280,13 +834,17 @@ class LocalMemoryService(AgentCoreService):
                 cutoff_time = datetime.now() - timedelta(hours=max_idle_hours)
                 expired_sessions = []
                 
-                for session_key, session in self.sessions.items():
-                    if session.last_activity < cutoff_time:
-                        expired_sessions.append(session_key)
+                # Least recently active first, so stop at the first active session
+                for session_key in self._session_activity:
+                    if self.sessions[session_key].last_activity >= cutoff_time:
+                        break
+                    expired_sessions.append(session_key)
                 
                 # Remove expired sessions
                 for session_key in expired_sessions:
-                    del self.sessions[session_key]
+                    self._remove_session(session_key)
+                    self._session_expiry.cancel(session_key)
+                    self._log_session_delete(session_key)
                 
                 if expired_sessions:
                     logger.info(f"Cleaned up {len(expired_sessions)} expired sessions")
@@ -297,86 +855,249 @@ class LocalMemoryService(AgentCoreService):
             logger.error(f"Error cleaning up expired sessions: {e}")
             return 0
     
-    async def _cleanup_expired_entries(self):
-        """Background task to clean up expired memory entries and sessions."""
-        while True:
-            try:
-                await asyncio.sleep(self.cleanup_interval)
-                
-                # Clean up expired memory entries
-                with self._lock:
-                    expired_keys = []
-                    for key, entry in self.memory_store.items():
-                        if entry.is_expired():
-                            expired_keys.append(key)
-                    
-                    for key in expired_keys:
-                        del self.memory_store[key]
-                    
-                    if expired_keys:
-                        logger.debug(f"Cleaned up {len(expired_keys)} expired memory entries")
+    async def list_memory(self, user_id: str, tenant_id: str, prefix: str = "") -> Dict[str, Any]:
+        """List a user's memory entries whose keys start with `prefix`, by key."""
+        try:
+            with self._lock:
+                memories = {}
+                expired = []
                 
-                # Clean up expired sessions
-                await self.cleanup_expired_sessions()
+                for key in self.memory_store.keys_with_prefix(tenant_id, user_id, prefix):
+                    memory_key = self._generate_memory_key(user_id, key, tenant_id)
+                    entry = self.memory_store[memory_key]
+                    if entry.is_expired():
+                        expired.append(memory_key)
+                    else:
+                        memories[key] = entry.value
                 
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"Error in cleanup task: {e}")
+                for memory_key in expired:
+                    del self.memory_store[memory_key]
+                
+                return memories
+        
+        except Exception as e:
+            logger.error(f"Error listing memory for user {user_id} in tenant {tenant_id}: {e}")
+            return {}
     
-    def _load_persisted_data(self):
-        """Load persisted memory and session data from disk."""
-        try:
-            # Load memory store
-            if self.memory_file.exists():
-                with open(self.memory_file, 'r') as f:
-                    data = json.load(f)
-                    
-                    for key, entry_data in data.items():
-                        # Convert datetime strings back to datetime objects
-                        entry_data['created_at'] = datetime.fromisoformat(entry_data['created_at'])
-                        entry_data['updated_at'] = datetime.fromisoformat(entry_data['updated_at'])
-                        
-                        if entry_data.get('expires_at'):
-                            entry_data['expires_at'] = datetime.fromisoformat(entry_data['expires_at'])
-                        
-                        if entry_data.get('last_accessed'):
-                            entry_data['last_accessed'] = datetime.fromisoformat(entry_data['last_accessed'])
-                        
-                        entry = MemoryEntry(**entry_data)
-                        
-                        # Only load non-expired entries
-                        if not entry.is_expired():
-                            self.memory_store[key] = entry
+    def _add_session(self, session_key: str, session: AgentSession):
+        """Store a session and index it by user and activity."""
+        self.sessions[session_key] = session
+        self._user_sessions.setdefault((session.tenant_id, session.user_id), {})[session_key] = None
+        self._session_activity[session_key] = None
+        self._session_activity.move_to_end(session_key)
+    
+    def _remove_session(self, session_key: str, owner: Optional[Tuple[str, str]] = None):
+        """Remove a session and its index entries; `owner` overrides its (tenant_id, user_id)."""
+        session = self.sessions.pop(session_key)
+        owner = owner or (session.tenant_id, session.user_id)
+        session_keys = self._user_sessions.get(owner)
+        if session_keys is not None:
+            session_keys.pop(session_key, None)
+            if not session_keys:
+                del self._user_sessions[owner]
+        self._session_activity.pop(session_key, None)
+    
+    def _touch_session(self, session_key: str, session: AgentSession):
+        """Record activity, moving the session to the most recent end of the activity index."""
+        session.last_activity = datetime.now()
+        self._session_activity.move_to_end(session_key)
+    
+    def _rebuild_session_indexes(self):
+        """Index loaded sessions, ordering the activity index by last activity."""
+        sessions = sorted(self.sessions.items(), key=lambda item: item[1].last_activity)
+        self.sessions = {}
+        self._user_sessions.clear()
+        self._session_activity.clear()
+        for session_key, session in sessions:
+            self._add_session(session_key, session)
+    
+    def _schedule_session_expiry(self, session_key: str, session: AgentSession):
+        """Schedule an idle check for when the session would go idle."""
+        deadline = session.last_activity.timestamp() + self.session_idle_hours * 3600
+        self._session_expiry.schedule(session_key, deadline)
+    
+    def _expire_memory(self, memory_keys: List[str]):
+        """Expiry callback: drop memory entries whose TTL has passed."""
+        with self._lock:
+            expired = 0
+            for memory_key in memory_keys:
+                entry = self.memory_store.get(memory_key)
+                if entry is None or entry.expires_at is None:
+                    continue
                 
-                logger.info(f"Loaded {len(self.memory_store)} memory entries from persistence")
+                if entry.is_expired():
+                    del self.memory_store[memory_key]
+                    expired += 1
+                else:
+                    self._memory_expiry.schedule(memory_key, entry.expires_at.timestamp())
             
-            # Load sessions
-            if self.sessions_file.exists():
-                with open(self.sessions_file, 'r') as f:
-                    data = json.load(f)
-                    
-                    for key, session_data in data.items():
-                        # Convert datetime strings back to datetime objects
-                        session_data['created_at'] = datetime.fromisoformat(session_data['created_at'])
-                        session_data['last_activity'] = datetime.fromisoformat(session_data['last_activity'])
-                        
-                        session = AgentSession(**session_data)
-                        self.sessions[key] = session
+            if expired:
+                logger.debug(f"Cleaned up {expired} expired memory entries")
+    
+    def _expire_sessions(self, session_keys: List[str]):
+        """Expiry callback: drop sessions idle for session_idle_hours."""
+        with self._lock:
+            cutoff_time = datetime.now() - timedelta(hours=self.session_idle_hours)
+            expired = 0
+            for session_key in session_keys:
+                session = self.sessions.get(session_key)
+                if session is None:
+                    continue
                 
-                logger.info(f"Loaded {len(self.sessions)} sessions from persistence")
+                # Activity since the timer was set pushes the deadline back
+                if session.last_activity < cutoff_time:
+                    self._remove_session(session_key)
+                    self._log_session_delete(session_key)
+                    expired += 1
+                else:
+                    self._schedule_session_expiry(session_key, session)
+            
+            if expired:
+                logger.info(f"Cleaned up {expired} expired sessions")
+    
+    def _log_memory_delete(self, memory_key: str):
+        """Log the removal of a memory entry (evicted for space or no longer persistable)."""
+        self.wal.append(MemoryWriteAheadLog.DELETE_MEMORY, memory_key.encode())
+    
+    def _log_session_put(self, session_key: str, session: AgentSession):
+        self.wal.append(
+            MemoryWriteAheadLog.PUT_SESSION,
+            pickle.dumps((session_key, asdict(session)), protocol=pickle.HIGHEST_PROTOCOL)
+        )
+    
+    def _log_session_touch(self, session_key: str, session: AgentSession):
+        """Log a new last activity time without re-logging the whole session."""
+        self.wal.append(
+            MemoryWriteAheadLog.TOUCH_SESSION,
+            encode_session_touch(session_key, session.last_activity)
+        )
+    
+    def _log_session_delete(self, session_key: str):
+        self.wal.append(MemoryWriteAheadLog.DELETE_SESSION, session_key.encode())
+    
+    def _load_persisted_data(self):
+        """Recover memory and sessions from the snapshot and WAL, or migrate legacy JSON files."""
+        try:
+            if self.wal.exists():
+                self._recover_from_wal()
+            elif self.memory_file.exists() or self.sessions_file.exists():
+                self._load_legacy_data()
                 
+                # Snapshot right away so the WAL never depends on the JSON files
+                generation = self.wal.rotate()
+                self._write_snapshot(generation, list(self.memory_store.items()), list(self.sessions.items()))
+                for legacy_file in [self.memory_file, self.sessions_file]:
+                    if legacy_file.exists():
+                        legacy_file.rename(legacy_file.with_name(legacy_file.name + ".migrated"))
+                logger.info("Migrated memory and sessions from JSON files to the WAL")
+        
         except Exception as e:
             logger.error(f"Error loading persisted data: {e}")
     
+    def _recover_from_wal(self):
+        """Replay the newest snapshot plus the WAL tail."""
+        start_time = time.time()
+        entries: Dict[str, Tuple[MemoryEntry, int]] = {}
+        records = 0
+        
+        for op, payload in self.wal.replay():
+            records += 1
+            if op == MemoryWriteAheadLog.PUT_MEMORY:
+                memory_key, entry, value_size = decode_memory_entry(payload)
+                entries.pop(memory_key, None)  # Re-puts move to the most recent end
+                entries[memory_key] = (entry, value_size)
+            elif op == MemoryWriteAheadLog.DELETE_MEMORY:
+                entries.pop(payload.decode(), None)
+            elif op == MemoryWriteAheadLog.PUT_SESSION:
+                session_key, session_data = pickle.loads(payload)
+                self.sessions[session_key] = AgentSession(**session_data)
+            elif op == MemoryWriteAheadLog.DELETE_SESSION:
+                self.sessions.pop(payload.decode(), None)
+            elif op == MemoryWriteAheadLog.TOUCH_SESSION:
+                session_key, last_activity = decode_session_touch(payload)
+                if session_key in self.sessions:
+                    self.sessions[session_key].last_activity = last_activity
+        
+        for memory_key, (entry, value_size) in entries.items():
+            if not entry.is_expired():
+                self.memory_store.put(memory_key, entry, value_size)
+        self._rebuild_session_indexes()
+        for session_key, session in self.sessions.items():
+            self._schedule_session_expiry(session_key, session)
+        
+        logger.info(
+            f"Recovered {len(self.memory_store)} memory entries and {len(self.sessions)} sessions "
+            f"from {records} WAL records in {time.time() - start_time:.2f}s"
+        )
+    
+    def _load_legacy_data(self):
+        """Load memory and session data from the legacy JSON files."""
+        # Load memory store
+        if self.memory_file.exists():
+            with open(self.memory_file, 'r') as f:
+                data = json.load(f)
+                
+                for key, entry_data in data.items():
+                    # Convert datetime strings back to datetime objects
+                    entry_data['created_at'] = datetime.fromisoformat(entry_data['created_at'])
+                    entry_data['updated_at'] = datetime.fromisoformat(entry_data['updated_at'])
+                    
+                    if entry_data.get('expires_at'):
+                        entry_data['expires_at'] = datetime.fromisoformat(entry_data['expires_at'])
+                    
+                    if entry_data.get('last_accessed'):
+                        entry_data['last_accessed'] = datetime.fromisoformat(entry_data['last_accessed'])
+                    
+                    entry = MemoryEntry(**entry_data)
+                    
+                    # Only load non-expired entries
+                    if not entry.is_expired():
+                        self.memory_store.put(key, entry)
+            
+            logger.info(f"Loaded {len(self.memory_store)} memory entries from persistence")
+        
+        # Load sessions
+        if self.sessions_file.exists():
+            with open(self.sessions_file, 'r') as f:
+                data = json.load(f)
+                
+                for key, session_data in data.items():
+                    # Convert datetime strings back to datetime objects
+                    session_data['created_at'] = datetime.fromisoformat(session_data['created_at'])
+                    session_data['last_activity'] = datetime.fromisoformat(session_data['last_activity'])
+                    
+                    session = AgentSession(**session_data)
+                    self.sessions[key] = session
+                    self._schedule_session_expiry(key, session)
+            
+            self._rebuild_session_indexes()
+            logger.info(f"Loaded {len(self.sessions)} sessions from persistence")
+    
+    
+    async def _wal_flush_loop(self):
+        """Background task that group-commits buffered WAL records."""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            try:
+                await asyncio.sleep(self.wal_flush_interval)
+                if self.wal.has_pending():
+                    await loop.run_in_executor(self._wal_executor, self.wal.flush)
+                
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error flushing memory WAL: {e}")
+    
     async def _periodic_persistence(self):
-        """Background task to periodically persist data to disk."""
+        """Background task that compacts the WAL into a snapshot once it grows large."""
         persistence_interval = 300  # 5 minutes
         
         while True:
             try:
                 await asyncio.sleep(persistence_interval)
-                await self.persist_data()
+                if self.wal.bytes_since_snapshot >= self.snapshot_wal_bytes:
+                    await self.persist_data()
                 
             except asyncio.CancelledError:
                 break
@@ -384,60 +1105,57 @@ class LocalMemoryService(AgentCoreService):
                 logger.error(f"Error in persistence task: {e}")
     
     async def persist_data(self):
-        """Persist current memory and session data to disk."""
+        """
+        Write a compacted snapshot of memory and sessions and drop older WAL files.
+        
+        The lock is only held to start a new WAL generation and copy the
+        entry references; encoding and writing run on the WAL thread.
+        """
         try:
             with self._lock:
-                # Persist memory store
-                memory_data = {}
-                for key, entry in self.memory_store.items():
-                    if not entry.is_expired():
-                        entry_dict = asdict(entry)
-                        # Convert datetime objects to ISO strings
-                        entry_dict['created_at'] = entry.created_at.isoformat()
-                        entry_dict['updated_at'] = entry.updated_at.isoformat()
+                generation = self.wal.rotate()
+                entries = list(self.memory_store.items())
+                sessions = list(self.sessions.items())
                         
-                        if entry.expires_at:
-                            entry_dict['expires_at'] = entry.expires_at.isoformat()
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._wal_executor, self._write_snapshot, generation, entries, sessions)
                         
-                        if entry.last_accessed:
-                            entry_dict['last_accessed'] = entry.last_accessed.isoformat()
-                        
-                        memory_data[key] = entry_dict
-                
-                with open(self.memory_file, 'w') as f:
-                    json.dump(memory_data, f, indent=2)
-                
-                # Persist sessions
-                session_data = {}
-                for key, session in self.sessions.items():
-                    session_dict = asdict(session)
-                    # Convert datetime objects to ISO strings
-                    session_dict['created_at'] = session.created_at.isoformat()
-                    session_dict['last_activity'] = session.last_activity.isoformat()
-                    
-                    session_data[key] = session_dict
-                
-                with open(self.sessions_file, 'w') as f:
-                    json.dump(session_data, f, indent=2)
-                
-                logger.debug("Persisted memory and session data to disk")
+            logger.debug(f"Persisted memory snapshot generation {generation}")
                 
         except Exception as e:
             logger.error(f"Error persisting data: {e}")
     
+    def _write_snapshot(self, generation: int, entries: List[Tuple[str, MemoryEntry]],
+                        sessions: List[Tuple[str, AgentSession]]):
+        """Encode and write a snapshot (blocking; runs on the WAL thread)."""
+        def records() -> Iterator[bytes]:
+            for memory_key, entry in entries:
+                if entry.is_expired():
+                    continue
+                try:
+                    value_bytes = pickle.dumps(entry.value, protocol=pickle.HIGHEST_PROTOCOL)
+                except Exception:
+                    continue  # Unpicklable values are kept in memory only
+                yield MemoryWriteAheadLog.encode(
+                    MemoryWriteAheadLog.PUT_MEMORY, encode_memory_entry(memory_key, entry, value_bytes)
+                )
+            
+            for session_key, session in sessions:
+                yield MemoryWriteAheadLog.encode(
+                    MemoryWriteAheadLog.PUT_SESSION,
+                    pickle.dumps((session_key, asdict(session)), protocol=pickle.HIGHEST_PROTOCOL)
+                )
+        
+        self.wal.write_snapshot(generation, records())
+    
     def get_memory_stats(self) -> Dict[str, Any]:
         """Get memory service statistics."""
         with self._lock:
             total_entries = len(self.memory_store)
             total_sessions = len(self.sessions)
             
-            # Calculate memory usage (approximate)
-            memory_usage_bytes = 0
-            for entry in self.memory_store.values():
-                try:
-                    memory_usage_bytes += len(pickle.dumps(entry.value))
-                except:
-                    memory_usage_bytes += 1024  # Estimate
+            store_stats = self.memory_store.get_stats()
+            memory_usage_bytes = store_stats["bytes"]
             
             return {
                 "total_memory_entries": total_entries,
@@ -445,7 +1163,13 @@ class LocalMemoryService(AgentCoreService):
                 "memory_usage_bytes": memory_usage_bytes,
                 "memory_usage_mb": memory_usage_bytes / (1024 * 1024),
                 "max_memory_mb": self.max_memory_mb,
-                "memory_utilization_percent": (memory_usage_bytes / (1024 * 1024)) / self.max_memory_mb * 100
+                "memory_utilization_percent": (memory_usage_bytes / (1024 * 1024)) / self.max_memory_mb * 100,
+                "eviction_policy": store_stats["eviction_policy"],
+                "evictions": store_stats["evictions"],
+                "expired_evictions": store_stats["expired_evictions"],
+                "evicted_bytes": store_stats["evicted_bytes"],
+                "rejections": store_stats["rejections"],
+                "wal": self.wal.get_stats()
             }
     
     async def shutdown(self):
@@ -453,29 +1177,29 @@ class LocalMemoryService(AgentCoreService):
         logger.info("Shutting down local memory service")
         
         # Cancel background tasks
-        if self._cleanup_task:
-            self._cleanup_task.cancel()
-        if self._persistence_task:
-            self._persistence_task.cancel()
+        tasks = [t for t in [self._persistence_task, self._wal_flush_task] if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
         
-        # Wait for tasks to complete
-        if self._cleanup_task or self._persistence_task:
-            tasks = [t for t in [self._cleanup_task, self._persistence_task] if t]
-            await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Final persistence
+        # Final snapshot, so the next start replays no WAL
         await self.persist_data()
         
+        self.wal.close()
+        self._wal_executor.shutdown(wait=True)
+        self._memory_expiry.close()
+        self._session_expiry.close()
+        
         logger.info("Local memory service shutdown complete")
 
-cla
-ss LocalCacheService:
+class LocalCacheService:
     """Local cache service using in-memory storage."""
     
     def __init__(self):
         """Initialize local cache service."""
         self._cache: Dict[str, Dict[str, Any]] = {}
         self._lock = threading.RLock()
+        self._expiry = get_expiry_scheduler().register("cache", self._expire_keys)
     
     def _get_cache_key(self, key: str, tenant_id: str) -> str:
         """Generate tenant-isolated cache key."""
@@ -515,6 +1239,9 @@ ss LocalCacheService:
                 
                 if ttl:
                     entry['expires_at'] = time.time() + ttl
+                    self._expiry.schedule(cache_key, entry['expires_at'])
+                else:
+                    self._expiry.cancel(cache_key)
                 
                 self._cache[cache_key] = entry
                 return True
@@ -530,6 +1257,7 @@ ss LocalCacheService:
                 cache_key = self._get_cache_key(key, tenant_id)
                 if cache_key in self._cache:
                     del self._cache[cache_key]
+                    self._expiry.cancel(cache_key)
                 return True
                 
         except Exception as e:
@@ -555,4 +1283,86 @@ ss LocalCacheService:
                 
         except Exception as e:
             logger.error(f"Error checking cache key existence: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    async def get_multiple(self, keys: List[str], tenant_id: str) -> Dict[str, Any]:
+        """Get multiple values from cache under one lock; missing keys map to None."""
+        try:
+            with self._lock:
+                now = time.time()
+                result = {}
+                
+                for key in keys:
+                    cache_key = self._get_cache_key(key, tenant_id)
+                    entry = self._cache.get(cache_key)
+                    
+                    if entry and entry.get('expires_at') and now > entry['expires_at']:
+                        del self._cache[cache_key]
+                        entry = None
+                    
+                    result[key] = entry['value'] if entry else None
+                
+                return result
+        
+        except Exception as e:
+            logger.error(f"Error getting multiple cache values: {e}")
+            return {}
+    
+    async def set_multiple(self, key_value_pairs: Dict[str, Any], tenant_id: str, ttl: int = None) -> bool:
+        """Set multiple values in cache under one lock, with an optional shared TTL."""
+        try:
+            with self._lock:
+                now = time.time()
+                
+                for key, value in key_value_pairs.items():
+                    cache_key = self._get_cache_key(key, tenant_id)
+                    entry = {
+                        'value': value,
+                        'created_at': now
+                    }
+                    
+                    if ttl:
+                        entry['expires_at'] = now + ttl
+                        self._expiry.schedule(cache_key, entry['expires_at'])
+                    else:
+                        self._expiry.cancel(cache_key)
+                    
+                    self._cache[cache_key] = entry
+                
+                return True
+        
+        except Exception as e:
+            logger.error(f"Error setting multiple cache values: {e}")
+            return False
+    
+    async def delete_multiple(self, keys: List[str], tenant_id: str) -> int:
+        """Delete multiple values from cache. Returns the number of keys removed."""
+        try:
+            with self._lock:
+                deleted = 0
+                
+                for key in keys:
+                    cache_key = self._get_cache_key(key, tenant_id)
+                    if self._cache.pop(cache_key, None) is not None:
+                        self._expiry.cancel(cache_key)
+                        deleted += 1
+                
+                return deleted
+        
+        except Exception as e:
+            logger.error(f"Error deleting multiple cache values: {e}")
+            return 0
+    
+    def _expire_keys(self, cache_keys: List[str]):
+        """Expiry callback: drop entries whose TTL has passed."""
+        with self._lock:
+            now = time.time()
+            for cache_key in cache_keys:
+                entry = self._cache.get(cache_key)
+                if entry is None or not entry.get('expires_at'):
+                    continue
+                
+                if now > entry['expires_at']:
+                    del self._cache[cache_key]
+                else:
+                    self._expiry.schedule(cache_key, entry['expires_at'])
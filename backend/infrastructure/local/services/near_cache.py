@@ -0,0 +1,177 @@
+"""
+In-process near cache (L1) placed in front of the shared Redis cache (L2).
+Hot keys are served from process memory for a short TTL; writes publish
+invalidation messages so other processes drop their copies.
+"""
+
+import json
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+class NearCache:
+    """
+    Bounded LRU of (tenant_id, key) -> value with a short per-entry TTL.
+    
+    Entries are namespaced per tenant so a tenant can be invalidated
+    without touching others. The TTL bounds how stale a value can get when
+    an invalidation message is lost or a writer bypasses the near cache.
+    
+    A value read from L2 is only stored if no invalidation arrived while
+    the read was in flight (see fill_token()), so a slow read can't put
+    back a value another process has just replaced.
+    
+    Values are kept pickled and decoded on every hit, so like a read from
+    L2 each caller gets its own copy, and changing a value after writing it
+    doesn't change what later reads return. Values that can't be pickled
+    are not cached.
+    
+    Thread-safe, so invalidations can be applied from a listener thread.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 5.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        
+        # Identifies this process's own invalidation messages
+        self.origin = uuid.uuid4().hex
+        
+        # (tenant_id, key) -> (pickled value, expires_at), least recently used first
+        self._entries: 'OrderedDict[Tuple[str, Hashable], Tuple[bytes, float]]' = OrderedDict()
+        self._tenant_keys: Dict[str, Set[Hashable]] = {}
+        self._invalidations = 0
+        self._lock = threading.Lock()
+        
+        # Counters
+        self.l1_hits = 0
+        self.l1_misses = 0
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.evictions = 0
+        self.invalidated = 0
+    
+    def get(self, key: Hashable, tenant_id: str) -> Tuple[bool, Any]:
+        """Look a key up in L1. Returns (found, value)."""
+        with self._lock:
+            item = self._entries.get((tenant_id, key))
+            if item is not None:
+                data, expires_at = item
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end((tenant_id, key))
+                    self.l1_hits += 1
+                    return True, pickle.loads(data)
+                self._remove(tenant_id, key)
+            
+            self.l1_misses += 1
+            return False, None
+    
+    def fill_token(self) -> int:
+        """Take a token before reading L2; pass it to fill()."""
+        return self._invalidations
+    
+    def fill(self, key: Hashable, value: Any, tenant_id: str, token: int):
+        """Store a value read from L2, unless an invalidation arrived since `token`."""
+        data = self._encode(value) if value is not None else None
+        with self._lock:
+            if value is None:
+                self.l2_misses += 1
+                return
+            self.l2_hits += 1
+            if data is not None and token == self._invalidations:
+                self._store(tenant_id, key, data)
+    
+    def put(self, key: Hashable, value: Any, tenant_id: str, ttl: Optional[float] = None):
+        """Store a value this process has just written to L2 with TTL `ttl`, if any."""
+        data = self._encode(value)
+        if data is None:
+            return
+        with self._lock:
+            self._store(tenant_id, key, data, ttl)
+    
+    def invalidate(self, keys: Iterable[Hashable], tenant_id: str):
+        """Drop keys of a tenant."""
+        with self._lock:
+            self._invalidations += 1
+            for key in keys:
+                self._remove(tenant_id, key)
+    
+    def invalidate_tenant(self, tenant_id: str):
+        """Drop every key of a tenant."""
+        with self._lock:
+            self._invalidations += 1
+            for key in list(self._tenant_keys.get(tenant_id, ())):
+                self._remove(tenant_id, key)
+    
+    def invalidation_message(self, tenant_id: str, keys: Optional[List[Hashable]] = None) -> bytes:
+        """Encode an invalidation for other processes; keys=None means the whole tenant."""
+        return json.dumps({"origin": self.origin, "tenant_id": tenant_id, "keys": keys}).encode('utf-8')
+    
+    def apply_invalidation(self, payload: bytes):
+        """Apply an invalidation message published by another process."""
+        message = json.loads(payload)
+        if message.get("origin") == self.origin:
+            return
+        
+        if message.get("keys") is None:
+            self.invalidate_tenant(message["tenant_id"])
+        else:
+            self.invalidate(message["keys"], message["tenant_id"])
+    
+    @staticmethod
+    def _encode(value: Any) -> Optional[bytes]:
+        """Pickle a value for storage, or None if it can't be pickled."""
+        try:
+            return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return None
+    
+    def _store(self, tenant_id: str, key: Hashable, data: bytes, ttl: Optional[float] = None):
+        """Insert or refresh an entry, evicting the least recently used (caller holds the lock)."""
+        entry_key = (tenant_id, key)
+        ttl_seconds = min(self.ttl_seconds, ttl) if ttl else self.ttl_seconds
+        self._entries[entry_key] = (data, time.monotonic() + ttl_seconds)
+        self._entries.move_to_end(entry_key)
+        self._tenant_keys.setdefault(tenant_id, set()).add(key)
+        
+        while len(self._entries) > self.max_entries:
+            (evicted_tenant, evicted_key), _ = self._entries.popitem(last=False)
+            self._untrack(evicted_tenant, evicted_key)
+            self.evictions += 1
+    
+    def _remove(self, tenant_id: str, key: Hashable):
+        if self._entries.pop((tenant_id, key), None) is not None:
+            self._untrack(tenant_id, key)
+            self.invalidated += 1
+    
+    def _untrack(self, tenant_id: str, key: Hashable):
+        keys = self._tenant_keys.get(tenant_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tenant_keys[tenant_id]
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get L1 and L2 hit ratios; L2 counts only reads that missed L1."""
+        with self._lock:
+            l1_lookups = self.l1_hits + self.l1_misses
+            l2_lookups = self.l2_hits + self.l2_misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "l1_hits": self.l1_hits,
+                "l1_misses": self.l1_misses,
+                "l1_hit_ratio": self.l1_hits / l1_lookups if l1_lookups else 0.0,
+                "l2_hits": self.l2_hits,
+                "l2_misses": self.l2_misses,
+                "l2_hit_ratio": self.l2_hits / l2_lookups if l2_lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidated": self.invalidated
+            }
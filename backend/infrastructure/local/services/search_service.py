@@ -4,17 +4,26 @@ Provides BM25 text search and FAISS vector search with tenant isolation.
 """
 
 import asyncio
+import bisect
+import hashlib
 import json
 import math
+import mmap
+import os
 import logging
 import numpy as np
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from datetime import datetime
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from pathlib import Path
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, OrderedDict
+from collections.abc import MutableMapping
+from urllib.parse import quote, unquote
 import threading
 import re
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import faiss
@@ -31,6 +40,15 @@ from ....core.settings import get_settings
 logger = logging.getLogger(__name__)
 
 
+_TOKEN_PATTERN = re.compile(r'\b\w+\b')
+
+
+def tokenize_text(text: str) -> List[str]:
+    """Tokenize text into BM25 terms."""
+    # Simple tokenization - convert to lowercase and split on non-alphanumeric
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
 @dataclass
 class SearchDocument:
     """Document stored in the search index."""
@@ -48,10 +66,622 @@ class SearchDocument:
             self.created_at = datetime.now()
         if self.updated_at is None:
             self.updated_at = datetime.now()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization."""
+        return {
+            "doc_id": self.doc_id,
+            "tenant_id": self.tenant_id,
+            "index_name": self.index_name,
+            "content": self.content,
+            "text_fields": self.text_fields,
+            "vector_field": self.vector_field,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat()
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SearchDocument':
+        """Create from dictionary."""
+        data = data.copy()
+        data['created_at'] = datetime.fromisoformat(data['created_at'])
+        data['updated_at'] = datetime.fromisoformat(data['updated_at'])
+        return cls(**data)
+
+
+def _write_json_atomic(path: Path, data: Any):
+    """Write JSON through a temp file so readers never see a partial file."""
+    temp_path = path.with_name(path.name + ".tmp")
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class _LockSide:
+    """Context manager for one side of a ReadWriteLock."""
+    
+    def __init__(self, acquire, release):
+        self._acquire = acquire
+        self._release = release
+    
+    def __enter__(self):
+        self._acquire()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._release()
+
+
+class ReadWriteLock:
+    """
+    Writer-preferring reader-writer lock.
+    
+    Use `with lock.reader:` for shared access and `with lock.writer:` for
+    exclusive access. The writer side is reentrant; read locks must not be
+    nested, since a waiting writer blocks new readers.
+    """
+    
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: Optional[int] = None  # Owning thread ident
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        
+        self.reader = _LockSide(self.acquire_read, self.release_read)
+        self.writer = _LockSide(self.acquire_write, self.release_write)
+    
+    def acquire_read(self):
+        with self._condition:
+            if self._writer == threading.get_ident():
+                # The writer may read what it is writing
+                self._writer_depth += 1
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+    
+    def release_read(self):
+        with self._condition:
+            if self._writer == threading.get_ident():
+                self._writer_depth -= 1
+                return
+            self._readers -= 1
+            if self._readers == 0:
+                self._condition.notify_all()
+    
+    def acquire_write(self):
+        with self._condition:
+            ident = threading.get_ident()
+            if self._writer == ident:
+                self._writer_depth += 1
+                return
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = ident
+            self._writer_depth = 1
+    
+    def release_write(self):
+        with self._condition:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer = None
+                self._condition.notify_all()
+
+
+class SearchDocumentStore(MutableMapping):
+    """
+    Documents of one search index backed by an append-only JSON-lines log.
+    
+    Flushed documents stay on disk and are decoded from a memory-mapped log
+    through an offset index; documents changed since the last flush are
+    held in memory until flush() appends them. The log is rewritten once
+    superseded records outweigh live ones.
+    """
+    
+    def __init__(self):
+        # Documents added or replaced since the last flush
+        self._documents: Dict[str, SearchDocument] = {}
+        
+        # Flushed documents: doc_id -> (offset, length) of the record in the log
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        
+        # Logged doc ids whose record has been deleted or superseded
+        self._pending_deletes: Set[str] = set()
+        
+        self._log_path: Optional[Path] = None
+        self._log_map: Optional[mmap.mmap] = None
+        self._log_size = 0
+        self._dead_bytes = 0  # Bytes of superseded records in the log
+        self._generation = 0
+    
+    def __getitem__(self, doc_id: str) -> SearchDocument:
+        search_doc = self._documents.get(doc_id)
+        if search_doc is not None:
+            return search_doc
+        
+        offset, length = self._offsets[doc_id]
+        record = json.loads(self._log_map[offset:offset + length])
+        return SearchDocument.from_dict(record['document'])
+    
+    def __setitem__(self, doc_id: str, search_doc: SearchDocument):
+        self._drop_logged(doc_id)
+        self._documents[doc_id] = search_doc
+    
+    def __delitem__(self, doc_id: str):
+        if doc_id in self._documents:
+            del self._documents[doc_id]
+        elif doc_id not in self._offsets:
+            raise KeyError(doc_id)
+        self._drop_logged(doc_id)
+    
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._documents or doc_id in self._offsets
+    
+    def __iter__(self) -> Iterator[str]:
+        yield from list(self._offsets)
+        yield from list(self._documents)
+    
+    def __len__(self) -> int:
+        return len(self._documents) + len(self._offsets)
+    
+    @property
+    def dirty(self) -> bool:
+        """Whether there are changes not yet written to the log."""
+        return bool(self._documents or self._pending_deletes)
+    
+    def _drop_logged(self, doc_id: str):
+        """Mark the logged record of a doc as superseded."""
+        location = self._offsets.pop(doc_id, None)
+        if location is not None:
+            self._dead_bytes += location[1] + 1
+            self._pending_deletes.add(doc_id)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Capture the pending changes for flush(); call with the store's lock held."""
+        live_bytes = self._log_size - self._dead_bytes
+        rewrite = self._log_path is None or self._dead_bytes > live_bytes
+        return {
+            "pending": list(self._documents.items()),
+            "deletes": list(self._pending_deletes),
+            "rewrite": rewrite,
+            "logged": dict(self._offsets) if rewrite else {},
+            "old_map": self._log_map,
+            "generation": self._generation + 1 if rewrite else self._generation
+        }
+    
+    def flush(self, directory: Path, index_file: str, lock,
+              snapshot: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Append pending changes to the log and write the offset index.
+        
+        `lock` guards this store; it is held only to snapshot pending changes
+        and to publish the new offsets, not while encoding or writing. Pass
+        a snapshot() taken earlier to write the store as of that point.
+        Returns the offset index that was written.
+        """
+        if snapshot is None:
+            with lock:
+                snapshot = self.snapshot()
+        pending = snapshot['pending']
+        deletes = snapshot['deletes']
+        rewrite = snapshot['rewrite']
+        logged = snapshot['logged']
+        old_map = snapshot['old_map']
+        generation = snapshot['generation']
+        
+        log_path = directory / f"documents.{generation}.log"
+        written: Dict[str, Tuple[int, int]] = {}
+        with open(log_path, 'wb' if rewrite else 'ab') as f:
+            offset = log_start = f.tell()
+            
+            def append(doc_id: Optional[str], record: bytes):
+                nonlocal offset
+                f.write(record)
+                f.write(b"\n")
+                if doc_id is not None:
+                    written[doc_id] = (offset, len(record))
+                offset += len(record) + 1
+            
+            if rewrite:
+                # Copy live records verbatim; deletes are implied by their absence
+                for doc_id, (start, length) in logged.items():
+                    append(doc_id, old_map[start:start + length])
+            else:
+                for doc_id in deletes:
+                    append(None, json.dumps({"doc_id": doc_id, "deleted": True}).encode())
+            tombstone_bytes = offset - log_start if not rewrite else 0
+            
+            for doc_id, search_doc in pending:
+                append(doc_id, json.dumps({"doc_id": doc_id, "document": search_doc.to_dict()}).encode())
+            
+            f.flush()
+            os.fsync(f.fileno())
+            log_size = offset
+        
+        with lock:
+            if rewrite:
+                self._dead_bytes = 0
+                self._pending_deletes.clear()
+                for doc_id, location in logged.items():
+                    if self._offsets.get(doc_id) == location:
+                        self._offsets[doc_id] = written[doc_id]
+                    else:
+                        # Deleted or replaced while writing
+                        self._dead_bytes += written[doc_id][1] + 1
+                        self._pending_deletes.add(doc_id)
+            else:
+                # Delete records only matter until the next rewrite
+                self._dead_bytes += tombstone_bytes
+                self._pending_deletes.difference_update(deletes)
+            
+            for doc_id, search_doc in pending:
+                if self._documents.get(doc_id) is search_doc:
+                    del self._documents[doc_id]
+                    self._offsets[doc_id] = written[doc_id]
+                else:
+                    # Deleted or replaced while writing: the record is stale
+                    self._dead_bytes += written[doc_id][1] + 1
+                    self._pending_deletes.add(doc_id)
+            
+            self._generation = generation
+            self._log_size = log_size
+            self._remap(log_path)
+            
+            offset_index = {
+                "log_file": log_path.name,
+                "log_size": log_size,
+                "dead_bytes": self._dead_bytes,
+                "offsets": dict(self._offsets)
+            }
+        
+        _write_json_atomic(directory / index_file, offset_index)
+        return offset_index
+    
+    def _remap(self, log_path: Path):
+        """Memory-map the current log file."""
+        if self._log_map is not None:
+            self._log_map.close()
+            self._log_map = None
+        
+        self._log_path = log_path
+        if self._log_size > 0:
+            with open(log_path, 'rb') as f:
+                self._log_map = mmap.mmap(f.fileno(), self._log_size, access=mmap.ACCESS_READ)
+    
+    @classmethod
+    def load(cls, directory: Path, index_file: str) -> 'SearchDocumentStore':
+        """Open a store from its offset index without decoding any document."""
+        with open(directory / index_file, 'r') as f:
+            offset_index = json.load(f)
+        
+        store = cls()
+        log_path = directory / offset_index['log_file']
+        store._generation = int(log_path.name.split('.')[1])
+        store._offsets = {doc_id: tuple(location) for doc_id, location in offset_index['offsets'].items()}
+        store._log_size = offset_index['log_size']
+        store._dead_bytes = offset_index['dead_bytes']
+        store._remap(log_path)
+        return store
+    
+    def close(self):
+        """Release the log mapping."""
+        if self._log_map is not None:
+            self._log_map.close()
+            self._log_map = None
+
+
+_UNINDEXED = object()  # FieldIndex marker for values kept out of the postings
+
+_RANGE_OPERATORS = ('gte', 'gt', 'lte', 'lt')
+
+
+class RangeIndex:
+    """
+    Sorted values of one field for gte/gt/lte/lt filters.
+    
+    Numbers and strings do not compare with each other, so each gets its own
+    sorted array, rebuilt lazily after updates. NaN passes every comparison
+    in _apply_filters and is tracked separately to keep that behavior.
+    """
+    
+    def __init__(self):
+        self.doc_values: Dict[str, Any] = {}  # doc_id -> sortable value
+        self.nan_docs: Set[str] = set()
+        
+        # Value kind -> (sorted values, doc ids); None after updates
+        self._sorted: Optional[Dict[str, Tuple[List[Any], List[str]]]] = None
+    
+    @staticmethod
+    def _kind(value: Any) -> Optional[str]:
+        """Get the comparison group of a value, or None if it is not sortable."""
+        if isinstance(value, str):
+            return "string"
+        if isinstance(value, (int, float)) and value == value:
+            return "number"
+        return None
+    
+    def add(self, doc_id: str, value: Any):
+        """Index a document's value, replacing any previous one."""
+        self.remove(doc_id)
+        if isinstance(value, float) and math.isnan(value):
+            self.nan_docs.add(doc_id)
+        elif self._kind(value) is not None:
+            self.doc_values[doc_id] = value
+            self._sorted = None
+    
+    def remove(self, doc_id: str):
+        """Remove a document's value."""
+        self.nan_docs.discard(doc_id)
+        if self.doc_values.pop(doc_id, _UNINDEXED) is not _UNINDEXED:
+            self._sorted = None
+    
+    def _arrays(self, kind: str) -> Tuple[List[Any], List[str]]:
+        """Get the sorted (values, doc ids) of one kind, rebuilding if stale."""
+        sorted_arrays = self._sorted
+        if sorted_arrays is None:
+            entries: Dict[str, List[Tuple[Any, str]]] = defaultdict(list)
+            for doc_id, value in self.doc_values.items():
+                entries[self._kind(value)].append((value, doc_id))
+            
+            sorted_arrays = {}
+            for value_kind, pairs in entries.items():
+                pairs.sort(key=lambda pair: pair[0])
+                sorted_arrays[value_kind] = ([value for value, _ in pairs], [doc_id for _, doc_id in pairs])
+            # Publish only once complete; concurrent readers may rebuild too
+            self._sorted = sorted_arrays
+        
+        return sorted_arrays.get(kind, ([], []))
+    
+    def match(self, bounds: Dict[str, Any]) -> Optional[Set[str]]:
+        """Get the docs within the bounds, or None if they can't be answered here."""
+        kinds = {self._kind(bound) for bound in bounds.values()}
+        if not bounds or not set(bounds) <= set(_RANGE_OPERATORS) or len(kinds) != 1 or None in kinds:
+            return None
+        
+        kind = kinds.pop()
+        values, doc_ids = self._arrays(kind)
+        start, end = 0, len(values)
+        if 'gte' in bounds:
+            start = max(start, bisect.bisect_left(values, bounds['gte']))
+        if 'gt' in bounds:
+            start = max(start, bisect.bisect_right(values, bounds['gt']))
+        if 'lte' in bounds:
+            end = min(end, bisect.bisect_right(values, bounds['lte']))
+        if 'lt' in bounds:
+            end = min(end, bisect.bisect_left(values, bounds['lt']))
+        
+        matched = set(doc_ids[start:end])
+        return matched | self.nan_docs if kind == "number" else matched
+
+
+class FieldIndex:
+    """
+    Secondary indexes over document fields, used to resolve filters
+    without reading documents.
+    
+    Short scalar values of every field go into hash postings for equality
+    and IN filters. Declared hash fields index string values of any length,
+    and declared range fields also keep a RangeIndex. Documents whose value
+    is not in the postings (long strings, lists, dicts) are tracked per field
+    and verified with the regular filter logic, so equality and IN results
+    always agree with _apply_filters.
+    """
+    
+    def __init__(self, max_value_length: int = 64):
+        self.max_value_length = max_value_length
+        
+        # field -> value -> doc ids
+        self.postings: Dict[str, Dict[Any, Set[str]]] = defaultdict(dict)
+        
+        # field -> doc ids whose value is not in the postings
+        self.unindexed: Dict[str, Set[str]] = defaultdict(set)
+        
+        # Forward index for removals: doc_id -> {field: value}
+        self.doc_values: Dict[str, Dict[str, Any]] = {}
+        
+        # Declared indexes
+        self.hash_fields: Set[str] = set()
+        self.range_indices: Dict[str, RangeIndex] = {}
+    
+    def _indexable(self, field: str, value: Any) -> bool:
+        """Check whether a document value belongs in the postings."""
+        if isinstance(value, str):
+            return len(value) <= self.max_value_length or field in self.hash_fields
+        return value is None or isinstance(value, (int, float, bool))
+    
+    def add_document(self, doc_id: str, content: Dict[str, Any]):
+        """Index a document's field values, replacing any previous version."""
+        self.remove_document(doc_id)
+        
+        values = {}
+        for field, value in content.items():
+            values[field] = self._add_value(doc_id, field, value)
+        self.doc_values[doc_id] = values
+        
+        for field, range_index in self.range_indices.items():
+            range_index.add(doc_id, content.get(field))
+    
+    def _add_value(self, doc_id: str, field: str, value: Any) -> Any:
+        """Add one value to the postings; returns what the forward index records."""
+        if self._indexable(field, value):
+            self.postings[field].setdefault(value, set()).add(doc_id)
+            return value
+        
+        self.unindexed[field].add(doc_id)
+        return _UNINDEXED
+    
+    def remove_document(self, doc_id: str):
+        """Remove a document's field values."""
+        values = self.doc_values.pop(doc_id, None)
+        if values is None:
+            return
+        
+        for field, value in values.items():
+            self._remove_value(doc_id, field, value)
+        
+        for range_index in self.range_indices.values():
+            range_index.remove(doc_id)
+    
+    def _remove_value(self, doc_id: str, field: str, value: Any):
+        """Remove one value recorded in the forward index."""
+        if value is _UNINDEXED:
+            docs = self.unindexed[field]
+            docs.discard(doc_id)
+            if not docs:
+                del self.unindexed[field]
+            return
+        
+        field_postings = self.postings[field]
+        docs = field_postings[value]
+        docs.discard(doc_id)
+        if not docs:
+            del field_postings[value]
+            if not field_postings:
+                del self.postings[field]
+    
+    def declare(self, field: str, kind: str, lookup: Callable[[str], Dict[str, Any]]):
+        """
+        Declare a "hash" or "range" index on a field and index existing docs.
+        
+        `lookup(doc_id)` returns a document's content; it is only called for
+        docs whose value is not already in the postings.
+        """
+        if kind == "hash":
+            if field in self.hash_fields:
+                return
+            self.hash_fields.add(field)
+            for doc_id in list(self.unindexed.get(field, ())):
+                self._remove_value(doc_id, field, _UNINDEXED)
+                self.doc_values[doc_id][field] = self._add_value(doc_id, field, lookup(doc_id).get(field))
+        elif kind == "range":
+            if field in self.range_indices:
+                return
+            range_index = RangeIndex()
+            for doc_id, values in self.doc_values.items():
+                value = values.get(field)
+                if value is _UNINDEXED:
+                    value = lookup(doc_id).get(field)
+                range_index.add(doc_id, value)
+            self.range_indices[field] = range_index
+        else:
+            raise ValueError(f"Unknown field index kind: {kind}")
+    
+    def resolve(self, filters: Optional[Dict[str, Any]],
+                verify: Callable[[str, Dict[str, Any]], bool]) -> Tuple[Optional[Set[str]], Dict[str, Any]]:
+        """
+        Split filters into the doc ids matching the indexable ones and the rest.
+        
+        Equality and IN filters on scalar values are answered from the
+        postings; `verify(doc_id, {field: expected})` checks documents with
+        unindexed values. Range filters on declared range fields are answered
+        from the sorted values. Other filters are returned as residual
+        filters. The id set is None when nothing could be resolved.
+        """
+        residual: Dict[str, Any] = {}
+        groups: List[List[Set[str]]] = []  # Per resolved filter: a union of doc id sets
+        
+        for field, expected in (filters or {}).items():
+            if isinstance(expected, dict):
+                range_index = self.range_indices.get(field)
+                docs = range_index.match(expected) if range_index is not None else None
+                if docs is None:
+                    residual[field] = expected
+                else:
+                    groups.append([docs])
+                continue
+            
+            values = expected if isinstance(expected, list) else [expected]
+            if not all(isinstance(value, (str, int, float, bool)) for value in values):
+                residual[field] = expected
+                continue
+            
+            field_postings = self.postings.get(field, {})
+            sets = [field_postings[value] for value in values if value in field_postings]
+            unindexed = self.unindexed.get(field)
+            if unindexed:
+                sets.append({doc_id for doc_id in unindexed if verify(doc_id, {field: expected})})
+            groups.append(sets)
+        
+        if not groups:
+            return None, residual
+        
+        # Intersect by probing the other filters with the smallest one's docs
+        groups.sort(key=lambda sets: sum(len(docs) for docs in sets))
+        matched = {
+            doc_id for doc_id in set().union(*groups[0])
+            if all(any(doc_id in docs for docs in sets) for sets in groups[1:])
+        }
+        
+        return matched, residual
+    
+    def export(self) -> Dict[str, Any]:
+        """Snapshot the index as JSON-serializable data."""
+        return {
+            "max_value_length": self.max_value_length,
+            "hash_fields": sorted(self.hash_fields),
+            "postings": [
+                [field, [[value, list(docs)] for value, docs in field_postings.items()]]
+                for field, field_postings in self.postings.items()
+            ],
+            "unindexed": {field: list(docs) for field, docs in self.unindexed.items()},
+            "range_fields": {
+                field: [[doc_id, value] for doc_id, value in range_index.doc_values.items()] +
+                       [[doc_id, math.nan] for doc_id in range_index.nan_docs]
+                for field, range_index in self.range_indices.items()
+            }
+        }
+    
+    @classmethod
+    def from_export(cls, data: Dict[str, Any]) -> 'FieldIndex':
+        """Rebuild an index from export() data."""
+        index = cls(data['max_value_length'])
+        index.hash_fields = set(data.get('hash_fields', ()))
+        
+        for field, entries in data['postings']:
+            field_postings = index.postings[field]
+            for value, doc_ids in entries:
+                field_postings[value] = set(doc_ids)
+                for doc_id in doc_ids:
+                    index.doc_values.setdefault(doc_id, {})[field] = value
+        
+        for field, doc_ids in data['unindexed'].items():
+            index.unindexed[field] = set(doc_ids)
+            for doc_id in doc_ids:
+                index.doc_values.setdefault(doc_id, {})[field] = _UNINDEXED
+        
+        for field, entries in data.get('range_fields', {}).items():
+            range_index = RangeIndex()
+            for doc_id, value in entries:
+                range_index.add(doc_id, value)
+            index.range_indices[field] = range_index
+        
+        return index
 
 
 class BM25Scorer:
-    """BM25 scoring algorithm implementation."""
+    """
+    BM25 scoring algorithm implementation.
+    
+    Postings are kept in dicts for O(1) updates and lazily frozen into sorted
+    NumPy arrays (doc ordinals + term frequencies) for query evaluation.
+    
+    A scorer opened with load() serves postings straight from memory-mapped
+    .npy files; a term's dict is only materialized when a document touching
+    it is added or removed.
+    """
+    
+    # Arrays written by save(), one .npy file each
+    ARRAY_FILES = (
+        "term_offsets", "postings_ordinals", "postings_tfs", "term_max_tf", "term_min_length",
+        "doc_lengths", "forward_offsets", "forward_terms", "forward_tfs"
+    )
     
     def __init__(self, k1: float = 1.2, b: float = 0.75):
         self.k1 = k1
@@ -61,50 +691,351 @@ class BM25Scorer:
         self.doc_frequencies: Dict[str, int] = defaultdict(int)  # Term -> doc count
         self.doc_lengths: Dict[str, int] = {}  # Doc ID -> length
         self.total_docs = 0
+        self.total_doc_length = 0  # Running sum of doc_lengths
         self.avg_doc_length = 0.0
         
         # Inverted index: term -> {doc_id: term_frequency}
-        self.inverted_index: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
-    
-    def add_document(self, doc_id: str, text: str):
-        """Add a document to the BM25 index."""
-        terms = self._tokenize(text)
-        term_counts = Counter(terms)
+        self.inverted_index: Dict[str, Dict[str, int]] = defaultdict(dict)
         
-        # Update document length
-        self.doc_lengths[doc_id] = len(terms)
+        # Forward index: doc_id -> {term: term_frequency}
+        self.doc_terms: Dict[str, Dict[str, int]] = {}
         
-        # Update inverted index and document frequencies
-        for term, count in term_counts.items():
-            if doc_id not in self.inverted_index[term]:
-                self.doc_frequencies[term] += 1
-            self.inverted_index[term][doc_id] = count
+        # Dense doc ordinals used by the array-backed postings
+        self._doc_ordinals: Dict[str, int] = {}
+        self._ordinal_doc_ids: List[Optional[str]] = []
+        self._free_ordinals: List[int] = []
+        self._ordinal_lengths = np.zeros(1024, dtype=np.int32)
         
-        self.total_docs += 1
+        # Frozen postings: term -> (sorted doc ordinals, term frequencies)
+        self._postings_arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        
+        # Per-term score bound inputs: BM25 term weight grows with tf and
+        # shrinks with doc length, so (max tf, min doc length) bounds it.
+        self._term_max_tf: Dict[str, int] = {}
+        self._term_min_length: Dict[str, int] = {}
+        
+        # Loaded (memory-mapped) segment: term list and forward index by
+        # ordinal, used for documents not yet in doc_terms
+        self._base_terms: List[str] = []
+        self._base_forward: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+    
+    def add_document(self, doc_id: str, text: str):
+        """Add a document to the BM25 index, replacing any previous version."""
+        self._add_terms(doc_id, self._tokenize(text))
         self._update_avg_doc_length()
     
+    def index_documents(self, docs: Iterable[Tuple[str, str]]) -> int:
+        """Add multiple (doc_id, text) pairs, updating corpus statistics once."""
+        return self.index_tokenized((doc_id, self._tokenize(text)) for doc_id, text in docs)
+    
+    def index_tokenized(self, docs: Iterable[Tuple[str, List[str]]]) -> int:
+        """Add multiple pre-tokenized (doc_id, terms) pairs."""
+        count = 0
+        for doc_id, terms in docs:
+            self._add_terms(doc_id, terms)
+            count += 1
+        
+        self._update_avg_doc_length()
+        return count
+    
     def remove_document(self, doc_id: str):
         """Remove a document from the BM25 index."""
         if doc_id not in self.doc_lengths:
             return
         
-        # Remove from inverted index and update document frequencies
-        for term in list(self.inverted_index.keys()):
-            if doc_id in self.inverted_index[term]:
-                del self.inverted_index[term][doc_id]
-                self.doc_frequencies[term] -= 1
-                
-                # Clean up empty term entries
-                if self.doc_frequencies[term] == 0:
-                    del self.doc_frequencies[term]
-                    del self.inverted_index[term]
+        self._remove_terms(doc_id)
+        self._release_ordinal(doc_id)
+        self._update_avg_doc_length()
+    
+    def _add_terms(self, doc_id: str, terms: List[str]):
+        """Index tokenized terms for a document in O(terms in the doc)."""
+        if doc_id in self.doc_lengths:
+            self._remove_terms(doc_id)
+        
+        term_counts = dict(Counter(terms))
+        doc_length = len(terms)
+        
+        # Update forward index and document length
+        self.doc_terms[doc_id] = term_counts
+        self.doc_lengths[doc_id] = doc_length
+        self.total_doc_length += doc_length
+        
+        ordinal = self._assign_ordinal(doc_id)
+        self._ordinal_lengths[ordinal] = doc_length
         
-        del self.doc_lengths[doc_id]
+        # Update inverted index and document frequencies
+        for term, count in term_counts.items():
+            self._mutable_postings(term)[doc_id] = count
+            self.doc_frequencies[term] += 1
+            
+            if count > self._term_max_tf.get(term, 0):
+                self._term_max_tf[term] = count
+            if doc_length < self._term_min_length.get(term, doc_length + 1):
+                self._term_min_length[term] = doc_length
+        
+        self.total_docs += 1
+    
+    def _remove_terms(self, doc_id: str):
+        """Remove a document's postings using the forward index."""
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            terms = self._base_doc_terms(doc_id)
+        
+        for term in terms:
+            if term not in self.doc_frequencies:
+                continue
+            postings = self._mutable_postings(term)
+            if doc_id not in postings:
+                continue
+            
+            del postings[doc_id]
+            self.doc_frequencies[term] -= 1
+            
+            # Clean up empty term entries
+            if self.doc_frequencies[term] == 0:
+                del self.doc_frequencies[term]
+                del self.inverted_index[term]
+                del self._term_max_tf[term]
+                del self._term_min_length[term]
+        
+        self.total_doc_length -= self.doc_lengths.pop(doc_id)
         self.total_docs -= 1
-        self._update_avg_doc_length()
     
-    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
-        """Search for documents using BM25 scoring."""
+    def _mutable_postings(self, term: str) -> Dict[str, int]:
+        """Get the postings dict of a term for update, invalidating its arrays."""
+        postings = self.inverted_index.get(term)
+        if postings is None:
+            arrays = self._postings_arrays.get(term)
+            postings = {}
+            if arrays is not None:
+                postings = dict(zip(
+                    (self._ordinal_doc_ids[ordinal] for ordinal in arrays[0].tolist()),
+                    arrays[1].tolist()
+                ))
+            self.inverted_index[term] = postings
+        
+        self._postings_arrays.pop(term, None)
+        return postings
+    
+    def _postings_items(self, term: str) -> Iterable[Tuple[str, int]]:
+        """Iterate (doc_id, tf) postings of a term without materializing them."""
+        postings = self.inverted_index.get(term)
+        if postings is not None:
+            return postings.items()
+        
+        ordinals, frequencies = self._postings_arrays[term]
+        return zip((self._ordinal_doc_ids[ordinal] for ordinal in ordinals.tolist()), frequencies.tolist())
+    
+    def _base_doc_terms(self, doc_id: str) -> Dict[str, int]:
+        """Read a loaded document's terms from the memory-mapped forward index."""
+        if self._base_forward is None:
+            return {}
+        
+        offsets, term_ids, frequencies = self._base_forward
+        ordinal = self._doc_ordinals[doc_id]
+        if ordinal + 1 >= len(offsets):
+            return {}
+        
+        start, end = int(offsets[ordinal]), int(offsets[ordinal + 1])
+        return dict(zip(
+            (self._base_terms[term_id] for term_id in term_ids[start:end].tolist()),
+            frequencies[start:end].tolist()
+        ))
+    
+    def _assign_ordinal(self, doc_id: str) -> int:
+        """Return the dense ordinal for a doc, allocating one if needed."""
+        ordinal = self._doc_ordinals.get(doc_id)
+        if ordinal is not None:
+            return ordinal
+        
+        if self._free_ordinals:
+            ordinal = self._free_ordinals.pop()
+            self._ordinal_doc_ids[ordinal] = doc_id
+        else:
+            ordinal = len(self._ordinal_doc_ids)
+            self._ordinal_doc_ids.append(doc_id)
+            if ordinal >= len(self._ordinal_lengths):
+                self._ordinal_lengths = np.resize(self._ordinal_lengths, 2 * len(self._ordinal_lengths))
+        
+        self._doc_ordinals[doc_id] = ordinal
+        return ordinal
+    
+    def _release_ordinal(self, doc_id: str):
+        """Return a removed doc's ordinal to the free list."""
+        ordinal = self._doc_ordinals.pop(doc_id)
+        self._ordinal_doc_ids[ordinal] = None
+        self._free_ordinals.append(ordinal)
+    
+    def _get_postings_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Get (sorted doc ordinals, term frequencies) arrays for a term."""
+        arrays = self._postings_arrays.get(term)
+        if arrays is not None:
+            return arrays
+        
+        postings = self.inverted_index[term]
+        ordinals = np.fromiter(
+            (self._doc_ordinals[doc_id] for doc_id in postings), dtype=np.int32, count=len(postings)
+        )
+        frequencies = np.fromiter(postings.values(), dtype=np.int32, count=len(postings))
+        order = np.argsort(ordinals, kind='stable')
+        arrays = (ordinals[order], frequencies[order])
+        
+        # Tighten the bound inputs now that we have the exact postings
+        self._term_max_tf[term] = int(arrays[1].max())
+        self._term_min_length[term] = int(self._ordinal_lengths[arrays[0]].min())
+        
+        self._postings_arrays[term] = arrays
+        return arrays
+    
+    def _idf(self, term: str) -> float:
+        """Calculate IDF for a term."""
+        df = self.doc_frequencies[term]
+        return math.log((self.total_docs - df + 0.5) / (df + 0.5))
+    
+    def _term_weights(self, frequencies: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """Vectorized BM25 term weight without the IDF factor."""
+        frequencies = frequencies.astype(np.float64)
+        return (frequencies * (self.k1 + 1)) / (
+            frequencies + self.k1 * (1 - self.b + self.b * (lengths / self.avg_doc_length))
+        )
+    
+    def _term_upper_bound(self, term: str) -> float:
+        """Upper bound of the IDF-free BM25 weight for any posting of a term."""
+        max_tf = self._term_max_tf[term]
+        min_length = self._term_min_length[term]
+        return (max_tf * (self.k1 + 1)) / (
+            max_tf + self.k1 * (1 - self.b + self.b * (min_length / self.avg_doc_length))
+        )
+    
+    def ordinal_mask(self, doc_ids: Iterable[str]) -> np.ndarray:
+        """Build a boolean mask over doc ordinals selecting the given docs."""
+        mask = np.zeros(len(self._ordinal_doc_ids), dtype=bool)
+        ordinals = [self._doc_ordinals[doc_id] for doc_id in doc_ids if doc_id in self._doc_ordinals]
+        mask[ordinals] = True
+        return mask
+    
+    def search(self, query: str, limit: int = 10, allowed: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """
+        Search for the top documents using BM25 with MaxScore pruning.
+        
+        Terms are evaluated in decreasing order of their score upper bound.
+        Once the bounds of the remaining terms cannot lift an unseen document
+        past the current k-th best score, evaluation stops admitting new
+        candidates and only looks up the remaining (typically frequent) terms
+        for the surviving candidates.
+        
+        `allowed` is an optional ordinal_mask(); other documents are never
+        admitted as candidates. Corpus statistics are not affected by it.
+        """
+        if self.total_docs == 0 or limit <= 0:
+            return []
+        
+        query_counts = Counter(term for term in self._tokenize(query) if term in self.doc_frequencies)
+        if not query_counts:
+            return []
+        
+        # (upper bound, lower bound, weighted idf, term) per distinct query term.
+        # Repeated query terms contribute once per occurrence, as in the
+        # exhaustive path.
+        plan = []
+        for term, occurrences in query_counts.items():
+            weighted_idf = occurrences * self._idf(term)
+            plan.append((
+                max(weighted_idf * self._term_upper_bound(term), 0.0),
+                min(weighted_idf * (self.k1 + 1), 0.0),
+                weighted_idf,
+                term
+            ))
+        plan.sort(key=lambda entry: entry[0], reverse=True)
+        
+        # Suffix sums: best/worst contribution still available from terms i..n
+        upper_remaining = np.cumsum([entry[0] for entry in plan][::-1])[::-1].tolist() + [0.0]
+        lower_remaining = np.cumsum([entry[1] for entry in plan][::-1])[::-1].tolist() + [0.0]
+        
+        if allowed is not None:
+            allowed_ordinals = np.flatnonzero(allowed).astype(np.int32)
+            if len(allowed_ordinals) < sum(self.doc_frequencies[term] for term in query_counts):
+                # Selective filter: look terms up for the allowed docs only
+                return self._score_candidates(plan, allowed_ordinals, limit)
+        
+        candidates = np.empty(0, dtype=np.int32)
+        scores = np.empty(0, dtype=np.float64)
+        threshold = -math.inf
+        admitting = True
+        
+        for i, (_, _, weighted_idf, term) in enumerate(plan):
+            ordinals, frequencies = self._get_postings_arrays(term)
+            
+            if admitting and upper_remaining[i] < threshold:
+                admitting = False
+            
+            if admitting:
+                if allowed is not None:
+                    keep = allowed[ordinals]
+                    ordinals, frequencies = ordinals[keep], frequencies[keep]
+                
+                # Union: every posting of this term becomes a candidate
+                contributions = weighted_idf * self._term_weights(frequencies, self._ordinal_lengths[ordinals])
+                merged = np.concatenate((candidates, ordinals))
+                candidates, inverse = np.unique(merged, return_inverse=True)
+                scores = np.bincount(
+                    inverse, weights=np.concatenate((scores, contributions)), minlength=len(candidates)
+                )
+            else:
+                # Lookup only: score surviving candidates that contain this term
+                positions = np.searchsorted(ordinals, candidates)
+                positions[positions >= len(ordinals)] = 0
+                hits = ordinals[positions] == candidates
+                if hits.any():
+                    hit_ordinals = candidates[hits]
+                    scores[hits] += weighted_idf * self._term_weights(
+                        frequencies[positions[hits]], self._ordinal_lengths[hit_ordinals]
+                    )
+            
+            # k-th best guaranteed final score among current candidates
+            if len(candidates) >= limit:
+                floor_scores = scores + lower_remaining[i + 1]
+                threshold = max(threshold, float(np.partition(floor_scores, -limit)[-limit]))
+            
+            if not admitting:
+                keep = scores + upper_remaining[i + 1] >= threshold
+                candidates = candidates[keep]
+                scores = scores[keep]
+        
+        return self._top_results(candidates, scores, limit)
+    
+    def _score_candidates(self, plan: List[Tuple[float, float, float, str]], candidates: np.ndarray,
+                          limit: int) -> List[Tuple[str, float]]:
+        """Score a fixed candidate set by looking up every query term."""
+        scores = np.zeros(len(candidates), dtype=np.float64)
+        matched = np.zeros(len(candidates), dtype=bool)
+        
+        for _, _, weighted_idf, term in plan:
+            ordinals, frequencies = self._get_postings_arrays(term)
+            positions = np.searchsorted(ordinals, candidates)
+            positions[positions >= len(ordinals)] = 0
+            hits = ordinals[positions] == candidates
+            if hits.any():
+                scores[hits] += weighted_idf * self._term_weights(
+                    frequencies[positions[hits]], self._ordinal_lengths[candidates[hits]]
+                )
+                matched |= hits
+        
+        return self._top_results(candidates[matched], scores[matched], limit)
+    
+    def _top_results(self, candidates: np.ndarray, scores: np.ndarray, limit: int) -> List[Tuple[str, float]]:
+        """Select the top results without sorting the whole candidate set."""
+        if len(candidates) > limit:
+            top = np.argpartition(scores, -limit)[-limit:]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        
+        return [(self._ordinal_doc_ids[candidates[i]], float(scores[i])) for i in top]
+    
+    def search_exhaustive(self, query: str, limit: int = 10,
+                          allowed: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Score every posting of every query term (reference implementation)."""
         if self.total_docs == 0:
             return []
         
@@ -116,15 +1047,16 @@ class BM25Scorer:
         doc_scores: Dict[str, float] = defaultdict(float)
         
         for term in query_terms:
-            if term not in self.inverted_index:
+            if term not in self.doc_frequencies:
                 continue
             
             # Calculate IDF
-            df = self.doc_frequencies[term]
-            idf = math.log((self.total_docs - df + 0.5) / (df + 0.5))
+            idf = self._idf(term)
             
             # Calculate BM25 score for each document containing this term
-            for doc_id, tf in self.inverted_index[term].items():
+            for doc_id, tf in self._postings_items(term):
+                if allowed is not None and not allowed[self._doc_ordinals[doc_id]]:
+                    continue
                 doc_length = self.doc_lengths[doc_id]
                 
                 # BM25 formula
@@ -139,84 +1071,476 @@ class BM25Scorer:
     
     def _tokenize(self, text: str) -> List[str]:
         """Tokenize text into terms."""
-        # Simple tokenization - convert to lowercase and split on non-alphanumeric
-        text = text.lower()
-        terms = re.findall(r'\b\w+\b', text)
-        return terms
+        return tokenize_text(text)
+    
+    def export_arrays(self) -> Dict[str, Any]:
+        """
+        Snapshot the index as flat arrays for save().
+        
+        Postings are laid out CSR-style: term i owns
+        postings_*[term_offsets[i]:term_offsets[i + 1]]. The forward index is
+        the same postings regrouped by doc ordinal.
+        """
+        terms = list(self.doc_frequencies)
+        per_term = [self._get_postings_arrays(term) for term in terms]
+        
+        postings_counts = np.fromiter((len(arrays[0]) for arrays in per_term), dtype=np.int64, count=len(terms))
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(postings_counts, out=term_offsets[1:])
+        
+        if per_term:
+            ordinals = np.concatenate([arrays[0] for arrays in per_term]).astype(np.int32, copy=False)
+            frequencies = np.concatenate([arrays[1] for arrays in per_term]).astype(np.int32, copy=False)
+        else:
+            ordinals = np.empty(0, dtype=np.int32)
+            frequencies = np.empty(0, dtype=np.int32)
+        
+        num_ordinals = len(self._ordinal_doc_ids)
+        term_ids = np.repeat(np.arange(len(terms), dtype=np.int32), postings_counts)
+        by_doc = np.argsort(ordinals, kind='stable')
+        forward_offsets = np.zeros(num_ordinals + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ordinals, minlength=num_ordinals), out=forward_offsets[1:])
+        
+        return {
+            "meta": {
+                "k1": self.k1,
+                "b": self.b,
+                "total_docs": self.total_docs,
+                "total_doc_length": self.total_doc_length,
+                "terms": terms,
+                "doc_ids": list(self._ordinal_doc_ids)
+            },
+            "term_offsets": term_offsets,
+            "postings_ordinals": ordinals,
+            "postings_tfs": frequencies,
+            "term_max_tf": np.array([self._term_max_tf[term] for term in terms], dtype=np.int32),
+            "term_min_length": np.array([self._term_min_length[term] for term in terms], dtype=np.int32),
+            "doc_lengths": self._ordinal_lengths[:num_ordinals].copy(),
+            "forward_offsets": forward_offsets,
+            "forward_terms": term_ids[by_doc],
+            "forward_tfs": frequencies[by_doc]
+        }
+    
+    @classmethod
+    def save(cls, directory: Path, arrays: Dict[str, Any]):
+        """Write an export_arrays() snapshot as .npy files plus a JSON header."""
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in cls.ARRAY_FILES:
+            np.save(directory / f"{name}.npy", arrays[name])
+        _write_json_atomic(directory / "bm25.json", arrays["meta"])
+    
+    @classmethod
+    def load(cls, directory: Path) -> 'BM25Scorer':
+        """Open a saved index, memory-mapping its postings."""
+        with open(directory / "bm25.json", 'r') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode='r') for name in cls.ARRAY_FILES}
+        
+        scorer = cls(meta['k1'], meta['b'])
+        terms = meta['terms']
+        doc_ids = meta['doc_ids']
+        
+        scorer._ordinal_doc_ids = doc_ids
+        scorer._doc_ordinals = {doc_id: ordinal for ordinal, doc_id in enumerate(doc_ids) if doc_id is not None}
+        scorer._free_ordinals = [ordinal for ordinal, doc_id in enumerate(doc_ids) if doc_id is None]
+        scorer._ordinal_lengths = np.zeros(max(1024, 2 * len(doc_ids)), dtype=np.int32)
+        scorer._ordinal_lengths[:len(doc_ids)] = arrays['doc_lengths']
+        scorer.doc_lengths = {
+            doc_id: length for doc_id, length in zip(doc_ids, arrays['doc_lengths'].tolist())
+            if doc_id is not None
+        }
+        scorer.total_docs = meta['total_docs']
+        scorer.total_doc_length = meta['total_doc_length']
+        scorer._update_avg_doc_length()
+        
+        term_offsets = np.asarray(arrays['term_offsets']).tolist()
+        scorer.doc_frequencies.update(zip(terms, np.diff(term_offsets).tolist()))
+        scorer._term_max_tf = dict(zip(terms, arrays['term_max_tf'].tolist()))
+        scorer._term_min_length = dict(zip(terms, arrays['term_min_length'].tolist()))
+        
+        # Plain ndarray views of the mappings slice much faster than np.memmap
+        ordinals, frequencies = np.asarray(arrays['postings_ordinals']), np.asarray(arrays['postings_tfs'])
+        scorer._postings_arrays = {
+            term: (ordinals[term_offsets[i]:term_offsets[i + 1]], frequencies[term_offsets[i]:term_offsets[i + 1]])
+            for i, term in enumerate(terms)
+        }
+        
+        scorer._base_terms = terms
+        scorer._base_forward = (
+            np.asarray(arrays['forward_offsets']), np.asarray(arrays['forward_terms']),
+            np.asarray(arrays['forward_tfs'])
+        )
+        return scorer
     
     def _update_avg_doc_length(self):
-        """Update average document length."""
+        """Update average document length from the running total."""
         if self.total_docs > 0:
-            self.avg_doc_length = sum(self.doc_lengths.values()) / self.total_docs
+            self.avg_doc_length = self.total_doc_length / self.total_docs
         else:
             self.avg_doc_length = 0.0
 
 
+VECTOR_INDEX_TYPES = ("hnsw_flat", "hnsw_sq8", "ivf_pq")
+
+
 class VectorIndex:
-    """FAISS-based vector index for similarity search."""
+    """
+    FAISS-based vector index for similarity search.
+    
+    Every vector carries a stable int64 id (IndexIDMap2), so deletes are O(1)
+    tombstones filtered at query time. The index is rebuilt by compact()
+    once the tombstone ratio passes compaction_threshold.
+    
+    index_type selects the storage:
+    - "hnsw_flat": HNSW graph over float32 vectors (4 bytes per dimension)
+    - "hnsw_sq8": HNSW graph over 8-bit scalar-quantized vectors (1 byte per dimension)
+    - "ivf_pq": inverted lists of product-quantized codes (pq_m bytes per vector)
     
-    def __init__(self, dimension: int = 1536):
+    Quantized types are trained on the first train_size vectors; until then
+    vectors are staged in an exact flat index.
+    """
+    
+    def __init__(self, dimension: int = 1536, compaction_threshold: float = 0.25,
+                 index_type: str = "hnsw_flat", train_size: int = 10_000,
+                 nlist: int = 256, pq_m: Optional[int] = None):
         self.dimension = dimension
+        self.compaction_threshold = compaction_threshold
         self.index = None
-        self.doc_ids: List[str] = []
+        
+        # Storage layout
+        self.index_type = "hnsw_flat"
+        self.train_size = train_size
+        self.nlist = nlist  # IVF lists, capped at train_size // 39
+        self.pq_m = pq_m  # PQ sub-quantizers; defaults to ~8 dimensions each
+        self.nprobe = 16  # IVF lists visited per query
+        self.trained = True
+        self._template: Optional[np.ndarray] = None  # Serialized trained, empty index
+        self._rebuilds = 0  # Bumped when training or configure() swaps the layout
+        self._set_layout(index_type, train_size, nlist, pq_m)
+        
+        # Stable vector ids: doc_id <-> int64 id stored in FAISS
+        self._ids_by_doc: Dict[str, int] = {}
+        self._docs_by_id: Dict[int, str] = {}
+        self._next_id = 0
+        
+        # Ids still present in the FAISS graph but deleted
+        self._tombstones: Set[int] = set()
+        
+        # Set by the owner when a background compaction has been submitted
+        self.compaction_scheduled = False
+        
+        # Filtered searches over at most this many vectors are scored exactly
+        self.exact_search_limit = 4096
+        
+        # Guards index swaps during background compaction
+        self._lock = threading.RLock()
         
         if FAISS_AVAILABLE:
-            # Use HNSW index for better performance
-            self.index = faiss.IndexHNSWFlat(dimension, 32)
-            self.index.hnsw.efConstruction = 40
-            self.index.hnsw.efSearch = 16
+            self.index = self._create_index()
         else:
             logger.warning("FAISS not available. Vector search disabled.")
     
+    def _set_layout(self, index_type: str, train_size: int, nlist: int, pq_m: Optional[int]):
+        """Validate and apply storage settings; quantized types start untrained."""
+        if index_type not in VECTOR_INDEX_TYPES:
+            raise ValueError(f"Unknown vector index type: {index_type}")
+        if pq_m is not None and self.dimension % pq_m:
+            raise ValueError(f"pq_m {pq_m} must divide the vector dimension {self.dimension}")
+        if index_type == "ivf_pq" and train_size < 256:
+            raise ValueError("ivf_pq needs train_size >= 256 to train 8-bit PQ codebooks")
+        
+        self.index_type = index_type
+        self.train_size = train_size
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.trained = index_type == "hnsw_flat"
+        self._template = None
+    
+    def _create_index(self):
+        """Create an empty id-mapped index of the configured type."""
+        if self.index_type == "hnsw_flat":
+            # Use HNSW index for better performance
+            hnsw_index = faiss.IndexHNSWFlat(self.dimension, 32)
+            hnsw_index.hnsw.efConstruction = 40
+            hnsw_index.hnsw.efSearch = 16
+            return faiss.IndexIDMap2(hnsw_index)
+        
+        if not self.trained:
+            # Staging area until there are enough vectors to train on
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+        
+        if self._template is None:
+            # Loaded from disk: keep the trained codebooks, drop the vectors
+            empty = faiss.clone_index(self.index.index)
+            empty.reset()
+            self._template = faiss.serialize_index(empty)
+        
+        return faiss.IndexIDMap2(faiss.deserialize_index(self._template))
+    
+    def _train_index(self, training_vectors: np.ndarray):
+        """Train the quantizer of the configured type and keep it as a template."""
+        if self.index_type == "hnsw_sq8":
+            quantized = faiss.IndexHNSWSQ(self.dimension, faiss.ScalarQuantizer.QT_8bit, 32)
+            quantized.hnsw.efConstruction = 40
+            quantized.hnsw.efSearch = 16
+        else:
+            nlist = max(1, min(self.nlist, len(training_vectors) // 39))
+            pq_m = self.pq_m or max(m for m in range(1, max(1, self.dimension // 8) + 1) if self.dimension % m == 0)
+            quantized = faiss.IndexIVFPQ(faiss.IndexFlatL2(self.dimension), self.dimension, nlist, pq_m, 8)
+            quantized.nprobe = min(self.nprobe, nlist)
+            quantized.make_direct_map()  # Needed by reconstruct for exact and compaction paths
+        
+        quantized.train(training_vectors)
+        self._template = faiss.serialize_index(quantized)
+        self.trained = True
+    
+    def _live_vectors(self, index) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the (ids, vectors) of an index that are not tombstoned (caller holds the lock)."""
+        stored_ids = faiss.vector_to_array(index.id_map).copy()
+        live = np.fromiter(
+            (vector_id in self._docs_by_id for vector_id in stored_ids.tolist()),
+            dtype=bool, count=len(stored_ids)
+        )
+        if not len(stored_ids):
+            return stored_ids, np.empty((0, self.dimension), dtype=np.float32)
+        return stored_ids[live], index.index.reconstruct_n(0, index.ntotal)[live]
+    
+    def _rebuild(self, training_vectors: Optional[np.ndarray] = None):
+        """Move live vectors into a fresh index of the current layout (caller holds the lock)."""
+        live_ids, live_vectors = self._live_vectors(self.index)
+        if training_vectors is not None:
+            self._train_index(training_vectors)
+        
+        index = self._create_index()
+        if len(live_ids):
+            index.add_with_ids(live_vectors, live_ids)
+        
+        self.index = index
+        self._tombstones.clear()
+        self._rebuilds += 1
+    
+    def configure(self, index_type: str, train_size: Optional[int] = None,
+                  nlist: Optional[int] = None, pq_m: Optional[int] = None):
+        """
+        Switch the storage type, re-encoding vectors already in the index.
+        
+        Vectors are re-encoded from the current storage, so moving away from
+        a quantized type does not restore full precision.
+        """
+        if not FAISS_AVAILABLE or self.index is None:
+            return
+        
+        with self._lock:
+            self._set_layout(
+                index_type,
+                self.train_size if train_size is None else train_size,
+                self.nlist if nlist is None else nlist,
+                pq_m
+            )
+            self._rebuild()
+            self._train_if_ready()
+    
+    def _train_if_ready(self):
+        """Train a staged quantized index once it holds train_size vectors (caller holds the lock)."""
+        if self.trained or self.index.ntotal < self.train_size:
+            return
+        
+        # Train on the first train_size vectors, then encode everything
+        training_vectors = self.index.index.reconstruct_n(0, self.train_size)
+        self._rebuild(training_vectors)
+    
+    @property
+    def size(self) -> int:
+        """Number of live (non-deleted) vectors."""
+        return len(self._ids_by_doc)
+    
+    @property
+    def tombstone_ratio(self) -> float:
+        """Fraction of stored vectors that are deleted."""
+        if self.index is None or self.index.ntotal == 0:
+            return 0.0
+        return len(self._tombstones) / self.index.ntotal
+    
+    def needs_compaction(self) -> bool:
+        """Check whether the tombstone ratio warrants a graph rebuild."""
+        return bool(self._tombstones) and self.tombstone_ratio >= self.compaction_threshold
+    
     def add_vectors(self, doc_ids: List[str], vectors: np.ndarray):
-        """Add vectors to the index."""
+        """Add vectors to the index, replacing existing vectors for the same doc ids."""
         if not FAISS_AVAILABLE or self.index is None:
             return
         
         if vectors.shape[1] != self.dimension:
             raise ValueError(f"Vector dimension {vectors.shape[1]} doesn't match index dimension {self.dimension}")
         
-        # Normalize vectors for cosine similarity
-        faiss.normalize_L2(vectors)
+        # Normalize vectors for cosine similarity
+        faiss.normalize_L2(vectors)
+        
+        with self._lock:
+            # Tombstone previous versions of re-indexed documents
+            self.remove_vectors({doc_id for doc_id in doc_ids if doc_id in self._ids_by_doc})
+            
+            vector_ids = np.arange(self._next_id, self._next_id + len(doc_ids), dtype=np.int64)
+            self._next_id += len(doc_ids)
+            
+            self.index.add_with_ids(vectors, vector_ids)
+            
+            for doc_id, vector_id in zip(doc_ids, vector_ids.tolist()):
+                self._ids_by_doc[doc_id] = vector_id
+                self._docs_by_id[vector_id] = doc_id
+            
+            self._train_if_ready()
+    
+    def remove_vectors(self, doc_ids_to_remove: Set[str]) -> int:
+        """Remove vectors from the index by tombstoning their ids."""
+        if not FAISS_AVAILABLE or self.index is None:
+            return 0
+        
+        with self._lock:
+            removed = 0
+            for doc_id in doc_ids_to_remove:
+                vector_id = self._ids_by_doc.pop(doc_id, None)
+                if vector_id is None:
+                    continue
+                
+                del self._docs_by_id[vector_id]
+                self._tombstones.add(vector_id)
+                removed += 1
+            
+            # Nothing left to keep: reset instead of carrying tombstones
+            if not self._ids_by_doc and not self.compaction_scheduled:
+                self.index.reset()
+                self._tombstones.clear()
+            
+            return removed
+    
+    def compact(self) -> int:
+        """
+        Rebuild the index without tombstoned vectors.
+        
+        The graph is built outside the lock; vectors added or removed while
+        building are reconciled before the new index is swapped in. Returns
+        the number of tombstones dropped.
+        """
+        if not FAISS_AVAILABLE or self.index is None:
+            return 0
+        
+        try:
+            # Snapshot live vectors (already normalized)
+            with self._lock:
+                if not self._tombstones:
+                    return 0
+                
+                old_index = self.index
+                rebuilds = self._rebuilds
+                live_ids, live_vectors = self._live_vectors(old_index)
+                new_index = self._create_index()
+            
+            if len(live_ids):
+                new_index.add_with_ids(live_vectors, live_ids)
+            
+            with self._lock:
+                if self._rebuilds != rebuilds:
+                    # Trained or reconfigured meanwhile, which already dropped tombstones
+                    return 0
+                
+                # Vectors added while building are copied from the old graph
+                snapshot_ids = set(live_ids.tolist())
+                added_ids = [vector_id for vector_id in self._docs_by_id if vector_id not in snapshot_ids]
+                if added_ids:
+                    added_vectors = np.vstack([old_index.reconstruct(vector_id) for vector_id in added_ids])
+                    new_index.add_with_ids(added_vectors, np.array(added_ids, dtype=np.int64))
+                
+                # Vectors removed while building become tombstones in the new graph
+                dropped = len(self._tombstones)
+                self._tombstones = {
+                    vector_id for vector_id in snapshot_ids if vector_id not in self._docs_by_id
+                }
+                self.index = new_index
+                
+                return dropped - len(self._tombstones)
+        finally:
+            self.compaction_scheduled = False
+    
+    def snapshot(self) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+        """Serialize the FAISS index and its doc id mapping in memory for save()."""
+        if not FAISS_AVAILABLE or self.index is None:
+            return None
+        
+        with self._lock:
+            return faiss.serialize_index(self.index), {
+                "next_id": self._next_id,
+                "ids_by_doc": dict(self._ids_by_doc),
+                "layout": {
+                    "index_type": self.index_type,
+                    "train_size": self.train_size,
+                    "nlist": self.nlist,
+                    "pq_m": self.pq_m,
+                    "trained": self.trained
+                }
+            }
+    
+    def save(self, index_path: Path, ids_path: Path,
+             snapshot: Optional[Tuple[np.ndarray, Dict[str, Any]]] = None):
+        """Write the FAISS index in its native format plus the doc id mapping."""
+        if snapshot is None:
+            snapshot = self.snapshot()
+            if snapshot is None:
+                return
+        
+        serialized, mapping = snapshot
+        with open(index_path, 'wb') as f:
+            f.write(serialized.tobytes())
         
-        self.index.add(vectors)
-        self.doc_ids.extend(doc_ids)
+        _write_json_atomic(ids_path, mapping)
     
-    def remove_vectors(self, doc_ids_to_remove: Set[str]):
-        """Remove vectors from the index (requires rebuilding)."""
-        if not FAISS_AVAILABLE or self.index is None:
+    def load(self, index_path: Path, ids_path: Path):
+        """Open a saved index, memory-mapping it where FAISS supports it."""
+        if not FAISS_AVAILABLE:
             return
         
-        # Find indices to keep
-        keep_indices = []
-        new_doc_ids = []
+        with open(ids_path, 'r') as f:
+            mapping = json.load(f)
         
-        for i, doc_id in enumerate(self.doc_ids):
-            if doc_id not in doc_ids_to_remove:
-                keep_indices.append(i)
-                new_doc_ids.append(doc_id)
+        layout = mapping.get('layout', {"index_type": "hnsw_flat", "trained": True})
         
-        if not keep_indices:
-            # No vectors to keep, reset index
-            self.index.reset()
-            self.doc_ids = []
-            return
+        if layout['index_type'] == "ivf_pq" and layout['trained']:
+            # Mapped inverted lists are read-only; PQ codes are small enough to load
+            index = faiss.read_index(str(index_path))
+        else:
+            try:
+                index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP)
+            except RuntimeError:
+                index = faiss.read_index(str(index_path))
         
-        # Rebuild index with remaining vectors
-        if len(keep_indices) < len(self.doc_ids):
-            # Get vectors for documents to keep
-            vectors = np.zeros((len(keep_indices), self.dimension), dtype=np.float32)
-            for new_idx, old_idx in enumerate(keep_indices):
-                self.index.reconstruct(old_idx, vectors[new_idx])
-            
-            # Reset and rebuild index
-            self.index.reset()
-            self.index.add(vectors)
-            self.doc_ids = new_doc_ids
-    
-    def search(self, query_vector: np.ndarray, k: int = 10) -> List[Tuple[str, float]]:
-        """Search for similar vectors."""
-        if not FAISS_AVAILABLE or self.index is None or self.index.ntotal == 0:
+        
+        with self._lock:
+            self._set_layout(
+                layout['index_type'], layout.get('train_size', self.train_size),
+                layout.get('nlist', self.nlist), layout.get('pq_m')
+            )
+            self.trained = layout['trained']
+            self.index = index
+            self._next_id = mapping['next_id']
+            self._ids_by_doc = mapping['ids_by_doc']
+            self._docs_by_id = {vector_id: doc_id for doc_id, vector_id in self._ids_by_doc.items()}
+            
+            # Tombstones are the stored ids that no document maps to
+            stored_ids = faiss.vector_to_array(index.id_map).tolist()
+            self._tombstones = {vector_id for vector_id in stored_ids if vector_id not in self._docs_by_id}
+    
+    def search(self, query_vector: np.ndarray, k: int = 10,
+               doc_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Search for similar vectors, returning (doc_id, cosine similarity).
+        
+        When `doc_ids` is given only those documents are considered: small
+        sets are scored exactly, larger ones through a FAISS id selector.
+        The FAISS query runs outside the index lock so concurrent searches
+        proceed in parallel (FAISS releases the GIL); callers must not add
+        or remove vectors concurrently.
+        """
+        if not FAISS_AVAILABLE or self.index is None or not self._ids_by_doc:
             return []
         
         if query_vector.shape[0] != self.dimension:
@@ -226,15 +1550,131 @@ class VectorIndex:
         query_vector = query_vector.reshape(1, -1).astype(np.float32)
         faiss.normalize_L2(query_vector)
         
-        # Search
-        scores, indices = self.index.search(query_vector, min(k, self.index.ntotal))
+        with self._lock:
+            index = self.index
+            inverted_lists = self.index_type == "ivf_pq" and self.trained
+            if doc_ids is not None:
+                vector_ids = np.fromiter(
+                    (self._ids_by_doc[doc_id] for doc_id in doc_ids if doc_id in self._ids_by_doc),
+                    dtype=np.int64
+                )
+            # Oversample by the tombstone count so k live hits survive filtering
+            fetch = min(k + len(self._tombstones), index.ntotal)
+        
+        if doc_ids is None:
+            distances, result_ids = index.search(query_vector, fetch)
+        else:
+            if len(vector_ids) == 0:
+                return []
+            if len(vector_ids) <= self.exact_search_limit:
+                return self._exact_search(index, query_vector, vector_ids, k)
+            
+            # Selected ids are all live, so no oversampling is needed
+            selector = faiss.IDSelectorBatch(vector_ids)
+            if inverted_lists:
+                params = faiss.SearchParametersIVF(sel=selector, nprobe=faiss.extract_index_ivf(index).nprobe)
+            else:
+                params = faiss.SearchParameters(sel=selector)
+            distances, result_ids = index.search(query_vector, min(k, len(vector_ids)), params=params)
+            if (result_ids[0] < 0).any():
+                # The filtered graph walk ran out of reachable candidates
+                return self._exact_search(index, query_vector, vector_ids, k)
         
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx >= 0 and idx < len(self.doc_ids):
-                results.append((self.doc_ids[idx], float(score)))
+        for distance, vector_id in zip(distances[0].tolist(), result_ids[0].tolist()):
+            doc_id = self._docs_by_id.get(vector_id)
+            if doc_id is not None:
+                # Squared L2 distance between unit vectors -> cosine similarity
+                results.append((doc_id, 1.0 - distance / 2.0))
+                if len(results) >= k:
+                    break
         
         return results
+    
+    def _exact_search(self, index, query_vector: np.ndarray, vector_ids: np.ndarray,
+                      k: int) -> List[Tuple[str, float]]:
+        """Score a small set of stored vectors by brute force."""
+        similarities = index.reconstruct_batch(vector_ids) @ query_vector[0]
+        if len(similarities) > k:
+            top = np.argpartition(-similarities, k)[:k]
+        else:
+            top = np.arange(len(similarities))
+        top = top[np.argsort(-similarities[top], kind='stable')]
+        
+        return [
+            (self._docs_by_id[vector_id], similarity)
+            for vector_id, similarity in zip(vector_ids[top].tolist(), similarities[top].tolist())
+            if vector_id in self._docs_by_id
+        ]
+
+
+class QueryResultCache:
+    """
+    LRU cache of materialized query results, bounded by estimated size.
+    
+    Keys carry the generation of the queried index, so entries of an index
+    that has since changed are never hit again and simply age out.
+    """
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        
+        # key -> (results, estimated bytes), least recently used first
+        self._entries: 'OrderedDict[Tuple, Tuple[List[Dict[str, Any]], int]]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _estimate_size(results: List[Dict[str, Any]]) -> int:
+        """Estimate the memory held by a result list (top-level values only)."""
+        size = sys.getsizeof(results)
+        for result in results:
+            size += sys.getsizeof(result) + sum(sys.getsizeof(value) for value in result.values())
+        return size
+    
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        """Get cached results, counting the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key: Tuple, results: List[Dict[str, Any]]):
+        """Cache results, evicting least recently used entries over the budget."""
+        size = self._estimate_size(results)
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            
+            self._entries[key] = (results, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit rate and memory usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes
+            }
 
 
 class LocalSearchService(SearchService):
@@ -250,19 +1690,59 @@ class LocalSearchService(SearchService):
         self.data_directory = Path(self.settings.local.data_directory)
         self.data_directory.mkdir(parents=True, exist_ok=True)
         
-        # Document storage: {tenant_id: {index_name: {doc_id: SearchDocument}}}
-        self.documents: Dict[str, Dict[str, Dict[str, SearchDocument]]] = defaultdict(lambda: defaultdict(dict))
+        # Per-index binary persistence: search/<tenant>/<index>/
+        self.search_directory = self.data_directory / "search"
+        
+        # Document storage: {tenant_id: {index_name: SearchDocumentStore}}
+        self.documents: Dict[str, Dict[str, SearchDocumentStore]] = defaultdict(
+            lambda: defaultdict(SearchDocumentStore)
+        )
         
         # BM25 indices: {tenant_id: {index_name: BM25Scorer}}
         self.bm25_indices: Dict[str, Dict[str, BM25Scorer]] = defaultdict(lambda: defaultdict(BM25Scorer))
         
         # Vector indices: {tenant_id: {index_name: VectorIndex}}
+        self.vector_compaction_threshold = 0.25  # Tombstone ratio that triggers a rebuild
+        self.default_vector_index_type = "hnsw_flat"  # See configure_vector_index
         self.vector_indices: Dict[str, Dict[str, VectorIndex]] = defaultdict(
-            lambda: defaultdict(lambda: VectorIndex(self.settings.local.vector_dimensions))
+            lambda: defaultdict(lambda: VectorIndex(
+                self.settings.local.vector_dimensions, self.vector_compaction_threshold,
+                self.default_vector_index_type
+            ))
         )
         
-        # Thread safety
+        # Keyword indices for filter pushdown: {tenant_id: {index_name: FieldIndex}}
+        self.field_indices: Dict[str, Dict[str, FieldIndex]] = defaultdict(lambda: defaultdict(FieldIndex))
+        
+        # BM25 query evaluation: MaxScore top-k by default, exhaustive scoring
+        # kept as a reference path for correctness checks
+        self.bm25_exhaustive_search = False
+        self.search_depth = 50  # Candidates taken from each ranking
+        
+        # Worker threads for CPU-heavy work (tokenization, index maintenance)
+        self.thread_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search")
+        self.ingest_chunk_size = 256  # Documents per tokenization task
+        
+        # Bounded pool for BM25 scoring and FAISS queries, kept apart from
+        # indexing work so bulk ingestion cannot starve queries
+        self.query_workers = 8
+        self.query_pool = ThreadPoolExecutor(max_workers=self.query_workers, thread_name_prefix="search-query")
+        
+        # Thread safety: one reader-writer lock per (tenant_id, index_name);
+        # self._lock only guards the index registries
         self._lock = threading.RLock()
+        self._index_locks: Dict[Tuple[str, str], ReadWriteLock] = {}
+        
+        # (tenant_id, index_name) pairs changed since the last persistence
+        self._dirty_indices: Set[Tuple[str, str]] = set()
+        
+        # Per-index mutation counters; part of every result cache key
+        self._generations: Dict[Tuple[str, str], int] = {}
+        
+        # Results of repeated queries, invalidated by index generation
+        self.result_cache_mb = 64
+        self.result_cache = QueryResultCache(self.result_cache_mb * 1024 * 1024)
+        self._legacy_file: Optional[Path] = None  # search_indices.json pending migration
         
         # Load persisted data
         self._load_persisted_data()
@@ -295,6 +1775,80 @@ class LocalSearchService(SearchService):
         
         return index_name
     
+    def _index_lock(self, tenant_id: str, index_name: str) -> ReadWriteLock:
+        """Get the reader-writer lock of an index."""
+        lock = self._index_locks.get((tenant_id, index_name))
+        if lock is None:
+            with self._lock:
+                lock = self._index_locks.setdefault((tenant_id, index_name), ReadWriteLock())
+        return lock
+    
+    def _open_index(self, tenant_id: str,
+                    index_name: str) -> Tuple[SearchDocumentStore, BM25Scorer, VectorIndex, FieldIndex]:
+        """Get the document store and the BM25, vector and field indices, creating them if needed."""
+        with self._lock:
+            return (
+                self.documents[tenant_id][index_name],
+                self.bm25_indices[tenant_id][index_name],
+                self.vector_indices[tenant_id][index_name],
+                self.field_indices[tenant_id][index_name]
+            )
+    
+    def _mark_dirty(self, tenant_id: str, index_name: str):
+        """Record a mutation: bump the index generation and queue it for persistence."""
+        with self._lock:
+            self._dirty_indices.add((tenant_id, index_name))
+            key = (tenant_id, index_name)
+            self._generations[key] = self._generations.get(key, 0) + 1
+    
+    @staticmethod
+    def _query_key(kind: str, query: Optional[str], filters: Optional[Dict[str, Any]],
+                   vector: Optional[List[float]] = None, *params: Any) -> Optional[Tuple]:
+        """Build the result cache key of a query, or None if it can't be cached."""
+        try:
+            filters_key = json.dumps(filters or {}, sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+        
+        # Queries with the same BM25 terms rank identically
+        query_key = " ".join(tokenize_text(query)) if query is not None else None
+        vector_key = None
+        if vector is not None:
+            vector_key = hashlib.blake2b(np.asarray(vector, dtype=np.float32).tobytes(), digest_size=16).hexdigest()
+        
+        return (kind, query_key, filters_key, vector_key) + params
+    
+    def _cached_query(self, tenant_id: str, index_name: str, key: Optional[Tuple],
+                      compute: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Serve a query from the result cache or compute it (caller holds the index read lock)."""
+        if key is None:
+            return compute()
+        
+        key = (tenant_id, index_name, self._generations.get((tenant_id, index_name), 0),
+               self.search_depth, self.bm25_exhaustive_search) + key
+        results = self.result_cache.get(key)
+        if results is None:
+            results = compute()
+            self.result_cache.put(key, results)
+        
+        # Callers own their copies; cached entries stay untouched
+        return [dict(result) for result in results]
+    
+    def _detect_fields(self, doc: Dict[str, Any]) -> Tuple[List[str], Optional[str]]:
+        """Determine text fields to index and the vector field of a document."""
+        text_fields = []
+        vector_field = None
+        
+        for key, value in doc.items():
+            if isinstance(value, str) and len(value.strip()) > 0:
+                text_fields.append(key)
+            elif isinstance(value, list) and len(value) > 0 and isinstance(value[0], (int, float)):
+                # Assume this is a vector field
+                if vector_field is None:
+                    vector_field = key
+        
+        return text_fields, vector_field
+    
     async def index_document(self, doc: Dict[str, Any], tenant_id: str, index_name: str = None) -> str:
         """Index a document for search."""
         try:
@@ -304,121 +1858,378 @@ class LocalSearchService(SearchService):
             doc_id = doc.get('id') or doc.get('_id') or f"doc_{int(datetime.now().timestamp() * 1000)}"
             
             # Determine text fields to index
-            text_fields = []
-            vector_field = None
+            text_fields, vector_field = self._detect_fields(doc)
+            vector = doc[vector_field] if vector_field else None
             
-            for key, value in doc.items():
-                if isinstance(value, str) and len(value.strip()) > 0:
-                    text_fields.append(key)
-                elif isinstance(value, list) and len(value) > 0 and isinstance(value[0], (int, float)):
-                    # Assume this is a vector field
-                    if vector_field is None:
-                        vector_field = key
+            # Reject before storing: the vector is stripped from the stored content
+            self._check_vector_dimension(vector)
             
-            with self._lock:
-                # Create search document
-                search_doc = SearchDocument(
+            # Create search document
+            search_doc = SearchDocument(
+                doc_id=doc_id,
+                tenant_id=tenant_id,
+                index_name=index_name,
+                content=self._stored_content(doc, vector_field),
+                text_fields=text_fields,
+                vector_field=vector_field,
+                updated_at=datetime.now()
+            )
+            
+            loop = asyncio.get_running_loop()
+            vector_index = await loop.run_in_executor(
+                self.thread_pool, self._store_document, tenant_id, index_name, search_doc, vector
+            )
+            self._schedule_vector_compaction(tenant_id, index_name, vector_index)
+            
+            logger.debug(f"Indexed document {doc_id} in {index_name}")
+            return doc_id
+                
+        except Exception as e:
+            logger.error(f"Error indexing document in {index_name} for tenant {tenant_id}: {e}")
+            raise
+    
+    def _check_vector_dimension(self, vector: Optional[List[float]]):
+        """Raise ValueError for a vector the index can't hold."""
+        if (vector is not None and FAISS_AVAILABLE and 
+                len(vector) != self.settings.local.vector_dimensions):
+            raise ValueError(
+                f"Vector dimension {len(vector)} doesn't match index dimension "
+                f"{self.settings.local.vector_dimensions}"
+            )
+    
+    @staticmethod
+    def _stored_content(doc: Dict[str, Any], vector_field: Optional[str]) -> Dict[str, Any]:
+        """Get the content kept for a document; indexed vectors live only in FAISS."""
+        if vector_field is None or not FAISS_AVAILABLE:
+            return doc
+        return {field: value for field, value in doc.items() if field != vector_field}
+    
+    def _store_document(self, tenant_id: str, index_name: str, search_doc: SearchDocument,
+                        vector: Optional[List[float]]) -> VectorIndex:
+        """Store and index one document under the index write lock."""
+        documents, bm25_index, vector_index, field_index = self._open_index(tenant_id, index_name)
+        doc_id = search_doc.doc_id
+        doc = search_doc.content
+        
+        with self._index_lock(tenant_id, index_name).writer:
+            # Remove existing document if it exists
+            if doc_id in documents:
+                self._remove_document_from_indices(tenant_id, index_name, doc_id)
+            
+            # Store document
+            documents[doc_id] = search_doc
+            field_index.add_document(doc_id, doc)
+            self._mark_dirty(tenant_id, index_name)
+            
+            # Index text content
+            if search_doc.text_fields:
+                text_content = " ".join([str(doc.get(field, "")) for field in search_doc.text_fields])
+                bm25_index.add_document(doc_id, text_content)
+            
+            # Index vector content
+            if vector is not None:
+                vector_data = np.array([vector], dtype=np.float32)
+                vector_index.add_vectors([doc_id], vector_data)
+        
+        return vector_index
+    
+    async def create_field_index(self, field: str, tenant_id: str, index_name: str = None,
+                                 kind: str = "hash") -> bool:
+        """
+        Declare a secondary index on a document field.
+        
+        "hash" indexes every string value of the field for equality and IN
+        filters (short scalar values are always indexed); "range" keeps the
+        values sorted for gte/gt/lte/lt filters. Declarations are persisted
+        with the index.
+        """
+        try:
+            index_name = self._validate_tenant_access(tenant_id, index_name)
+            
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                self.thread_pool, self._declare_field_index, tenant_id, index_name, field, kind
+            )
+            
+            logger.debug(f"Created {kind} field index on {field} in {index_name}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error creating field index on {field} in {index_name} for tenant {tenant_id}: {e}")
+            raise
+    
+    def _declare_field_index(self, tenant_id: str, index_name: str, field: str, kind: str):
+        """Build a declared field index under the index write lock."""
+        documents, _, _, field_index = self._open_index(tenant_id, index_name)
+        
+        with self._index_lock(tenant_id, index_name).writer:
+            field_index.declare(field, kind, lambda doc_id: documents[doc_id].content)
+            self._mark_dirty(tenant_id, index_name)
+    
+    async def configure_vector_index(self, tenant_id: str, index_name: str = None,
+                                     index_type: str = "hnsw_flat", train_size: int = None,
+                                     nlist: int = None, pq_m: int = None) -> bool:
+        """
+        Choose the vector storage of an index: "hnsw_flat", "hnsw_sq8" or "ivf_pq".
+        
+        Quantized types are trained on the first train_size vectors (default
+        10,000). Vectors already in the index are re-encoded. The layout is
+        persisted with the index.
+        """
+        try:
+            index_name = self._validate_tenant_access(tenant_id, index_name)
+            
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                self.thread_pool, self._configure_vector_index, tenant_id, index_name,
+                index_type, train_size, nlist, pq_m
+            )
+            
+            logger.debug(f"Configured {index_type} vector storage for {index_name}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error configuring vector index {index_name} for tenant {tenant_id}: {e}")
+            raise
+    
+    def _configure_vector_index(self, tenant_id: str, index_name: str, index_type: str,
+                                train_size: Optional[int], nlist: Optional[int], pq_m: Optional[int]):
+        """Re-encode a vector index under the index write lock."""
+        _, _, vector_index, _ = self._open_index(tenant_id, index_name)
+        
+        with self._index_lock(tenant_id, index_name).writer:
+            vector_index.configure(index_type, train_size, nlist, pq_m)
+            self._mark_dirty(tenant_id, index_name)
+    
+    async def index_documents(self, docs: List[Dict[str, Any]], tenant_id: str, 
+                              index_name: str = None) -> List[Dict[str, Any]]:
+        """
+        Index a batch of documents.
+        
+        Text is tokenized on the thread pool, vectors are stacked into one
+        float32 matrix and normalized/inserted in a single FAISS call, and
+        all index mutations happen in one locked section.
+        
+        Returns one {"id", "error"} entry per input document, in order.
+        """
+        index_name = self._validate_tenant_access(tenant_id, index_name)
+        results: List[Dict[str, Any]] = [{"id": None, "error": None} for _ in docs]
+        batch_timestamp = int(datetime.now().timestamp() * 1000)
+        
+        # Validate and prepare documents; the last occurrence of a doc id wins
+        prepared: Dict[str, Tuple[int, SearchDocument, Optional[List[float]]]] = {}
+        for position, doc in enumerate(docs):
+            try:
+                if not isinstance(doc, dict):
+                    raise ValueError("Document must be a dict")
+                
+                doc_id = doc.get('id') or doc.get('_id') or f"doc_{batch_timestamp}_{position}"
+                results[position]["id"] = doc_id
+                text_fields, vector_field = self._detect_fields(doc)
+                
+                vector = doc[vector_field] if vector_field else None
+                self._check_vector_dimension(vector)
+                
+                prepared[doc_id] = (position, SearchDocument(
                     doc_id=doc_id,
                     tenant_id=tenant_id,
                     index_name=index_name,
-                    content=doc,
+                    content=self._stored_content(doc, vector_field),
                     text_fields=text_fields,
                     vector_field=vector_field,
                     updated_at=datetime.now()
-                )
-                
-                # Remove existing document if it exists
-                if doc_id in self.documents[tenant_id][index_name]:
-                    await self._remove_document_from_indices(tenant_id, index_name, doc_id)
-                
-                # Store document
-                self.documents[tenant_id][index_name][doc_id] = search_doc
-                
-                # Index text content
-                if text_fields:
-                    text_content = " ".join([str(doc.get(field, "")) for field in text_fields])
-                    self.bm25_indices[tenant_id][index_name].add_document(doc_id, text_content)
-                
-                # Index vector content
-                if vector_field and vector_field in doc:
-                    vector_data = np.array([doc[vector_field]], dtype=np.float32)
-                    self.vector_indices[tenant_id][index_name].add_vectors([doc_id], vector_data)
-                
-                logger.debug(f"Indexed document {doc_id} in {index_name}")
-                return doc_id
-                
+                ), vector)
+            except Exception as e:
+                results[position]["error"] = str(e)
+        
+        if not prepared:
+            return results
+        
+        # Tokenize text fields off the event loop
+        text_batch = [
+            (doc_id, " ".join(str(search_doc.content.get(field, "")) for field in search_doc.text_fields))
+            for doc_id, (_, search_doc, _) in prepared.items()
+            if search_doc.text_fields
+        ]
+        loop = asyncio.get_running_loop()
+        chunks = [
+            text_batch[i:i + self.ingest_chunk_size]
+            for i in range(0, len(text_batch), self.ingest_chunk_size)
+        ]
+        tokenized_chunks = await asyncio.gather(*[
+            loop.run_in_executor(self.thread_pool, self._tokenize_chunk, chunk) for chunk in chunks
+        ])
+        
+        # Stack vectors into one contiguous float32 matrix
+        vector_doc_ids = [doc_id for doc_id, (_, _, vector) in prepared.items() if vector is not None]
+        vector_matrix = None
+        if vector_doc_ids:
+            vector_matrix = np.ascontiguousarray(
+                [prepared[doc_id][2] for doc_id in vector_doc_ids], dtype=np.float32
+            )
+        
+        try:
+            vector_index = await loop.run_in_executor(
+                self.thread_pool, self._store_documents, tenant_id, index_name,
+                [search_doc for _, search_doc, _ in prepared.values()],
+                tokenized_chunks, vector_doc_ids, vector_matrix
+            )
+            self._schedule_vector_compaction(tenant_id, index_name, vector_index)
+            
+            logger.debug(f"Bulk indexed {len(prepared)} documents in {index_name}")
+            
         except Exception as e:
-            logger.error(f"Error indexing document in {index_name} for tenant {tenant_id}: {e}")
-            raise
+            logger.error(f"Error bulk indexing documents in {index_name} for tenant {tenant_id}: {e}")
+            for position, _, _ in prepared.values():
+                results[position]["error"] = str(e)
+        
+        return results
+    
+    def _store_documents(self, tenant_id: str, index_name: str, search_docs: List[SearchDocument],
+                         tokenized_chunks: List[List[Tuple[str, List[str]]]], vector_doc_ids: List[str],
+                         vector_matrix: Optional[np.ndarray]) -> VectorIndex:
+        """Apply a prepared batch in one section under the index write lock."""
+        documents, bm25_index, vector_index, field_index = self._open_index(tenant_id, index_name)
+        
+        with self._index_lock(tenant_id, index_name).writer:
+            # Drop previous versions of re-indexed documents
+            existing_ids = [search_doc.doc_id for search_doc in search_docs if search_doc.doc_id in documents]
+            for doc_id in existing_ids:
+                bm25_index.remove_document(doc_id)
+            vector_index.remove_vectors(set(existing_ids))
+            
+            for search_doc in search_docs:
+                documents[search_doc.doc_id] = search_doc
+                field_index.add_document(search_doc.doc_id, search_doc.content)
+            self._mark_dirty(tenant_id, index_name)
+            
+            for tokenized in tokenized_chunks:
+                bm25_index.index_tokenized(tokenized)
+            
+            if vector_matrix is not None:
+                vector_index.add_vectors(vector_doc_ids, vector_matrix)
+        
+        return vector_index
+    
+    @staticmethod
+    def _tokenize_chunk(chunk: List[Tuple[str, str]]) -> List[Tuple[str, List[str]]]:
+        """Tokenize (doc_id, text) pairs on a worker thread."""
+        return [(doc_id, tokenize_text(text)) for doc_id, text in chunk]
     
     async def search(self, query: str, tenant_id: str, filters: Dict[str, Any] = None, 
-                    index_name: str = None) -> List[Dict[str, Any]]:
-        """Perform text search using BM25."""
+                    index_name: str = None, filter_only: bool = False,
+                    limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Perform text search using BM25.
+        
+        With filter_only=True the query text is ignored and documents
+        matching the filters are returned in doc id order, answered from the
+        field indices without BM25 scoring (see create_field_index).
+        """
         try:
             index_name = self._validate_tenant_access(tenant_id, index_name)
             
-            with self._lock:
-                if tenant_id not in self.bm25_indices or index_name not in self.bm25_indices[tenant_id]:
-                    return []
-                
-                # Perform BM25 search
-                bm25_results = self.bm25_indices[tenant_id][index_name].search(query, limit=50)
-                
-                # Get documents and apply filters
-                results = []
-                for doc_id, score in bm25_results:
-                    if doc_id in self.documents[tenant_id][index_name]:
-                        doc = self.documents[tenant_id][index_name][doc_id]
-                        
-                        # Apply filters
-                        if self._apply_filters(doc.content, filters):
-                            result = doc.content.copy()
-                            result['_score'] = score
-                            result['_id'] = doc_id
-                            results.append(result)
-                
-                logger.debug(f"Text search returned {len(results)} results for query: {query}")
-                return results
+            loop = asyncio.get_running_loop()
+            if filter_only:
+                results = await loop.run_in_executor(
+                    self.query_pool, self._filter_search, tenant_id, filters, index_name,
+                    limit or self.search_depth
+                )
+            else:
+                results = await loop.run_in_executor(
+                    self.query_pool, self._text_search, query, tenant_id, filters, index_name
+                )
+                if limit is not None:
+                    results = results[:limit]
+            
+            logger.debug(f"Text search returned {len(results)} results for query: {query}")
+            return results
                 
         except Exception as e:
             logger.error(f"Error performing text search in {index_name} for tenant {tenant_id}: {e}")
             return []
     
+    def _filter_search(self, tenant_id: str, filters: Optional[Dict[str, Any]], index_name: str,
+                       limit: int) -> List[Dict[str, Any]]:
+        """Select documents by filters alone under the index read lock, in doc id order."""
+        documents = self.documents.get(tenant_id, {}).get(index_name)
+        if documents is None:
+            return []
+        
+        with self._index_lock(tenant_id, index_name).reader:
+            return self._cached_query(
+                tenant_id, index_name, self._query_key("filter", None, filters, None, limit),
+                lambda: self._select_filtered(tenant_id, filters, index_name, limit)
+            )
+    
+    def _select_filtered(self, tenant_id: str, filters: Optional[Dict[str, Any]], index_name: str,
+                         limit: int) -> List[Dict[str, Any]]:
+        """Select the first documents matching the filters (caller holds the index read lock)."""
+        documents = self.documents[tenant_id][index_name]
+        allowed, residual = self._resolve_filters(tenant_id, index_name, filters)
+        candidates = sorted(allowed) if allowed is not None else sorted(documents)
+        
+        hits = []
+        for doc_id in candidates:
+            if len(hits) >= limit:
+                break
+            if residual and not self._apply_filters(documents[doc_id].content, residual):
+                continue
+            hits.append((doc_id, {'_score': 0.0}))
+        
+        return self._materialize(tenant_id, index_name, hits)
+    
+    def _text_search(self, query: str, tenant_id: str, filters: Optional[Dict[str, Any]],
+                     index_name: str) -> List[Dict[str, Any]]:
+        """Score a BM25 query under the index read lock."""
+        if self.bm25_indices.get(tenant_id, {}).get(index_name) is None:
+            return []
+        
+        with self._index_lock(tenant_id, index_name).reader:
+            return self._cached_query(
+                tenant_id, index_name, self._query_key("text", query, filters),
+                lambda: self._score_text_query(query, tenant_id, filters, index_name)
+            )
+    
+    def _score_text_query(self, query: str, tenant_id: str, filters: Optional[Dict[str, Any]],
+                          index_name: str) -> List[Dict[str, Any]]:
+        """Rank and materialize a BM25 query (caller holds the index read lock)."""
+        allowed, residual = self._resolve_filters(tenant_id, index_name, filters)
+        if allowed is not None and not allowed:
+            return []
+        
+        ranking = self._rank_text(query, tenant_id, index_name, allowed, residual, self.search_depth)
+        return self._materialize(
+            tenant_id, index_name, [(doc_id, {'_score': score}) for doc_id, score in ranking]
+        )
+    
     async def hybrid_search(self, query: str, vector: List[float], tenant_id: str, 
-                           filters: Dict[str, Any] = None, index_name: str = None) -> List[Dict[str, Any]]:
-        """Perform hybrid text and vector search."""
+                           filters: Dict[str, Any] = None, index_name: str = None,
+                           fusion: str = "weighted", text_weight: float = None, vector_weight: float = None,
+                           rrf_k: int = 60, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Perform hybrid text and vector search.
+        
+        Filters answered by the field indices are applied before scoring.
+        The BM25 and vector rankings are fused with either "weighted"
+        (max-normalized scores, default weights 0.7/0.3) or "rrf" (reciprocal
+        rank fusion, default weights 1.0/1.0), and only the top `limit`
+        documents are materialized.
+        """
         try:
             index_name = self._validate_tenant_access(tenant_id, index_name)
             
-            # Perform text search
-            text_results = await self.search(query, tenant_id, filters, index_name)
-            text_scores = {result['_id']: result['_score'] for result in text_results}
-            
-            # Perform vector search
-            vector_results = []
-            if FAISS_AVAILABLE:
-                with self._lock:
-                    if (tenant_id in self.vector_indices and 
-                        index_name in self.vector_indices[tenant_id]):
-                        
-                        query_vector = np.array(vector, dtype=np.float32)
-                        vector_search_results = self.vector_indices[tenant_id][index_name].search(
-                            query_vector, k=50
-                        )
-                        
-                        for doc_id, similarity in vector_search_results:
-                            if doc_id in self.documents[tenant_id][index_name]:
-                                doc = self.documents[tenant_id][index_name][doc_id]
-                                
-                                # Apply filters
-                                if self._apply_filters(doc.content, filters):
-                                    result = doc.content.copy()
-                                    result['_vector_score'] = similarity
-                                    result['_id'] = doc_id
-                                    vector_results.append(result)
-            
-            # Combine results with hybrid scoring
-            combined_results = self._combine_hybrid_results(text_results, vector_results, text_scores)
+            if fusion not in ("weighted", "rrf"):
+                raise ValueError(f"Unknown fusion method: {fusion}")
+            default_text_weight, default_vector_weight = (0.7, 0.3) if fusion == "weighted" else (1.0, 1.0)
+            text_weight = default_text_weight if text_weight is None else text_weight
+            vector_weight = default_vector_weight if vector_weight is None else vector_weight
+            
+            loop = asyncio.get_running_loop()
+            combined_results = await loop.run_in_executor(
+                self.query_pool, self._hybrid_search, query, vector, tenant_id, filters, index_name,
+                fusion, text_weight, vector_weight, rrf_k, limit
+            )
             
             logger.debug(f"Hybrid search returned {len(combined_results)} results")
             return combined_results
@@ -427,47 +2238,133 @@ class LocalSearchService(SearchService):
             logger.error(f"Error performing hybrid search in {index_name} for tenant {tenant_id}: {e}")
             return []
     
-    def _combine_hybrid_results(self, text_results: List[Dict], vector_results: List[Dict], 
-                               text_scores: Dict[str, float]) -> List[Dict[str, Any]]:
-        """Combine text and vector search results with hybrid scoring."""
-        # Normalize scores
-        max_text_score = max(text_scores.values()) if text_scores else 1.0
-        max_vector_score = max([r.get('_vector_score', 0) for r in vector_results]) if vector_results else 1.0
-        
-        # Combine results
-        combined = {}
-        
-        # Add text results
-        for result in text_results:
-            doc_id = result['_id']
-            normalized_text_score = result['_score'] / max_text_score if max_text_score > 0 else 0
-            
-            combined[doc_id] = result.copy()
-            combined[doc_id]['_text_score'] = normalized_text_score
-            combined[doc_id]['_vector_score'] = 0.0
-            combined[doc_id]['_hybrid_score'] = normalized_text_score * 0.7  # 70% weight for text
-        
-        # Add/update with vector results
-        for result in vector_results:
-            doc_id = result['_id']
-            normalized_vector_score = result['_vector_score'] / max_vector_score if max_vector_score > 0 else 0
-            
-            if doc_id in combined:
-                # Update existing result
-                combined[doc_id]['_vector_score'] = normalized_vector_score
-                combined[doc_id]['_hybrid_score'] = (
-                    combined[doc_id]['_text_score'] * 0.7 + normalized_vector_score * 0.3
+    def _hybrid_search(self, query: str, vector: List[float], tenant_id: str, filters: Optional[Dict[str, Any]],
+                       index_name: str, fusion: str, text_weight: float, vector_weight: float,
+                       rrf_k: int, limit: int) -> List[Dict[str, Any]]:
+        """Rank, fuse and materialize a hybrid query under the index read lock."""
+        if index_name not in self.documents.get(tenant_id, {}):
+            return []
+        
+        with self._index_lock(tenant_id, index_name).reader:
+            return self._cached_query(
+                tenant_id, index_name,
+                self._query_key("hybrid", query, filters, vector, fusion, text_weight, vector_weight, rrf_k, limit),
+                lambda: self._fuse_hybrid_query(
+                    query, vector, tenant_id, filters, index_name, fusion, text_weight, vector_weight, rrf_k, limit
                 )
+            )
+    
+    def _fuse_hybrid_query(self, query: str, vector: List[float], tenant_id: str,
+                           filters: Optional[Dict[str, Any]], index_name: str, fusion: str,
+                           text_weight: float, vector_weight: float, rrf_k: int,
+                           limit: int) -> List[Dict[str, Any]]:
+        """Rank, fuse and materialize a hybrid query (caller holds the index read lock)."""
+        allowed, residual = self._resolve_filters(tenant_id, index_name, filters)
+        if allowed is not None and not allowed:
+            return []
+        
+        text_ranking = self._rank_text(query, tenant_id, index_name, allowed, residual, self.search_depth)
+        vector_ranking = self._rank_vector(vector, tenant_id, index_name, allowed, residual, self.search_depth)
+        
+        fused = self._fuse_rankings(text_ranking, vector_ranking, fusion, text_weight, vector_weight, rrf_k)
+        return self._materialize(tenant_id, index_name, fused[:limit])
+    
+    def _resolve_filters(self, tenant_id: str, index_name: str,
+                         filters: Optional[Dict[str, Any]]) -> Tuple[Optional[Set[str]], Dict[str, Any]]:
+        """Resolve filters against the field index into (allowed doc ids, residual filters)."""
+        field_index = self.field_indices.get(tenant_id, {}).get(index_name)
+        if not filters or field_index is None:
+            return None, filters or {}
+        
+        documents = self.documents[tenant_id][index_name]
+        return field_index.resolve(
+            filters, lambda doc_id, field_filter: self._apply_filters(documents[doc_id].content, field_filter)
+        )
+    
+    def _rank_text(self, query: str, tenant_id: str, index_name: str, allowed: Optional[Set[str]],
+                   residual: Dict[str, Any], depth: int) -> List[Tuple[str, float]]:
+        """Get the top BM25 (doc_id, score) pairs among allowed documents."""
+        scorer = self.bm25_indices.get(tenant_id, {}).get(index_name)
+        if scorer is None:
+            return []
+        
+        mask = scorer.ordinal_mask(allowed) if allowed is not None else None
+        if self.bm25_exhaustive_search:
+            ranking = scorer.search_exhaustive(query, limit=depth, allowed=mask)
+        else:
+            ranking = scorer.search(query, limit=depth, allowed=mask)
+        
+        return self._filter_ranking(tenant_id, index_name, ranking, residual)
+    
+    def _rank_vector(self, vector: List[float], tenant_id: str, index_name: str, allowed: Optional[Set[str]],
+                     residual: Dict[str, Any], depth: int) -> List[Tuple[str, float]]:
+        """Get the top (doc_id, cosine similarity) pairs among allowed documents."""
+        vector_index = self.vector_indices.get(tenant_id, {}).get(index_name)
+        if not FAISS_AVAILABLE or vector_index is None:
+            return []
+        
+        query_vector = np.array(vector, dtype=np.float32)
+        ranking = vector_index.search(query_vector, k=depth, doc_ids=allowed)
+        return self._filter_ranking(tenant_id, index_name, ranking, residual)
+    
+    def _filter_ranking(self, tenant_id: str, index_name: str, ranking: List[Tuple[str, float]],
+                        residual: Dict[str, Any]) -> List[Tuple[str, float]]:
+        """Apply filters that could not be pushed down to a ranked list."""
+        documents = self.documents[tenant_id][index_name]
+        return [
+            (doc_id, score) for doc_id, score in ranking
+            if doc_id in documents and (not residual or self._apply_filters(documents[doc_id].content, residual))
+        ]
+    
+    @staticmethod
+    def _fuse_rankings(text_ranking: List[Tuple[str, float]], vector_ranking: List[Tuple[str, float]],
+                       fusion: str, text_weight: float, vector_weight: float,
+                       rrf_k: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """Fuse two rankings into (doc_id, score fields) sorted by hybrid score."""
+        # Normalize scores
+        max_text_score = max((score for _, score in text_ranking), default=1.0)
+        max_vector_score = max((score for _, score in vector_ranking), default=1.0)
+        
+        combined: Dict[str, Dict[str, Any]] = {}
+        for rank, (doc_id, score) in enumerate(text_ranking, start=1):
+            combined[doc_id] = {
+                '_text_score': score / max_text_score if max_text_score > 0 else 0,
+                '_vector_score': 0.0,
+                '_text_rank': rank,
+                '_vector_rank': None
+            }
+        for rank, (doc_id, score) in enumerate(vector_ranking, start=1):
+            fields = combined.setdefault(doc_id, {'_text_score': 0.0, '_text_rank': None})
+            fields['_vector_score'] = score / max_vector_score if max_vector_score > 0 else 0
+            fields['_vector_rank'] = rank
+        
+        for fields in combined.values():
+            if fusion == "rrf":
+                hybrid_score = 0.0
+                if fields['_text_rank'] is not None:
+                    hybrid_score += text_weight / (rrf_k + fields['_text_rank'])
+                if fields['_vector_rank'] is not None:
+                    hybrid_score += vector_weight / (rrf_k + fields['_vector_rank'])
             else:
-                # Add new result
-                combined[doc_id] = result.copy()
-                combined[doc_id]['_text_score'] = 0.0
-                combined[doc_id]['_vector_score'] = normalized_vector_score
-                combined[doc_id]['_hybrid_score'] = normalized_vector_score * 0.3  # 30% weight for vector
+                hybrid_score = text_weight * fields['_text_score'] + vector_weight * fields['_vector_score']
+            fields['_hybrid_score'] = hybrid_score
         
         # Sort by hybrid score and return
-        sorted_results = sorted(combined.values(), key=lambda x: x['_hybrid_score'], reverse=True)
-        return sorted_results
+        return sorted(combined.items(), key=lambda item: item[1]['_hybrid_score'], reverse=True)
+    
+    def _materialize(self, tenant_id: str, index_name: str,
+                     hits: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Copy the content of the final hits and attach their score fields."""
+        documents = self.documents[tenant_id][index_name]
+        results = []
+        for doc_id, fields in hits:
+            if doc_id in documents:
+                result = documents[doc_id].content.copy()
+                result.update(fields)
+                result['_id'] = doc_id
+                results.append(result)
+        
+        return results
     
     def _apply_filters(self, doc_content: Dict[str, Any], filters: Dict[str, Any]) -> bool:
         """Apply filters to a document."""
@@ -501,76 +2398,173 @@ class LocalSearchService(SearchService):
         try:
             index_name = self._validate_tenant_access(tenant_id, index_name)
             
-            with self._lock:
-                if (tenant_id in self.documents and 
-                    index_name in self.documents[tenant_id] and 
-                    doc_id in self.documents[tenant_id][index_name]):
-                    
-                    # Remove from indices
-                    await self._remove_document_from_indices(tenant_id, index_name, doc_id)
-                    
-                    # Remove document
-                    del self.documents[tenant_id][index_name][doc_id]
-                    
-                    logger.debug(f"Deleted document {doc_id} from {index_name}")
-                    return True
-                
+            if index_name not in self.documents.get(tenant_id, {}):
                 return False
+            
+            loop = asyncio.get_running_loop()
+            deleted = await loop.run_in_executor(
+                self.thread_pool, self._delete_from_index, doc_id, tenant_id, index_name
+            )
+            
+            if deleted:
+                vector_index = self.vector_indices.get(tenant_id, {}).get(index_name)
+                if vector_index is not None:
+                    self._schedule_vector_compaction(tenant_id, index_name, vector_index)
+                logger.debug(f"Deleted document {doc_id} from {index_name}")
+            return deleted
                 
         except Exception as e:
             logger.error(f"Error deleting document {doc_id} from {index_name} for tenant {tenant_id}: {e}")
             return False
     
-    async def _remove_document_from_indices(self, tenant_id: str, index_name: str, doc_id: str):
-        """Remove document from BM25 and vector indices."""
+    def _delete_from_index(self, doc_id: str, tenant_id: str, index_name: str) -> bool:
+        """Delete a document under the index write lock."""
+        with self._index_lock(tenant_id, index_name).writer:
+            documents = self.documents[tenant_id][index_name]
+            if doc_id not in documents:
+                return False
+            
+            # Remove from indices
+            self._remove_document_from_indices(tenant_id, index_name, doc_id)
+            
+            # Remove document
+            del documents[doc_id]
+            self._mark_dirty(tenant_id, index_name)
+            return True
+    
+    def _remove_document_from_indices(self, tenant_id: str, index_name: str, doc_id: str):
+        """Remove document from BM25 and vector indices (caller holds the index write lock)."""
         # Remove from BM25 index
-        if tenant_id in self.bm25_indices and index_name in self.bm25_indices[tenant_id]:
-            self.bm25_indices[tenant_id][index_name].remove_document(doc_id)
+        bm25_index = self.bm25_indices.get(tenant_id, {}).get(index_name)
+        if bm25_index is not None:
+            bm25_index.remove_document(doc_id)
+        
+        # Remove from vector index (tombstone; graph is compacted in the background)
+        vector_index = self.vector_indices.get(tenant_id, {}).get(index_name)
+        if vector_index is not None:
+            vector_index.remove_vectors({doc_id})
+        
+        field_index = self.field_indices.get(tenant_id, {}).get(index_name)
+        if field_index is not None:
+            field_index.remove_document(doc_id)
+    
+    def _schedule_vector_compaction(self, tenant_id: str, index_name: str, vector_index: VectorIndex):
+        """Compact a vector index on a worker thread once it has enough tombstones."""
+        if vector_index.compaction_scheduled or not vector_index.needs_compaction():
+            return
+        
+        vector_index.compaction_scheduled = True
+        future = asyncio.get_running_loop().run_in_executor(None, vector_index.compact)
+        
+        def _log_result(done: asyncio.Future):
+            if done.exception():
+                logger.error(f"Error compacting vector index {index_name} for tenant {tenant_id}: {done.exception()}")
+            else:
+                logger.debug(f"Compacted vector index {index_name}: dropped {done.result()} tombstones")
         
-        # Remove from vector index
-        if tenant_id in self.vector_indices and index_name in self.vector_indices[tenant_id]:
-            self.vector_indices[tenant_id][index_name].remove_vectors({doc_id})
+        future.add_done_callback(_log_result)
+    
+    def _index_directory(self, tenant_id: str, index_name: str) -> Path:
+        """Get the directory holding the persisted files of one index."""
+        return self.search_directory / quote(tenant_id, safe='') / quote(index_name, safe='')
     
     def _load_persisted_data(self):
         """Load persisted search data from disk."""
         try:
-            index_file = self.data_directory / "search_indices.json"
-            if index_file.exists():
-                with open(index_file, 'r') as f:
-                    data = json.load(f)
+            total_docs = 0
+            
+            if self.search_directory.exists():
+                for tenant_dir in self.search_directory.iterdir():
+                    for index_dir in tenant_dir.iterdir():
+                        tenant_id, index_name = unquote(tenant_dir.name), unquote(index_dir.name)
+                        try:
+                            total_docs += self._load_index(tenant_id, index_name, index_dir)
+                        except Exception as e:
+                            logger.error(f"Error loading search index {index_name} for tenant {tenant_id}: {e}")
+            
+            # Migrate data written in the previous single-file JSON format
+            legacy_file = self.data_directory / "search_indices.json"
+            if legacy_file.exists():
+                total_docs += self._load_legacy_data(legacy_file)
+                self._legacy_file = legacy_file
+            
+            logger.info(f"Loaded {total_docs} documents from persistence")
+            
+        except Exception as e:
+            logger.error(f"Error loading persisted search data: {e}")
+    
+    def _load_index(self, tenant_id: str, index_name: str, index_dir: Path) -> int:
+        """Map one persisted index without re-tokenizing or re-inserting vectors."""
+        manifest_path = index_dir / "manifest.json"
+        if not manifest_path.exists():
+            return 0
+        
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        
+        documents = SearchDocumentStore.load(index_dir, manifest['documents'])
+        self.documents[tenant_id][index_name] = documents
+        self.bm25_indices[tenant_id][index_name] = BM25Scorer.load(index_dir / manifest['bm25'])
+        
+        if manifest.get('fields'):
+            with open(index_dir / manifest['fields'], 'r') as f:
+                self.field_indices[tenant_id][index_name] = FieldIndex.from_export(json.load(f))
+        else:
+            # Written before field indices were persisted
+            field_index = self.field_indices[tenant_id][index_name]
+            for doc_id in documents:
+                field_index.add_document(doc_id, documents[doc_id].content)
+            self._mark_dirty(tenant_id, index_name)
+        
+        if FAISS_AVAILABLE and manifest.get('vectors'):
+            self.vector_indices[tenant_id][index_name].load(
+                index_dir / manifest['vectors'], index_dir / manifest['vector_ids']
+            )
+        
+        return len(documents)
+    
+    def _load_legacy_data(self, index_file: Path) -> int:
+        """Rebuild indices from search_indices.json and mark them for rewriting."""
+        with open(index_file, 'r') as f:
+            data = json.load(f)
+        
+        total_docs = 0
+        for tenant_id, tenant_data in data.items():
+            for index_name, docs in tenant_data.items():
+                # Indices already in the binary format are newer
+                if index_name in self.documents.get(tenant_id, {}):
+                    continue
                 
-                # Rebuild indices from persisted documents
-                for tenant_id, tenant_data in data.items():
-                    for index_name, docs in tenant_data.items():
-                        for doc_id, doc_data in docs.items():
-                            # Convert datetime strings back to datetime objects
-                            doc_data['created_at'] = datetime.fromisoformat(doc_data['created_at'])
-                            doc_data['updated_at'] = datetime.fromisoformat(doc_data['updated_at'])
-                            
-                            search_doc = SearchDocument(**doc_data)
-                            self.documents[tenant_id][index_name][doc_id] = search_doc
-                            
-                            # Rebuild BM25 index
-                            if search_doc.text_fields:
-                                text_content = " ".join([
-                                    str(search_doc.content.get(field, "")) 
-                                    for field in search_doc.text_fields
-                                ])
-                                self.bm25_indices[tenant_id][index_name].add_document(doc_id, text_content)
-                            
-                            # Rebuild vector index
-                            if search_doc.vector_field and search_doc.vector_field in search_doc.content:
-                                vector_data = np.array([search_doc.content[search_doc.vector_field]], dtype=np.float32)
-                                self.vector_indices[tenant_id][index_name].add_vectors([doc_id], vector_data)
+                text_batch = []
                 
-                total_docs = sum(
-                    len(docs) for tenant_data in data.values() 
-                    for docs in tenant_data.values()
-                )
-                logger.info(f"Loaded {total_docs} documents from persistence")
+                for doc_id, doc_data in docs.items():
+                    search_doc = SearchDocument.from_dict(doc_data)
+                    vector = search_doc.content.get(search_doc.vector_field) if search_doc.vector_field else None
+                    search_doc.content = self._stored_content(search_doc.content, search_doc.vector_field)
+                    self.documents[tenant_id][index_name][doc_id] = search_doc
+                    self.field_indices[tenant_id][index_name].add_document(doc_id, search_doc.content)
+                    
+                    # Collect text for bulk BM25 indexing
+                    if search_doc.text_fields:
+                        text_content = " ".join([
+                            str(search_doc.content.get(field, "")) 
+                            for field in search_doc.text_fields
+                        ])
+                        text_batch.append((doc_id, text_content))
+                    
+                    # Rebuild vector index
+                    if vector is not None:
+                        vector_data = np.array([vector], dtype=np.float32)
+                        self.vector_indices[tenant_id][index_name].add_vectors([doc_id], vector_data)
                 
-        except Exception as e:
-            logger.error(f"Error loading persisted search data: {e}")
+                # Rebuild BM25 index
+                if text_batch:
+                    self.bm25_indices[tenant_id][index_name].index_documents(text_batch)
+                
+                self._mark_dirty(tenant_id, index_name)
+                total_docs += len(docs)
+        
+        return total_docs
     
     async def _periodic_persistence(self):
         """Background task to periodically persist data to disk."""
@@ -587,36 +2581,92 @@ class LocalSearchService(SearchService):
                 logger.error(f"Error in search persistence task: {e}")
     
     async def persist_data(self):
-        """Persist search data to disk."""
+        """Persist indices changed since the last call to disk."""
         try:
             with self._lock:
-                # Prepare data for persistence
-                persist_data = {}
-                
-                for tenant_id, tenant_indices in self.documents.items():
-                    persist_data[tenant_id] = {}
-                    
-                    for index_name, docs in tenant_indices.items():
-                        persist_data[tenant_id][index_name] = {}
-                        
-                        for doc_id, search_doc in docs.items():
-                            doc_dict = asdict(search_doc)
-                            # Convert datetime objects to ISO strings
-                            doc_dict['created_at'] = search_doc.created_at.isoformat()
-                            doc_dict['updated_at'] = search_doc.updated_at.isoformat()
-                            
-                            persist_data[tenant_id][index_name][doc_id] = doc_dict
-                
-                # Write to file
-                index_file = self.data_directory / "search_indices.json"
-                with open(index_file, 'w') as f:
-                    json.dump(persist_data, f, indent=2)
-                
-                logger.debug("Persisted search data to disk")
+                dirty_indices = sorted(self._dirty_indices)
+                self._dirty_indices.clear()
+            
+            loop = asyncio.get_running_loop()
+            failed = 0
+            
+            for tenant_id, index_name in dirty_indices:
+                try:
+                    await loop.run_in_executor(self.thread_pool, self._persist_index, tenant_id, index_name)
+                except Exception as e:
+                    failed += 1
+                    with self._lock:
+                        self._dirty_indices.add((tenant_id, index_name))
+                    logger.error(f"Error persisting search index {index_name} for tenant {tenant_id}: {e}")
+            
+            # The legacy file is superseded once every migrated index is written
+            if self._legacy_file is not None and not failed:
+                self._legacy_file.rename(self._legacy_file.with_name(self._legacy_file.name + ".migrated"))
+                self._legacy_file = None
+            
+            if dirty_indices:
+                logger.debug(f"Persisted {len(dirty_indices) - failed} search indices to disk")
                 
         except Exception as e:
             logger.error(f"Error persisting search data: {e}")
     
+    def _persist_index(self, tenant_id: str, index_name: str):
+        """
+        Write one index as a new generation of files and switch the manifest.
+        
+        Runs on a worker thread. Pending documents, BM25 arrays, field
+        postings and vectors are captured together under the index lock so
+        the files of a generation agree; they are written outside it. An
+        index changed while it is being written stays dirty and is written
+        again on the next pass.
+        """
+        directory = self._index_directory(tenant_id, index_name)
+        directory.mkdir(parents=True, exist_ok=True)
+        manifest_path = directory / "manifest.json"
+        
+        generation = 1
+        if manifest_path.exists():
+            with open(manifest_path, 'r') as f:
+                generation = json.load(f)['generation'] + 1
+        
+        documents, bm25_index, vector_index, field_index = self._open_index(tenant_id, index_name)
+        index_lock = self._index_lock(tenant_id, index_name)
+        with index_lock.reader:
+            document_snapshot = documents.snapshot()
+            bm25_arrays = bm25_index.export_arrays()
+            field_data = field_index.export()
+            vector_snapshot = vector_index.snapshot()
+        
+        manifest = {
+            "generation": generation,
+            "documents": f"documents.{generation}.idx.json",
+            "bm25": f"bm25.{generation}",
+            "fields": f"fields.{generation}.json",
+            "vectors": None,
+            "vector_ids": None
+        }
+        
+        offset_index = documents.flush(directory, manifest['documents'], index_lock.writer, document_snapshot)
+        BM25Scorer.save(directory / manifest['bm25'], bm25_arrays)
+        _write_json_atomic(directory / manifest['fields'], field_data)
+        if vector_snapshot is not None:
+            manifest['vectors'] = f"vectors.{generation}.faiss"
+            manifest['vector_ids'] = f"vectors.{generation}.json"
+            vector_index.save(directory / manifest['vectors'], directory / manifest['vector_ids'], vector_snapshot)
+        
+        _write_json_atomic(manifest_path, manifest)
+        
+        # Remove files of previous generations
+        keep = {manifest_path.name, offset_index['log_file']}
+        keep.update(name for name in manifest.values() if isinstance(name, str))
+        for path in directory.iterdir():
+            if path.name in keep:
+                continue
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+    
     def get_search_stats(self) -> Dict[str, Any]:
         """Get search service statistics."""
         with self._lock:
@@ -644,7 +2694,8 @@ class LocalSearchService(SearchService):
                 "total_indices": total_indices,
                 "tenant_stats": tenant_stats,
                 "faiss_available": FAISS_AVAILABLE,
-                "vector_dimension": self.settings.local.vector_dimensions
+                "vector_dimension": self.settings.local.vector_dimensions,
+                "result_cache": self.result_cache.get_stats()
             }
     
     async def shutdown(self):
@@ -659,4 +2710,7 @@ class LocalSearchService(SearchService):
         # Final persistence
         await self.persist_data()
         
+        self.thread_pool.shutdown(wait=True)
+        self.query_pool.shutdown(wait=True)
+        
         logger.info("Local search service shutdown complete")
\ No newline at end of file
@@ -8,7 +8,9 @@ import json
 import logging
 import hashlib
 import shutil
-from typing import Any, Dict, List, Optional, Tuple
+import socket
+import tempfile
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
 from datetime import datetime
 from dataclasses import dataclass, asdict
 from pathlib import Path
@@ -59,6 +61,72 @@ class StorageObject:
         return cls(**data)
 
 
+class ObjectStream:
+    """
+    An open, read-only view of a stored object or a byte range of it.
+    
+    Iterate with `async for` to read the range in chunks off the event loop
+    (FastAPI's StreamingResponse accepts the stream as is), or send it
+    zero-copy with sendfile(): fileno(), offset and length are exposed for
+    servers that call os.sendfile themselves. The file is opened when the
+    stream is created, so an overwrite of the object afterwards doesn't
+    change what is read. Close the stream when done, or use it as an async
+    context manager.
+    """
+    
+    def __init__(self, file, offset: int, length: int, size_bytes: int,
+                 content_type: str, etag: str, chunk_size: int):
+        self._file = file
+        self.offset = offset
+        self.length = length
+        self.size_bytes = size_bytes
+        self.content_type = content_type
+        self.etag = etag
+        self.chunk_size = chunk_size
+    
+    @property
+    def content_range(self) -> str:
+        """Content-Range header value for a partial (206) response."""
+        if not self.length:
+            return f"bytes */{self.size_bytes}"
+        return f"bytes {self.offset}-{self.offset + self.length - 1}/{self.size_bytes}"
+    
+    def fileno(self) -> int:
+        """File descriptor of the object, for os.sendfile."""
+        return self._file.fileno()
+    
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        position, end = self.offset, self.offset + self.length
+        while position < end:
+            # pread doesn't move a shared file position, so reads never race each other
+            chunk = await asyncio.to_thread(
+                os.pread, self.fileno(), min(self.chunk_size, end - position), position
+            )
+            if not chunk:
+                break
+            position += len(chunk)
+            yield chunk
+    
+    async def read(self) -> bytes:
+        """Read the whole range."""
+        return b"".join([chunk async for chunk in self])
+    
+    async def sendfile(self, sock: socket.socket) -> int:
+        """Send the range to a non-blocking socket with os.sendfile where available."""
+        loop = asyncio.get_running_loop()
+        return await loop.sock_sendfile(sock, self._file, self.offset, self.length)
+    
+    def close(self):
+        """Close the underlying file."""
+        self._file.close()
+    
+    async def __aenter__(self) -> 'ObjectStream':
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
 class LocalStorageService(StorageService):
     """
     Local file storage service that provides S3-like functionality.
@@ -72,6 +140,11 @@ class LocalStorageService(StorageService):
         self.data_directory = Path(self.settings.local.data_directory) / "storage"
         self.data_directory.mkdir(parents=True, exist_ok=True)
         
+        # Streamed uploads are written here and renamed into place, so they
+        # must stay on the same filesystem as the objects
+        self.upload_directory = self.data_directory / "uploads"
+        self.upload_directory.mkdir(parents=True, exist_ok=True)
+        
         self.metadata_directory = self.data_directory / "metadata"
         self.metadata_directory.mkdir(parents=True, exist_ok=True)
         
@@ -82,6 +155,7 @@ class LocalStorageService(StorageService):
         self.max_disk_gb = self.settings.local.max_disk_gb
         self.enable_versioning = True
         self.enable_compression = False  # Could be enabled for text files
+        self.stream_chunk_size = 1024 * 1024
         
         # Thread safety
         self._lock = threading.RLock()
@@ -253,21 +327,180 @@ class LocalStorageService(StorageService):
                     logger.warning(f"Object file missing: {object_path}")
                     return None
                 
-                # Read object data
-                with open(object_path, 'rb') as f:
-                    data = f.read()
+                # Open under the lock, read outside it
+                f = open(object_path, 'rb')
                 
                 # Update access time in metadata
                 storage_object = self.object_metadata[tenant_id][key]
                 storage_object.updated_at = datetime.now()
                 
-                logger.debug(f"Retrieved object {key} for tenant {tenant_id} ({len(data)} bytes)")
-                return data
+            with f:
+                data = await asyncio.to_thread(f.read)
+            
+            logger.debug(f"Retrieved object {key} for tenant {tenant_id} ({len(data)} bytes)")
+            return data
                 
         except Exception as e:
             logger.error(f"Error retrieving object {key} for tenant {tenant_id}: {e}")
             return None
     
+    async def open_object_stream(self, key: str, tenant_id: str,
+                                 byte_range: Optional[Tuple[Optional[int], Optional[int]]] = None
+                                 ) -> Optional[ObjectStream]:
+        """
+        Open an object for streaming without reading it into memory.
+        
+        byte_range is an inclusive (start, end) pair as in an HTTP Range
+        header: (start, None) reads to the end and (None, n) reads the last
+        n bytes. Returns None if the object doesn't exist and raises
+        ValueError if the range can't be satisfied.
+        """
+        if not tenant_id or not key:
+            return None
+        
+        try:
+            with self._lock:
+                if (tenant_id not in self.object_metadata or 
+                    key not in self.object_metadata[tenant_id]):
+                    return None
+                
+                object_path = self._get_object_path(tenant_id, key)
+                
+                if not object_path.exists():
+                    logger.warning(f"Object file missing: {object_path}")
+                    return None
+                
+                f = open(object_path, 'rb')
+                
+                storage_object = self.object_metadata[tenant_id][key]
+                storage_object.updated_at = datetime.now()
+        
+        except Exception as e:
+            logger.error(f"Error opening object {key} for tenant {tenant_id}: {e}")
+            return None
+        
+        try:
+            size_bytes = os.fstat(f.fileno()).st_size
+            offset, length = self._resolve_byte_range(byte_range, size_bytes)
+        except Exception:
+            f.close()
+            raise
+        
+        return ObjectStream(
+            f, offset, length, size_bytes,
+            storage_object.content_type, storage_object.etag, self.stream_chunk_size
+        )
+    
+    def _resolve_byte_range(self, byte_range: Optional[Tuple[Optional[int], Optional[int]]],
+                            size_bytes: int) -> Tuple[int, int]:
+        """Turn an inclusive (start, end) range into (offset, length) within an object."""
+        if byte_range is None:
+            return 0, size_bytes
+        
+        start, end = byte_range
+        if start is None:
+            # Suffix range: the last `end` bytes
+            if end is None or end <= 0:
+                raise ValueError(f"Invalid byte range {byte_range}")
+            start, end = max(size_bytes - end, 0), size_bytes - 1
+        elif end is None or end >= size_bytes:
+            end = size_bytes - 1
+        
+        if start < 0 or start > end or start >= size_bytes:
+            raise ValueError(f"Byte range {byte_range} not satisfiable for {size_bytes} bytes")
+        return start, end - start + 1
+    
+    async def put_object_stream(self, key: str, chunks: AsyncIterable[bytes], tenant_id: str,
+                                metadata: Dict[str, str] = None,
+                                content_type: Optional[str] = None) -> bool:
+        """
+        Store an object from an async iterable of byte chunks.
+        
+        Chunks are hashed as they are written to a temporary file, which is
+        renamed over the object only once the upload is complete, so readers
+        never see a partial object and memory use stays at one chunk.
+        content_type defaults to a guess from the key and the first chunk.
+        """
+        temp_path = None
+        try:
+            if not tenant_id:
+                raise ValueError("Tenant ID is required")
+            
+            if not key:
+                raise ValueError("Object key is required")
+            
+            if metadata is None:
+                metadata = {}
+            
+            # Check disk space as the upload grows
+            current_usage = await self._get_disk_usage()
+            max_usage_bytes = self.max_disk_gb * 1024 * 1024 * 1024
+            
+            fd, temp_name = tempfile.mkstemp(dir=self.upload_directory, suffix=".part")
+            temp_path = Path(temp_name)
+            md5 = hashlib.md5()
+            size_bytes = 0
+            with os.fdopen(fd, 'wb') as f:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    
+                    if content_type is None:
+                        content_type = self._get_content_type(key, chunk)
+                    
+                    size_bytes += len(chunk)
+                    if current_usage + size_bytes > max_usage_bytes:
+                        raise Exception(f"Storage quota exceeded. Current: {current_usage / (1024**3):.2f}GB, Max: {self.max_disk_gb}GB")
+                    
+                    md5.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            
+            if content_type is None:
+                content_type = self._get_content_type(key, b"")
+            
+            with self._lock:
+                object_path = self._get_object_path(tenant_id, key)
+                
+                # Handle versioning
+                version_id = None
+                if self.enable_versioning and object_path.exists():
+                    version_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+                    version_path = object_path.with_suffix(f".{version_id}{object_path.suffix}")
+                    shutil.move(str(object_path), str(version_path))
+                
+                os.replace(temp_path, object_path)
+                temp_path = None
+                
+                storage_object = StorageObject(
+                    key=key,
+                    tenant_id=tenant_id,
+                    size_bytes=size_bytes,
+                    content_type=content_type,
+                    etag=md5.hexdigest(),
+                    created_at=datetime.now(),
+                    updated_at=datetime.now(),
+                    metadata=metadata,
+                    version_id=version_id
+                )
+                
+                if tenant_id not in self.object_metadata:
+                    self.object_metadata[tenant_id] = {}
+                
+                self.object_metadata[tenant_id][key] = storage_object
+                
+                await self._persist_metadata(tenant_id)
+                
+                logger.debug(f"Stored streamed object {key} for tenant {tenant_id} ({size_bytes} bytes)")
+                return True
+        
+        except Exception as e:
+            logger.error(f"Error storing streamed object {key} for tenant {tenant_id}: {e}")
+            return False
+        
+        finally:
+            if temp_path is not None:
+                temp_path.unlink(missing_ok=True)
+    
     async def delete_object(self, key: str, tenant_id: str) -> bool:
         """Delete an object."""
         try:
@@ -358,23 +591,24 @@ class LocalStorageService(StorageService):
             if dest_tenant_id is None:
                 dest_tenant_id = tenant_id
             
-            # Get source object
-            source_data = await self.get_object(source_key, tenant_id)
-            if source_data is None:
-                return False
-            
             # Get source metadata
             source_metadata = await self.get_object_metadata(source_key, tenant_id)
             if source_metadata is None:
                 return False
             
-            # Copy to destination
-            return await self.put_object(
-                dest_key, 
-                source_data, 
-                dest_tenant_id, 
-                source_metadata.get('metadata', {})
-            )
+            # Stream the source to the destination
+            source = await self.open_object_stream(source_key, tenant_id)
+            if source is None:
+                return False
+            
+            async with source:
+                return await self.put_object_stream(
+                    dest_key, 
+                    source, 
+                    dest_tenant_id, 
+                    source_metadata.get('metadata', {}),
+                    content_type=source.content_type
+                )
             
         except Exception as e:
             logger.error(f"Error copying object {source_key} to {dest_key}: {e}")
@@ -9,7 +9,7 @@ existing infrastructure and provides seamless switching between cloud and local
 import asyncio
 import logging
 import uuid
-from typing import Any, Dict, List, Optional, Type, Union, Callable, AsyncIterator
+from typing import Any, Dict, Iterable, List, Optional, Type, Union, Callable, AsyncIterator
 from enum import Enum
 
 from backend.core.interfaces import (
@@ -77,7 +77,10 @@ class ServiceFacadeConfig:
         health_check_interval: int = 30,
         enable_metrics: bool = True,
         enable_agent_services: bool = True,
-        gcp_migration_enabled: bool = False
+        gcp_migration_enabled: bool = False,
+        near_cache_enabled: bool = False,
+        near_cache_max_entries: int = 10000,
+        near_cache_ttl_seconds: float = 5.0
     ):
         self.mode = mode
         self.aws_region = aws_region
@@ -86,6 +89,11 @@ class ServiceFacadeConfig:
         self.enable_metrics = enable_metrics
         self.enable_agent_services = enable_agent_services
         self.gcp_migration_enabled = gcp_migration_enabled
+        
+        # In-process L1 cache in front of the cache service
+        self.near_cache_enabled = near_cache_enabled
+        self.near_cache_max_entries = near_cache_max_entries
+        self.near_cache_ttl_seconds = near_cache_ttl_seconds
 
 
 class ServiceFacade:
@@ -107,6 +115,9 @@ class ServiceFacade:
         # Circuit breakers for each service type
         self._circuit_breakers: Dict[str, CircuitBreaker] = {}
         
+        # Near cache (L1) for the cache service, if enabled
+        self._near_cache = None
+        
         # Health monitoring
         self._health_checker = get_health_checker()
         self._degradation_handler = GracefulDegradationHandler()
@@ -131,6 +142,9 @@ class ServiceFacade:
             # Initialize circuit breakers
             self._initialize_circuit_breakers()
             
+            if self.config.near_cache_enabled:
+                await self._initialize_near_cache()
+            
             self.logger.info("Service facade initialization completed")
             
         except Exception as e:
@@ -233,6 +247,36 @@ class ServiceFacade:
             self._circuit_breakers[service_type] = create_default_circuit_breaker()
             self.logger.debug(f"Circuit breaker initialized for {service_type}")
     
+    async def _initialize_near_cache(self):
+        """Create the L1 cache and subscribe it to invalidations from other processes."""
+        from backend.infrastructure.local.services.near_cache import NearCache
+        self._near_cache = NearCache(
+            max_entries=self.config.near_cache_max_entries,
+            ttl_seconds=self.config.near_cache_ttl_seconds
+        )
+        
+        aws_cache = self._aws_services.get('cache')
+        if aws_cache is not None:
+            try:
+                await aws_cache.subscribe_invalidations(self._near_cache.apply_invalidation)
+            except Exception as e:
+                # Without invalidations, other processes' writes show after the L1 TTL
+                self.logger.warning(f"Near cache invalidation subscription failed: {e}")
+        
+        self.logger.info("Near cache enabled for the cache service")
+    
+    async def _publish_cache_invalidation(self, tenant_id: str, keys: List[str]):
+        """Tell other processes to drop keys from their near caches."""
+        aws_cache = self._aws_services.get('cache')
+        circuit_breaker = self._circuit_breakers.get('cache')
+        if aws_cache is None or (circuit_breaker and circuit_breaker.is_open):
+            return
+        
+        try:
+            await aws_cache.publish_invalidation(self._near_cache.invalidation_message(tenant_id, keys))
+        except Exception as e:
+            self.logger.warning(f"Failed to publish cache invalidation for tenant {tenant_id}: {e}")
+    
     async def _check_service_health(self, service_type: str) -> ServiceHealth:
         """Check health of a specific service type."""
         try:
@@ -513,34 +557,214 @@ class ComputeFacade(ComputeService):
         return await self.facade._execute_with_circuit_breaker(
             'compute', 'get_job_status', job_id, tenant_id
         )
+    
+    async def invoke_map(self, function_name: str, payloads: Iterable[Dict[str, Any]], tenant_id: str,
+                         concurrency: int = 10) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Invoke a function once per payload and stream per-item outcomes as they complete.
+        
+        The backend is chosen once for the whole batch. On AWS the batch is a
+        single circuit-breaker call: per-item errors are streamed back and
+        don't count against the breaker, while an error that aborts the batch
+        counts once and the items not yet delivered fall back to the local
+        job runner.
+        """
+        payloads = list(payloads)
+        config = self.facade.config
+        circuit_breaker = self.facade._circuit_breakers.get('compute')
+        aws_service = self.facade._aws_services.get('compute')
+        local_service = self.facade._local_services.get('compute')
+        delivered = set()
+        
+        if (aws_service is not None and config.mode in [ServiceMode.AWS_ONLY, ServiceMode.HYBRID] and
+                not (circuit_breaker and circuit_breaker.is_open)):
+            # Outcomes, then None when the batch succeeds or the exception that aborted it
+            outcomes: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+            
+            async def aws_batch():
+                async for outcome in aws_service.invoke_map(function_name, payloads, tenant_id, concurrency):
+                    await outcomes.put(outcome)
+            
+            async def run_batch():
+                try:
+                    await (circuit_breaker.execute(aws_batch) if circuit_breaker else aws_batch())
+                except Exception as e:
+                    await outcomes.put(e)
+                else:
+                    await outcomes.put(None)
+            
+            batch = asyncio.create_task(run_batch())
+            try:
+                while isinstance(outcome := await outcomes.get(), dict):
+                    delivered.add(outcome["index"])
+                    yield outcome
+            finally:
+                if not batch.done():
+                    batch.cancel()
+            
+            error = outcome
+            if error is None:
+                return
+            self.facade.logger.warning(f"AWS compute batch failed after {len(delivered)} items: {error}")
+            if config.mode not in [ServiceMode.LOCAL_ONLY, ServiceMode.HYBRID] or local_service is None:
+                if isinstance(error, CircuitBreakerOpenError):
+                    raise ServiceUnavailableError("compute service unavailable (circuit breaker open)")
+                raise error
+        
+        elif config.mode not in [ServiceMode.LOCAL_ONLY, ServiceMode.HYBRID] or local_service is None:
+            raise ServiceUnavailableError("No compute service available for invoke_map")
+        
+        # Local job runner, for the whole batch or for what AWS didn't deliver
+        remaining = [index for index in range(len(payloads)) if index not in delivered]
+        async for outcome in local_service.invoke_map(
+            function_name, [payloads[index] for index in remaining], tenant_id, concurrency
+        ):
+            outcome["index"] = remaining[outcome["index"]]
+            yield outcome
+    
+    # Completion notifications come from the local job runner; Lambda jobs
+    # have no equivalent, so these don't go through the circuit breaker
+    
+    def _local_job_runner(self):
+        job_runner = self.facade._local_services.get('compute')
+        if job_runner is None:
+            raise ServiceUnavailableError("Job notifications require the local job runner")
+        return job_runner
+    
+    async def wait_for_job(self, job_id: str, tenant_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await self._local_job_runner().wait_for_job(job_id, tenant_id, timeout)
+    
+    def watch_jobs(self, tenant_id: str) -> AsyncIterator[Dict[str, Any]]:
+        return self._local_job_runner().watch_jobs(tenant_id)
 
 
 class CacheFacade(CacheService):
-    """Cache service facade with AWS/local failover."""
+    """
+    Cache service facade with AWS/local failover.
+    
+    With the near cache enabled, reads are served from the in-process L1
+    first; writes and deletes update L1 and publish an invalidation so
+    other processes drop their copies.
+    """
     
     def __init__(self, service_facade: ServiceFacade):
         self.facade = service_facade
+        self.near_cache = service_facade._near_cache
     
     async def get(self, key: str, tenant_id: str) -> Optional[Any]:
-        return await self.facade._execute_with_circuit_breaker(
+        if self.near_cache is None:
+            return await self.facade._execute_with_circuit_breaker(
+                'cache', 'get', key, tenant_id
+            )
+        
+        found, value = self.near_cache.get(key, tenant_id)
+        if found:
+            return value
+        
+        token = self.near_cache.fill_token()
+        value = await self.facade._execute_with_circuit_breaker(
             'cache', 'get', key, tenant_id
         )
+        self.near_cache.fill(key, value, tenant_id, token)
+        return value
     
     async def set(self, key: str, value: Any, tenant_id: str, ttl: int = None) -> bool:
-        return await self.facade._execute_with_circuit_breaker(
+        if self.near_cache is not None:
+            self.near_cache.invalidate([key], tenant_id)
+        
+        result = await self.facade._execute_with_circuit_breaker(
             'cache', 'set', key, value, tenant_id, ttl
         )
     
+        if self.near_cache is not None and result:
+            self.near_cache.put(key, value, tenant_id, ttl)
+            await self.facade._publish_cache_invalidation(tenant_id, [key])
+        return result
+    
     async def delete(self, key: str, tenant_id: str) -> bool:
-        return await self.facade._execute_with_circuit_breaker(
+        if self.near_cache is not None:
+            self.near_cache.invalidate([key], tenant_id)
+        
+        result = await self.facade._execute_with_circuit_breaker(
             'cache', 'delete', key, tenant_id
         )
+        
+        if self.near_cache is not None:
+            await self.facade._publish_cache_invalidation(tenant_id, [key])
+        return result
     
     async def exists(self, key: str, tenant_id: str) -> bool:
         return await self.facade._execute_with_circuit_breaker(
             'cache', 'exists', key, tenant_id
         )
 
+    # Batch operations go through the circuit breaker once per batch
+    async def get_multiple(self, keys: List[str], tenant_id: str) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        if self.near_cache is None:
+            return await self.facade._execute_with_circuit_breaker(
+                'cache', 'get_multiple', keys, tenant_id
+            )
+        
+        # Only keys missing from L1 go to the cache service
+        result = {}
+        missing = []
+        for key in keys:
+            found, value = self.near_cache.get(key, tenant_id)
+            if found:
+                result[key] = value
+            else:
+                missing.append(key)
+        
+        if missing:
+            token = self.near_cache.fill_token()
+            fetched = await self.facade._execute_with_circuit_breaker(
+                'cache', 'get_multiple', missing, tenant_id
+            )
+            for key in missing:
+                value = fetched.get(key)
+                self.near_cache.fill(key, value, tenant_id, token)
+                result[key] = value
+        
+        return result
+    
+    async def set_multiple(self, key_value_pairs: Dict[str, Any], tenant_id: str, ttl: int = None) -> bool:
+        if not key_value_pairs:
+            return True
+        if self.near_cache is not None:
+            self.near_cache.invalidate(list(key_value_pairs), tenant_id)
+        
+        result = await self.facade._execute_with_circuit_breaker(
+            'cache', 'set_multiple', key_value_pairs, tenant_id, ttl
+        )
+        
+        if self.near_cache is not None and result:
+            for key, value in key_value_pairs.items():
+                self.near_cache.put(key, value, tenant_id, ttl)
+            await self.facade._publish_cache_invalidation(tenant_id, list(key_value_pairs))
+        return result
+    
+    async def delete_multiple(self, keys: List[str], tenant_id: str) -> int:
+        if not keys:
+            return 0
+        if self.near_cache is not None:
+            self.near_cache.invalidate(keys, tenant_id)
+        
+        result = await self.facade._execute_with_circuit_breaker(
+            'cache', 'delete_multiple', keys, tenant_id
+        )
+        
+        if self.near_cache is not None:
+            await self.facade._publish_cache_invalidation(tenant_id, list(keys))
+        return result
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get near cache statistics with separate L1 and L2 hit ratios."""
+        if self.near_cache is None:
+            return {"near_cache_enabled": False}
+        return {"near_cache_enabled": True, **self.near_cache.get_stats()}
+
 
 class StorageFacade(StorageService):
     """Storage service facade with AWS/local failover."""
@@ -1050,6 +1274,13 @@ class AgentComputeService:
             self.agent_type, operation
         )
 
+    async def wait_for_agent_job(self, job_id: str, tenant_id: str,
+                                 timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Wait for a scheduled agent job to finish and return its final status."""
+        # Not an agent operation: a slow job must not count against the agent's circuit breaker
+        compute_service = self.facade.get_compute_service()
+        return await compute_service.wait_for_job(job_id, tenant_id, timeout)
+
 
 # GCP Migration data classes (to be implemented)
 class GCPMigrationConfig:
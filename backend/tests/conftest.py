@@ -0,0 +1,72 @@
+"""
+Shared fixtures and helpers for the local service tests.
+
+The local services read their configuration from get_settings() when they
+are created; tests build a settings stand-in with make_local_settings()
+(or the local_settings fixture) and create services with create_service().
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+
+# Small limits so tests exercise eviction, quotas and concurrency quickly
+LOCAL_SETTINGS_DEFAULTS = {
+    "max_concurrent_jobs": 1,
+    "max_memory_mb": 16,
+    "max_disk_gb": 1,
+    "vector_dimensions": 8
+}
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "local_settings(**overrides): override fields of the local_settings fixture"
+    )
+
+
+def make_local_settings(data_directory, **overrides) -> SimpleNamespace:
+    """Local service settings pointing at `data_directory`; keyword arguments override the defaults."""
+    return SimpleNamespace(local=SimpleNamespace(
+        data_directory=str(data_directory),
+        **dict(LOCAL_SETTINGS_DEFAULTS, **overrides)
+    ))
+
+
+def create_service(service_class, settings):
+    """Create a local service with `settings` patched into its module (requires a running loop)."""
+    with patch(f"{service_class.__module__}.get_settings", return_value=settings):
+        return service_class()
+
+
+async def wait_for_status(runner, job_id: str, status, timeout: float = 3.0, tenant_id: str = "tenant_a"):
+    """Poll a local job runner until a job reaches `status` (a JobStatus)."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = await runner.get_job_status(job_id, tenant_id)
+        if job["status"] == status.value:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not reach {status.value}: {job}")
+
+
+@pytest.fixture
+def local_settings(tmp_path, request):
+    """
+    Local service settings pointing at a temporary data directory.
+
+    Override fields with @pytest.mark.local_settings(...) on a test, a
+    class or a module (pytestmark).
+    """
+    marker = request.node.get_closest_marker("local_settings")
+    return make_local_settings(tmp_path, **(marker.kwargs if marker else {}))
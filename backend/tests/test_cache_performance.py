@@ -0,0 +1,163 @@
+"""
+Performance benchmarks for the ElastiCache adapter.
+
+Tests:
+- Serializer encode + decode time and payload size versus the earlier
+  JSON/pickle encoding
+- get/set throughput with many concurrent requests, with the asyncio
+  client versus a client that blocks the event loop on every command
+
+Redis is replaced by an in-memory stand-in with a simulated round trip.
+
+Set SKIP_PERFORMANCE_TESTS=1 to skip these tests.
+
+Usage:
+    # Skip performance tests (default)
+    pytest backend/tests/test_cache_performance.py -v
+
+    # Run performance tests
+    SKIP_PERFORMANCE_TESTS=0 pytest backend/tests/test_cache_performance.py -v -s
+"""
+
+import asyncio
+import json
+import os
+import pickle
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from backend.infrastructure.aws.services import cache_serializer
+from backend.infrastructure.aws.services.cache_serializer import CacheSerializer
+from backend.infrastructure.aws.services.elasticache_adapter import AWSElastiCacheAdapter
+
+
+# Skip tests if performance tests are disabled
+SKIP_PERF_TESTS = os.getenv("SKIP_PERFORMANCE_TESTS", "1") == "1"
+skip_perf = pytest.mark.skipif(SKIP_PERF_TESTS, reason="Performance tests disabled")
+
+# Simulated network round trip per Redis command
+ROUND_TRIP_SECONDS = 0.0005
+
+TOOL_SCHEMA = {
+    "name": "search_meetings",
+    "description": "Search meeting transcripts and summaries for a tenant " * 4,
+    "parameters": {
+        "type": "object",
+        "properties": {
+            f"field_{i}": {"type": "string", "description": f"Filter on field {i}", "enum": ["a", "b", "c"]}
+            for i in range(20)
+        },
+        "required": ["query"]
+    },
+    "examples": [{"query": f"decisions about project {i}", "limit": 10} for i in range(10)]
+}
+
+
+def legacy_dumps(value) -> bytes:
+    """The adapter's earlier encoding: JSON for scalars, pickle otherwise."""
+    if isinstance(value, (str, int, float, bool)):
+        return json.dumps(value).encode('utf-8')
+    return pickle.dumps(value)
+
+
+class AsyncRedisStandIn:
+    """Redis stand-in whose commands await a simulated round trip."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def round_trip(self):
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+
+    async def get(self, key):
+        await self.round_trip()
+        return self.data.get(key)
+
+    async def set(self, key, value):
+        await self.round_trip()
+        self.data[key] = value
+        return True
+
+
+class BlockingRedisStandIn(AsyncRedisStandIn):
+    """Stand-in that blocks the event loop for the round trip, like sync redis-py."""
+
+    async def round_trip(self):
+        time.sleep(ROUND_TRIP_SECONDS)
+
+
+def create_adapter(redis_client, **kwargs) -> AWSElastiCacheAdapter:
+    module = "backend.infrastructure.aws.services.elasticache_adapter"
+    with patch(f"{module}.boto3"), patch(f"{module}.redis_asyncio"):
+        adapter = AWSElastiCacheAdapter("cache.example.com", **kwargs)
+    adapter._redis_client = redis_client
+    return adapter
+
+
+async def run_workload(adapter: AWSElastiCacheAdapter, concurrency: int, operations: int) -> float:
+    """Run reads (90%) and writes from concurrent tasks; returns operations per second."""
+    async def worker(worker_id: int):
+        for i in range(operations // concurrency):
+            key = f"tool:{(worker_id * 7 + i) % 100}"
+            if i % 10 == 0:
+                await adapter.set(key, TOOL_SCHEMA, "tenant_a")
+            else:
+                await adapter.get(key, "tenant_a")
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(n) for n in range(concurrency)])
+    return operations / (time.perf_counter() - start)
+
+
+@skip_perf
+def test_serializer_speed_and_size():
+    """Test compact encodings against the earlier JSON/pickle encoding."""
+    iterations = 20000
+    codecs = ["pickle"]
+    if cache_serializer.ORJSON_AVAILABLE:
+        codecs.insert(0, "orjson")
+    if cache_serializer.MSGPACK_AVAILABLE:
+        codecs.insert(0, "msgpack")
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        pickle.loads(legacy_dumps(TOOL_SCHEMA))
+    legacy_us = (time.perf_counter() - start) / iterations * 1e6
+    print(f"\nTool schema: earlier JSON/pickle {legacy_us:.1f}us, {len(legacy_dumps(TOOL_SCHEMA))} bytes")
+
+    thresholds = [None, 1024] if cache_serializer.ZSTD_AVAILABLE else [None]
+    for codec in codecs:
+        for threshold in thresholds:
+            serializer = CacheSerializer(codec, compression_threshold=threshold or 1 << 30)
+            payload = serializer.dumps(TOOL_SCHEMA)
+            start = time.perf_counter()
+            for _ in range(iterations):
+                serializer.loads(serializer.dumps(TOOL_SCHEMA))
+            elapsed_us = (time.perf_counter() - start) / iterations * 1e6
+            label = f"{codec} + zstd" if threshold else codec
+            print(f"  {label:<15} {elapsed_us:.1f}us, {len(payload)} bytes")
+            assert serializer.loads(payload) == TOOL_SCHEMA
+
+
+@skip_perf
+@pytest.mark.asyncio
+async def test_concurrent_throughput():
+    """Test concurrent requests overlap their round trips with the asyncio client."""
+    operations = 4000
+    concurrency = 64
+
+    async_ops = await run_workload(create_adapter(AsyncRedisStandIn()), concurrency, operations)
+    blocking_ops = await run_workload(create_adapter(BlockingRedisStandIn()), concurrency, operations)
+
+    print(f"\n{concurrency} concurrent tasks, {ROUND_TRIP_SECONDS * 1e3:.1f}ms round trip: "
+          f"asyncio client {async_ops:,.0f} ops/s, blocking client {blocking_ops:,.0f} ops/s")
+
+    assert async_ops > blocking_ops
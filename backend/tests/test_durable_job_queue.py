@@ -0,0 +1,303 @@
+"""
+Unit tests for the durable job queue behind the local job runner.
+
+Tests:
+- Idempotency keys, leases, visibility timeouts and acknowledgements
+- Dead-lettering after max retries or too many unfinished deliveries
+- Queued, scheduled and interrupted jobs surviving a restart
+"""
+
+import asyncio
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from conftest import create_service, wait_for_status
+from backend.infrastructure.local.services.durable_queue import DurableJobQueue
+from backend.infrastructure.local.services.job_runner import JobStatus, LocalJobRunner
+
+
+async def crash(runner: LocalJobRunner):
+    """Stop a runner without any shutdown bookkeeping, as if the process died."""
+    await asyncio.sleep(0)
+    tasks = runner.worker_tasks + [runner.scheduler_task]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    runner.job_store.close()
+    runner.thread_pool.shutdown(wait=False)
+    runner.process_pool.shutdown(wait=False)
+    runner._result_expiry.close()
+
+
+class TestDurableJobQueue:
+    """Test the SQLite job table."""
+
+    def test_idempotency_key_is_unique_per_tenant(self, tmp_path):
+        """Test a repeated key returns the existing job."""
+        queue = DurableJobQueue(tmp_path / "jobs.db")
+
+        assert queue.enqueue("job-1", "tenant_a", {"n": 1}, 0, 3, "key") == ("job-1", True)
+        assert queue.enqueue("job-2", "tenant_a", {"n": 2}, 0, 3, "key") == ("job-1", False)
+        assert queue.enqueue("job-3", "tenant_b", {"n": 3}, 0, 3, "key") == ("job-3", True)
+        assert queue.get_job("job-1") == {"n": 1}
+        queue.close()
+
+    def test_lease_hides_job_until_visibility_timeout(self, tmp_path):
+        """Test a leased job can't be leased again until its lease times out."""
+        queue = DurableJobQueue(tmp_path / "jobs.db")
+        queue.enqueue("job-1", "tenant_a", {}, 0, 3)
+
+        assert queue.lease("job-1", visibility_timeout=0.1)
+        assert not queue.lease("job-1", visibility_timeout=0.1)
+
+        time.sleep(0.15)
+        assert queue.lease("job-1", visibility_timeout=60)
+        assert queue.get_state("job-1", "tenant_a")["deliveries"] == 2
+        queue.close()
+
+    def test_acked_job_is_not_redelivered(self, tmp_path):
+        """Test ack() ends delivery and forget() frees the idempotency key."""
+        queue = DurableJobQueue(tmp_path / "jobs.db")
+        queue.enqueue("job-1", "tenant_a", {}, 0, 3, "key")
+        queue.lease("job-1", visibility_timeout=0)
+        queue.ack("job-1")
+
+        assert not queue.lease("job-1", visibility_timeout=60)
+        assert queue.pending_jobs() == []
+
+        queue.forget(["job-1"])
+        assert queue.enqueue("job-2", "tenant_a", {}, 0, 3, "key") == ("job-2", True)
+        queue.close()
+
+    def test_release_only_requeues_stored_jobs(self, tmp_path):
+        """Test release() puts a leased job back and ignores ids the queue doesn't have."""
+        queue = DurableJobQueue(tmp_path / "jobs.db")
+        queue.enqueue("job-1", "tenant_a", {"attempt": 1}, 0, 3)
+        queue.lease("job-1", visibility_timeout=60)
+
+        assert queue.release("job-1", {"attempt": 2}, 0, 3, error="boom")
+        assert not queue.release("job-2", {}, 0, 3)
+
+        assert queue.get_state("job-1", "tenant_a")["state"] == DurableJobQueue.QUEUED
+        assert [job for _, job in queue.pending_jobs()] == [{"attempt": 2}]
+        queue.close()
+
+    def test_unfinished_deliveries_are_dead_lettered(self, tmp_path):
+        """Test a job that keeps losing its lease is dead-lettered, and can be requeued."""
+        queue = DurableJobQueue(tmp_path / "jobs.db")
+        queue.enqueue("job-1", "tenant_a", {}, 0, 2)
+
+        assert queue.lease("job-1", visibility_timeout=0)
+        assert queue.lease("job-1", visibility_timeout=0)
+        assert not queue.lease("job-1", visibility_timeout=0)
+
+        dead_letters = queue.list_dead_letters("tenant_a")
+        assert [job["job_id"] for job in dead_letters] == ["job-1"]
+        assert queue.get_stats()["dead"] == 1
+
+        assert not queue.requeue_dead_letter("job-1", "tenant_b")
+        assert queue.requeue_dead_letter("job-1", "tenant_a")
+        assert queue.lease("job-1", visibility_timeout=0)
+        queue.close()
+
+    def test_pending_jobs_survive_reopen(self, tmp_path):
+        """Test queued and leased jobs are loaded again after reopening the database."""
+        queue = DurableJobQueue(tmp_path / "jobs.db")
+        queue.enqueue_many([
+            ("job-1", "tenant_a", {"n": 1}, 100, 3, None),
+            ("job-2", "tenant_a", {"n": 2}, 0, 3, None),
+            ("job-3", "tenant_a", {"n": 3}, 0, 3, None)
+        ])
+        queue.lease("job-3", visibility_timeout=60)
+        queue.ack("job-3")
+        queue.lease("job-2", visibility_timeout=60)
+        queue.close()
+
+        reopened = DurableJobQueue(tmp_path / "jobs.db")
+        pending = reopened.pending_jobs()
+
+        assert [job for _, job in pending] == [{"n": 1}, {"n": 2}]
+        assert pending[1][0] > time.time() + 50
+        reopened.close()
+
+
+class TestRunnerDurability:
+    """Test the job runner's use of the durable queue."""
+
+    @pytest.mark.asyncio
+    async def test_idempotent_schedule_runs_once(self, local_settings):
+        """Test scheduling twice with one idempotency key returns the same job."""
+        runner = create_service(LocalJobRunner, local_settings)
+        try:
+            first = await runner.schedule_job({"function_name": "echo", "idempotency_key": "k"}, "tenant_a")
+            second = await runner.schedule_job({"function_name": "echo", "idempotency_key": "k"}, "tenant_a")
+
+            assert first == second
+            await wait_for_status(runner, first, JobStatus.COMPLETED)
+            assert runner.get_job_stats()["durable_queue"]["done"] == 1
+        finally:
+            await runner.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_failed_job_is_dead_lettered_and_requeued(self, local_settings):
+        """Test a job that exhausts its retries lands in the dead-letter queue."""
+        runner = create_service(LocalJobRunner, local_settings)
+        outcomes = ["fail", "fail"]
+
+        def flaky(payload):
+            if outcomes:
+                raise RuntimeError(outcomes.pop())
+            return "ok"
+
+        runner.function_registry.register_function("flaky", flaky)
+        try:
+            job_id = await runner.schedule_job(
+                {"function_name": "flaky", "max_retries": 1, "retry_delay_seconds": 0}, "tenant_a"
+            )
+            await wait_for_status(runner, job_id, JobStatus.FAILED)
+
+            dead_letters = await runner.list_dead_letters("tenant_a")
+            assert [(job["job_id"], job["error"]) for job in dead_letters] == [(job_id, "fail")]
+
+            assert await runner.requeue_dead_letter(job_id, "tenant_a")
+            job = await wait_for_status(runner, job_id, JobStatus.COMPLETED)
+            assert job["result"] == "ok"
+        finally:
+            await runner.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_queued_and_scheduled_jobs_survive_crash(self, local_settings):
+        """Test jobs queued before a crash run after the restart."""
+        runner = create_service(LocalJobRunner, local_settings)
+        scheduled_id = await runner.schedule_job({
+            "function_name": "echo",
+            "scheduled_at": datetime.now() + timedelta(milliseconds=300)
+        }, "tenant_a")
+        await crash(runner)
+
+        restarted = create_service(LocalJobRunner, local_settings)
+        try:
+            assert (await restarted.get_job_status(scheduled_id, "tenant_a"))["status"] == "pending"
+            await wait_for_status(restarted, scheduled_id, JobStatus.COMPLETED)
+        finally:
+            await restarted.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_running_job_is_redelivered_after_lease_expires(self, local_settings):
+        """Test a job running when the process died is redelivered once its lease times out."""
+        runner = create_service(LocalJobRunner, local_settings)
+        runner.visibility_grace_seconds = 0
+        started = asyncio.Event()
+
+        async def hang(payload):
+            started.set()
+            await asyncio.Event().wait()
+
+        runner.function_registry.register_function("task", hang)
+        job_id = await runner.schedule_job({"function_name": "task", "timeout_seconds": 1}, "tenant_a")
+        await asyncio.wait_for(started.wait(), timeout=1)
+        await crash(runner)
+
+        restarted = create_service(LocalJobRunner, local_settings)
+
+        async def finish(payload):
+            return "done"
+
+        restarted.function_registry.register_function("task", finish)
+        try:
+            assert len(restarted.delayed_jobs) == 1
+            job = await wait_for_status(restarted, job_id, JobStatus.COMPLETED)
+            assert job["result"] == "done"
+        finally:
+            await restarted.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_shutdown_releases_running_jobs(self, local_settings):
+        """Test jobs interrupted by a clean shutdown are redelivered at once on restart."""
+        runner = create_service(LocalJobRunner, local_settings)
+        started = asyncio.Event()
+
+        async def hang(payload):
+            started.set()
+            await asyncio.Event().wait()
+
+        runner.function_registry.register_function("task", hang)
+        job_id = await runner.schedule_job({"function_name": "task"}, "tenant_a")
+        await asyncio.wait_for(started.wait(), timeout=1)
+        await runner.shutdown()
+
+        restarted = create_service(LocalJobRunner, local_settings)
+
+        async def finish(payload):
+            return "done"
+
+        restarted.function_registry.register_function("task", finish)
+        try:
+            assert len(restarted.delayed_jobs) == 0
+            assert (await restarted.get_job_status(job_id, "tenant_a"))["status"] == "pending"
+            await wait_for_status(restarted, job_id, JobStatus.COMPLETED, timeout=1.0)
+        finally:
+            await restarted.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_sync_invocations_stay_out_of_the_store(self, local_settings):
+        """Test synchronous invocations are never stored, even when retried or cut off by shutdown."""
+        runner = create_service(LocalJobRunner, local_settings)
+        outcomes = ["fail"]
+
+        def flaky(payload):
+            if outcomes:
+                raise RuntimeError(outcomes.pop())
+            return "ok"
+
+        runner.function_registry.register_function("flaky", flaky)
+        with pytest.raises(Exception, match="Job failed"):
+            await runner.invoke_function("flaky", {"max_retries": 1}, "tenant_a")
+        assert runner.get_job_stats()["durable_queue"] == {"queued": 0, "running": 0, "done": 0, "dead": 0}
+
+        invocation = asyncio.create_task(runner.invoke_function("sleep_test", {"sleep_seconds": 0.2}, "tenant_a"))
+        await asyncio.sleep(0.05)
+        await runner.shutdown()
+        assert (await invocation)["slept_for"] == 0.2
+
+        restarted = create_service(LocalJobRunner, local_settings)
+        try:
+            assert restarted.get_job_stats()["durable_queue"] == {"queued": 0, "running": 0, "done": 0, "dead": 0}
+        finally:
+            await restarted.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_store_error_does_not_fail_a_completed_job(self, local_settings):
+        """Test a job whose ack fails stays completed and is not run again."""
+        runner = create_service(LocalJobRunner, local_settings)
+        calls = []
+
+        def record(payload):
+            calls.append(payload)
+            return "ok"
+
+        def locked(job_id):
+            raise sqlite3.OperationalError("database is locked")
+
+        runner.function_registry.register_function("record", record)
+        runner.job_store.ack = locked
+        try:
+            job_id = await runner.schedule_job({"function_name": "record", "retry_delay_seconds": 0}, "tenant_a")
+            job = await wait_for_status(runner, job_id, JobStatus.COMPLETED)
+            await asyncio.sleep(0.1)
+
+            assert job["result"] == "ok"
+            assert len(calls) == 1
+            assert len(runner.delayed_jobs) == 0
+        finally:
+            await runner.shutdown()
@@ -0,0 +1,251 @@
+"""
+Unit tests for the ElastiCache adapter's keyspace operations.
+
+Tests:
+- Pattern listing walks the keyspace with SCAN instead of KEYS
+- Tenant flushes UNLINK in bounded batches
+- Versioned tenant namespaces flush in O(1)
+- Compact serialization with compression and decoding of older payloads
+
+Redis is replaced by an in-memory stand-in.
+"""
+
+import fnmatch
+import json
+import pickle
+import sys
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from backend.infrastructure.aws.services import cache_serializer
+from backend.infrastructure.aws.services.cache_serializer import CacheSerializer, PAYLOAD_VERSION
+from backend.infrastructure.aws.services.elasticache_adapter import AWSElastiCacheAdapter
+
+
+class FakePipeline:
+    """Buffers commands and runs them on execute(), like a redis.asyncio pipeline."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __getattr__(self, command):
+        def buffer(*args):
+            self.commands.append((command, args))
+            return self
+        return buffer
+
+    async def execute(self):
+        return [await getattr(self.redis, command)(*args) for command, args in self.commands]
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis.asyncio commands the adapter uses."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.calls = []
+        self._scan_order = []
+
+    def _record(self, command, *args):
+        self.calls.append((command, args))
+
+    async def get(self, key):
+        self._record("get", key)
+        return self.data.get(key)
+
+    async def set(self, key, value):
+        self._record("set", key)
+        self.data[key] = value
+        return True
+
+    async def setex(self, key, ttl, value):
+        self._record("setex", key, ttl)
+        self.data[key] = value
+        self.ttls[key] = ttl
+        return True
+
+    async def incr(self, key):
+        self._record("incr", key)
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+        return int(self.data[key])
+
+    async def unlink(self, *keys):
+        self._record("unlink", *keys)
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def mget(self, keys):
+        self._record("mget", *keys)
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def keys(self, pattern):
+        raise AssertionError("KEYS must not be used")
+
+    async def scan(self, cursor, match=None, count=10):
+        # Like Redis, keys deleted mid-scan don't cause others to be skipped
+        self._record("scan", cursor, count)
+        if cursor == 0:
+            self._scan_order = sorted(self.data)
+        page = self._scan_order[cursor:cursor + count]
+        next_cursor = cursor + count if cursor + count < len(self._scan_order) else 0
+        return next_cursor, [
+            key.encode() for key in page
+            if key in self.data and (match is None or fnmatch.fnmatchcase(key, match))
+        ]
+
+
+@pytest.fixture
+def make_adapter():
+    """Build adapters whose Redis client is the in-memory stand-in."""
+    def make(**kwargs) -> AWSElastiCacheAdapter:
+        module = "backend.infrastructure.aws.services.elasticache_adapter"
+        with patch(f"{module}.boto3"), patch(f"{module}.redis_asyncio"):
+            adapter = AWSElastiCacheAdapter("cache.example.com", **kwargs)
+        adapter._redis_client = FakeRedis()
+        return adapter
+    return make
+
+
+class TestKeyspaceScans:
+    """Test SCAN-based listing and UNLINK-based flushes."""
+
+    @pytest.mark.asyncio
+    async def test_get_keys_by_pattern_scans(self, make_adapter):
+        """Test listing pages through SCAN and strips the tenant prefix."""
+        adapter = make_adapter(scan_count=2)
+        for i in range(5):
+            await adapter.set(f"session:{i}", i, "tenant_a")
+        await adapter.set("session:0", 0, "tenant_b")
+        await adapter.set("profile", 1, "tenant_a")
+
+        keys = await adapter.get_keys_by_pattern("session:*", "tenant_a")
+
+        assert sorted(keys) == [f"session:{i}" for i in range(5)]
+        # COUNT bounds keys examined per step, matching or not: 7 keys in 4 steps
+        scans = [args for command, args in adapter.redis_client.calls if command == "scan"]
+        assert len(scans) == 4
+
+    @pytest.mark.asyncio
+    async def test_flush_unlinks_in_batches(self, make_adapter):
+        """Test a tenant flush removes only its keys, in bounded UNLINK batches."""
+        adapter = make_adapter(scan_count=4, unlink_batch_size=3)
+        for i in range(7):
+            await adapter.set(f"k{i}", i, "tenant_a")
+        await adapter.set("k0", 0, "tenant_b")
+
+        assert await adapter.flush_tenant_cache("tenant_a")
+
+        unlinks = [args for command, args in adapter.redis_client.calls if command == "unlink"]
+        assert [len(keys) for keys in unlinks] == [3, 3, 1]
+        assert list(adapter.redis_client.data) == ["tenant_b:k0"]
+
+
+class TestNamespaceVersioning:
+    """Test O(1) tenant flushes through namespace versions."""
+
+    @pytest.mark.asyncio
+    async def test_flush_bumps_version(self, make_adapter):
+        """Test a flush hides old keys without touching them."""
+        adapter = make_adapter(namespace_versioning=True)
+        await adapter.set("persona", "formal", "tenant_a")
+        await adapter.set("persona", "casual", "tenant_b")
+
+        assert await adapter.flush_tenant_cache("tenant_a")
+
+        assert await adapter.get("persona", "tenant_a") is None
+        assert await adapter.get("persona", "tenant_b") == "casual"
+        assert "tenant_a:v0:persona" in adapter.redis_client.data
+        assert not any(command == "unlink" for command, _ in adapter.redis_client.calls)
+
+        await adapter.set("persona", "direct", "tenant_a")
+        assert await adapter.get_keys_by_pattern("*", "tenant_a") == ["persona"]
+
+    @pytest.mark.asyncio
+    async def test_versioned_keys_always_expire(self, make_adapter):
+        """Test writes without a TTL get namespace_key_ttl so old versions are reclaimed."""
+        adapter = make_adapter(namespace_versioning=True, namespace_key_ttl=3600)
+        await adapter.set("persona", "formal", "tenant_a")
+        await adapter.set("short", "value", "tenant_a", ttl=60)
+
+        assert adapter.redis_client.ttls == {"tenant_a:v0:persona": 3600, "tenant_a:v0:short": 60}
+
+    @pytest.mark.asyncio
+    async def test_other_processes_see_new_version_after_refresh(self, make_adapter):
+        """Test a flush in one process reaches another once its cached version is stale."""
+        writer = make_adapter(namespace_versioning=True)
+        reader = make_adapter(namespace_versioning=True, namespace_refresh_seconds=0)
+        reader._redis_client = writer.redis_client
+        await writer.set("persona", "formal", "tenant_a")
+        assert await reader.get("persona", "tenant_a") == "formal"
+
+        await writer.flush_tenant_cache("tenant_a")
+
+        assert await reader.get("persona", "tenant_a") is None
+
+
+class TestCacheSerializer:
+    """Test value encoding."""
+
+    @pytest.mark.parametrize("codec", ["orjson", "msgpack", "pickle"])
+    def test_round_trip(self, codec):
+        """Test each installed codec round-trips typical values, falling back to pickle."""
+        if codec == "orjson" and not cache_serializer.ORJSON_AVAILABLE:
+            pytest.skip("orjson not installed")
+        if codec == "msgpack" and not cache_serializer.MSGPACK_AVAILABLE:
+            pytest.skip("msgpack not installed")
+        serializer = CacheSerializer(codec)
+
+        values = [
+            "text", 42, 1.5, True, None, {"tools": [{"name": "search", "args": ["q"]}]},
+            datetime(2024, 5, 1, 12, 30), {"when": datetime(2024, 5, 1)}, {1, 2}
+        ]
+        for value in values:
+            payload = serializer.dumps(value)
+            assert payload[0] == PAYLOAD_VERSION
+            assert serializer.loads(payload) == value
+
+    def test_large_payloads_compressed(self):
+        """Test bodies above the threshold are zstd-compressed when available."""
+        serializer = CacheSerializer(compression_threshold=256)
+        value = {"transcript": "hello world " * 500}
+
+        payload = serializer.dumps(value)
+
+        assert serializer.loads(payload) == value
+        if cache_serializer.ZSTD_AVAILABLE:
+            assert payload[1] & cache_serializer.FLAG_ZSTD
+            assert len(payload) < len(json.dumps(value))
+
+    def test_reads_earlier_payloads(self):
+        """Test values written as JSON or pickle by the earlier adapter still decode."""
+        serializer = CacheSerializer()
+
+        assert serializer.loads(json.dumps("formal").encode("utf-8")) == "formal"
+        assert serializer.loads(json.dumps(7).encode("utf-8")) == 7
+        assert serializer.loads(pickle.dumps({"a": (1, 2)})) == {"a": (1, 2)}
+
+    @pytest.mark.asyncio
+    async def test_adapter_batches_round_trip(self, make_adapter):
+        """Test pipelined writes and MGET reads go through the serializer."""
+        adapter = make_adapter()
+        assert await adapter.set_multiple({"a": {"x": 1}, "b": [1, 2]}, "tenant_a", ttl=60)
+
+        assert await adapter.get_multiple(["a", "b", "c"], "tenant_a") == {"a": {"x": 1}, "b": [1, 2], "c": None}
+        assert all(value[0] == PAYLOAD_VERSION for value in adapter.redis_client.data.values())
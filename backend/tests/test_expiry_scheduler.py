@@ -0,0 +1,137 @@
+"""
+Unit tests for the shared expiry scheduler of the local services.
+
+Tests:
+- Due keys fire in one batch per handle; rescheduled and cancelled keys don't
+- Stale heap items are compacted away
+- Memory, session and cache expiry through registered callbacks
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from conftest import create_service
+from backend.infrastructure.local.services.expiry_scheduler import ExpiryScheduler
+from backend.infrastructure.local.services.memory_service import (
+    LocalCacheService, LocalMemoryService
+)
+
+
+@pytest.fixture
+def scheduler():
+    """A private scheduler patched in place of the shared one."""
+    scheduler = ExpiryScheduler()
+    with patch(
+        "backend.infrastructure.local.services.memory_service.get_expiry_scheduler",
+        return_value=scheduler
+    ):
+        yield scheduler
+
+
+class TestExpiryScheduler:
+    """Test the deadline heap."""
+
+    def test_due_keys_fire_once_in_batches(self):
+        """Test only keys past their deadline fire, batched per handle."""
+        scheduler = ExpiryScheduler()
+        fired = {"a": [], "b": []}
+        handle_a = scheduler.register("a", fired["a"].extend)
+        handle_b = scheduler.register("b", fired["b"].extend)
+
+        handle_a.schedule("k1", 100)
+        handle_a.schedule("k2", 200)
+        handle_a.schedule("k3", 300)
+        handle_b.schedule("k1", 150)
+
+        assert scheduler.run_due(now=250) == 3
+        assert sorted(fired["a"]) == ["k1", "k2"]
+        assert fired["b"] == ["k1"]
+        assert scheduler.run_due(now=250) == 0
+        assert len(handle_a) == 1
+
+    def test_reschedule_and_cancel(self):
+        """Test a rescheduled key fires at its new deadline and a cancelled one never."""
+        scheduler = ExpiryScheduler()
+        fired = []
+        handle = scheduler.register("a", fired.extend)
+
+        handle.schedule("k1", 100)
+        handle.schedule("k1", 500)
+        handle.schedule("k2", 100)
+        handle.cancel("k2")
+
+        assert scheduler.run_due(now=400) == 0
+        assert scheduler.run_due(now=500) == 1
+        assert fired == ["k1"]
+
+        handle.schedule("k3", 600)
+        handle.close()
+        assert scheduler.run_due(now=1000) == 0
+        assert scheduler.get_stats()["pending"] == 0
+
+    def test_stale_items_are_compacted(self):
+        """Test rescheduling the same key does not grow the heap without bound."""
+        scheduler = ExpiryScheduler()
+        handle = scheduler.register("a", lambda keys: None)
+
+        for i in range(10000):
+            handle.schedule("k1", 100 + i)
+
+        stats = scheduler.get_stats()
+        assert stats["pending"] == 1
+        assert stats["heap_size"] <= 2 * stats["pending"] + 1024
+
+
+class TestServiceExpiry:
+    """Test local services expire items through the scheduler."""
+
+    @pytest.mark.asyncio
+    async def test_memory_entries_expire_without_scan(self, scheduler, local_settings):
+        """Test expired memory entries are dropped when their timer fires."""
+        service = create_service(LocalMemoryService, local_settings)
+        await service.put_memory("user-1", "short", "value", "tenant_a", ttl_hours=1)
+        await service.put_memory("user-1", "long", "value", "tenant_a", ttl_hours=48)
+        service.memory_store["tenant_a:user-1:short"].expires_at = datetime.now() - timedelta(seconds=1)
+
+        scheduler.run_due(now=time.time() + 2 * 3600)
+
+        assert "tenant_a:user-1:short" not in service.memory_store
+        assert "tenant_a:user-1:long" in service.memory_store
+        await service.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_idle_sessions_expire_and_active_ones_rearm(self, scheduler, local_settings):
+        """Test idle sessions are removed and active ones get a new timer."""
+        service = create_service(LocalMemoryService, local_settings)
+        idle_id = await service.create_session("tenant_a", "agent", "user-1", {})
+        active_id = await service.create_session("tenant_a", "agent", "user-2", {})
+        (await service.get_session(idle_id, "tenant_a")).last_activity = datetime.now() - timedelta(hours=25)
+
+        scheduler.run_due(now=time.time() + 25 * 3600)
+
+        assert await service.get_session(idle_id, "tenant_a") is None
+        assert await service.get_session(active_id, "tenant_a") is not None
+        assert len(service._session_expiry) == 1
+        await service.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_cache_expires_without_reads(self, scheduler):
+        """Test LocalCacheService drops expired keys that are never read again."""
+        cache = LocalCacheService()
+        await cache.set("short", "value", "tenant_a", ttl=1)
+        await cache.set("forever", "value", "tenant_a")
+        cache._cache["tenant_a:short"]["expires_at"] = time.time() - 1
+
+        scheduler.run_due(now=time.time() + 10)
+
+        assert "tenant_a:short" not in cache._cache
+        assert "tenant_a:forever" in cache._cache
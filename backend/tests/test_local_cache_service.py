@@ -0,0 +1,94 @@
+"""
+Unit tests for the local cache service and the cache facade's batch operations.
+
+Tests:
+- get_multiple, set_multiple and delete_multiple on LocalCacheService
+- Expired keys read as missing in a batch
+- CacheFacade makes one circuit-breaker call per batch
+"""
+
+import sys
+import time
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from backend.infrastructure.local.services.memory_service import LocalCacheService
+
+
+class TestLocalCacheBatch:
+    """Test batch operations on LocalCacheService."""
+
+    @pytest.mark.asyncio
+    async def test_set_and_get_multiple(self):
+        """Test a batch round-trips and missing keys map to None."""
+        cache = LocalCacheService()
+        assert await cache.set_multiple({"a": 1, "b": {"nested": True}}, "tenant_a")
+        await cache.set("c", "other tenant", "tenant_b")
+
+        assert await cache.get_multiple(["a", "b", "c"], "tenant_a") == {
+            "a": 1, "b": {"nested": True}, "c": None
+        }
+
+    @pytest.mark.asyncio
+    async def test_set_multiple_with_ttl_expires(self):
+        """Test a shared TTL is scheduled and expired keys read as missing."""
+        cache = LocalCacheService()
+        await cache.set_multiple({"a": 1, "b": 2}, "tenant_a", ttl=60)
+        assert len(cache._expiry) == 2
+
+        cache._cache["tenant_a:a"]["expires_at"] = time.time() - 1
+
+        assert await cache.get_multiple(["a", "b"], "tenant_a") == {"a": None, "b": 2}
+        assert "tenant_a:a" not in cache._cache
+
+    @pytest.mark.asyncio
+    async def test_delete_multiple_counts_removed_keys(self):
+        """Test delete_multiple removes only existing keys of the tenant."""
+        cache = LocalCacheService()
+        await cache.set_multiple({"a": 1, "b": 2}, "tenant_a", ttl=60)
+        await cache.set("a", 1, "tenant_b")
+
+        assert await cache.delete_multiple(["a", "b", "missing"], "tenant_a") == 2
+        assert await cache.exists("a", "tenant_b")
+        assert len(cache._expiry) == 0
+
+
+class TestCacheFacadeBatch:
+    """Test the cache facade routes each batch through one breaker call."""
+
+    @pytest.fixture
+    def service_facade(self):
+        service_facade = MagicMock(_near_cache=None)
+        service_facade._execute_with_circuit_breaker = AsyncMock(return_value={"a": 1, "b": None})
+        return service_facade
+
+    @pytest.mark.asyncio
+    async def test_one_breaker_call_per_batch(self, service_facade):
+        """Test get_multiple makes a single circuit-breaker call for all keys."""
+        from backend.infrastructure.service_facade import CacheFacade
+
+        cache = CacheFacade(service_facade)
+        result = await cache.get_multiple(["a", "b"], "tenant_a")
+
+        assert result == {"a": 1, "b": None}
+        service_facade._execute_with_circuit_breaker.assert_awaited_once_with(
+            'cache', 'get_multiple', ["a", "b"], "tenant_a"
+        )
+
+    @pytest.mark.asyncio
+    async def test_empty_batches_skip_the_breaker(self, service_facade):
+        """Test empty batches return without touching a backend."""
+        from backend.infrastructure.service_facade import CacheFacade
+
+        cache = CacheFacade(service_facade)
+
+        assert await cache.get_multiple([], "tenant_a") == {}
+        assert await cache.set_multiple({}, "tenant_a") is True
+        assert await cache.delete_multiple([], "tenant_a") == 0
+        service_facade._execute_with_circuit_breaker.assert_not_awaited()
@@ -0,0 +1,587 @@
+"""
+Unit tests for the local job runner (in-process fallback for AWS Lambda).
+
+Tests:
+- Priority order and weighted fair queuing across tenants in JobQueue
+- Delay heap ordering and wake-up
+- Scheduled jobs wait in the delay heap instead of a worker
+- Retries back off exponentially through the delay heap
+- Execution lanes and shared-memory payloads for the process lane
+- Completion notifications through wait_for_job and watch_jobs
+- Bounded fan-out with invoke_map and the facade's local fallback
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from conftest import create_service, wait_for_status
+from backend.infrastructure.fan_out import map_as_completed
+from backend.infrastructure.local.services.job_runner import (
+    DelayedJobQueue, ExecutionLane, FunctionRegistry, JobConfig, JobPriority, JobQueue,
+    JobStatus, LocalJobRunner, SharedArrayRef, _attach_arrays, _share_arrays
+)
+
+
+def make_job(job_id: str, tenant_id: str = "tenant_a", **kwargs) -> JobConfig:
+    """Create an echo job config."""
+    return JobConfig(job_id=job_id, tenant_id=tenant_id, function_name="echo", payload={}, **kwargs)
+
+
+def describe_array(payload):
+    """Process-lane function reporting where it ran and how it received its array."""
+    data = payload["data"]
+    return {"pid": os.getpid(), "sum": float(data.sum()), "owndata": bool(data.flags.owndata)}
+
+
+async def drain(queue: JobQueue) -> list:
+    """Get every queued job id in dequeue order."""
+    job_ids = []
+    while len(queue):
+        job_ids.append((await queue.get()).job_id)
+    return job_ids
+
+
+class TestJobQueue:
+    """Test the priority queue and per-tenant fairness."""
+
+    @pytest.mark.asyncio
+    async def test_priority_order_and_fifo_within_tenant(self):
+        """Test higher priorities come first and a tenant's jobs stay in order."""
+        queue = JobQueue()
+        await queue.put(make_job("low", priority=JobPriority.LOW))
+        await queue.put(make_job("normal-1"))
+        await queue.put(make_job("critical", priority=JobPriority.CRITICAL))
+        await queue.put(make_job("normal-2"))
+
+        assert await drain(queue) == ["critical", "normal-1", "normal-2", "low"]
+
+    @pytest.mark.asyncio
+    async def test_flooding_tenant_does_not_starve_others(self):
+        """Test a tenant arriving behind a backlog is interleaved with it."""
+        queue = JobQueue()
+        for i in range(10):
+            await queue.put(make_job(f"a{i}", priority=JobPriority.HIGH))
+        await queue.put(make_job("b0", "tenant_b", priority=JobPriority.HIGH))
+        await queue.put(make_job("b1", "tenant_b", priority=JobPriority.HIGH))
+
+        assert (await drain(queue))[:4] == ["a0", "b0", "a1", "b1"]
+
+    @pytest.mark.asyncio
+    async def test_weights_set_tenant_share(self):
+        """Test a tenant with weight 2 gets two jobs for every one of a weight-1 tenant."""
+        queue = JobQueue()
+        queue.set_tenant_weight("tenant_b", 2.0)
+        for i in range(6):
+            await queue.put(make_job(f"a{i}"))
+            await queue.put(make_job(f"b{i}", "tenant_b"))
+
+        first_six = (await drain(queue))[:6]
+        assert sum(job_id.startswith("b") for job_id in first_six) == 4
+
+    @pytest.mark.asyncio
+    async def test_idle_tenant_gets_no_banked_credit(self):
+        """Test a tenant returning after idling starts at the current virtual time."""
+        queue = JobQueue()
+        await queue.put(make_job("b0", "tenant_b"))
+        await drain(queue)
+
+        for i in range(4):
+            await queue.put(make_job(f"a{i}"))
+        await queue.get()
+        for i in range(1, 4):
+            await queue.put(make_job(f"b{i}", "tenant_b"))
+
+        assert await drain(queue) == ["a1", "b1", "a2", "b2", "a3", "b3"]
+
+    @pytest.mark.asyncio
+    async def test_waiting_getter_and_cancellation(self):
+        """Test a blocked get wakes on put and a cancelled get loses no job."""
+        queue = JobQueue()
+        cancelled = asyncio.create_task(queue.get())
+        waiting = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        await queue.put(make_job("job"))
+
+        assert (await asyncio.wait_for(waiting, timeout=1)).job_id == "job"
+        assert len(queue) == 0
+
+    @pytest.mark.asyncio
+    async def test_depth_metrics(self):
+        """Test per-priority and per-tenant depths track puts and gets."""
+        queue = JobQueue()
+        await queue.put(make_job("a0", priority=JobPriority.HIGH))
+        await queue.put(make_job("a1"))
+        await queue.put(make_job("b0", "tenant_b"))
+        await queue.get()
+
+        assert queue.qsize()[JobPriority.HIGH] == 0
+        assert queue.qsize()[JobPriority.NORMAL] == 2
+        assert queue.tenant_sizes() == {"tenant_a": 1, "tenant_b": 1}
+
+
+class TestDelayedJobQueue:
+    """Test the delay heap."""
+
+    def test_pops_due_jobs_in_run_at_order(self):
+        """Test only due jobs are returned, earliest first."""
+        queue = DelayedJobQueue()
+        queue.put(make_job("late"), run_at=300)
+        queue.put(make_job("early"), run_at=100)
+        queue.put(make_job("middle"), run_at=200)
+
+        assert [job.job_id for job in queue.pop_due(now=250)] == ["early", "middle"]
+        assert queue.next_run_at() == 300
+        assert len(queue) == 1
+
+    @pytest.mark.asyncio
+    async def test_earlier_job_wakes_waiter(self):
+        """Test adding a new earliest job ends the scheduler's sleep."""
+        queue = DelayedJobQueue()
+        queue.put(make_job("late"), run_at=time.time() + 60)
+        queue.clear_changed()
+
+        waiter = asyncio.create_task(queue.wait(timeout=60))
+        await asyncio.sleep(0)
+        queue.put(make_job("soon"), run_at=time.time())
+
+        await asyncio.wait_for(waiter, timeout=1)
+
+
+class TestDelayedExecution:
+    """Test scheduled jobs and retries go through the delay heap."""
+
+    @pytest.mark.asyncio
+    async def test_scheduled_job_does_not_hold_a_worker(self, local_settings):
+        """Test a job scheduled for later leaves the only worker free."""
+        runner = create_service(LocalJobRunner, local_settings)
+        try:
+            later_id = await runner.schedule_job({
+                "function_name": "echo",
+                "scheduled_at": (datetime.now() + timedelta(minutes=5)).isoformat()
+            }, "tenant_a")
+            now_id = await runner.schedule_job({"function_name": "echo"}, "tenant_a")
+
+            await wait_for_status(runner, now_id, JobStatus.COMPLETED, timeout=1.0)
+            assert (await runner.get_job_status(later_id, "tenant_a"))["status"] == "pending"
+            assert runner.get_job_stats()["delayed_jobs"] == 1
+            assert runner.get_job_stats()["tenant_queue_depths"] == {}
+        finally:
+            await runner.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_scheduled_job_runs_when_due(self, local_settings):
+        """Test the timer promotes a scheduled job once its time comes."""
+        runner = create_service(LocalJobRunner, local_settings)
+        try:
+            scheduled_at = datetime.now() + timedelta(milliseconds=200)
+            job_id = await runner.schedule_job(
+                {"function_name": "echo", "scheduled_at": scheduled_at}, "tenant_a"
+            )
+
+            await asyncio.sleep(0.05)
+            assert len(runner.delayed_jobs) == 1
+
+            job = await wait_for_status(runner, job_id, JobStatus.COMPLETED)
+            assert datetime.fromisoformat(job["started_at"]) >= scheduled_at
+            assert len(runner.delayed_jobs) == 0
+        finally:
+            await runner.shutdown()
+
+    def test_retry_delay_backs_off_exponentially(self):
+        """Test the retry delay doubles per attempt up to the cap."""
+        job = make_job("job", retry_delay_seconds=5, max_retry_delay_seconds=30)
+
+        assert [job.retry_delay(n) for n in range(1, 6)] == [5, 10, 20, 30, 30]
+
+    @pytest.mark.asyncio
+    async def test_failed_attempt_is_held_in_delay_heap(self, local_settings):
+        """Test a failed attempt returns at once and is rescheduled with backoff."""
+        runner = create_service(LocalJobRunner, local_settings)
+
+        def fail(payload):
+            raise RuntimeError("boom")
+
+        runner.function_registry.register_function("fail", fail)
+        try:
+            job = make_job("job", retry_delay_seconds=10, retry_count=1)
+            job.function_name = "fail"
+
+            started = time.time()
+            result = await runner._execute_job(job)
+
+            assert time.time() - started < 1
+            assert result.status == JobStatus.RETRYING
+            assert result.retry_count == 2
+            assert job.retry_count == 2
+            assert runner.delayed_jobs.next_run_at() == pytest.approx(started + 20, abs=1)
+        finally:
+            await runner.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_flaky_job_completes_after_retries(self, local_settings):
+        """Test retries carry the attempt count and logs until the job succeeds."""
+        runner = create_service(LocalJobRunner, local_settings)
+        attempts = []
+
+        def flaky(payload):
+            attempts.append(payload)
+            if len(attempts) < 3:
+                raise RuntimeError(f"attempt {len(attempts)} failed")
+            return {"attempts": len(attempts)}
+
+        runner.function_registry.register_function("flaky", flaky)
+        try:
+            job_id = await runner.schedule_job(
+                {"function_name": "flaky", "max_retries": 3, "retry_delay_seconds": 0}, "tenant_a"
+            )
+
+            job = await wait_for_status(runner, job_id, JobStatus.COMPLETED)
+            assert job["result"] == {"attempts": 3}
+            assert job["retry_count"] == 2
+            assert job["logs"] == ["Retry 1: attempt 1 failed", "Retry 2: attempt 2 failed"]
+        finally:
+            await runner.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_job_fails_after_max_retries(self, local_settings):
+        """Test a job that keeps failing stops after max_retries."""
+        runner = create_service(LocalJobRunner, local_settings)
+        attempts = []
+
+        def fail(payload):
+            attempts.append(payload)
+            raise RuntimeError("boom")
+
+        runner.function_registry.register_function("fail", fail)
+        try:
+            job_id = await runner.schedule_job(
+                {"function_name": "fail", "max_retries": 2, "retry_delay_seconds": 0}, "tenant_a"
+            )
+
+            job = await wait_for_status(runner, job_id, JobStatus.FAILED)
+            assert len(attempts) == 3
+            assert job["retry_count"] == 2
+        finally:
+            await runner.shutdown()
+
+
+class TestExecutionLanes:
+    """Test lane declaration and process-lane execution."""
+
+    def test_default_lanes(self):
+        """Test coroutine functions default to the async lane and sync ones to threads."""
+        registry = FunctionRegistry()
+
+        async def fetch(payload):
+            return payload
+
+        registry.register_function("fetch", fetch)
+        registry.register_function("describe", describe_array, {"lane": "process"})
+        registry.register_function("echo", lambda payload: payload)
+
+        assert registry.get_lane("fetch") == ExecutionLane.ASYNC
+        assert registry.get_lane("describe") == ExecutionLane.PROCESS
+        assert registry.get_function_metadata("describe")["lane"] == "process"
+        assert registry.get_lane("echo") == ExecutionLane.THREAD
+
+    def test_invalid_lanes_are_rejected(self):
+        """Test mismatched lanes and unpicklable process-lane functions fail at registration."""
+        registry = FunctionRegistry()
+
+        async def fetch(payload):
+            return payload
+
+        with pytest.raises(ValueError):
+            registry.register_function("fetch", fetch, {"lane": "thread"})
+        with pytest.raises(ValueError):
+            registry.register_function("describe", describe_array, {"lane": "async"})
+        with pytest.raises(ValueError):
+            registry.register_function("echo", lambda payload: payload, {"lane": "process"})
+        with pytest.raises(ValueError):
+            registry.register_function("describe", describe_array, {"lane": "gpu"})
+        assert registry.list_functions() == []
+
+    def test_share_and_attach_arrays(self):
+        """Test large arrays are swapped for shared-memory refs and come back equal."""
+        large = np.arange(1000, dtype=np.float64)
+        small = np.arange(10)
+        segments, attached = [], []
+        try:
+            shared = _share_arrays({"large": [large], "small": small, "n": 1}, 1024, segments)
+
+            assert isinstance(shared["large"][0], SharedArrayRef)
+            assert shared["small"] is small
+            assert len(segments) == 1
+
+            payload = _attach_arrays(shared, attached)
+            assert np.array_equal(payload["large"][0], large)
+            assert not payload["large"][0].flags.owndata
+            del payload
+        finally:
+            for segment in attached + segments:
+                segment.close()
+            for segment in segments:
+                segment.unlink()
+
+    @pytest.mark.asyncio
+    async def test_process_lane_runs_in_pool_with_shared_array(self, local_settings):
+        """Test a process-lane job runs in another process and reads its array from shared memory."""
+        runner = create_service(LocalJobRunner, local_settings)
+        runner.shared_memory_min_bytes = 1024
+        runner.function_registry.register_function("describe", describe_array, {"lane": "process"})
+        try:
+            result = await runner.invoke_function(
+                "describe", {"data": np.ones(100_000, dtype=np.float32)}, "tenant_a"
+            )
+
+            assert result["pid"] != os.getpid()
+            assert result["sum"] == 100_000
+            assert result["owndata"] is False
+        finally:
+            await runner.shutdown()
+
+
+class TestCompletionNotifications:
+    """Test waiting for and watching jobs without polling."""
+
+    @pytest.mark.asyncio
+    async def test_wait_for_job_wakes_on_completion(self, local_settings):
+        """Test a waiter gets the final status when the job finishes."""
+        runner = create_service(LocalJobRunner, local_settings)
+        try:
+            job_id = await runner.schedule_job({"function_name": "echo", "payload": {"n": 1}}, "tenant_a")
+
+            job = await runner.wait_for_job(job_id, "tenant_a", timeout=1)
+
+            assert job["status"] == "completed"
+            assert job["result"]["echo"] == {"n": 1}
+            assert runner._job_waiters == {}
+        finally:
+            await runner.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_wait_for_job_wakes_on_failure_after_retries(self, local_settings):
+        """Test a waiter is not woken by retries, only by the final failure."""
+        runner = create_service(LocalJobRunner, local_settings)
+
+        def fail(payload):
+            raise RuntimeError("boom")
+
+        runner.function_registry.register_function("fail", fail)
+        try:
+            job_id = await runner.schedule_job(
+                {"function_name": "fail", "max_retries": 2, "retry_delay_seconds": 0}, "tenant_a"
+            )
+
+            job = await runner.wait_for_job(job_id, "tenant_a", timeout=1)
+
+            assert job["status"] == "failed"
+            assert job["retry_count"] == 2
+        finally:
+            await runner.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_wait_for_finished_unknown_and_slow_jobs(self, local_settings):
+        """Test finished jobs return at once, unknown jobs raise and slow ones time out."""
+        runner = create_service(LocalJobRunner, local_settings)
+        try:
+            job_id = await runner.schedule_job({"function_name": "echo"}, "tenant_a")
+            await runner.wait_for_job(job_id, "tenant_a", timeout=1)
+            assert (await runner.wait_for_job(job_id, "tenant_a", timeout=0))["status"] == "completed"
+
+            with pytest.raises(ValueError):
+                await runner.wait_for_job("missing", "tenant_a", timeout=1)
+
+            later_id = await runner.schedule_job({
+                "function_name": "echo",
+                "scheduled_at": datetime.now() + timedelta(minutes=5)
+            }, "tenant_a")
+            with pytest.raises(asyncio.TimeoutError):
+                await runner.wait_for_job(later_id, "tenant_a", timeout=0.05)
+            assert runner._job_waiters == {}
+        finally:
+            await runner.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_watch_jobs_streams_tenant_events(self, local_settings):
+        """Test a watcher sees its own tenant's status changes in order, and the stream ends on shutdown."""
+        runner = create_service(LocalJobRunner, local_settings)
+        events = []
+
+        async def watch():
+            async for event in runner.watch_jobs("tenant_a"):
+                events.append((event["job_id"], event["status"]))
+
+        watcher = asyncio.create_task(watch())
+        await asyncio.sleep(0)
+
+        other_id = await runner.schedule_job({"function_name": "echo"}, "tenant_b")
+        job_id = await runner.schedule_job({"function_name": "echo"}, "tenant_a")
+        await runner.wait_for_job(job_id, "tenant_a", timeout=1)
+        await runner.wait_for_job(other_id, "tenant_b", timeout=1)
+
+        await runner.shutdown()
+        await asyncio.wait_for(watcher, timeout=1)
+
+        assert events == [(job_id, "running"), (job_id, "completed")]
+        assert runner._job_watchers == {}
+
+    @pytest.mark.asyncio
+    async def test_slow_watcher_drops_oldest_events(self, local_settings):
+        """Test a full watcher queue keeps the newest events."""
+        runner = create_service(LocalJobRunner, local_settings)
+        runner.watch_queue_size = 2
+        try:
+            stream = runner.watch_jobs("tenant_a")
+            first = asyncio.create_task(stream.__anext__())
+            await asyncio.sleep(0)
+
+            for n in range(3):
+                job_id = await runner.schedule_job({"function_name": "echo", "payload": {"n": n}}, "tenant_a")
+                await runner.wait_for_job(job_id, "tenant_a", timeout=1)
+
+            assert (await first)["status"] == "running"
+            remaining = [await stream.__anext__() for _ in range(2)]
+            assert [(event["result"] or {}).get("echo") for event in remaining] == [None, {"n": 2}]
+            await stream.aclose()
+        finally:
+            await runner.shutdown()
+
+
+class TestInvokeMap:
+    """Test map-style fan-out over many payloads."""
+
+    @pytest.mark.asyncio
+    async def test_map_bounds_concurrency_and_streams_as_completed(self):
+        """Test outcomes arrive in completion order with a fixed number in flight."""
+        in_flight, peak = 0, 0
+
+        async def work(delay):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(delay)
+            in_flight -= 1
+            if delay == 0.02:
+                raise ValueError("bad item")
+            return delay
+
+        outcomes = [outcome async for outcome in map_as_completed(work, [0.05, 0.01, 0.02, 0.03, 0.0], 2)]
+
+        assert peak == 2
+        assert [outcome["index"] for outcome in outcomes] == [1, 2, 0, 4, 3]
+        assert outcomes[1] == {"index": 2, "status": "failed", "error": "bad item", "error_type": "ValueError"}
+        assert outcomes[0] == {"index": 1, "status": "completed", "result": 0.01}
+
+    @pytest.mark.asyncio
+    async def test_map_stops_when_consumer_stops(self):
+        """Test closing the stream early cancels the remaining items."""
+        started = []
+
+        async def work(item):
+            started.append(item)
+            await asyncio.sleep(0.01 * item)
+            return item
+
+        stream = map_as_completed(work, range(100), 3)
+        assert (await stream.__anext__())["index"] == 0
+        await stream.aclose()
+
+        assert len(started) < 10
+
+    @pytest.mark.asyncio
+    async def test_runner_invoke_map_reports_item_errors(self, local_settings):
+        """Test a failing payload is reported in the stream without retries or affecting the others."""
+        runner = create_service(LocalJobRunner, local_settings)
+        calls = []
+
+        def square(payload):
+            calls.append(payload["n"])
+            if payload["n"] == 3:
+                raise RuntimeError("three")
+            return payload["n"] ** 2
+
+        runner.function_registry.register_function("square", square)
+        try:
+            outcomes = [
+                outcome async for outcome in runner.invoke_map("square", [{"n": n} for n in range(6)], "tenant_a", 4)
+            ]
+        finally:
+            await runner.shutdown()
+
+        by_index = {outcome["index"]: outcome for outcome in outcomes}
+        assert sorted(by_index) == list(range(6))
+        assert by_index[3]["status"] == "failed" and by_index[3]["error"] == "three"
+        assert [by_index[n]["result"] for n in (0, 1, 2, 4, 5)] == [0, 1, 4, 16, 25]
+        assert sorted(calls) == list(range(6))
+
+
+class TestComputeFacadeNotifications:
+    """Test the compute facade hands waits to the local job runner."""
+
+    @pytest.mark.asyncio
+    async def test_wait_for_job_uses_local_runner(self, local_settings):
+        """Test wait_for_job bypasses the circuit breaker and needs the local runner."""
+        from backend.infrastructure.service_facade import ComputeFacade, ServiceUnavailableError
+
+        runner = create_service(LocalJobRunner, local_settings)
+        service_facade = MagicMock(_local_services={"compute": runner})
+        try:
+            job_id = await runner.schedule_job({"function_name": "echo"}, "tenant_a")
+
+            job = await ComputeFacade(service_facade).wait_for_job(job_id, "tenant_a", timeout=1)
+
+            assert job["status"] == "completed"
+            service_facade._execute_with_circuit_breaker.assert_not_called()
+        finally:
+            await runner.shutdown()
+
+        with pytest.raises(ServiceUnavailableError):
+            await ComputeFacade(MagicMock(_local_services={})).wait_for_job(job_id, "tenant_a")
+
+    @pytest.mark.asyncio
+    async def test_invoke_map_falls_back_for_undelivered_items(self, local_settings):
+        """Test items an aborted AWS batch didn't deliver are run by the local runner."""
+        from backend.infrastructure.service_facade import ComputeFacade, ServiceMode
+
+        class FailingLambda:
+            async def invoke_map(self, function_name, payloads, tenant_id, concurrency):
+                for index in (2, 0):
+                    yield {"index": index, "status": "completed", "result": "aws"}
+                raise ConnectionError("Lambda throttled")
+
+        runner = create_service(LocalJobRunner, local_settings)
+        service_facade = MagicMock(
+            config=SimpleNamespace(mode=ServiceMode.HYBRID),
+            _circuit_breakers={},
+            _aws_services={"compute": FailingLambda()},
+            _local_services={"compute": runner}
+        )
+        try:
+            outcomes = [
+                outcome async for outcome in ComputeFacade(service_facade).invoke_map(
+                    "echo", [{"n": n} for n in range(5)], "tenant_a", concurrency=2
+                )
+            ]
+        finally:
+            await runner.shutdown()
+
+        assert [outcome["index"] for outcome in outcomes[:2]] == [2, 0]
+        assert sorted(outcome["index"] for outcome in outcomes) == list(range(5))
+        local = {outcome["index"]: outcome["result"] for outcome in outcomes[2:]}
+        assert local[4]["echo"] == {"n": 4}
@@ -0,0 +1,377 @@
+"""
+Unit tests for the local memory service (in-process fallback for Agent Core).
+
+Tests:
+- Byte accounting and budget enforcement in BoundedMemoryStore
+- LRU, LFU and TTL-first eviction policies
+- Eviction counters and O(1) memory statistics
+- WAL group commit, snapshot compaction and crash recovery
+- Session and memory key indexes behind listing and idle cleanup
+"""
+
+import asyncio
+import json
+import sys
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from conftest import create_service
+from backend.infrastructure.local.services.memory_service import (
+    BoundedMemoryStore, LocalMemoryService, MemoryEntry, MemoryWriteAheadLog
+)
+
+
+def make_entry(key: str, value="x" * 100, expires_in: float = None) -> MemoryEntry:
+    """Create a memory entry for user-1 in tenant_a."""
+    now = datetime.now()
+    return MemoryEntry(
+        key=key,
+        value=value,
+        tenant_id="tenant_a",
+        user_id="user-1",
+        created_at=now,
+        updated_at=now,
+        expires_at=now + timedelta(seconds=expires_in) if expires_in is not None else None
+    )
+
+
+def make_store(policy: str, capacity: int = 3) -> BoundedMemoryStore:
+    """Create a store with room for `capacity` entries from make_entry."""
+    entry_size = BoundedMemoryStore.measure("k0", make_entry("k0"))
+    return BoundedMemoryStore(max_bytes=entry_size * capacity, policy=policy)
+
+
+class TestBoundedMemoryStore:
+    """Test byte accounting and eviction policies."""
+
+    def test_accounting_follows_puts_replaces_and_deletes(self):
+        """Test the running total matches the sizes of the stored entries."""
+        store = BoundedMemoryStore(max_bytes=1024 * 1024)
+        store.put("k1", make_entry("k1"))
+        store.put("k2", make_entry("k2", value={"notes": ["a"] * 50}))
+        store.put("k1", make_entry("k1", value="y" * 1000))
+        del store["k2"]
+
+        assert store.total_bytes == store["k1"].size_bytes
+        assert store["k1"].size_bytes == BoundedMemoryStore.measure("k1", store["k1"])
+        assert store.get_stats()["evictions"] == 0
+
+    def test_lru_evicts_least_recently_used(self):
+        """Test LRU keeps recently read entries."""
+        store = make_store("lru")
+        for key in ["k1", "k2", "k3"]:
+            store.put(key, make_entry(key))
+        store.touch("k1")
+        store.put("k4", make_entry("k4"))
+
+        assert set(store) == {"k1", "k3", "k4"}
+        assert store.total_bytes <= store.max_bytes
+        assert store.evictions == 1
+
+    def test_lfu_evicts_least_frequently_used(self):
+        """Test LFU keeps frequently read entries even if not read recently."""
+        store = make_store("lfu")
+        for key in ["k1", "k2", "k3"]:
+            store.put(key, make_entry(key))
+        for _ in range(3):
+            store.touch("k1")
+        store.touch("k2")
+        store.touch("k3")
+        store.touch("k3")
+        store.put("k4", make_entry("k4"))
+
+        assert set(store) == {"k1", "k3", "k4"}
+
+    def test_ttl_evicts_soonest_to_expire(self):
+        """Test TTL-first evicts by expiry, then least recently used."""
+        store = make_store("ttl")
+        store.put("k1", make_entry("k1"))
+        store.put("k2", make_entry("k2", expires_in=3600))
+        store.put("k3", make_entry("k3", expires_in=60))
+        store.put("k4", make_entry("k4"))
+        assert set(store) == {"k1", "k2", "k4"}
+
+        store.put("k5", make_entry("k5"))
+        store.put("k6", make_entry("k6"))
+        assert set(store) == {"k4", "k5", "k6"}
+
+    def test_expired_entries_go_first(self):
+        """Test expired entries are evicted before the policy's choice."""
+        store = make_store("lru")
+        store.put("k1", make_entry("k1"))
+        store.put("k2", make_entry("k2", expires_in=-1))
+        store.put("k3", make_entry("k3"))
+        store.put("k4", make_entry("k4"))
+
+        assert set(store) == {"k1", "k3", "k4"}
+        assert store.expired_evictions == 1
+
+    def test_oversized_entry_is_rejected(self):
+        """Test an entry larger than the budget leaves the store untouched."""
+        store = make_store("lru")
+        store.put("k1", make_entry("k1"))
+
+        assert not store.put("k1", make_entry("k1", value="x" * 10000))
+        assert store["k1"].value == "x" * 100
+        assert store.rejections == 1
+        with pytest.raises(ValueError):
+            store["k2"] = make_entry("k2", value="x" * 10000)
+
+
+@pytest.mark.local_settings(max_memory_mb=1)
+class TestLocalMemoryServiceBudget:
+    """Test max_memory_mb is enforced by the service."""
+
+    @pytest.mark.asyncio
+    async def test_budget_enforced_with_stats(self, local_settings):
+        """Test puts beyond max_memory_mb evict and stats report the totals."""
+        service = create_service(LocalMemoryService, local_settings)
+        value = "x" * 100 * 1024
+
+        for i in range(9):
+            assert await service.put_memory("user-1", f"note-{i}", value, "tenant_a")
+        await service.get_memory("user-1", "note-0", "tenant_a")
+        for i in range(9, 12):
+            assert await service.put_memory("user-1", f"note-{i}", value, "tenant_a")
+
+        stats = service.get_memory_stats()
+        assert stats["memory_usage_bytes"] <= 1024 * 1024
+        assert stats["evictions"] > 0
+        assert stats["eviction_policy"] == "lru"
+        assert await service.get_memory("user-1", "note-0", "tenant_a") == value
+        assert await service.get_memory("user-1", "note-1", "tenant_a") is None
+
+        assert not await service.put_memory("user-1", "huge", "x" * 2 * 1024 * 1024, "tenant_a")
+        await service.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_persisted_entries_reload_within_budget(self, local_settings):
+        """Test reloaded entries are re-measured against the budget."""
+        service = create_service(LocalMemoryService, local_settings)
+        await service.put_memory("user-1", "profile", {"name": "Ada"}, "tenant_a")
+        await service.shutdown()
+
+        reloaded = create_service(LocalMemoryService, local_settings)
+        assert await reloaded.get_memory("user-1", "profile", "tenant_a") == {"name": "Ada"}
+        assert reloaded.get_memory_stats()["memory_usage_bytes"] == reloaded.memory_store.total_bytes > 0
+        await reloaded.shutdown()
+
+
+async def crash(service: LocalMemoryService):
+    """Stop a service without its final snapshot, as if the process died."""
+    await asyncio.sleep(0)  # Let the background tasks start
+    for task in [service._persistence_task, service._wal_flush_task]:
+        task.cancel()
+    service.wal.flush()
+    service.wal.close()
+    service._wal_executor.shutdown(wait=True)
+    service._memory_expiry.close()
+    service._session_expiry.close()
+
+
+class TestWriteAheadLog:
+    """Test WAL persistence and recovery."""
+
+    def test_replay_stops_at_torn_tail(self, tmp_path):
+        """Test a partially written record is discarded and truncated."""
+        wal = MemoryWriteAheadLog(tmp_path)
+        wal.append(MemoryWriteAheadLog.DELETE_MEMORY, b"first")
+        wal.append(MemoryWriteAheadLog.DELETE_MEMORY, b"second")
+        wal.flush()
+        wal.close()
+
+        log_path = tmp_path / "memory.1.wal"
+        with open(log_path, "ab") as f:
+            f.write(MemoryWriteAheadLog.encode(MemoryWriteAheadLog.DELETE_MEMORY, b"third")[:-2])
+        size = log_path.stat().st_size
+
+        replayed = list(MemoryWriteAheadLog(tmp_path).replay())
+
+        assert replayed == [(2, b"first"), (2, b"second")]
+        assert log_path.stat().st_size < size
+
+    @pytest.mark.asyncio
+    async def test_recovers_unsnapshotted_writes_after_crash(self, local_settings):
+        """Test puts, evictions and session changes survive a crash via the WAL tail."""
+        service = create_service(LocalMemoryService, local_settings)
+        await asyncio.sleep(0)  # Start the WAL flush task
+        await service.put_memory("user-1", "profile", {"name": "Ada"}, "tenant_a")
+        await service.put_memory("user-1", "profile", {"name": "Grace"}, "tenant_a")
+        await service.put_memory("user-2", "notes", ["a", "b"], "tenant_b", ttl_hours=1)
+        session_id = await service.create_session("tenant_a", "agent", "user-1", {"voice": True})
+        await service.update_session(session_id, "tenant_a", {"status": "paused"})
+        await asyncio.sleep(service.wal_flush_interval * 4)
+        await crash(service)
+
+        recovered = create_service(LocalMemoryService, local_settings)
+        assert await recovered.get_memory("user-1", "profile", "tenant_a") == {"name": "Grace"}
+        assert await recovered.get_memory("user-2", "notes", "tenant_b") == ["a", "b"]
+        assert (await recovered.get_session(session_id, "tenant_a")).status == "paused"
+        assert recovered.memory_store.total_bytes == sum(
+            entry.size_bytes for entry in recovered.memory_store.values()
+        )
+        await recovered.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_unpicklable_overwrite_is_not_undone_by_recovery(self, local_settings):
+        """Test overwriting a value with one that can't be persisted drops the old logged value."""
+        service = create_service(LocalMemoryService, local_settings)
+        await service.put_memory("user-1", "handle", "persisted", "tenant_a")
+        assert await service.put_memory("user-1", "handle", threading.Lock(), "tenant_a")
+        await crash(service)
+
+        recovered = create_service(LocalMemoryService, local_settings)
+        assert await recovered.get_memory("user-1", "handle", "tenant_a") is None
+        await recovered.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_session_activity_survives_crash(self, local_settings):
+        """Test the activity time recorded by get_session is recovered from the WAL."""
+        service = create_service(LocalMemoryService, local_settings)
+        session_id = await service.create_session("tenant_a", "agent", "user-1", {})
+        created_at = service.sessions[f"tenant_a:{session_id}"].last_activity
+        await asyncio.sleep(0.05)
+        touched_at = (await service.get_session(session_id, "tenant_a")).last_activity
+        await crash(service)
+
+        recovered = create_service(LocalMemoryService, local_settings)
+        recovered_at = recovered.sessions[f"tenant_a:{session_id}"].last_activity
+        assert recovered_at.timestamp() == pytest.approx(touched_at.timestamp(), abs=1e-3)
+        assert recovered_at > created_at
+        await recovered.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_snapshot_compacts_wal(self, local_settings, tmp_path):
+        """Test persist_data replaces older WAL files with one snapshot."""
+        service = create_service(LocalMemoryService, local_settings)
+        for i in range(100):
+            await service.put_memory("user-1", "counter", i, "tenant_a")
+        await service.persist_data()
+        await service.put_memory("user-1", "after", "snapshot", "tenant_a")
+        await crash(service)
+
+        wal_directory = tmp_path / "memory"
+        assert json.loads((wal_directory / "manifest.json").read_text())["generation"] == 2
+        assert sorted(path.name for path in wal_directory.iterdir()) == [
+            "manifest.json", "memory.2.snapshot", "memory.2.wal"
+        ]
+
+        recovered = create_service(LocalMemoryService, local_settings)
+        assert await recovered.get_memory("user-1", "counter", "tenant_a") == 99
+        assert await recovered.get_memory("user-1", "after", "tenant_a") == "snapshot"
+        await recovered.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_legacy_json_is_migrated(self, local_settings, tmp_path):
+        """Test the previous JSON files are loaded once and snapshotted."""
+        now = datetime.now()
+        (tmp_path / "memory_store.json").write_text(json.dumps({
+            "tenant_a:user-1:profile": {
+                "key": "profile", "value": {"name": "Ada"}, "tenant_id": "tenant_a", "user_id": "user-1",
+                "created_at": now.isoformat(), "updated_at": now.isoformat(),
+                "expires_at": (now + timedelta(hours=1)).isoformat(), "access_count": 0, "last_accessed": None
+            }
+        }))
+
+        service = create_service(LocalMemoryService, local_settings)
+        assert (tmp_path / "memory_store.json.migrated").exists()
+        await crash(service)
+
+        recovered = create_service(LocalMemoryService, local_settings)
+        assert await recovered.get_memory("user-1", "profile", "tenant_a") == {"name": "Ada"}
+        await recovered.shutdown()
+
+
+class TestIndexes:
+    """Test the session and memory key indexes."""
+
+    def test_key_index_follows_puts_and_evictions(self):
+        """Test prefix listing tracks replaces, deletes and evictions."""
+        store = make_store("lru", capacity=4)  # Three entries with these longer keys
+        store.put("tenant_a:user-1:task:2", make_entry("task:2"))
+        store.put("tenant_a:user-1:note", make_entry("note"))
+        store.put("tenant_a:user-1:task:1", make_entry("task:1"))
+        store.put("tenant_a:user-1:task:1", make_entry("task:1", value="y" * 100))
+
+        assert store.keys_with_prefix("tenant_a", "user-1", "task:") == ["task:1", "task:2"]
+        assert store.keys_with_prefix("tenant_a", "user-1") == ["note", "task:1", "task:2"]
+        assert store.keys_with_prefix("tenant_b", "user-1") == []
+
+        store.put("tenant_a:user-1:task:3", make_entry("task:3"))  # Evicts task:2
+        del store["tenant_a:user-1:note"]
+
+        assert store.keys_with_prefix("tenant_a", "user-1") == ["task:1", "task:3"]
+
+    @pytest.mark.asyncio
+    async def test_list_memory_by_prefix(self, local_settings):
+        """Test list_memory returns only the user's live entries under the prefix."""
+        service = create_service(LocalMemoryService, local_settings)
+        await service.put_memory("user-1", "call:1", "hello", "tenant_a")
+        await service.put_memory("user-1", "call:2", "bye", "tenant_a")
+        await service.put_memory("user-1", "profile", {"name": "Ada"}, "tenant_a")
+        await service.put_memory("user-2", "call:1", "other user", "tenant_a")
+        await service.put_memory("user-1", "call:1", "other tenant", "tenant_b")
+        await service.put_memory("user-1", "call:3", "stale", "tenant_a")
+        service.memory_store["tenant_a:user-1:call:3"].expires_at = datetime.now() - timedelta(seconds=1)
+
+        assert await service.list_memory("user-1", "tenant_a", "call:") == {"call:1": "hello", "call:2": "bye"}
+        assert "tenant_a:user-1:call:3" not in service.memory_store
+        assert set(await service.list_memory("user-1", "tenant_a")) == {"call:1", "call:2", "profile"}
+        await service.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_user_sessions_follow_changes(self, local_settings):
+        """Test listing reflects creates, owner changes and deletes."""
+        service = create_service(LocalMemoryService, local_settings)
+        first = await service.create_session("tenant_a", "agent-1", "user-1", {})
+        second = await service.create_session("tenant_a", "agent-2", "user-1", {})
+        await service.create_session("tenant_a", "agent-1", "user-2", {})
+        await service.create_session("tenant_b", "agent-1", "user-1", {})
+
+        sessions = await service.list_user_sessions("user-1", "tenant_a")
+        assert [session.session_id for session in sessions] == [first, second]
+
+        await service.update_session(second, "tenant_a", {"user_id": "user-2"})
+        await service.delete_session(first, "tenant_a")
+
+        assert await service.list_user_sessions("user-1", "tenant_a") == []
+        assert len(await service.list_user_sessions("user-2", "tenant_a")) == 2
+        assert len(await service.list_user_sessions("user-1", "tenant_b")) == 1
+        await service.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_cleanup_stops_at_first_active_session(self, local_settings):
+        """Test idle cleanup removes sessions least recently active first."""
+        service = create_service(LocalMemoryService, local_settings)
+        idle = await service.create_session("tenant_a", "agent-1", "user-1", {})
+        touched = await service.create_session("tenant_a", "agent-2", "user-1", {})
+        active = await service.create_session("tenant_a", "agent-3", "user-1", {})
+        for session_id in [idle, touched, active]:
+            (await service.get_session(session_id, "tenant_a")).last_activity = datetime.now() - timedelta(hours=2)
+        service.sessions[f"tenant_a:{active}"].last_activity = datetime.now()
+        await service.get_session(touched, "tenant_a")
+
+        assert await service.cleanup_expired_sessions(max_idle_hours=1) == 1
+        sessions = await service.list_user_sessions("user-1", "tenant_a")
+        assert [session.session_id for session in sessions] == [touched, active]
+        await service.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_indexes_rebuilt_on_recovery(self, local_settings):
+        """Test recovered sessions and entries are listed without a full scan."""
+        service = create_service(LocalMemoryService, local_settings)
+        session_id = await service.create_session("tenant_a", "agent", "user-1", {})
+        await service.put_memory("user-1", "call:1", "hello", "tenant_a")
+        await crash(service)
+
+        recovered = create_service(LocalMemoryService, local_settings)
+        assert [s.session_id for s in await recovered.list_user_sessions("user-1", "tenant_a")] == [session_id]
+        assert await recovered.list_memory("user-1", "tenant_a", "call:") == {"call:1": "hello"}
+        await recovered.shutdown()
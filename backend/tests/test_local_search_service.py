@@ -0,0 +1,932 @@
+"""
+Unit tests for the local search service (BM25 + FAISS fallback for OpenSearch).
+
+Tests:
+- Incremental BM25 indexing, re-indexing and removal
+- Corpus statistics stay consistent with a from-scratch rebuild
+- MaxScore top-k evaluation matches exhaustive scoring
+- Tombstone deletes and compaction in the FAISS vector index
+- Quantized vector storage (HNSW-SQ8, IVF-PQ) training, compaction and persistence
+- Batched ingestion through LocalSearchService.index_documents
+- Per-index binary persistence: mmapped postings, FAISS files, document log
+- Per-index reader-writer locking and off-loop query execution
+- Field-index filter pushdown and weighted / RRF hybrid fusion
+- Declared hash / range field indexes and filter-only queries
+- Query result caching with index-generation invalidation
+"""
+
+import asyncio
+import json
+import random
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from conftest import create_service
+import numpy as np
+
+from backend.infrastructure.local.services.search_service import (
+    BM25Scorer, VectorIndex, FieldIndex, LocalSearchService, QueryResultCache, ReadWriteLock,
+    SearchDocument, SearchDocumentStore, FAISS_AVAILABLE
+)
+
+requires_faiss = pytest.mark.skipif(not FAISS_AVAILABLE, reason="FAISS not installed")
+
+
+CORPUS = {
+    "doc-1": "quarterly revenue grew in the nordic market",
+    "doc-2": "meeting notes about the revenue forecast",
+    "doc-3": "risk analysis for the crypto portfolio",
+    "doc-4": "action items from the product meeting",
+}
+
+
+def build_scorer(corpus):
+    """Build a scorer from scratch using single-document adds."""
+    scorer = BM25Scorer()
+    for doc_id, text in corpus.items():
+        scorer.add_document(doc_id, text)
+    return scorer
+
+
+def assert_same_index(left: BM25Scorer, right: BM25Scorer):
+    """Assert two scorers hold identical postings and statistics."""
+    assert left.total_docs == right.total_docs
+    assert left.total_doc_length == right.total_doc_length
+    assert left.avg_doc_length == pytest.approx(right.avg_doc_length)
+    assert dict(left.doc_frequencies) == dict(right.doc_frequencies)
+    assert {t: dict(p) for t, p in left.inverted_index.items()} == \
+        {t: dict(p) for t, p in right.inverted_index.items()}
+    assert left.doc_lengths == right.doc_lengths
+
+
+class TestBM25Incremental:
+    """Test incremental add, update and delete on BM25Scorer."""
+
+    def test_bulk_index_matches_single_adds(self):
+        """Test index_documents produces the same index as add_document."""
+        bulk = BM25Scorer()
+        assert bulk.index_documents(CORPUS.items()) == len(CORPUS)
+
+        assert_same_index(bulk, build_scorer(CORPUS))
+
+    def test_remove_matches_rebuild(self):
+        """Test removal leaves the index as if the doc was never added."""
+        scorer = build_scorer(CORPUS)
+        scorer.remove_document("doc-2")
+
+        remaining = {k: v for k, v in CORPUS.items() if k != "doc-2"}
+        assert_same_index(scorer, build_scorer(remaining))
+        assert "doc-2" not in scorer.doc_terms
+        assert "forecast" not in scorer.inverted_index
+
+    def test_readd_same_id_replaces_document(self):
+        """Test re-indexing an existing doc id replaces its postings."""
+        scorer = build_scorer(CORPUS)
+        scorer.add_document("doc-1", "completely different text")
+
+        updated = dict(CORPUS, **{"doc-1": "completely different text"})
+        assert_same_index(scorer, build_scorer(updated))
+        assert scorer.total_docs == len(CORPUS)
+
+    def test_remove_unknown_document_is_noop(self):
+        """Test removing an unknown doc id leaves the index untouched."""
+        scorer = build_scorer(CORPUS)
+        scorer.remove_document("missing")
+
+        assert_same_index(scorer, build_scorer(CORPUS))
+
+    def test_remove_all_documents(self):
+        """Test the index is empty after removing every document."""
+        scorer = build_scorer(CORPUS)
+        for doc_id in CORPUS:
+            scorer.remove_document(doc_id)
+
+        assert scorer.total_docs == 0
+        assert scorer.total_doc_length == 0
+        assert scorer.avg_doc_length == 0.0
+        assert not scorer.inverted_index
+        assert scorer.search("revenue") == []
+
+    def test_search_ranks_matching_document_first(self):
+        """Test search still ranks documents after incremental updates."""
+        scorer = build_scorer(CORPUS)
+        scorer.remove_document("doc-4")
+
+        results = scorer.search("crypto portfolio", limit=2)
+        assert results[0][0] == "doc-3"
+
+
+class TestBM25TopK:
+    """Test MaxScore top-k evaluation against the exhaustive scorer."""
+
+    @pytest.fixture
+    def random_scorer(self):
+        """Build a scorer over a random Zipf-like corpus."""
+        rng = random.Random(1234)
+        vocabulary = [f"w{i}" for i in range(300)]
+        weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+        scorer = BM25Scorer()
+        scorer.index_documents(
+            (f"doc-{i}", " ".join(rng.choices(vocabulary, weights=weights, k=rng.randint(3, 40))))
+            for i in range(2000)
+        )
+        # Churn so ordinals are reused and postings arrays are rebuilt
+        for i in range(0, 2000, 7):
+            scorer.remove_document(f"doc-{i}")
+        for i in range(0, 2000, 14):
+            scorer.add_document(f"doc-{i}", " ".join(rng.choices(vocabulary, k=10)))
+        return scorer, vocabulary
+
+    @pytest.mark.parametrize("limit", [1, 5, 10, 50])
+    def test_top_k_matches_exhaustive(self, random_scorer, limit):
+        """Test pruned search returns the exhaustive top-k scores."""
+        scorer, vocabulary = random_scorer
+        rng = random.Random(limit)
+
+        for _ in range(100):
+            query = " ".join(rng.choices(vocabulary, k=rng.randint(1, 6)))
+            pruned = scorer.search(query, limit=limit)
+            exhaustive = scorer.search_exhaustive(query, limit=limit)
+
+            assert [score for _, score in pruned] == \
+                pytest.approx([score for _, score in exhaustive])
+            for doc_id, score in pruned:
+                assert dict(scorer.search_exhaustive(query, limit=len(scorer.doc_lengths)))[doc_id] == \
+                    pytest.approx(score)
+
+    def test_repeated_and_frequent_terms(self):
+        """Test repeated query terms and negative-IDF terms score like the exhaustive path."""
+        scorer = build_scorer(CORPUS)
+        for query in ["the the revenue", "meeting meeting", "the", "unknown words"]:
+            assert [s for _, s in scorer.search(query, limit=3)] == \
+                pytest.approx([s for _, s in scorer.search_exhaustive(query, limit=3)])
+
+    def test_postings_arrays_follow_updates(self):
+        """Test frozen postings arrays are invalidated on updates."""
+        scorer = build_scorer(CORPUS)
+        assert scorer.search("crypto")[0][0] == "doc-3"
+
+        scorer.remove_document("doc-3")
+        scorer.add_document("doc-9", "crypto crypto market")
+        assert [doc_id for doc_id, _ in scorer.search("crypto")] == ["doc-9"]
+
+
+@requires_faiss
+class TestVectorIndexTombstones:
+    """Test O(1) tombstone deletes and background compaction in VectorIndex."""
+
+    DIMENSION = 16
+
+    @pytest.fixture
+    def vectors(self):
+        """Random unit vectors keyed by doc id."""
+        rng = np.random.default_rng(3)
+        return {f"doc-{i}": rng.standard_normal(self.DIMENSION).astype(np.float32) for i in range(200)}
+
+    @pytest.fixture
+    def index(self, vectors):
+        """Vector index populated with all vectors."""
+        index = VectorIndex(self.DIMENSION, compaction_threshold=0.25)
+        index.add_vectors(list(vectors), np.stack(list(vectors.values())))
+        return index
+
+    def test_removed_vectors_are_not_returned(self, index, vectors):
+        """Test tombstoned vectors are filtered out of search results."""
+        assert index.search(vectors["doc-5"], k=1)[0][0] == "doc-5"
+
+        assert index.remove_vectors({"doc-5"}) == 1
+        results = index.search(vectors["doc-5"], k=10)
+
+        assert "doc-5" not in [doc_id for doc_id, _ in results]
+        assert len(results) == 10
+        assert index.size == 199
+        assert index.index.ntotal == 200  # Graph untouched until compaction
+
+    def test_reindex_replaces_vector(self, index, vectors):
+        """Test re-adding a doc id tombstones its previous vector."""
+        index.add_vectors(["doc-1"], vectors["doc-2"].reshape(1, -1).copy())
+
+        top_two = [doc_id for doc_id, _ in index.search(vectors["doc-2"], k=2)]
+        assert sorted(top_two) == ["doc-1", "doc-2"]
+        assert index.search(vectors["doc-1"], k=1)[0][0] != "doc-1"
+        assert index.size == 200
+
+    def test_compaction_threshold(self, index):
+        """Test compaction is requested only past the tombstone ratio."""
+        index.remove_vectors({f"doc-{i}" for i in range(40)})
+        assert not index.needs_compaction()
+
+        index.remove_vectors({f"doc-{i}" for i in range(40, 60)})
+        assert index.needs_compaction()
+
+    def test_compact_keeps_live_vectors(self, index, vectors):
+        """Test compaction drops tombstones and preserves search results."""
+        removed = {f"doc-{i}" for i in range(0, 200, 2)}
+        index.remove_vectors(removed)
+
+        assert index.compact() == len(removed)
+        assert index.index.ntotal == 100
+        assert index.tombstone_ratio == 0.0
+        for doc_id in ["doc-1", "doc-51", "doc-199"]:
+            assert index.search(vectors[doc_id], k=1)[0][0] == doc_id
+
+    def test_remove_all_resets_index(self, index, vectors):
+        """Test removing every vector resets the FAISS graph."""
+        index.remove_vectors(set(vectors))
+
+        assert index.index.ntotal == 0
+        assert index.search(vectors["doc-1"], k=5) == []
+
+
+@requires_faiss
+class TestQuantizedVectorIndex:
+    """Test HNSW-SQ8 and IVF-PQ storage in VectorIndex."""
+
+    DIMENSION = 16
+
+    @pytest.fixture
+    def vectors(self):
+        """Clustered unit vectors so quantized search stays accurate."""
+        rng = np.random.default_rng(8)
+        centers = rng.standard_normal((20, self.DIMENSION))
+        points = centers[rng.integers(0, 20, 1200)] + 0.1 * rng.standard_normal((1200, self.DIMENSION))
+        return {f"doc-{i}": point.astype(np.float32) for i, point in enumerate(points)}
+
+    @pytest.mark.parametrize("index_type", ["hnsw_sq8", "ivf_pq"])
+    def test_trains_after_first_vectors(self, vectors, index_type):
+        """Test vectors are staged exactly until train_size, then quantized."""
+        index = VectorIndex(self.DIMENSION, index_type=index_type, train_size=500)
+        doc_ids = list(vectors)
+        index.add_vectors(doc_ids[:400], np.stack([vectors[d] for d in doc_ids[:400]]))
+        assert not index.trained
+        assert index.search(vectors["doc-7"], k=1)[0][0] == "doc-7"
+
+        index.remove_vectors({"doc-3"})
+        index.add_vectors(doc_ids[400:], np.stack([vectors[d] for d in doc_ids[400:]]))
+        assert index.trained
+        assert index.size == 1199 and index.index.ntotal == 1199  # Tombstones dropped when training
+
+        hits = [index.search(vectors[doc_id], k=5)[0][0] for doc_id in doc_ids[::50]]
+        assert sum(hit == doc_id for hit, doc_id in zip(hits, doc_ids[::50])) >= 20
+
+        allowed = set(doc_ids[::3])
+        index.exact_search_limit = 0
+        assert all(doc_id in allowed for doc_id, _ in index.search(vectors["doc-9"], k=10, doc_ids=allowed))
+
+        index.remove_vectors(set(doc_ids[:600]))
+        assert index.compact() == 599
+        assert index.trained and index.index.ntotal == 600
+        assert "doc-900" in [doc_id for doc_id, _ in index.search(vectors["doc-900"], k=10)]
+
+    def test_configure_reencodes_and_persists(self, vectors, tmp_path):
+        """Test switching an existing index to IVF-PQ keeps its documents across a reload."""
+        index = VectorIndex(self.DIMENSION)
+        index.add_vectors(list(vectors), np.stack(list(vectors.values())))
+        index.configure("ivf_pq", train_size=1000, pq_m=4)
+        assert index.trained and index.index_type == "ivf_pq"
+        index.save(tmp_path / "vectors.faiss", tmp_path / "vectors.json")
+
+        loaded = VectorIndex(self.DIMENSION)
+        loaded.load(tmp_path / "vectors.faiss", tmp_path / "vectors.json")
+        assert (loaded.index_type, loaded.pq_m, loaded.trained) == ("ivf_pq", 4, True)
+        assert loaded.search(vectors["doc-11"], k=3) == index.search(vectors["doc-11"], k=3)
+
+        loaded.add_vectors(["new"], vectors["doc-11"].reshape(1, -1).copy())
+        loaded.remove_vectors({"doc-11"})
+        assert loaded.compact() == 1
+        assert loaded.search(vectors["doc-11"], k=1)[0][0] == "new"
+
+    def test_invalid_layouts(self):
+        """Test unknown types and impossible PQ settings are rejected."""
+        with pytest.raises(ValueError):
+            VectorIndex(self.DIMENSION, index_type="lsh")
+        with pytest.raises(ValueError):
+            VectorIndex(self.DIMENSION, index_type="ivf_pq", pq_m=5)
+        with pytest.raises(ValueError):
+            VectorIndex(self.DIMENSION, index_type="ivf_pq", train_size=100)
+
+    @pytest.mark.asyncio
+    async def test_service_keeps_vectors_out_of_content(self, local_settings):
+        """Test indexed embeddings are not duplicated in stored content."""
+        service = create_service(LocalSearchService, local_settings)
+        await service.configure_vector_index("tenant_a", "meetings", "hnsw_sq8", train_size=50)
+        docs = make_meeting_docs(100)
+        await service.index_documents(docs[:99], "tenant_a", "meetings")
+        await service.index_document(docs[99], "tenant_a", "meetings")
+
+        stored = service.documents["tenant_a"]["tenant_a-meetings"]
+        assert all("embedding" not in stored[doc["id"]].content for doc in docs)
+        assert stored["chunk-99"].vector_field == "embedding"
+
+        results = await service.hybrid_search("budget", docs[5]["embedding"], "tenant_a", index_name="meetings")
+        assert results[0]["_id"] == "chunk-5" and "embedding" not in results[0]
+        assert service.vector_indices["tenant_a"]["tenant_a-meetings"].trained
+        await service.shutdown()
+
+    @requires_faiss
+    @pytest.mark.asyncio
+    async def test_wrong_dimension_is_rejected_before_storing(self, local_settings):
+        """Test a document with a wrong-length vector is not stored without its embedding."""
+        service = create_service(LocalSearchService, local_settings)
+        doc = {"id": "short", "text": "budget review", "embedding": [0.1, 0.2, 0.3]}
+
+        with pytest.raises(ValueError):
+            await service.index_document(doc, "tenant_a", "meetings")
+
+        assert "short" not in service.documents.get("tenant_a", {}).get("tenant_a-meetings", {})
+        assert await service.search("budget", "tenant_a", index_name="meetings") == []
+        await service.shutdown()
+
+
+class TestBatchIngestion:
+    """Test LocalSearchService.index_documents."""
+
+    @pytest.mark.asyncio
+    async def test_batch_matches_single_indexing(self, local_settings):
+        """Test batch ingestion produces the same search results as single calls."""
+        rng = np.random.default_rng(5)
+        docs = [
+            {"id": f"doc-{i}", "text": f"meeting chunk {i % 7} about topic{i % 3}",
+             "embedding": rng.standard_normal(8).tolist()}
+            for i in range(50)
+        ]
+
+        batched = create_service(LocalSearchService, local_settings)
+        results = await batched.index_documents(docs, "tenant_a", "meetings")
+        assert [r["id"] for r in results] == [d["id"] for d in docs]
+        assert all(r["error"] is None for r in results)
+
+        single = create_service(LocalSearchService, local_settings)
+        for doc in docs:
+            await single.index_document(doc, "tenant_a", "meetings")
+
+        for query in ["topic1", "meeting chunk 3"]:
+            batched_hits = await batched.search(query, "tenant_a", index_name="meetings")
+            single_hits = await single.search(query, "tenant_a", index_name="meetings")
+            assert [(h["_id"], pytest.approx(h["_score"])) for h in batched_hits] == \
+                [(h["_id"], h["_score"]) for h in single_hits]
+
+        await batched.shutdown()
+        await single.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_batch_reports_per_document_errors(self, local_settings):
+        """Test invalid documents are reported without failing the batch."""
+        service = create_service(LocalSearchService, local_settings)
+        docs = [
+            {"id": "good", "text": "valid document"},
+            "not a document",
+            {"id": "bad-vector", "text": "wrong dimension", "embedding": [0.1, 0.2]},
+        ]
+
+        results = await service.index_documents(docs, "tenant_a")
+
+        assert results[0] == {"id": "good", "error": None}
+        assert results[1]["error"]
+        if FAISS_AVAILABLE:
+            assert results[2]["id"] == "bad-vector" and "dimension" in results[2]["error"]
+        assert [h["_id"] for h in await service.search("valid", "tenant_a")] == ["good"]
+
+        await service.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_batch_replaces_existing_documents(self, local_settings):
+        """Test re-indexing through a batch replaces previous versions."""
+        service = create_service(LocalSearchService, local_settings)
+        await service.index_document({"id": "doc-1", "text": "old content"}, "tenant_a")
+
+        await service.index_documents(
+            [{"id": "doc-1", "text": "new content"}, {"id": "doc-1", "text": "newest content"}],
+            "tenant_a"
+        )
+
+        assert await service.search("old", "tenant_a") == []
+        assert await service.search("new", "tenant_a") == []
+        assert [h["_id"] for h in await service.search("newest", "tenant_a")] == ["doc-1"]
+
+        await service.shutdown()
+
+
+class TestPersistence:
+    """Test per-index binary persistence and cold start."""
+
+    def test_loaded_scorer_matches_and_updates(self, tmp_path):
+        """Test a memory-mapped scorer scores and updates like an in-memory one."""
+        scorer = build_scorer(CORPUS)
+        BM25Scorer.save(tmp_path / "bm25", scorer.export_arrays())
+        loaded = BM25Scorer.load(tmp_path / "bm25")
+
+        for query in ["revenue meeting", "the", "crypto portfolio risk"]:
+            assert loaded.search(query, limit=3) == scorer.search(query, limit=3)
+
+        loaded.remove_document("doc-2")
+        loaded.add_document("doc-5", "revenue review meeting")
+        loaded.add_document("doc-1", "updated nordic notes")
+
+        corpus = dict(CORPUS, **{"doc-5": "revenue review meeting", "doc-1": "updated nordic notes"})
+        del corpus["doc-2"]
+        expected = build_scorer(corpus)
+        assert loaded.total_docs == expected.total_docs
+        assert loaded.total_doc_length == expected.total_doc_length
+        assert dict(loaded.doc_frequencies) == dict(expected.doc_frequencies)
+        for query in ["revenue meeting", "nordic", "the"]:
+            assert [doc_id for doc_id, _ in loaded.search_exhaustive(query)] == \
+                [doc_id for doc_id, _ in expected.search_exhaustive(query)]
+
+    def test_document_store_log_roundtrip(self, tmp_path):
+        """Test appends, deletes and log rewrites survive reopening the store."""
+        lock = threading.RLock()
+        store = SearchDocumentStore()
+        for i in range(4):
+            store[f"doc-{i}"] = SearchDocument(f"doc-{i}", "tenant_a", "idx", {"n": i}, ["n"])
+        store.flush(tmp_path, "documents.idx.json", lock)
+
+        del store["doc-0"]
+        store["doc-1"] = SearchDocument("doc-1", "tenant_a", "idx", {"n": 10}, ["n"])
+        first_log = store.flush(tmp_path, "documents.idx.json", lock)["log_file"]
+
+        reopened = SearchDocumentStore.load(tmp_path, "documents.idx.json")
+        assert sorted(reopened) == ["doc-1", "doc-2", "doc-3"]
+        assert reopened["doc-1"].content == {"n": 10}
+        assert not reopened.dirty
+
+        # Superseded records now outweigh live ones: the next flush rewrites
+        for doc_id in ["doc-2", "doc-3"]:
+            del reopened[doc_id]
+        offset_index = reopened.flush(tmp_path, "documents.idx.json", lock)
+        assert offset_index["log_file"] != first_log
+        assert offset_index["dead_bytes"] == 0
+
+        reopened = SearchDocumentStore.load(tmp_path, "documents.idx.json")
+        assert list(reopened) == ["doc-1"]
+        assert reopened["doc-1"].content == {"n": 10}
+
+    @pytest.mark.asyncio
+    async def test_service_roundtrip(self, local_settings):
+        """Test a restarted service serves the same results without rebuilding."""
+        rng = np.random.default_rng(3)
+        docs = [
+            {"id": f"doc-{i}", "text": f"meeting chunk {i % 5} about topic{i % 3}",
+             "embedding": rng.standard_normal(8).tolist()}
+            for i in range(30)
+        ]
+        service = create_service(LocalSearchService, local_settings)
+        await service.index_documents(docs, "tenant_a", "meetings")
+        await service.delete_document("doc-4", "tenant_a", "meetings")
+        expected = await service.hybrid_search("topic2", docs[7]["embedding"], "tenant_a", index_name="meetings")
+        await service.shutdown()
+
+        with patch.object(BM25Scorer, "index_documents", side_effect=AssertionError("rebuilt")):
+            restarted = create_service(LocalSearchService, local_settings)
+
+        assert restarted.get_search_stats()["total_documents"] == 29
+        restored = await restarted.hybrid_search("topic2", docs[7]["embedding"], "tenant_a", index_name="meetings")
+        assert [(r["_id"], pytest.approx(r["_hybrid_score"])) for r in restored] == \
+            [(r["_id"], r["_hybrid_score"]) for r in expected]
+        assert all(r["_id"] != "doc-4" for r in restored)
+
+        # The mapped indices keep accepting writes
+        await restarted.index_document({"id": "doc-99", "text": "fresh topic2 notes"}, "tenant_a", "meetings")
+        assert "doc-99" in [h["_id"] for h in await restarted.search("fresh", "tenant_a", index_name="meetings")]
+        await restarted.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_only_dirty_indices_are_written(self, local_settings):
+        """Test persist_data skips indices that have not changed."""
+        service = create_service(LocalSearchService, local_settings)
+        await service.index_document({"id": "a", "text": "alpha"}, "tenant_a", "one")
+        await service.index_document({"id": "b", "text": "beta"}, "tenant_a", "two")
+        await service.persist_data()
+
+        def generation(index_name):
+            manifest = service._index_directory("tenant_a", f"tenant_a-{index_name}") / "manifest.json"
+            return json.loads(manifest.read_text())["generation"]
+
+        await service.index_document({"id": "c", "text": "gamma"}, "tenant_a", "one")
+        await service.persist_data()
+
+        assert generation("one") == 2
+        assert generation("two") == 1
+        await service.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_generation_is_one_snapshot(self, local_settings):
+        """Test a document indexed while a generation is written is in none of its files."""
+        service = create_service(LocalSearchService, local_settings)
+        await service.index_document({"id": "a", "text": "alpha notes"}, "tenant_a", "one")
+        index_name = "tenant_a-one"
+        flush = SearchDocumentStore.flush
+
+        def index_then_flush(store, *args, **kwargs):
+            late = SearchDocument("late", "tenant_a", index_name, {"id": "late", "text": "late notes"}, ["text"])
+            service._store_document("tenant_a", index_name, late, None)
+            return flush(store, *args, **kwargs)
+
+        with patch.object(SearchDocumentStore, "flush", index_then_flush):
+            await service.persist_data()
+
+        # Read the generation back as after a crash, before the next pass
+        restarted = create_service(LocalSearchService, local_settings)
+        assert "late" not in restarted.documents["tenant_a"][index_name]
+        assert [h["_id"] for h in await restarted.search("notes", "tenant_a", index_name="one")] == ["a"]
+        await restarted.shutdown()
+
+        assert ("tenant_a", index_name) in service._dirty_indices
+        await service.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_legacy_json_is_migrated(self, local_settings, tmp_path):
+        """Test search_indices.json is loaded and replaced by the binary format."""
+        now = datetime.now().isoformat()
+        legacy = {"tenant_a": {"tenant_a-default": {"doc-1": {
+            "doc_id": "doc-1", "tenant_id": "tenant_a", "index_name": "tenant_a-default",
+            "content": {"id": "doc-1", "text": "legacy revenue notes"}, "text_fields": ["id", "text"],
+            "vector_field": None, "created_at": now, "updated_at": now
+        }}}}
+        (tmp_path / "search_indices.json").write_text(json.dumps(legacy))
+
+        service = create_service(LocalSearchService, local_settings)
+        assert [h["_id"] for h in await service.search("revenue", "tenant_a")] == ["doc-1"]
+        await service.shutdown()
+
+        assert not (tmp_path / "search_indices.json").exists()
+        assert (tmp_path / "search_indices.json.migrated").exists()
+
+        restarted = create_service(LocalSearchService, local_settings)
+        assert [h["_id"] for h in await restarted.search("revenue", "tenant_a")] == ["doc-1"]
+        await restarted.shutdown()
+
+
+class TestConcurrency:
+    """Test per-index reader-writer locking."""
+
+    def test_readers_share_and_writer_excludes(self):
+        """Test readers hold the lock together while a writer waits for them."""
+        lock = ReadWriteLock()
+        both_reading = threading.Barrier(3, timeout=5)
+        release_readers = threading.Event()
+        writer_done = threading.Event()
+
+        def reader():
+            with lock.reader:
+                both_reading.wait()
+                release_readers.wait(5)
+
+        def writer():
+            with lock.writer:
+                with lock.writer:  # Reentrant
+                    writer_done.set()
+
+        readers = [threading.Thread(target=reader) for _ in range(2)]
+        for thread in readers:
+            thread.start()
+        both_reading.wait()
+
+        writer_thread = threading.Thread(target=writer)
+        writer_thread.start()
+        assert not writer_done.wait(0.1)
+
+        release_readers.set()
+        assert writer_done.wait(5)
+        for thread in readers + [writer_thread]:
+            thread.join(5)
+
+    @pytest.mark.asyncio
+    async def test_write_lock_blocks_only_its_index(self, local_settings):
+        """Test a held write lock neither blocks other indices nor the event loop."""
+        service = create_service(LocalSearchService, local_settings)
+        await service.index_document({"id": "a", "text": "alpha report"}, "tenant_a", "docs")
+        await service.index_document({"id": "b", "text": "beta report"}, "tenant_b", "docs")
+
+        busy_lock = service._index_lock("tenant_b", "tenant_b-docs")
+        busy_lock.acquire_write()
+        try:
+            blocked = asyncio.ensure_future(service.search("beta", "tenant_b", index_name="docs"))
+            hits = await asyncio.wait_for(service.search("alpha", "tenant_a", index_name="docs"), 5)
+            assert [h["_id"] for h in hits] == ["a"]
+
+            # The event loop keeps running while the tenant_b search waits
+            await asyncio.sleep(0.05)
+            assert not blocked.done()
+        finally:
+            busy_lock.release_write()
+
+        assert [h["_id"] for h in await asyncio.wait_for(blocked, 5)] == ["b"]
+        await service.shutdown()
+
+
+def make_meeting_docs(count: int, seed: int = 9):
+    """Generate meeting chunks with keyword, numeric and vector fields."""
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "id": f"chunk-{i}",
+            "meeting_id": f"meeting-{i % 10}",
+            "data_type": ["transcript", "summary", "action_item"][i % 3],
+            "priority": i % 5,
+            "text": f"discussion of topic{i % 7} and budget item {i % 11}",
+            "embedding": rng.standard_normal(8).tolist(),
+        }
+        for i in range(count)
+    ]
+
+
+class TestFilterPushdown:
+    """Test field-index filter resolution and filtered search."""
+
+    def test_resolve_matches_apply_filters(self):
+        """Test resolved filters select exactly the documents _apply_filters accepts."""
+        docs = {
+            "a": {"kind": "note", "owner": "x" * 100, "flag": True, "n": 1},
+            "b": {"kind": "task", "owner": "bob", "flag": False, "n": 2},
+            "c": {"kind": "note", "owner": "x" * 100, "tags": ["a"], "n": 1.0},
+            "d": {"owner": "bob", "n": 3},
+        }
+        index = FieldIndex(max_value_length=16)
+        for doc_id, content in docs.items():
+            index.add_document(doc_id, content)
+        index.remove_document("b")
+        index.add_document("b", docs["b"])
+
+        def apply_filters(content, filters):
+            return LocalSearchService._apply_filters(None, content, filters)
+
+        cases = [
+            {"kind": "note"},
+            {"kind": ["note", "task"], "n": 1},
+            {"owner": "x" * 100},
+            {"flag": 1},
+            {"kind": "missing"},
+            {"kind": None},
+            {"n": {"gte": 1, "lt": 2}, "kind": "note"},
+        ]
+        for filters in cases:
+            allowed, residual = index.resolve(filters, lambda doc_id, f: apply_filters(docs[doc_id], f))
+            candidates = set(docs) if allowed is None else allowed
+            resolved = {doc_id for doc_id in candidates if apply_filters(docs[doc_id], residual)}
+            assert resolved == {doc_id for doc_id, content in docs.items() if apply_filters(content, filters)}
+
+    @pytest.mark.asyncio
+    async def test_filtered_search_returns_top_matching_documents(self, local_settings):
+        """Test filters are applied before BM25 ranking rather than to the top 50."""
+        service = create_service(LocalSearchService, local_settings)
+        service.search_depth = 5
+        await service.index_documents(make_meeting_docs(300), "tenant_a", "meetings")
+
+        filters = {"meeting_id": "meeting-3", "data_type": ["summary", "transcript"]}
+        hits = await service.search("topic3 budget", "tenant_a", filters, "meetings")
+
+        assert len(hits) == 5
+        assert all(h["meeting_id"] == "meeting-3" and h["data_type"] != "action_item" for h in hits)
+        scores = [h["_score"] for h in hits]
+        assert scores == sorted(scores, reverse=True)
+        await service.shutdown()
+
+    @requires_faiss
+    def test_vector_search_restricted_to_doc_ids(self):
+        """Test exact and id-selector filtered vector search agree."""
+        rng = np.random.default_rng(2)
+        index = VectorIndex(dimension=8)
+        doc_ids = [f"doc-{i}" for i in range(2000)]
+        index.add_vectors(doc_ids, rng.standard_normal((2000, 8)).astype(np.float32))
+        index.remove_vectors({"doc-10"})
+
+        allowed = {f"doc-{i}" for i in range(0, 2000, 4)}
+        query = rng.standard_normal(8).astype(np.float32)
+        exact = index.search(query, k=10, doc_ids=allowed)
+        index.exact_search_limit = 0
+        selected = index.search(query, k=10, doc_ids=allowed)
+
+        assert len(exact) == 10 and all(doc_id in allowed for doc_id, _ in exact)
+        assert all(doc_id in allowed for doc_id, _ in selected)
+        assert "doc-10" not in [doc_id for doc_id, _ in index.search(query, k=10, doc_ids={"doc-10", "doc-12"})]
+        assert [score for _, score in exact] == sorted((score for _, score in exact), reverse=True)
+        assert -1.0 <= exact[-1][1] <= exact[0][1] <= 1.0
+
+
+class TestFieldIndexes:
+    """Test declared hash and range field indexes and filter-only search."""
+
+    def test_range_resolve_matches_apply_filters(self):
+        """Test range filters on a declared field select what _apply_filters accepts."""
+        rng = random.Random(5)
+        docs = {f"doc-{i}": {"n": rng.choice([rng.randint(0, 20), rng.random() * 20]),
+                             "day": f"2024-01-{rng.randint(10, 30)}"} for i in range(200)}
+        docs["doc-nan"] = {"n": float("nan"), "day": "2024-01-15"}
+        index = FieldIndex()
+        for doc_id, content in docs.items():
+            index.add_document(doc_id, content)
+        index.declare("n", "range", lambda doc_id: docs[doc_id])
+        index.declare("day", "range", lambda doc_id: docs[doc_id])
+        index.add_document("doc-0", {"n": 7, "day": "2024-01-20"})
+        docs["doc-0"] = {"n": 7, "day": "2024-01-20"}
+
+        def apply_filters(content, filters):
+            return LocalSearchService._apply_filters(None, content, filters)
+
+        cases = [
+            {"n": {"gte": 5, "lt": 10}},
+            {"n": {"gt": 5.5, "lte": 10}},
+            {"n": {"gte": 15}, "day": {"lt": "2024-01-20"}},
+            {"n": {"lt": 0}},
+            {"day": {"gte": "2024-01-12", "lte": "2024-01-12"}},
+        ]
+        for filters in cases:
+            allowed, residual = index.resolve(filters, lambda doc_id, f: apply_filters(docs[doc_id], f))
+            assert residual == {} and allowed is not None
+            assert allowed == {doc_id for doc_id, content in docs.items() if apply_filters(content, filters)}
+
+        # Bounds that can't be answered from sorted values stay residual
+        _, residual = index.resolve({"n": {"gte": 1, "lte": "z"}}, lambda doc_id, f: True)
+        assert residual == {"n": {"gte": 1, "lte": "z"}}
+
+    def test_range_excludes_missing_and_incomparable_values(self):
+        """Test docs without a comparable value don't match instead of failing the query."""
+        index = FieldIndex()
+        index.declare("n", "range", lambda doc_id: {})
+        index.add_document("a", {"n": 3})
+        index.add_document("b", {})
+        index.add_document("c", {"n": "three"})
+        index.add_document("d", {"n": [3]})
+
+        allowed, _ = index.resolve({"n": {"gte": 1}}, lambda doc_id, f: True)
+        assert allowed == {"a"}
+        index.remove_document("a")
+        assert index.resolve({"n": {"gte": 1}}, lambda doc_id, f: True)[0] == set()
+
+    def test_declared_hash_indexes_long_values(self):
+        """Test a hash declaration moves long strings into the postings."""
+        docs = {"a": {"path": "x" * 100}, "b": {"path": "y" * 100}, "c": {"path": ["x" * 100]}}
+        index = FieldIndex(max_value_length=16)
+        for doc_id, content in docs.items():
+            index.add_document(doc_id, content)
+        index.declare("path", "hash", lambda doc_id: docs[doc_id])
+
+        assert index.unindexed == {"path": {"c"}}
+        assert index.postings["path"]["x" * 100] == {"a"}
+        allowed, _ = index.resolve({"path": "x" * 100}, lambda doc_id, f: docs[doc_id]["path"] == f["path"])
+        assert allowed == {"a"}
+
+        index.remove_document("a")
+        assert "x" * 100 not in index.postings["path"]
+        with pytest.raises(ValueError):
+            index.declare("path", "bitmap", lambda doc_id: docs[doc_id])
+
+    @pytest.mark.asyncio
+    async def test_filter_only_search(self, local_settings):
+        """Test filter-only queries return every match without a text query."""
+        service = create_service(LocalSearchService, local_settings)
+        docs = make_meeting_docs(300)
+        await service.index_documents(docs, "tenant_a", "meetings")
+        assert await service.create_field_index("priority", "tenant_a", "meetings", kind="range")
+
+        filters = {"meeting_id": "meeting-4", "data_type": "summary", "priority": {"gte": 2}}
+        with patch.object(BM25Scorer, "search", side_effect=AssertionError("scored")):
+            hits = await service.search("", "tenant_a", filters, "meetings", filter_only=True, limit=100)
+
+        expected = sorted(
+            doc["id"] for doc in docs
+            if doc["meeting_id"] == "meeting-4" and doc["data_type"] == "summary" and doc["priority"] >= 2
+        )
+        assert [h["_id"] for h in hits] == expected
+        assert all(h["_score"] == 0.0 for h in hits)
+
+        limited = await service.search("", "tenant_a", {"meeting_id": "meeting-4"}, "meetings",
+                                       filter_only=True, limit=3)
+        assert len(limited) == 3
+        await service.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_declarations_persist(self, local_settings):
+        """Test declared field indexes survive a restart and keep updating."""
+        service = create_service(LocalSearchService, local_settings)
+        await service.index_documents(make_meeting_docs(50), "tenant_a", "meetings")
+        await service.create_field_index("priority", "tenant_a", "meetings", kind="range")
+        await service.shutdown()
+
+        restarted = create_service(LocalSearchService, local_settings)
+        field_index = restarted.field_indices["tenant_a"]["tenant_a-meetings"]
+        assert set(field_index.range_indices) == {"priority"}
+
+        await restarted.index_document({"id": "late", "priority": 9, "text": "late"}, "tenant_a", "meetings")
+        hits = await restarted.search("", "tenant_a", {"priority": {"gt": 4}}, "meetings", filter_only=True)
+        assert [h["_id"] for h in hits] == ["late"]
+        await restarted.shutdown()
+
+
+class TestHybridFusion:
+    """Test hybrid_search fusion modes."""
+
+    def test_rrf_and_weighted_scores(self):
+        """Test fused scores follow the RRF and weighted-sum formulas."""
+        text = [("a", 4.0), ("b", 2.0)]
+        vector = [("b", 0.9), ("c", 0.45)]
+
+        rrf = dict(LocalSearchService._fuse_rankings(text, vector, "rrf", 1.0, 1.0, 60))
+        assert rrf["b"]["_hybrid_score"] == pytest.approx(1 / 62 + 1 / 61)
+        assert rrf["a"]["_hybrid_score"] == pytest.approx(1 / 61)
+        assert rrf["c"]["_text_rank"] is None and rrf["c"]["_vector_rank"] == 2
+
+        weighted = LocalSearchService._fuse_rankings(text, vector, "weighted", 0.7, 0.3, 60)
+        scores = {doc_id: fields["_hybrid_score"] for doc_id, fields in weighted}
+        assert scores == pytest.approx({"a": 0.7, "b": 0.7 * 0.5 + 0.3, "c": 0.3 * 0.5})
+        assert [doc_id for doc_id, _ in weighted] == ["a", "b", "c"]
+
+    @pytest.mark.asyncio
+    async def test_hybrid_search_with_filters_and_limit(self, local_settings):
+        """Test hybrid results respect filters, limit and fusion parameters."""
+        service = create_service(LocalSearchService, local_settings)
+        docs = make_meeting_docs(200)
+        await service.index_documents(docs, "tenant_a", "meetings")
+
+        target = docs[42]
+        results = await service.hybrid_search(
+            "budget", target["embedding"], "tenant_a", {"meeting_id": target["meeting_id"]}, "meetings",
+            fusion="rrf", limit=5
+        )
+
+        assert len(results) == 5
+        assert all(r["meeting_id"] == target["meeting_id"] for r in results)
+        if FAISS_AVAILABLE:
+            assert target["id"] in [r["_id"] for r in results]
+            top_vector = min((r for r in results if r["_vector_rank"]), key=lambda r: r["_vector_rank"])
+            assert top_vector["_id"] == target["id"]
+
+        assert await service.hybrid_search("budget", target["embedding"], "tenant_a", fusion="nope") == []
+        await service.shutdown()
+
+
+class TestResultCache:
+    """Test the query result cache and its generation-based invalidation."""
+
+    @pytest.mark.asyncio
+    async def test_repeated_queries_hit_until_index_changes(self, local_settings):
+        """Test identical queries are served from cache and never after a mutation."""
+        service = create_service(LocalSearchService, local_settings)
+        docs = make_meeting_docs(60)
+        await service.index_documents(docs, "tenant_a", "meetings")
+
+        first = await service.search("Budget  topic3", "tenant_a", {"data_type": "summary"}, "meetings")
+        first[0]["meeting_id"] = "mutated by caller"
+        with patch.object(BM25Scorer, "search", side_effect=AssertionError("scored")):
+            second = await service.search("budget topic3", "tenant_a", {"data_type": "summary"}, "meetings")
+        assert second[0]["meeting_id"] != "mutated by caller"
+
+        # Each mutation bumps the generation, so new results are computed
+        await service.index_document({"id": "new", "text": "budget topic3 budget", "data_type": "summary"},
+                                     "tenant_a", "meetings")
+        third = await service.search("budget topic3", "tenant_a", {"data_type": "summary"}, "meetings")
+        assert "new" in [r["_id"] for r in third]
+        await service.delete_document("new", "tenant_a", "meetings")
+        assert "new" not in [r["_id"] for r in await service.search("budget topic3", "tenant_a",
+                                                                    {"data_type": "summary"}, "meetings")]
+
+        stats = service.get_search_stats()["result_cache"]
+        assert stats["hits"] == 1 and stats["misses"] == 3
+        assert stats["hit_rate"] == pytest.approx(0.25)
+        await service.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_keys_separate_filters_vectors_and_indices(self, local_settings):
+        """Test queries differing in filters, vector or index don't share entries."""
+        service = create_service(LocalSearchService, local_settings)
+        docs = make_meeting_docs(60)
+        await service.index_documents(docs, "tenant_a", "meetings")
+        await service.index_documents(docs[:10], "tenant_a", "other")
+
+        await service.search("budget", "tenant_a", {"priority": 1}, "meetings")
+        await service.search("budget", "tenant_a", {"priority": 2}, "meetings")
+        await service.search("budget", "tenant_a", {"priority": 1}, "other")
+        await service.hybrid_search("budget", docs[0]["embedding"], "tenant_a", index_name="meetings")
+        await service.hybrid_search("budget", docs[1]["embedding"], "tenant_a", index_name="meetings")
+        await service.hybrid_search("budget", docs[1]["embedding"], "tenant_a", index_name="meetings", limit=3)
+        await service.search("", "tenant_a", {"priority": 1}, "meetings", filter_only=True)
+
+        assert service.get_search_stats()["result_cache"]["hits"] == 0
+        await service.shutdown()
+
+    def test_lru_eviction_within_budget(self):
+        """Test the cache evicts least recently used entries to stay under budget."""
+        results = [{"_id": f"doc-{i}", "text": "x" * 100} for i in range(10)]
+        entry_size = QueryResultCache._estimate_size(results)
+        cache = QueryResultCache(max_bytes=entry_size * 3)
+
+        for key in ["a", "b", "c"]:
+            cache.put((key,), results)
+        assert cache.get(("a",)) is results
+        cache.put(("d",), results)
+
+        assert cache.get(("b",)) is None
+        assert all(cache.get((key,)) is results for key in ["a", "c", "d"])
+        assert cache.bytes <= cache.max_bytes
+        cache.put(("huge",), results * 10)
+        assert cache.get(("huge",)) is None
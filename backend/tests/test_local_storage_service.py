@@ -0,0 +1,189 @@
+"""
+Unit tests for streaming reads and writes in the local storage service.
+
+Tests:
+- put_object_stream hashes as it writes and renames the upload into place
+- Failed uploads leave the existing object untouched
+- open_object_stream reads whole objects and HTTP-style byte ranges
+- Streams keep reading the version they opened and can be sent with sendfile
+"""
+
+import asyncio
+import hashlib
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from conftest import create_service
+from backend.infrastructure.local.services.storage_service import LocalStorageService
+
+
+async def chunked(data: bytes, chunk_size: int = 1000):
+    """Yield data in chunks, like a request body."""
+    for offset in range(0, len(data), chunk_size):
+        yield data[offset:offset + chunk_size]
+
+
+class TestStreamingPut:
+    """Test put_object_stream."""
+
+    @pytest.mark.asyncio
+    async def test_put_object_stream_matches_put_object(self, local_settings):
+        """Test a streamed upload stores the same bytes and ETag as put_object."""
+        storage = create_service(LocalStorageService, local_settings)
+        data = bytes(range(256)) * 100
+        try:
+            assert await storage.put_object_stream("exports/report.bin", chunked(data), "tenant_a", {"source": "sie"})
+            assert await storage.put_object("exports/copy.bin", data, "tenant_a")
+
+            assert await storage.get_object("exports/report.bin", "tenant_a") == data
+            metadata = await storage.get_object_metadata("exports/report.bin", "tenant_a")
+            assert metadata["etag"] == hashlib.md5(data).hexdigest()
+            assert metadata["etag"] == (await storage.get_object_metadata("exports/copy.bin", "tenant_a"))["etag"]
+            assert metadata["size_bytes"] == len(data)
+            assert metadata["metadata"] == {"source": "sie"}
+            assert list(storage.upload_directory.iterdir()) == []
+        finally:
+            await storage.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_failed_upload_keeps_existing_object(self, local_settings):
+        """Test an upload that breaks off midway doesn't replace the object or leave a temp file."""
+        storage = create_service(LocalStorageService, local_settings)
+
+        async def broken_body():
+            yield b"partial"
+            raise ConnectionError("client disconnected")
+
+        try:
+            await storage.put_object("recording.webm", b"original", "tenant_a")
+
+            assert not await storage.put_object_stream("recording.webm", broken_body(), "tenant_a")
+
+            assert await storage.get_object("recording.webm", "tenant_a") == b"original"
+            assert list(storage.upload_directory.iterdir()) == []
+        finally:
+            await storage.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_upload_over_quota_is_rejected(self, local_settings):
+        """Test the quota is enforced while the upload is written."""
+        local_settings.local.max_disk_gb = 1500 / (1024 ** 3)
+        storage = create_service(LocalStorageService, local_settings)
+        try:
+            assert not await storage.put_object_stream("big.bin", chunked(b"x" * 2000), "tenant_a")
+            assert await storage.get_object_metadata("big.bin", "tenant_a") is None
+        finally:
+            await storage.shutdown()
+
+
+class TestStreamingGet:
+    """Test open_object_stream."""
+
+    @pytest.mark.asyncio
+    async def test_stream_whole_object_in_chunks(self, local_settings):
+        """Test iterating a stream yields the object in chunk_size pieces."""
+        storage = create_service(LocalStorageService, local_settings)
+        storage.stream_chunk_size = 4096
+        data = b"0123456789" * 1000
+        try:
+            await storage.put_object("data.bin", data, "tenant_a")
+
+            async with await storage.open_object_stream("data.bin", "tenant_a") as stream:
+                chunks = [chunk async for chunk in stream]
+
+            assert [len(chunk) for chunk in chunks] == [4096, 4096, 1808]
+            assert b"".join(chunks) == data
+            assert stream.etag == hashlib.md5(data).hexdigest()
+            assert await storage.open_object_stream("missing.bin", "tenant_a") is None
+            assert await storage.open_object_stream("data.bin", "tenant_b") is None
+        finally:
+            await storage.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_byte_ranges(self, local_settings):
+        """Test inclusive, open-ended and suffix ranges, and unsatisfiable ones."""
+        storage = create_service(LocalStorageService, local_settings)
+        data = bytes(range(100))
+        try:
+            await storage.put_object("data.bin", data, "tenant_a")
+
+            for byte_range, expected, content_range in [
+                ((10, 19), data[10:20], "bytes 10-19/100"),
+                ((90, None), data[90:], "bytes 90-99/100"),
+                ((None, 5), data[95:], "bytes 95-99/100"),
+                ((50, 500), data[50:], "bytes 50-99/100")
+            ]:
+                async with await storage.open_object_stream("data.bin", "tenant_a", byte_range) as stream:
+                    assert await stream.read() == expected
+                    assert stream.content_range == content_range
+
+            for byte_range in [(100, None), (20, 10), (None, 0)]:
+                with pytest.raises(ValueError):
+                    await storage.open_object_stream("data.bin", "tenant_a", byte_range)
+        finally:
+            await storage.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_open_stream_survives_overwrite(self, local_settings):
+        """Test a stream keeps reading the version it opened after the object is replaced."""
+        storage = create_service(LocalStorageService, local_settings)
+        try:
+            await storage.put_object("report.csv", b"version 1", "tenant_a")
+            stream = await storage.open_object_stream("report.csv", "tenant_a")
+
+            assert await storage.put_object_stream("report.csv", chunked(b"version 2"), "tenant_a")
+
+            async with stream:
+                assert await stream.read() == b"version 1"
+            assert await storage.get_object("report.csv", "tenant_a") == b"version 2"
+        finally:
+            await storage.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_sendfile_range_to_socket(self, local_settings):
+        """Test sendfile() writes exactly the requested range to a socket."""
+        storage = create_service(LocalStorageService, local_settings)
+        data = bytes(range(256)) * 1000
+        server, client = socket.socketpair()
+        server.setblocking(False)
+        try:
+            await storage.put_object("recording.webm", data, "tenant_a")
+
+            # Read on a thread while sending, since the range is bigger than the socket buffer
+            reader = asyncio.create_task(
+                asyncio.to_thread(lambda: b"".join(iter(lambda: client.recv(65536), b"")))
+            )
+            async with await storage.open_object_stream("recording.webm", "tenant_a", (1000, 200_999)) as stream:
+                sent = await stream.sendfile(server)
+            server.shutdown(socket.SHUT_WR)
+
+            received = await reader
+            assert sent == 200_000
+            assert received == data[1000:201_000]
+        finally:
+            server.close()
+            client.close()
+            await storage.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_copy_object_streams_source(self, local_settings):
+        """Test copy_object copies content, content type and metadata across tenants."""
+        storage = create_service(LocalStorageService, local_settings)
+        try:
+            await storage.put_object("notes.json", b'{"a": 1}', "tenant_a", {"owner": "x"})
+
+            assert await storage.copy_object("notes.json", "copy.bin", "tenant_a", "tenant_b")
+
+            assert await storage.get_object("copy.bin", "tenant_b") == b'{"a": 1}'
+            metadata = await storage.get_object_metadata("copy.bin", "tenant_b")
+            assert metadata["content_type"] == "application/json"
+            assert metadata["metadata"] == {"owner": "x"}
+        finally:
+            await storage.shutdown()
@@ -0,0 +1,178 @@
+"""
+Performance benchmarks for the local memory service.
+
+Tests:
+- put_memory latency with WAL group commit, and the lock-held pause of the
+  previous full JSON rewrite, at 100k and 1M entries
+- Recovery time from snapshot + WAL tail versus loading the JSON files
+- list_user_sessions and list_memory through the indexes versus a full scan
+
+Note: These benchmarks allocate large in-memory stores and can take
+several minutes. Set SKIP_PERFORMANCE_TESTS=1 to skip these tests.
+
+Usage:
+    # Skip performance tests (default)
+    pytest backend/tests/test_memory_performance.py -v
+
+    # Run performance tests
+    SKIP_PERFORMANCE_TESTS=0 pytest backend/tests/test_memory_performance.py -v -s
+"""
+
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from conftest import create_service, make_local_settings
+from backend.infrastructure.local.services.memory_service import LocalMemoryService
+
+
+# Skip tests if performance tests are disabled
+SKIP_PERF_TESTS = os.getenv("SKIP_PERFORMANCE_TESTS", "1") == "1"
+skip_perf = pytest.mark.skipif(SKIP_PERF_TESTS, reason="Performance tests disabled")
+
+
+def create_memory_service(data_directory: Path) -> LocalMemoryService:
+    """Create a memory service with a budget large enough to never evict."""
+    return create_service(LocalMemoryService, make_local_settings(data_directory, max_memory_mb=16 * 1024))
+
+
+def write_legacy_json(service: LocalMemoryService):
+    """The previous persist_data: rewrite every entry as indented JSON."""
+    memory_data = {}
+    for key, entry in service.memory_store.items():
+        entry_dict = asdict(entry)
+        del entry_dict['size_bytes']
+        for field in ['created_at', 'updated_at', 'expires_at', 'last_accessed']:
+            if entry_dict[field]:
+                entry_dict[field] = entry_dict[field].isoformat()
+        memory_data[key] = entry_dict
+    with open(service.memory_file, 'w') as f:
+        json.dump(memory_data, f, indent=2)
+
+
+async def stop_without_snapshot(service: LocalMemoryService):
+    """Flush the WAL and stop, leaving recovery to replay it."""
+    await asyncio.sleep(0)  # Let the background tasks start
+    for task in [service._persistence_task, service._wal_flush_task]:
+        task.cancel()
+    service.wal.flush()
+    service.wal.close()
+    service._wal_executor.shutdown(wait=True)
+    service._memory_expiry.close()
+    service._session_expiry.close()
+
+
+@skip_perf
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [100_000, 1_000_000])
+async def test_put_latency_and_recovery(tmp_path, size):
+    """Test WAL puts stay fast and recovery beats loading the JSON rewrite."""
+    service = create_memory_service(tmp_path / "wal")
+    await asyncio.sleep(0)  # Start the WAL flush task
+
+    latencies = np.empty(size)
+    for i in range(size):
+        value = {"text": f"meeting note {i}", "speaker": f"user-{i % 50}", "tokens": i % 400}
+        start = time.perf_counter()
+        await service.put_memory(f"user-{i % 1000}", f"note-{i}", value, "tenant_a")
+        latencies[i] = time.perf_counter() - start
+        if i % 1000 == 0:
+            await asyncio.sleep(0)  # Let the WAL flush task run, as request handling would
+    await asyncio.sleep(service.wal_flush_interval * 2)
+    wal_bytes = service.wal.bytes_since_snapshot
+    fsyncs = service.wal.fsyncs
+
+    legacy_service = create_memory_service(tmp_path / "legacy")
+    legacy_service.memory_store = service.memory_store
+    start = time.perf_counter()
+    write_legacy_json(legacy_service)
+    legacy_pause = time.perf_counter() - start
+    await stop_without_snapshot(service)
+    await stop_without_snapshot(legacy_service)
+    del service, legacy_service
+    gc.collect()
+
+    start = time.perf_counter()
+    recovered = create_memory_service(tmp_path / "wal")
+    wal_recovery = time.perf_counter() - start
+    assert len(recovered.memory_store) == size
+
+    start = time.perf_counter()
+    await recovered.persist_data()
+    snapshot_seconds = time.perf_counter() - start
+    await stop_without_snapshot(recovered)
+    del recovered
+    gc.collect()
+
+    start = time.perf_counter()
+    from_snapshot = create_memory_service(tmp_path / "wal")
+    snapshot_recovery = time.perf_counter() - start
+    await stop_without_snapshot(from_snapshot)
+    del from_snapshot
+    gc.collect()
+
+    start = time.perf_counter()
+    legacy_loaded = create_memory_service(tmp_path / "legacy")
+    legacy_recovery = time.perf_counter() - start
+    assert len(legacy_loaded.memory_store) == size
+    await stop_without_snapshot(legacy_loaded)
+
+    print(f"\nMemory store {size:>9,} entries: put p50 {np.percentile(latencies, 50) * 1e6:.1f}us "
+          f"p99 {np.percentile(latencies, 99) * 1e6:.1f}us, WAL {wal_bytes / 2**20:.0f} MB in {fsyncs} fsyncs; "
+          f"legacy JSON rewrite pause {legacy_pause:.2f}s")
+    print(f"  recovery: WAL replay {wal_recovery:.2f}s, snapshot {snapshot_recovery:.2f}s "
+          f"(written off-loop in {snapshot_seconds:.2f}s), legacy JSON load + migrate {legacy_recovery:.2f}s")
+
+    assert np.percentile(latencies, 99) < legacy_pause
+
+
+@skip_perf
+@pytest.mark.asyncio
+async def test_listing_uses_indexes(tmp_path):
+    """Test per-user listing stays flat as the number of sessions grows."""
+    service = create_memory_service(tmp_path)
+    users = 5000
+    for i in range(50_000):
+        await service.create_session("tenant_a", f"agent-{i}", f"user-{i % users}", {})
+        await service.put_memory(f"user-{i % users}", f"call:{i}", {"summary": f"call {i}"}, "tenant_a")
+
+    iterations = 1000
+    start = time.perf_counter()
+    for i in range(iterations):
+        sessions = await service.list_user_sessions(f"user-{i % users}", "tenant_a")
+    indexed = (time.perf_counter() - start) / iterations
+    assert len(sessions) == 10
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        await service.list_memory(f"user-{i % users}", "tenant_a", "call:")
+    memory_indexed = (time.perf_counter() - start) / iterations
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        user_id = f"user-{i % users}"
+        scanned = [
+            session for session in service.sessions.values()
+            if session.user_id == user_id and session.tenant_id == "tenant_a"
+        ]
+    full_scan = (time.perf_counter() - start) / iterations
+    assert len(scanned) == 10
+
+    await service.shutdown()
+
+    print(f"\nListing a user's sessions among 50,000: indexed {indexed * 1e6:.1f}us, "
+          f"full scan {full_scan * 1e6:.1f}us; list_memory by prefix {memory_indexed * 1e6:.1f}us")
+
+    assert indexed < full_scan
@@ -0,0 +1,191 @@
+"""
+Unit tests for the near cache (in-process L1 in front of the shared cache).
+
+Tests:
+- LRU bound, short TTL and per-tenant invalidation
+- Reads in flight during an invalidation are not cached
+- Tiered CacheFacade reads and cross-process invalidation over a pub/sub stand-in
+- Separate L1 and L2 hit ratios
+"""
+
+import sys
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from backend.infrastructure.local.services.memory_service import LocalCacheService
+from backend.infrastructure.local.services.near_cache import NearCache
+
+
+class InvalidationBus:
+    """In-memory stand-in for the Redis invalidation channel."""
+
+    def __init__(self):
+        self.subscribers = []
+        self.published = 0
+
+    async def publish(self, message: bytes):
+        self.published += 1
+        for handler in self.subscribers:
+            handler(message)
+
+
+def create_process(l2: LocalCacheService, bus: InvalidationBus):
+    """A CacheFacade with its own near cache over the shared L2, as in one process."""
+    from backend.infrastructure.service_facade import CacheFacade
+
+    near_cache = NearCache(max_entries=100, ttl_seconds=60)
+    bus.subscribers.append(near_cache.apply_invalidation)
+
+    async def execute(service_type, operation, *args):
+        return await getattr(l2, operation)(*args)
+
+    async def publish(tenant_id, keys):
+        await bus.publish(near_cache.invalidation_message(tenant_id, keys))
+
+    service_facade = MagicMock(_near_cache=near_cache)
+    service_facade._execute_with_circuit_breaker = MagicMock(side_effect=execute)
+    service_facade._publish_cache_invalidation = publish
+    return CacheFacade(service_facade)
+
+
+class TestNearCache:
+    """Test the L1 store."""
+
+    def test_lru_bound_and_ttl(self):
+        """Test the least recently used entry is evicted and expired entries miss."""
+        near_cache = NearCache(max_entries=2, ttl_seconds=60)
+        near_cache.put("a", 1, "tenant_a")
+        near_cache.put("b", 2, "tenant_a")
+        near_cache.get("a", "tenant_a")
+        near_cache.put("c", 3, "tenant_a")
+
+        assert near_cache.get("b", "tenant_a") == (False, None)
+        assert near_cache.get("a", "tenant_a") == (True, 1)
+        assert near_cache.evictions == 1
+
+        near_cache.put("short", 4, "tenant_a", ttl=0.01)
+        time.sleep(0.02)
+        assert near_cache.get("short", "tenant_a") == (False, None)
+
+    def test_tenants_are_namespaced(self):
+        """Test the same key is separate per tenant and tenants invalidate alone."""
+        near_cache = NearCache()
+        near_cache.put("persona", "a", "tenant_a")
+        near_cache.put("persona", "b", "tenant_b")
+        near_cache.put("tools", "a", "tenant_a")
+
+        near_cache.invalidate_tenant("tenant_a")
+
+        assert near_cache.get("persona", "tenant_a") == (False, None)
+        assert near_cache.get("persona", "tenant_b") == (True, "b")
+        assert len(near_cache) == 1
+
+    def test_fill_skipped_after_invalidation(self):
+        """Test a value read before an invalidation is not stored."""
+        near_cache = NearCache()
+        token = near_cache.fill_token()
+        near_cache.apply_invalidation(NearCache().invalidation_message("tenant_a", ["a"]))
+        near_cache.fill("a", "stale", "tenant_a", token)
+
+        assert near_cache.get("a", "tenant_a") == (False, None)
+
+    def test_own_messages_are_ignored(self):
+        """Test a process does not drop the value it has just written."""
+        near_cache = NearCache()
+        near_cache.put("a", 1, "tenant_a")
+        near_cache.apply_invalidation(near_cache.invalidation_message("tenant_a", ["a"]))
+
+        assert near_cache.get("a", "tenant_a") == (True, 1)
+
+
+    def test_values_are_copied(self):
+        """Test changing a stored or returned value doesn't change later reads."""
+        near_cache = NearCache()
+        value = {"tools": ["search"]}
+        near_cache.put("schema", value, "tenant_a")
+        value["tools"].append("browse")
+
+        found, cached = near_cache.get("schema", "tenant_a")
+        cached["tools"].clear()
+
+        assert near_cache.get("schema", "tenant_a") == (True, {"tools": ["search"]})
+
+    def test_unpicklable_values_are_not_cached(self):
+        """Test a value that can't be pickled is left to L2."""
+        near_cache = NearCache()
+        near_cache.put("callback", lambda: None, "tenant_a")
+
+        assert near_cache.get("callback", "tenant_a") == (False, None)
+        assert len(near_cache) == 0
+
+class TestTieredCacheFacade:
+    """Test CacheFacade with the near cache enabled."""
+
+    @pytest.mark.asyncio
+    async def test_hot_reads_served_from_l1(self):
+        """Test repeated reads reach L2 once and hit ratios are reported per tier."""
+        l2 = LocalCacheService()
+        cache = create_process(l2, InvalidationBus())
+        await l2.set("schema", {"tools": ["search"]}, "tenant_a")
+
+        for _ in range(10):
+            assert await cache.get("schema", "tenant_a") == {"tools": ["search"]}
+        assert await cache.get("missing", "tenant_a") is None
+
+        stats = cache.get_cache_stats()
+        assert cache.facade._execute_with_circuit_breaker.call_count == 2
+        assert (stats["l1_hits"], stats["l1_misses"]) == (9, 2)
+        assert stats["l2_hit_ratio"] == 0.5
+
+    @pytest.mark.asyncio
+    async def test_writes_invalidate_other_processes(self):
+        """Test a write in one process drops the key from another's L1."""
+        l2 = LocalCacheService()
+        bus = InvalidationBus()
+        writer = create_process(l2, bus)
+        reader = create_process(l2, bus)
+
+        await writer.set("persona", "formal", "tenant_a")
+        assert await reader.get("persona", "tenant_a") == "formal"
+
+        await writer.set("persona", "casual", "tenant_a")
+        assert await reader.get("persona", "tenant_a") == "casual"
+
+        await writer.delete_multiple(["persona"], "tenant_a")
+        assert await reader.get("persona", "tenant_a") is None
+        assert bus.published == 3
+
+    @pytest.mark.asyncio
+    async def test_get_multiple_fetches_only_l1_misses(self):
+        """Test a batch read sends only keys missing from L1 to L2."""
+        l2 = LocalCacheService()
+        cache = create_process(l2, InvalidationBus())
+        await cache.set_multiple({"a": 1, "b": 2}, "tenant_a")
+        await l2.set("c", 3, "tenant_a")
+
+        assert await cache.get_multiple(["a", "b", "c"], "tenant_a") == {"a": 1, "b": 2, "c": 3}
+        cache.facade._execute_with_circuit_breaker.assert_called_with(
+            'cache', 'get_multiple', ["c"], "tenant_a"
+        )
+
+    @pytest.mark.asyncio
+    async def test_l1_reads_return_copies(self):
+        """Test readers get their own copies from L1, as they do from L2."""
+        cache = create_process(LocalCacheService(), InvalidationBus())
+        schema = {"tools": ["search"]}
+        await cache.set("schema", schema, "tenant_a")
+        await cache.set_multiple({"persona": {"tone": "formal"}}, "tenant_a")
+        schema["tools"].append("browse")
+
+        (await cache.get("schema", "tenant_a"))["tools"].clear()
+        (await cache.get_multiple(["persona"], "tenant_a"))["persona"]["tone"] = "casual"
+
+        assert await cache.get("schema", "tenant_a") == {"tools": ["search"]}
+        assert await cache.get("persona", "tenant_a") == {"tone": "formal"}
@@ -0,0 +1,456 @@
+"""
+Performance benchmarks for the local search service.
+
+Tests:
+- BM25 re-index (remove + add) latency versus the previous full-scan
+  implementation at 10k, 100k and 1M documents
+- Bulk indexing throughput with index_documents
+- MaxScore top-k query latency versus exhaustive BM25 scoring
+- Batched ingestion (index_documents) versus per-document index_document
+- Multi-tenant p99 query latency while another tenant bulk-indexes
+- Filtered hybrid search with field-index pushdown versus post-filtering
+- Filter-only queries from declared field indexes versus an _apply_filters scan
+- Recall@10 versus memory for HNSW-Flat, HNSW-SQ8 and IVF-PQ vector storage
+- Repeated hybrid queries served from the result cache versus recomputed
+
+Note: These benchmarks allocate large in-memory corpora and can take
+several minutes. Set SKIP_PERFORMANCE_TESTS=1 to skip these tests.
+
+Usage:
+    # Skip performance tests (default)
+    pytest backend/tests/test_search_performance.py -v
+
+    # Run performance tests
+    SKIP_PERFORMANCE_TESTS=0 pytest backend/tests/test_search_performance.py -v -s
+"""
+
+import asyncio
+import itertools
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from conftest import create_service, make_local_settings
+from backend.infrastructure.local.services.search_service import (
+    BM25Scorer, LocalSearchService, QueryResultCache, ReadWriteLock, VectorIndex
+)
+
+
+# Skip tests if performance tests are disabled
+SKIP_PERF_TESTS = os.getenv("SKIP_PERFORMANCE_TESTS", "1") == "1"
+skip_perf = pytest.mark.skipif(SKIP_PERF_TESTS, reason="Performance tests disabled")
+
+CORPUS_SIZES = [10_000, 100_000, 1_000_000]
+VOCABULARY = [f"term{i}" for i in range(50_000)]
+TERMS_PER_DOC = 8
+REINDEX_OPS = 200
+
+
+class LegacyBM25Scorer(BM25Scorer):
+    """Previous BM25 update path: full inverted-index scan and O(N) averages."""
+
+    def add_document(self, doc_id: str, text: str):
+        terms = self._tokenize(text)
+        self.doc_lengths[doc_id] = len(terms)
+        for term, count in Counter(terms).items():
+            if doc_id not in self.inverted_index[term]:
+                self.doc_frequencies[term] += 1
+            self.inverted_index[term][doc_id] = count
+        self.total_docs += 1
+        self.avg_doc_length = sum(self.doc_lengths.values()) / self.total_docs
+
+    def remove_document(self, doc_id: str):
+        if doc_id not in self.doc_lengths:
+            return
+        for term in list(self.inverted_index.keys()):
+            if doc_id in self.inverted_index[term]:
+                del self.inverted_index[term][doc_id]
+                self.doc_frequencies[term] -= 1
+                if self.doc_frequencies[term] == 0:
+                    del self.doc_frequencies[term]
+                    del self.inverted_index[term]
+        del self.doc_lengths[doc_id]
+        self.total_docs -= 1
+        self.avg_doc_length = (
+            sum(self.doc_lengths.values()) / self.total_docs if self.total_docs else 0.0
+        )
+
+
+def generate_corpus(size: int, seed: int = 42):
+    """Generate (doc_id, text) pairs with a Zipf-like term distribution."""
+    rng = random.Random(seed)
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(VOCABULARY))))
+    for i in range(size):
+        terms = rng.choices(VOCABULARY, cum_weights=cum_weights, k=TERMS_PER_DOC)
+        yield f"doc-{i}", " ".join(terms)
+
+
+def time_reindex(scorer: BM25Scorer, size: int, ops: int) -> float:
+    """Return mean seconds per re-index (remove + add) of existing docs."""
+    rng = random.Random(7)
+    targets = [f"doc-{rng.randrange(size)}" for _ in range(ops)]
+    start = time.perf_counter()
+    for doc_id in targets:
+        scorer.remove_document(doc_id)
+        scorer.add_document(doc_id, "updated meeting chunk text")
+    return (time.perf_counter() - start) / ops
+
+
+@skip_perf
+@pytest.mark.parametrize("size", CORPUS_SIZES)
+def test_bm25_reindex_speedup(size):
+    """Test incremental re-index is much faster than the full-scan path."""
+    corpus = list(generate_corpus(size))
+
+    scorer = BM25Scorer()
+    start = time.perf_counter()
+    scorer.index_documents(corpus)
+    bulk_seconds = time.perf_counter() - start
+
+    incremental = time_reindex(scorer, size, REINDEX_OPS)
+
+    legacy = LegacyBM25Scorer()
+    legacy.index_documents(corpus)
+    # The legacy path is O(corpus) per op, so sample fewer operations
+    legacy_ops = max(5, REINDEX_OPS * 10_000 // size)
+    legacy_latency = time_reindex(legacy, size, legacy_ops)
+
+    speedup = legacy_latency / incremental
+    print(f"\nBM25 corpus={size:>9,}: bulk index {bulk_seconds:.2f}s "
+          f"({size / bulk_seconds:,.0f} docs/s), "
+          f"re-index {incremental * 1e6:.1f}us vs legacy {legacy_latency * 1e3:.2f}ms "
+          f"({speedup:,.0f}x)")
+
+    assert speedup > 10
+
+
+@skip_perf
+@pytest.mark.parametrize("size", [100_000, 1_000_000])
+def test_bm25_top_k_query_latency(size):
+    """Test MaxScore top-k beats exhaustive scoring on frequent-term queries."""
+    scorer = BM25Scorer()
+    scorer.index_documents(generate_corpus(size))
+
+    rng = random.Random(11)
+    # Mix one rare term with frequent head terms, as in real queries
+    queries = [
+        f"term{rng.randrange(1000, 50_000)} term{rng.randrange(0, 10)} term{rng.randrange(10, 100)}"
+        for _ in range(50)
+    ]
+
+    def mean_latency(search):
+        start = time.perf_counter()
+        for query in queries:
+            search(query, limit=10)
+        return (time.perf_counter() - start) / len(queries)
+
+    mean_latency(scorer.search)  # Freeze postings arrays before timing
+    pruned = mean_latency(scorer.search)
+    exhaustive = mean_latency(scorer.search_exhaustive)
+
+    print(f"\nBM25 top-10 corpus={size:>9,}: MaxScore {pruned * 1e3:.2f}ms "
+          f"vs exhaustive {exhaustive * 1e3:.2f}ms ({exhaustive / pruned:.1f}x)")
+
+    assert pruned < exhaustive
+
+
+@skip_perf
+@pytest.mark.asyncio
+async def test_batch_ingest_speedup(tmp_path):
+    """Test index_documents is at least 10x faster than per-document calls at batch size 1000."""
+    faiss = pytest.importorskip("faiss")
+    dimension = 1536
+    settings = make_local_settings(tmp_path, vector_dimensions=dimension)
+    rng = np.random.default_rng(0)
+    corpus = list(generate_corpus(1000))
+    docs = [
+        {"id": doc_id, "text": text, "embedding": rng.standard_normal(dimension).tolist()}
+        for doc_id, text in corpus
+    ]
+
+    single_service = create_service(LocalSearchService, settings)
+    batch_service = create_service(LocalSearchService, settings)
+
+    start = time.perf_counter()
+    for doc in docs:
+        await single_service.index_document(doc, "tenant_a", "bench")
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = await batch_service.index_documents(docs, "tenant_a", "bench")
+    batch_seconds = time.perf_counter() - start
+
+    assert all(result["error"] is None for result in results)
+    speedup = single_seconds / batch_seconds
+    print(f"\nIngest 1000 docs x {dimension}d: single {single_seconds:.2f}s, "
+          f"batch {batch_seconds:.2f}s ({speedup:.1f}x)")
+
+    await single_service.shutdown()
+    await batch_service.shutdown()
+
+    # Batched HNSW inserts parallelize across FAISS OpenMP threads; on a
+    # single core graph construction dominates both paths.
+    if faiss.omp_get_max_threads() >= 8:
+        assert speedup >= 10
+    else:
+        assert speedup > 1
+
+
+async def measure_query_latencies(service, queries, duration_stop: asyncio.Event = None):
+    """Run tenant_a queries back to back, returning per-query latencies in seconds."""
+    latencies = []
+    for query in queries:
+        if duration_stop is not None and duration_stop.is_set():
+            break
+        start = time.perf_counter()
+        await service.search(query, "tenant_a", index_name="docs")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+@skip_perf
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sharded", [True, False], ids=["per-index-locks", "single-lock"])
+async def test_multi_tenant_p99_under_bulk_indexing(tmp_path, sharded):
+    """Test tenant_a p99 query latency is unaffected while tenant_b bulk-indexes."""
+    settings = make_local_settings(tmp_path, vector_dimensions=8)
+    service = create_service(LocalSearchService, settings)
+    service.result_cache.max_bytes = 0  # Measure query evaluation, not cache hits
+
+    if not sharded:
+        # Emulate the previous process-wide lock for comparison
+        shared_lock = ReadWriteLock()
+        service._index_lock = lambda tenant_id, index_name: shared_lock
+
+    tenant_a_docs = [{"id": doc_id, "text": text} for doc_id, text in generate_corpus(20_000, seed=1)]
+    await service.index_documents(tenant_a_docs, "tenant_a", "docs")
+
+    rng = random.Random(3)
+    queries = [f"term{rng.randrange(0, 50)} term{rng.randrange(100, 5000)}" for _ in range(300)]
+    await measure_query_latencies(service, queries[:20])  # Warm up postings arrays
+
+    idle = await measure_query_latencies(service, queries)
+
+    tenant_b_docs = [{"id": doc_id, "text": text} for doc_id, text in generate_corpus(100_000, seed=2)]
+    ingest_done = asyncio.Event()
+
+    async def bulk_index():
+        for i in range(0, len(tenant_b_docs), 5000):
+            await service.index_documents(tenant_b_docs[i:i + 5000], "tenant_b", "docs")
+        ingest_done.set()
+
+    ingest = asyncio.create_task(bulk_index())
+    loaded = []
+    while not ingest_done.is_set():
+        loaded.extend(await measure_query_latencies(service, queries, ingest_done))
+    await ingest
+
+    idle_p99 = float(np.percentile(idle, 99))
+    loaded_p99 = float(np.percentile(loaded, 99))
+    print(f"\ntenant_a p99 ({'per-index locks' if sharded else 'single lock'}): "
+          f"idle {idle_p99 * 1e3:.2f}ms, during tenant_b bulk index {loaded_p99 * 1e3:.2f}ms "
+          f"({len(loaded)} queries)")
+
+    await service.shutdown()
+
+    if sharded:
+        # Only GIL contention with tokenization remains; no waiting on tenant_b's lock
+        assert loaded_p99 < max(5 * idle_p99, 0.05)
+
+
+@skip_perf
+@pytest.mark.asyncio
+async def test_filtered_hybrid_search_pushdown(tmp_path):
+    """Test selective filters make hybrid queries on a 50k-doc tenant much cheaper."""
+    dimension = 64
+    settings = make_local_settings(tmp_path, vector_dimensions=dimension)
+    service = create_service(LocalSearchService, settings)
+    service.result_cache.max_bytes = 0  # Measure query evaluation, not cache hits
+
+    rng = np.random.default_rng(4)
+    docs = [
+        {"id": doc_id, "text": text, "meeting_id": f"meeting-{i % 500}",
+         "data_type": ["transcript", "summary"][i % 2],
+         "embedding": rng.standard_normal(dimension).tolist()}
+        for i, (doc_id, text) in enumerate(generate_corpus(50_000, seed=5))
+    ]
+    await service.index_documents(docs, "tenant_a", "meetings")
+
+    queries = [
+        (f"term{i % 10} term{100 + i}", rng.standard_normal(dimension).tolist(),
+         {"meeting_id": f"meeting-{i * 7 % 500}", "data_type": "summary"})
+        for i in range(50)
+    ]
+
+    async def mean_latency():
+        await service.hybrid_search(*queries[0][:2], "tenant_a", queries[0][2], "meetings")
+        start = time.perf_counter()
+        for query, vector, filters in queries:
+            await service.hybrid_search(query, vector, "tenant_a", filters, "meetings", limit=10)
+        return (time.perf_counter() - start) / len(queries)
+
+    pushdown = await mean_latency()
+
+    # Post-filtering needs the full rankings to return the same matches
+    service._resolve_filters = lambda tenant_id, index_name, filters: (None, filters or {})
+    service.search_depth = len(docs)
+    post_filter = await mean_latency()
+
+    print(f"\nFiltered hybrid search over 50k docs: pushdown {pushdown * 1e3:.2f}ms "
+          f"vs post-filter {post_filter * 1e3:.2f}ms ({post_filter / pushdown:.1f}x)")
+
+    await service.shutdown()
+    assert pushdown < post_filter
+
+
+@skip_perf
+@pytest.mark.asyncio
+async def test_filter_only_query_from_field_indexes(tmp_path):
+    """Test filter-only lookups on 100k docs beat scanning with _apply_filters."""
+    settings = make_local_settings(tmp_path, vector_dimensions=8)
+    service = create_service(LocalSearchService, settings)
+    service.result_cache.max_bytes = 0  # Measure query evaluation, not cache hits
+
+    docs = [
+        {"id": doc_id, "text": text, "meeting_id": f"meeting-{i % 1000}",
+         "data_type": ["transcript", "summary"][i % 2], "timestamp": i}
+        for i, (doc_id, text) in enumerate(generate_corpus(100_000, seed=6))
+    ]
+    await service.index_documents(docs, "tenant_a", "meetings")
+    await service.create_field_index("timestamp", "tenant_a", "meetings", kind="range")
+
+    filters = [
+        {"meeting_id": f"meeting-{i * 13 % 1000}", "data_type": "summary",
+         "timestamp": {"gte": i * 1000, "lt": i * 1000 + 50_000}}
+        for i in range(50)
+    ]
+
+    async def mean_latency():
+        start = time.perf_counter()
+        for query_filters in filters:
+            await service.search("", "tenant_a", query_filters, "meetings", filter_only=True)
+        return (time.perf_counter() - start) / len(filters)
+
+    await mean_latency()
+    indexed = await mean_latency()
+
+    service._resolve_filters = lambda tenant_id, index_name, filters: (None, filters or {})
+    scan = await mean_latency()
+
+    print(f"\nFilter-only query over 100k docs: field indexes {indexed * 1e3:.2f}ms "
+          f"vs _apply_filters scan {scan * 1e3:.2f}ms ({scan / indexed:.1f}x)")
+
+    await service.shutdown()
+    assert indexed < scan
+
+
+def generate_embeddings(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    """Generate float32 embeddings with a low intrinsic dimension, like real text embeddings."""
+    projection = np.random.default_rng(99).standard_normal((32, dimension)).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    latent = rng.standard_normal((count, 32)).astype(np.float32)
+    return latent @ projection + 0.1 * rng.standard_normal((count, dimension)).astype(np.float32)
+
+
+@skip_perf
+@pytest.mark.parametrize("dimension", [384, 1536])
+def test_vector_storage_recall_versus_memory(dimension):
+    """Report recall@10 against exact search and bytes per vector for each storage type."""
+    faiss = pytest.importorskip("faiss")
+    count = 50_000 if dimension == 384 else 20_000
+    corpus = generate_embeddings(count, dimension)
+    queries = generate_embeddings(200, dimension, seed=1)
+    doc_ids = [f"doc-{i}" for i in range(count)]
+
+    # Exact cosine top-10 as ground truth
+    normalized = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    similarities = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalized.T
+    truth = [set(np.argpartition(-row, 10)[:10].tolist()) for row in similarities]
+
+    # Python content overhead of keeping the raw embedding list per document
+    tracemalloc.start()
+    raw_lists = [corpus[i].tolist() for i in range(200)]
+    content_bytes = tracemalloc.get_traced_memory()[0] / len(raw_lists)
+    tracemalloc.stop()
+    del raw_lists
+
+    print(f"\n{count:,} x {dimension}d vectors (raw embedding list in content: {content_bytes / 1024:.1f} KB/doc)")
+    recalls = {}
+    for index_type in ["hnsw_flat", "hnsw_sq8", "ivf_pq"]:
+        index = VectorIndex(dimension, index_type=index_type, train_size=10_000)
+        start = time.perf_counter()
+        for i in range(0, count, 5000):
+            index.add_vectors(doc_ids[i:i + 5000], corpus[i:i + 5000].copy())
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hits = [index.search(query.copy(), k=10) for query in queries]
+        query_seconds = (time.perf_counter() - start) / len(queries)
+
+        recalls[index_type] = float(np.mean([
+            len(truth[q] & {int(doc_id[4:]) for doc_id, _ in hits[q]}) / 10 for q in range(len(queries))
+        ]))
+        bytes_per_vector = len(faiss.serialize_index(index.index)) / count
+        print(f"  {index_type:>9}: recall@10 {recalls[index_type]:.3f}, {bytes_per_vector:,.0f} B/vector, "
+              f"build {build_seconds:.1f}s, query {query_seconds * 1e3:.2f}ms")
+
+    assert recalls["hnsw_sq8"] > 0.8 * recalls["hnsw_flat"]
+    assert recalls["ivf_pq"] > 0.3
+
+
+@skip_perf
+@pytest.mark.asyncio
+async def test_repeated_query_result_cache(tmp_path):
+    """Test repeated dashboard-style hybrid queries are served from the result cache."""
+    dimension = 384
+    settings = make_local_settings(tmp_path, vector_dimensions=dimension)
+    service = create_service(LocalSearchService, settings)
+
+    embeddings = generate_embeddings(50_000, dimension, seed=7)
+    docs = [
+        {"id": doc_id, "text": text, "asset_type": ["crypto", "equity", "fx"][i % 3],
+         "embedding": embeddings[i].tolist()}
+        for i, (doc_id, text) in enumerate(generate_corpus(50_000, seed=7))
+    ]
+    await service.index_documents(docs, "tenant_a", "market")
+
+    # Ten dashboard panels refreshed 20 times each
+    panels = [
+        (f"term{i} term{i + 20} market analysis", embeddings[i].tolist(), {"asset_type": ["crypto", "equity", "fx"][i % 3]})
+        for i in range(10)
+    ]
+
+    async def mean_latency():
+        start = time.perf_counter()
+        for _ in range(20):
+            for query, vector, filters in panels:
+                await service.hybrid_search(query, vector, "tenant_a", filters, "market", limit=20)
+        return (time.perf_counter() - start) / (20 * len(panels))
+
+    # Warm up postings arrays and the HNSW graph without caching
+    cache_bytes = service.result_cache.max_bytes
+    service.result_cache.max_bytes = 0
+    await mean_latency()
+    uncached = await mean_latency()
+
+    service.result_cache = QueryResultCache(cache_bytes)
+    cached = await mean_latency()
+    hit_rate = service.get_search_stats()["result_cache"]["hit_rate"]
+
+    print(f"\nRepeated hybrid queries over 50k docs: cached {cached * 1e3:.2f}ms "
+          f"vs uncached {uncached * 1e3:.2f}ms ({uncached / cached:.1f}x), hit rate {hit_rate:.2f}")
+
+    await service.shutdown()
+    assert hit_rate == pytest.approx(0.95)
+    assert cached < uncached
@@ -0,0 +1,120 @@
+"""
+Performance benchmarks for streaming in the local storage service.
+
+Tests:
+- Peak memory reading a large object with get_object versus open_object_stream
+- Peak memory and throughput storing a large object with put_object versus
+  put_object_stream
+
+Set SKIP_PERFORMANCE_TESTS=1 to skip these tests.
+
+Usage:
+    # Skip performance tests (default)
+    pytest backend/tests/test_storage_performance.py -v
+
+    # Run performance tests
+    SKIP_PERFORMANCE_TESTS=0 pytest backend/tests/test_storage_performance.py -v -s
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_path.parent))
+
+from conftest import create_service, make_local_settings
+from backend.infrastructure.local.services.storage_service import LocalStorageService
+
+
+# Skip tests if performance tests are disabled
+SKIP_PERF_TESTS = os.getenv("SKIP_PERFORMANCE_TESTS", "1") == "1"
+skip_perf = pytest.mark.skipif(SKIP_PERF_TESTS, reason="Performance tests disabled")
+
+OBJECT_MB = 128
+CHUNK_SIZE = 1024 * 1024
+
+
+def create_storage_service(tmp_path) -> LocalStorageService:
+    """Create a storage service in `tmp_path` (requires a running loop)."""
+    return create_service(LocalStorageService, make_local_settings(tmp_path, max_disk_gb=10))
+
+
+async def upload_body():
+    """Yield OBJECT_MB of data one chunk at a time, like a request body."""
+    chunk = os.urandom(CHUNK_SIZE)
+    for _ in range(OBJECT_MB):
+        yield chunk
+
+
+async def measure(operation):
+    """Run an async operation and return (seconds, peak traced MB)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    await operation()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+
+@skip_perf
+class TestStoragePerformance:
+    """Benchmark buffered versus streamed object transfer."""
+
+    @pytest.mark.asyncio
+    async def test_streamed_read_memory(self, tmp_path):
+        """Test streaming a large object holds one chunk at a time."""
+        storage = create_storage_service(tmp_path)
+        try:
+            assert await storage.put_object_stream("recording.webm", upload_body(), "tenant_a")
+
+            async def buffered():
+                assert len(await storage.get_object("recording.webm", "tenant_a")) == OBJECT_MB * CHUNK_SIZE
+
+            async def streamed():
+                total = 0
+                async with await storage.open_object_stream("recording.webm", "tenant_a") as stream:
+                    async for chunk in stream:
+                        total += len(chunk)
+                assert total == OBJECT_MB * CHUNK_SIZE
+
+            buffered_time, buffered_peak = await measure(buffered)
+            streamed_time, streamed_peak = await measure(streamed)
+        finally:
+            await storage.shutdown()
+
+        print(
+            f"\nReading a {OBJECT_MB} MB object: get_object {buffered_peak:.1f} MB peak in {buffered_time:.2f}s, "
+            f"open_object_stream {streamed_peak:.1f} MB peak in {streamed_time:.2f}s"
+        )
+        assert streamed_peak < buffered_peak / 10
+
+    @pytest.mark.asyncio
+    async def test_streamed_write_memory(self, tmp_path):
+        """Test a streamed upload holds one chunk at a time."""
+        storage = create_storage_service(tmp_path)
+        try:
+            async def buffered():
+                data = b"".join([chunk async for chunk in upload_body()])
+                assert await storage.put_object("buffered.webm", data, "tenant_a")
+
+            async def streamed():
+                assert await storage.put_object_stream("streamed.webm", upload_body(), "tenant_a")
+
+            buffered_time, buffered_peak = await measure(buffered)
+            streamed_time, streamed_peak = await measure(streamed)
+        finally:
+            await storage.shutdown()
+
+        print(
+            f"\nStoring a {OBJECT_MB} MB object: put_object {buffered_peak:.1f} MB peak "
+            f"({OBJECT_MB / buffered_time:.0f} MB/s), put_object_stream {streamed_peak:.1f} MB peak "
+            f"({OBJECT_MB / streamed_time:.0f} MB/s)"
+        )
+        assert streamed_peak < buffered_peak / 10